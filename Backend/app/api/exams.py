@@ -10,6 +10,8 @@ from app import db
 from app.models.user import User
 from app.models.exam import Exam, Question, QuestionOption, AnswerKey
 from app.api import api
+from app.services.ocr.answer_regions import validate_answer_region_template
+from app.services.ocr.omr import validate_bubble_sheet_template, bubble_sheet_pages
 
 exams_bp = Blueprint('exams', __name__)
 exams_ns = Namespace('exams', description='Exam management operations')
@@ -59,6 +61,8 @@ exam_response_model = api.model('ExamResponse', {
     'is_active': fields.Boolean(description='Is active', example=True),
     'start_date': fields.String(description='Start date (ISO format)', example='2025-12-15T09:00:00'),
     'end_date': fields.String(description='End date (ISO format)', example='2025-12-15T12:00:00'),
+    'has_answer_region_template': fields.Boolean(description='Answer sheet has an answer region template', example=False),
+    'has_bubble_sheet_template': fields.Boolean(description='Answer sheet has multiple-choice bubble grids', example=False),
     'created_at': fields.String(description='Creation date (ISO format)', example='2025-12-05T10:30:00.123456'),
     'updated_at': fields.String(description='Last update date (ISO format)', example='2025-12-05T10:30:00.123456')
 })
@@ -191,6 +195,52 @@ option_detail_response = api.model('OptionDetailResponse', {
     'status': fields.String(description='Response status', example='success')
 })
 
+answer_region_model = api.model('AnswerRegion', {
+    'question_id': fields.Integer(required=True, description='Question ID', example=1),
+    'page': fields.Integer(description='Page number (1-based)', example=1, default=1),
+    'box': fields.List(fields.Float, required=True,
+                       description='[x0, y0, x1, y1] as fractions of the anchor frame', example=[0.1, 0.2, 0.9, 0.26])
+})
+
+answer_region_template_model = api.model('AnswerRegionTemplate', {
+    'anchor': fields.String(description="'corner_marks' (four printed corner squares) or 'page'",
+                            example='corner_marks', default='corner_marks'),
+    'regions': fields.List(fields.Nested(answer_region_model), required=True, description='One answer box per question')
+})
+
+answer_region_template_response = api.model('AnswerRegionTemplateResponse', {
+    'answer_region_template': fields.Nested(answer_region_template_model, allow_null=True,
+                                            description='Template, or null if answers are read from full pages'),
+    'status': fields.String(description='Response status', example='success')
+})
+
+bubble_grid_model = api.model('BubbleGrid', {
+    'page': fields.Integer(description='Page number (1-based)', example=1, default=1),
+    'question_ids': fields.List(fields.Integer, required=True,
+                                description='Multiple choice questions, one row of bubbles each (top to bottom)',
+                                example=[1, 2, 3]),
+    'options': fields.Integer(required=True, description='Bubbles per row (A, B, C, ...)', example=4),
+    'origin': fields.List(fields.Float, required=True,
+                          description='[x, y] centre of the first bubble, as fractions of the anchor frame',
+                          example=[0.15, 0.1]),
+    'option_step': fields.Float(required=True, description='Distance between bubble centres in a row (fraction of frame width)',
+                                example=0.06),
+    'question_step': fields.Float(required=True, description='Distance between rows (fraction of frame height)', example=0.03),
+    'bubble_size': fields.Float(required=True, description='Bubble diameter (fraction of frame width)', example=0.025)
+})
+
+bubble_sheet_template_model = api.model('BubbleSheetTemplate', {
+    'anchor': fields.String(description="'corner_marks' (four printed corner squares) or 'page'",
+                            example='corner_marks', default='corner_marks'),
+    'grids': fields.List(fields.Nested(bubble_grid_model), required=True, description='Bubble grids of the sheet')
+})
+
+bubble_sheet_template_response = api.model('BubbleSheetTemplateResponse', {
+    'bubble_sheet_template': fields.Nested(bubble_sheet_template_model, allow_null=True,
+                                           description='Template, or null if multiple choice answers are read by OCR'),
+    'status': fields.String(description='Response status', example='success')
+})
+
 message_response = api.model('MessageResponse', {
     'message': fields.String(description='Response message', example='Operation completed successfully'),
     'status': fields.String(description='Response status', example='success')
@@ -1261,3 +1311,227 @@ class AnswerKeyDetail(Resource):
         except Exception as e:
             db.session.rollback()
             return {'message': f'Failed to delete answer key: {str(e)}', 'status': 'error'}, 500
+
+
+@exams_ns.route('/<int:exam_id>/answer-regions')
+@exams_ns.param('exam_id', 'The exam identifier')
+class AnswerRegionTemplate(Resource):
+    @jwt_required()
+    @exams_ns.doc(
+        description='Get the answer region template of an exam (Owner or Admin only). When set, OCR only reads the listed answer boxes of full-page scans.',
+        security='Bearer Auth',
+        responses={
+            200: ('Template retrieved successfully', answer_region_template_response),
+            403: ('Access denied - Only exam creator or admin can view the template', message_response),
+            404: ('Exam not found', message_response)
+        }
+    )
+    @require_teacher_or_admin
+    def get(self, exam_id):
+        """Get the answer region template of an exam"""
+        current_user_id = get_jwt_identity()
+        user = User.query.get(int(current_user_id))
+        exam = Exam.query.get_or_404(exam_id)
+
+        # Check ownership
+        if not is_exam_owner_or_admin(exam, user):
+            return {'message': 'Access denied', 'status': 'error'}, 403
+
+        return {
+            'answer_region_template': exam.answer_region_template,
+            'status': 'success'
+        }, 200
+
+    @jwt_required()
+    @exams_ns.expect(answer_region_template_model, validate=False)
+    @exams_ns.doc(
+        description='Set the answer region template of an exam (Owner or Admin only). Each region maps one question to a box on a page, given as [x0, y0, x1, y1] fractions of the frame spanned by the four corner marks printed on the answer sheet (or of the whole page with anchor "page").',
+        security='Bearer Auth',
+        responses={
+            200: ('Template saved successfully', answer_region_template_response),
+            400: ('Validation error - Malformed template or question not found in exam', message_response),
+            403: ('Access denied - Only exam creator or admin can set the template', message_response),
+            404: ('Exam not found', message_response)
+        }
+    )
+    @require_teacher_or_admin
+    def put(self, exam_id):
+        """Set the answer region template of an exam"""
+        current_user_id = get_jwt_identity()
+        user = User.query.get(int(current_user_id))
+        exam = Exam.query.get_or_404(exam_id)
+
+        # Check ownership
+        if not is_exam_owner_or_admin(exam, user):
+            return {'message': 'Access denied', 'status': 'error'}, 403
+
+        data = request.get_json()
+        error = validate_answer_region_template(data, [q.id for q in exam.questions])
+        if error:
+            return {'message': error, 'status': 'error'}, 400
+
+        shared_pages = {region.get('page', 1) for region in data['regions']} & \
+            bubble_sheet_pages(exam.bubble_sheet_template)
+        if shared_pages:
+            return {'message': f'Page(s) {sorted(shared_pages)} are bubble sheet pages, which are not OCR\'d',
+                    'status': 'error'}, 400
+
+        exam.answer_region_template = {
+            'anchor': data.get('anchor', 'corner_marks'),
+            'regions': [
+                {'question_id': region['question_id'], 'page': region.get('page', 1), 'box': region['box']}
+                for region in data['regions']
+            ]
+        }
+
+        try:
+            db.session.commit()
+            return {
+                'answer_region_template': exam.answer_region_template,
+                'message': 'Answer region template saved successfully',
+                'status': 'success'
+            }, 200
+        except Exception as e:
+            db.session.rollback()
+            return {'message': f'Failed to save answer region template: {str(e)}', 'status': 'error'}, 500
+
+    @jwt_required()
+    @exams_ns.doc(
+        description='Remove the answer region template of an exam (Owner or Admin only). Full-page scans are then read as whole pages again.',
+        security='Bearer Auth',
+        responses={
+            200: ('Template removed successfully', message_response),
+            403: ('Access denied - Only exam creator or admin can remove the template', message_response),
+            404: ('Exam not found', message_response)
+        }
+    )
+    @exams_ns.marshal_with(message_response, code=200)
+    @require_teacher_or_admin
+    def delete(self, exam_id):
+        """Remove the answer region template of an exam"""
+        current_user_id = get_jwt_identity()
+        user = User.query.get(int(current_user_id))
+        exam = Exam.query.get_or_404(exam_id)
+
+        # Check ownership
+        if not is_exam_owner_or_admin(exam, user):
+            return {'message': 'Access denied', 'status': 'error'}, 403
+
+        try:
+            exam.answer_region_template = None
+            db.session.commit()
+            return {'message': 'Answer region template removed successfully', 'status': 'success'}, 200
+        except Exception as e:
+            db.session.rollback()
+            return {'message': f'Failed to remove answer region template: {str(e)}', 'status': 'error'}, 500
+
+
+@exams_ns.route('/<int:exam_id>/bubble-sheet')
+@exams_ns.param('exam_id', 'The exam identifier')
+class BubbleSheetTemplate(Resource):
+    @jwt_required()
+    @exams_ns.doc(
+        description='Get the bubble sheet template of an exam (Owner or Admin only). When set, the multiple choice answers on its pages are read by optical mark recognition instead of OCR.',
+        security='Bearer Auth',
+        responses={
+            200: ('Template retrieved successfully', bubble_sheet_template_response),
+            403: ('Access denied - Only exam creator or admin can view the template', message_response),
+            404: ('Exam not found', message_response)
+        }
+    )
+    @require_teacher_or_admin
+    def get(self, exam_id):
+        """Get the bubble sheet template of an exam"""
+        current_user_id = get_jwt_identity()
+        user = User.query.get(int(current_user_id))
+        exam = Exam.query.get_or_404(exam_id)
+
+        # Check ownership
+        if not is_exam_owner_or_admin(exam, user):
+            return {'message': 'Access denied', 'status': 'error'}, 403
+
+        return {
+            'bubble_sheet_template': exam.bubble_sheet_template,
+            'status': 'success'
+        }, 200
+
+    @jwt_required()
+    @exams_ns.expect(bubble_sheet_template_model, validate=False)
+    @exams_ns.doc(
+        description='Set the bubble sheet template of an exam (Owner or Admin only). Each grid places one row of bubbles per multiple choice question on a page; positions are fractions of the frame spanned by the four corner marks printed on the sheet (or of the whole page with anchor "page"). Bubble sheet pages are not sent to OCR, so they cannot also carry answer regions.',
+        security='Bearer Auth',
+        responses={
+            200: ('Template saved successfully', bubble_sheet_template_response),
+            400: ('Validation error - Malformed template, or question not found in exam or not multiple choice', message_response),
+            403: ('Access denied - Only exam creator or admin can set the template', message_response),
+            404: ('Exam not found', message_response)
+        }
+    )
+    @require_teacher_or_admin
+    def put(self, exam_id):
+        """Set the bubble sheet template of an exam"""
+        current_user_id = get_jwt_identity()
+        user = User.query.get(int(current_user_id))
+        exam = Exam.query.get_or_404(exam_id)
+
+        # Check ownership
+        if not is_exam_owner_or_admin(exam, user):
+            return {'message': 'Access denied', 'status': 'error'}, 403
+
+        data = request.get_json()
+        error = validate_bubble_sheet_template(data, exam.questions)
+        if error:
+            return {'message': error, 'status': 'error'}, 400
+
+        grid_keys = ('question_ids', 'options', 'origin', 'option_step', 'question_step', 'bubble_size')
+        grids = [dict({'page': grid.get('page', 1)}, **{key: grid[key] for key in grid_keys})
+                 for grid in data['grids']]
+
+        region_template = exam.answer_region_template or {}
+        shared_pages = bubble_sheet_pages({'grids': grids}) & \
+            {region.get('page', 1) for region in region_template.get('regions', [])}
+        if shared_pages:
+            return {'message': f'Page(s) {sorted(shared_pages)} already have answer regions', 'status': 'error'}, 400
+
+        exam.bubble_sheet_template = {'anchor': data.get('anchor', 'corner_marks'), 'grids': grids}
+
+        try:
+            db.session.commit()
+            return {
+                'bubble_sheet_template': exam.bubble_sheet_template,
+                'message': 'Bubble sheet template saved successfully',
+                'status': 'success'
+            }, 200
+        except Exception as e:
+            db.session.rollback()
+            return {'message': f'Failed to save bubble sheet template: {str(e)}', 'status': 'error'}, 500
+
+    @jwt_required()
+    @exams_ns.doc(
+        description='Remove the bubble sheet template of an exam (Owner or Admin only). Multiple choice answers are then read by OCR again.',
+        security='Bearer Auth',
+        responses={
+            200: ('Template removed successfully', message_response),
+            403: ('Access denied - Only exam creator or admin can remove the template', message_response),
+            404: ('Exam not found', message_response)
+        }
+    )
+    @exams_ns.marshal_with(message_response, code=200)
+    @require_teacher_or_admin
+    def delete(self, exam_id):
+        """Remove the bubble sheet template of an exam"""
+        current_user_id = get_jwt_identity()
+        user = User.query.get(int(current_user_id))
+        exam = Exam.query.get_or_404(exam_id)
+
+        # Check ownership
+        if not is_exam_owner_or_admin(exam, user):
+            return {'message': 'Access denied', 'status': 'error'}, 403
+
+        try:
+            exam.bubble_sheet_template = None
+            db.session.commit()
+            return {'message': 'Bubble sheet template removed successfully', 'status': 'success'}, 200
+        except Exception as e:
+            db.session.rollback()
+            return {'message': f'Failed to remove bubble sheet template: {str(e)}', 'status': 'error'}, 500
@@ -361,6 +361,183 @@ class DownloadPDF(Resource):
         )
 
 
+# ============================================================================
+# PAGE AND ANSWER PREVIEW ENDPOINTS
+# ============================================================================
+
+PREVIEW_MAX_AGE = 7 * 24 * 3600  # Previews are content-addressed, so they never change
+
+
+def _preview_options(default_size):
+    """Read size/format query parameters, returning (size, fmt, error)"""
+    from app.services.preview_service import PREVIEW_FORMATS, MAX_PREVIEW_SIZE
+
+    size = request.args.get('size', default_size, type=int)
+    fmt = request.args.get('format', 'jpeg').lower()
+    if fmt == 'jpg':
+        fmt = 'jpeg'
+    if not size or size < 16 or size > MAX_PREVIEW_SIZE:
+        return None, None, f'size must be between 16 and {MAX_PREVIEW_SIZE}'
+    if fmt not in PREVIEW_FORMATS:
+        return None, None, f"format must be one of: {', '.join(PREVIEW_FORMATS)}"
+    return size, fmt, None
+
+
+def _probed_scan(submission):
+    """
+    Locate a submission's scanned paper and its probe
+
+    Returns:
+        (file_path, probe, error response or None)
+    """
+    if not submission.scanned_paper_path:
+        return None, None, ({'message': 'Submission has no scanned paper', 'status': 'error'}, 404)
+    file_path = os.path.join(current_app.config.get('UPLOAD_FOLDER', 'uploads'), submission.scanned_paper_path)
+    if not os.path.exists(file_path):
+        return None, None, ({'message': 'Scanned paper not found', 'status': 'error'}, 404)
+
+    if not (submission.file_probe or {}).get('success'):
+        # Older submissions: probe once, then reuse
+        submission.refresh_file_probe(file_path)
+        db.session.commit()
+    probe = submission.file_probe
+    if not probe.get('success'):
+        return None, None, ({'message': probe.get('error', 'Scanned paper could not be read'), 'status': 'error'}, 422)
+    return file_path, probe, None
+
+
+def _send_preview(submission, page_number, box, size, fmt, scan=None):
+    """Serve a (cached) preview of a submission's scanned paper with an ETag"""
+    from app.services.preview_service import PREVIEW_FORMATS, get_preview
+
+    file_path, probe, error = scan or _probed_scan(submission)
+    if error:
+        return error
+    if page_number < 1 or page_number > probe['page_count']:
+        return {'message': f"Page must be between 1 and {probe['page_count']}", 'status': 'error'}, 404
+
+    preview_path, etag = get_preview(file_path, probe['file_hash'], page_number, box, size, fmt,
+                                     page_info=probe['pages'][page_number - 1])
+
+    response = send_file(preview_path, mimetype=PREVIEW_FORMATS[fmt], etag=etag,
+                         conditional=True, max_age=PREVIEW_MAX_AGE)
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
+
+
+@ocr_management_ns.route('/submissions/<int:submission_id>/pages/<int:page_number>/preview')
+@ocr_management_ns.param('submission_id', 'The submission identifier')
+@ocr_management_ns.param('page_number', 'Page number (1-based)')
+class PagePreview(Resource):
+    @jwt_required()
+    @ocr_management_ns.doc(
+        description='Get a page thumbnail, or a crop of the page, of a submission\'s scanned paper. '
+                    'Query parameters: size (longest edge in pixels, default 400), format (jpeg, png or webp), '
+                    'box (x0,y0,x1,y1 as fractions of the page). Supports If-None-Match.',
+        security='Bearer Auth',
+        responses={
+            200: 'Preview image',
+            304: 'Not modified',
+            400: ('Invalid parameters', message_response),
+            403: ('Access denied', message_response),
+            404: ('Submission, scan or page not found', message_response)
+        }
+    )
+    def get(self, submission_id, page_number):
+        """Get page preview"""
+        current_user_id = get_jwt_identity()
+        user = User.query.get(int(current_user_id))
+        submission = Submission.query.get_or_404(submission_id)
+
+        # Check permissions
+        if not can_access_submission(submission, user):
+            return {'message': 'Access denied', 'status': 'error'}, 403
+
+        size, fmt, error = _preview_options(400)
+        if error:
+            return {'message': error, 'status': 'error'}, 400
+
+        box = None
+        if request.args.get('box'):
+            try:
+                box = [float(v) for v in request.args['box'].split(',')]
+            except ValueError:
+                box = []
+            if len(box) != 4 or not all(0 <= v <= 1 for v in box) or box[0] >= box[2] or box[1] >= box[3]:
+                return {'message': 'box must be x0,y0,x1,y1 fractions with x0 < x1 and y0 < y1',
+                        'status': 'error'}, 400
+
+        return _send_preview(submission, page_number, box, size, fmt)
+
+
+@ocr_management_ns.route('/submissions/<int:submission_id>/answers/<int:answer_id>/preview')
+@ocr_management_ns.param('submission_id', 'The submission identifier')
+@ocr_management_ns.param('answer_id', 'The submission answer identifier')
+class AnswerPreview(Resource):
+    @jwt_required()
+    @ocr_management_ns.doc(
+        description='Get a cropped preview of where an answer was read on the scanned paper. '
+                    'Query parameters: size (longest edge in pixels, default 800), format (jpeg, png or webp). '
+                    'Supports If-None-Match.',
+        security='Bearer Auth',
+        responses={
+            200: 'Preview image',
+            304: 'Not modified',
+            400: ('Invalid parameters', message_response),
+            403: ('Access denied', message_response),
+            404: ('Answer not found or has no location', message_response)
+        }
+    )
+    def get(self, submission_id, answer_id):
+        """Get answer preview"""
+        from app.services.ocr.preprocessing import source_box
+
+        current_user_id = get_jwt_identity()
+        user = User.query.get(int(current_user_id))
+        submission = Submission.query.get_or_404(submission_id)
+
+        # Check permissions
+        if not can_access_submission(submission, user):
+            return {'message': 'Access denied', 'status': 'error'}, 403
+
+        answer = SubmissionAnswer.query.filter_by(id=answer_id, submission_id=submission_id).first()
+        if not answer:
+            return {'message': 'Answer not found', 'status': 'error'}, 404
+
+        size, fmt, error = _preview_options(800)
+        if error:
+            return {'message': error, 'status': 'error'}, 400
+
+        location = answer.extracted_bounding_box or {}
+        if not location.get('bbox'):
+            return {'message': 'No location recorded for this answer', 'status': 'error'}, 404
+
+        scan = _probed_scan(submission)
+        if scan[2]:
+            return scan[2]
+        page_number = location.get('page', 1)
+        if page_number < 1 or page_number > scan[1]['page_count']:
+            return {'message': 'Answer location is outside the scanned pages', 'status': 'error'}, 404
+
+        # Boxes are in pixels of the page as OCR'd - map them onto the page as scanned
+        ocr_result = OCRResult.query.filter_by(submission_id=submission_id, page_number=page_number) \
+            .order_by(OCRResult.id.desc()).first()
+        preprocessing = ocr_result.preprocessing if ocr_result else None
+        if not (preprocessing or {}).get('original_size'):
+            # Not preprocessed: pixels of the rasterized page (PDF points at OCR_PDF_DPI)
+            page_info = scan[1]['pages'][page_number - 1]
+            scale = 1.0
+            if submission.scanned_paper_path.lower().endswith('.pdf'):
+                scale = int(os.environ.get('OCR_PDF_DPI', 300)) / 72.0
+            preprocessing = {'steps': [], 'original_size': [page_info['width'] * scale, page_info['height'] * scale]}
+        box = source_box(location['bbox'], preprocessing)
+        if box is None:
+            return {'message': 'Answer location cannot be mapped onto the scan', 'status': 'error'}, 404
+
+        return _send_preview(submission, page_number, [round(v, 4) for v in box], size, fmt, scan=scan)
+
+
 @ocr_management_ns.route('/exams/<int:exam_id>/generate-all-pdfs')
 @ocr_management_ns.param('exam_id', 'The exam identifier')
 class BulkGeneratePDFs(Resource):
@@ -13,6 +13,10 @@ from app.models.user import User
 from app.models.exam import Exam
 from app.models.submission import Submission, SubmissionAnswer, OCRResult
 from app.utils.file_upload import save_uploaded_file, delete_file, allowed_file
+from app.utils.upload_sessions import (
+    create_upload_session, get_upload_session, get_finalized_upload, append_chunk, finalize_upload_session,
+    delete_upload_session
+)
 from app.api import api
 
 submissions_bp = Blueprint('submissions', __name__)
@@ -60,7 +64,8 @@ submission_response_model = api.model('SubmissionResponse', {
     'exam_id': fields.Integer(description='Exam ID', example=1),
     'student_id': fields.Integer(description='Student ID', example=5),
     'scanned_paper_path': fields.String(description='Path to scanned paper file', example='uploads/submissions/exam1_student5_20251205.pdf'),
-    'submission_status': fields.String(description='Status: pending, processing, completed, failed', example='completed'),
+    'file_hash': fields.String(description='SHA-256 of the scanned paper', example='9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08'),
+    'submission_status': fields.String(description='Status: assembling, pending, processing, completed, failed', example='completed'),
     'submitted_at': fields.String(description='Submission date (ISO format)', example='2025-12-05T10:30:00.123456'),
     'processed_at': fields.String(description='Processing completion date (ISO format)', example='2025-12-05T10:35:00.123456'),
     'created_at': fields.String(description='Creation date (ISO format)', example='2025-12-05T10:30:00.123456'),
@@ -72,7 +77,8 @@ submission_detail_model = api.model('SubmissionDetail', {
     'exam_id': fields.Integer(description='Exam ID', example=1),
     'student_id': fields.Integer(description='Student ID', example=5),
     'scanned_paper_path': fields.String(description='Path to scanned paper file', example='uploads/submissions/exam1_student5_20251205.pdf'),
-    'submission_status': fields.String(description='Status: pending, processing, completed, failed', example='completed'),
+    'file_hash': fields.String(description='SHA-256 of the scanned paper', example='9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08'),
+    'submission_status': fields.String(description='Status: assembling, pending, processing, completed, failed', example='completed'),
     'submitted_at': fields.String(description='Submission date (ISO format)', example='2025-12-05T10:30:00.123456'),
     'processed_at': fields.String(description='Processing completion date (ISO format)', example='2025-12-05T10:35:00.123456'),
     'created_at': fields.String(description='Creation date (ISO format)', example='2025-12-05T10:30:00.123456'),
@@ -100,11 +106,55 @@ submission_create_response = api.model('SubmissionCreateResponse', {
     'status': fields.String(description='Response status', example='success')
 })
 
+submission_assembly_job_model = api.model('SubmissionAssemblyJob', {
+    'submission_id': fields.Integer(description='Submission being assembled', example=1),
+    'status': fields.String(description='Submission status while the PDF is built', example='assembling'),
+    'status_url': fields.String(description='Poll this until the status changes', example='/api/v1/submissions/1')
+})
+
+submission_assembly_response = api.model('SubmissionAssemblyResponse', {
+    'submission': fields.Nested(submission_response_model, description='Reserved submission object'),
+    'job': fields.Nested(submission_assembly_job_model, description='Background PDF build'),
+    'message': fields.String(description='Response message'),
+    'status': fields.String(description='Response status', example='success'),
+    'page_count': fields.Integer(description='Number of pages (images)', example=3)
+})
+
 message_response = api.model('MessageResponse', {
     'message': fields.String(description='Response message', example='Operation completed successfully'),
     'status': fields.String(description='Response status', example='success')
 })
 
+upload_session_create_model = api.model('UploadSessionCreate', {
+    'exam_id': fields.Integer(required=True, description='Exam ID', example=1),
+    'student_id': fields.Integer(description='Student ID (teachers/admins only)', example=5),
+    'filename': fields.String(required=True, description='Original filename (decides the file type)', example='paper.pdf'),
+    'total_size': fields.Integer(required=True, description='Size of the whole file in bytes', example=52428800),
+    'sha256': fields.String(description='Optional hex SHA-256 of the whole file, checked on finalize')
+})
+
+upload_session_model = api.model('UploadSession', {
+    'upload_id': fields.String(description='Upload session ID', example='3f2b9c0e8d7a4b6c9e1f0a2b3c4d5e6f'),
+    'exam_id': fields.Integer(description='Exam ID', example=1),
+    'student_id': fields.Integer(description='Student ID', example=5),
+    'filename': fields.String(description='Original filename', example='paper.pdf'),
+    'total_size': fields.Integer(description='Size of the whole file in bytes', example=52428800),
+    'offset': fields.Integer(description='Bytes received so far (where the next chunk starts)', example=8388608),
+    'chunk_size': fields.Integer(description='Largest chunk accepted per request', example=8388608),
+    'expires_at': fields.Float(description='When the session expires unless more data arrives (Unix time)')
+})
+
+upload_session_response = api.model('UploadSessionResponse', {
+    'upload': fields.Nested(upload_session_model, description='Upload session'),
+    'status': fields.String(description='Response status', example='success')
+})
+
+upload_chunk_response = api.model('UploadChunkResponse', {
+    'offset': fields.Integer(description='Bytes received so far', example=16777216),
+    'message': fields.String(description='Response message'),
+    'status': fields.String(description='Response status', example='success')
+})
+
 
 # ============================================================================
 # HELPER FUNCTIONS
@@ -124,6 +174,150 @@ def can_access_submission(submission, user):
     return False
 
 
+def check_submission_target(user, exam_id, student_id=None):
+    """
+    Check that a user may submit a paper for an exam
+
+    Students submit for themselves; teachers/admins may submit on behalf
+    of student_id (defaulting to themselves).
+
+    Returns:
+        (student_id, error response or None)
+    """
+    # Students can submit, teachers/admins can submit on behalf of students
+    if not (user.has_role('student') or user.has_role('teacher') or user.has_role('admin')):
+        return None, ({'message': 'Insufficient permissions', 'status': 'error'}, 403)
+
+    # Verify exam exists and is published
+    exam = Exam.query.get_or_404(exam_id)
+
+    # Check if exam is published and active (students only)
+    if user.has_role('student'):
+        if not exam.is_published or not exam.is_active:
+            return None, ({'message': 'Exam not available for submission', 'status': 'error'}, 403)
+
+        # Check if within exam timeframe
+        now = datetime.utcnow()
+        if exam.start_date and now < exam.start_date:
+            return None, ({'message': 'Exam has not started yet', 'status': 'error'}, 403)
+        if exam.end_date and now > exam.end_date:
+            return None, ({'message': 'Exam submission period has ended', 'status': 'error'}, 403)
+
+    # Get student_id (teachers/admins can specify, otherwise use their own ID for testing)
+    if not (user.has_role('teacher') or user.has_role('admin')) or not student_id:
+        student_id = user.id
+
+    # Check if submission already exists
+    from app.services.submission_assembly import is_assembly_abandoned
+    existing_submission = Submission.query.filter_by(
+        exam_id=exam_id,
+        student_id=student_id
+    ).first()
+
+    if existing_submission and (is_assembly_abandoned(existing_submission) or (
+            existing_submission.submission_status == 'failed' and not existing_submission.scanned_paper_path)):
+        # A multi-image upload whose PDF could not be built, or whose build was lost with
+        # its server process, holds no paper - allow a new attempt (the delete is
+        # committed together with the new submission)
+        db.session.delete(existing_submission)
+        db.session.flush()
+    elif existing_submission:
+        return None, ({
+            'message': 'Submission already exists for this exam',
+            'status': 'error',
+            'submission': existing_submission.to_dict()
+        }, 409)
+
+    return student_id, None
+
+
+def create_scan_submission(exam_id, student_id, upload_result):
+    """
+    Create the submission for a stored scanned paper
+
+    Args:
+        exam_id: Exam ID
+        student_id: Student ID
+        upload_result: save_uploaded_file() / store_local_file() result
+
+    Returns:
+        Response tuple (the stored file is released if creation fails)
+    """
+    try:
+        # Create submission record
+        submission = Submission(
+            exam_id=exam_id,
+            student_id=student_id,
+            scanned_paper_path=upload_result['filepath'],
+            file_hash=upload_result['file_hash'],
+            submission_status='pending'  # Will be processed by OCR service
+        )
+
+        # Page count and sizes, read without rendering the scan
+        upload_base = current_app.config.get('UPLOAD_FOLDER', 'uploads')
+        submission.refresh_file_probe(os.path.join(upload_base, upload_result['filepath']))
+
+        db.session.add(submission)
+        db.session.commit()
+
+        # NOTE: OCR processing has been disabled. Returning hardcoded success response.
+        # Original OCR/Celery code is backed up in old_code/submissions_old.py
+
+        # Update submission status to completed
+        submission.submission_status = 'completed'
+        submission.processed_at = datetime.utcnow()
+        db.session.commit()
+
+        return {
+            'submission': submission.to_dict(),
+            'task_id': 'hardcoded-task-' + str(submission.id),
+            'message': 'Exam paper uploaded successfully. OCR processing completed (simulated).',
+            'status': 'success'
+        }, 201
+
+    except Exception as e:
+        db.session.rollback()
+        # Delete uploaded file if database operation failed
+        delete_file(upload_result['filepath'])
+        return {'message': f'Failed to create submission: {str(e)}', 'status': 'error'}, 500
+
+
+def upload_session_for(upload_id, user):
+    """
+    Get an upload session owned by user
+
+    Returns:
+        (session, error response or None)
+    """
+    session = get_upload_session(upload_id)
+    if session is None or session['user_id'] != user.id:
+        return None, ({'message': 'Upload session not found or expired', 'status': 'error'}, 404)
+    return session, None
+
+
+def finalized_upload_response(upload_result):
+    """
+    Response for a finalize retried after the upload was already finalized
+
+    Returns the submission the first finalize created, if it still exists.
+    """
+    session = upload_result['session']
+    submission = Submission.query.filter_by(
+        exam_id=session['exam_id'],
+        student_id=session['student_id'],
+        scanned_paper_path=upload_result['filepath']
+    ).first()
+    if submission is None:
+        return {'message': 'Upload was already finalized but no submission was kept - start a new upload',
+                'status': 'error'}, 404
+
+    return {
+        'submission': submission.to_dict(),
+        'message': 'Upload already finalized',
+        'status': 'success'
+    }, 200
+
+
 # ============================================================================
 # SUBMISSIONS ENDPOINTS
 # ============================================================================
@@ -217,56 +411,16 @@ class SubmissionList(Resource):
         if not user:
             return {'message': 'User not found', 'status': 'error'}, 404
 
-        # Students can submit, teachers/admins can submit on behalf of students
-        if not (user.has_role('student') or user.has_role('teacher') or user.has_role('admin')):
-            return {'message': 'Insufficient permissions', 'status': 'error'}, 403
-
         # Get exam_id from either form data or query parameters (for flexibility)
         exam_id = request.form.get('exam_id', type=int) or request.args.get('exam_id', type=int)
         if not exam_id:
             return {'message': 'exam_id is required', 'status': 'error'}, 400
 
-        # Verify exam exists and is published
-        exam = Exam.query.get_or_404(exam_id)
-
-        # Check if exam is published and active (students only)
-        if user.has_role('student'):
-            if not exam.is_published or not exam.is_active:
-                return {'message': 'Exam not available for submission', 'status': 'error'}, 403
-
-            # Check if within exam timeframe
-            now = datetime.utcnow()
-            if exam.start_date and now < exam.start_date:
-                return {'message': 'Exam has not started yet', 'status': 'error'}, 403
-            if exam.end_date and now > exam.end_date:
-                return {'message': 'Exam submission period has ended', 'status': 'error'}, 403
-
-        # Get student_id (teachers/admins can specify, otherwise use their own ID for testing)
-        if user.has_role('teacher') or user.has_role('admin'):
-            student_id = request.form.get('student_id', type=int) or request.args.get('student_id', type=int)
-
-            if student_id:
-                # Verify student exists if provided (skip validation for now due to date parsing issues)
-                # TODO: Fix User model date parsing
-                pass
-            else:
-                # Default to current user for testing purposes
-                student_id = user.id
-        else:
-            student_id = user.id
-
-        # Check if submission already exists
-        existing_submission = Submission.query.filter_by(
-            exam_id=exam_id,
-            student_id=student_id
-        ).first()
-
-        if existing_submission:
-            return {
-                'message': 'Submission already exists for this exam',
-                'status': 'error',
-                'submission': existing_submission.to_dict()
-            }, 409
+        student_id, error = check_submission_target(
+            user, exam_id, request.form.get('student_id', type=int) or request.args.get('student_id', type=int)
+        )
+        if error:
+            return error
 
         # Check if file was uploaded
         if 'file' not in request.files:
@@ -278,47 +432,188 @@ class SubmissionList(Resource):
             return {'message': 'No file selected', 'status': 'error'}, 400
 
         # Save file
-        upload_result = save_uploaded_file(
-            file,
-            subfolder='submissions',
-            prefix=f'exam{exam_id}_student{student_id}_'
-        )
+        upload_result = save_uploaded_file(file, subfolder='submissions')
 
         if not upload_result['success']:
             return {'message': upload_result['error'], 'status': 'error'}, 400
 
-        try:
-            # Create submission record
-            submission = Submission(
-                exam_id=exam_id,
-                student_id=student_id,
-                scanned_paper_path=upload_result['filepath'],
-                submission_status='pending'  # Will be processed by OCR service
-            )
+        return create_scan_submission(exam_id, student_id, upload_result)
 
-            db.session.add(submission)
-            db.session.commit()
 
-            # NOTE: OCR processing has been disabled. Returning hardcoded success response.
-            # Original OCR/Celery code is backed up in old_code/submissions_old.py
+@submissions_ns.route('/uploads')
+class SubmissionUploadSessions(Resource):
+    @jwt_required()
+    @submissions_ns.expect(upload_session_create_model)
+    @submissions_ns.doc(
+        description='Start a resumable upload of a scanned exam paper (for files too large for a single request). '
+                    'Send the file with PUT /submissions/uploads/{upload_id}?offset=N in chunks of at most chunk_size bytes, '
+                    'each with an X-Chunk-SHA256 header, then POST /submissions/uploads/{upload_id}/finalize. '
+                    'Sessions idle for longer than UPLOAD_SESSION_TTL_HOURS expire.',
+        security='Bearer Auth',
+        responses={
+            201: ('Upload session created', upload_session_response),
+            400: ('Validation error', message_response),
+            403: ('Insufficient permissions or exam not available for submission', message_response),
+            404: ('User or exam not found', message_response),
+            409: ('Submission already exists for this exam', submission_create_response)
+        }
+    )
+    def post(self):
+        """Start a resumable upload"""
+        current_user_id = get_jwt_identity()
+        user = User.query.get(int(current_user_id))
 
-            # Update submission status to completed
-            submission.submission_status = 'completed'
-            submission.processed_at = datetime.utcnow()
-            db.session.commit()
+        if not user:
+            return {'message': 'User not found', 'status': 'error'}, 404
 
-            return {
-                'submission': submission.to_dict(),
-                'task_id': 'hardcoded-task-' + str(submission.id),
-                'message': 'Exam paper uploaded successfully. OCR processing completed (simulated).',
-                'status': 'success'
-            }, 201
+        data = request.get_json(silent=True) or {}
+        exam_id = data.get('exam_id')
+        if not exam_id:
+            return {'message': 'exam_id is required', 'status': 'error'}, 400
 
-        except Exception as e:
-            db.session.rollback()
-            # Delete uploaded file if database operation failed
-            delete_file(upload_result['filepath'])
-            return {'message': f'Failed to create submission: {str(e)}', 'status': 'error'}, 500
+        student_id, error = check_submission_target(user, exam_id, data.get('student_id'))
+        if error:
+            return error
+
+        result = create_upload_session(
+            user_id=user.id,
+            exam_id=exam_id,
+            student_id=student_id,
+            filename=data.get('filename'),
+            total_size=data.get('total_size'),
+            sha256=data.get('sha256')
+        )
+        if not result['success']:
+            return {'message': result['error'], 'status': 'error'}, 400
+
+        return {'upload': result['session'], 'status': 'success'}, 201
+
+
+@submissions_ns.route('/uploads/<string:upload_id>')
+@submissions_ns.param('upload_id', 'The upload session identifier')
+class SubmissionUploadSession(Resource):
+    @jwt_required()
+    @submissions_ns.doc(
+        description='Get an upload session. Its offset is where an interrupted upload resumes.',
+        security='Bearer Auth',
+        responses={
+            200: ('Success', upload_session_response),
+            404: ('Upload session not found or expired', message_response)
+        }
+    )
+    def get(self, upload_id):
+        """Get upload session progress"""
+        user = User.query.get(int(get_jwt_identity()))
+        session, error = upload_session_for(upload_id, user)
+        if error:
+            return error
+
+        return {'upload': session, 'status': 'success'}, 200
+
+    @jwt_required()
+    @submissions_ns.param('offset', 'Byte offset of the chunk (must equal the session offset)', _in='query', type=int, required=True)
+    @submissions_ns.param('X-Chunk-SHA256', 'Hex SHA-256 of the chunk', _in='header', required=True)
+    @submissions_ns.doc(
+        description='Upload the next chunk as the raw request body (application/octet-stream). '
+                    'A chunk already received is acknowledged again, so lost responses can be retried.',
+        security='Bearer Auth',
+        responses={
+            200: ('Chunk stored', upload_chunk_response),
+            400: ('Invalid or corrupted chunk - resend it', upload_chunk_response),
+            404: ('Upload session not found or expired', message_response),
+            409: ('Offset does not match - resume from the returned offset', upload_chunk_response)
+        }
+    )
+    def put(self, upload_id):
+        """Upload a chunk"""
+        user = User.query.get(int(get_jwt_identity()))
+        session, error = upload_session_for(upload_id, user)
+        if error:
+            return error
+
+        result = append_chunk(
+            upload_id,
+            offset=request.args.get('offset', type=int),
+            stream=request.stream,
+            length=request.content_length,
+            checksum=request.headers.get('X-Chunk-SHA256')
+        )
+
+        if result['success']:
+            return {'offset': result['offset'], 'message': 'Chunk stored', 'status': 'success'}, 200
+
+        status_code = {'not_found': 404, 'offset_mismatch': 409}.get(result['reason'], 400)
+        response = {'message': result['error'], 'status': 'error'}
+        if 'offset' in result:
+            response['offset'] = result['offset']
+        return response, status_code
+
+    @jwt_required()
+    @submissions_ns.doc(
+        description='Abort an upload and discard the data received',
+        security='Bearer Auth',
+        responses={
+            200: ('Upload aborted', message_response),
+            404: ('Upload session not found or expired', message_response)
+        }
+    )
+    def delete(self, upload_id):
+        """Abort an upload"""
+        user = User.query.get(int(get_jwt_identity()))
+        session, error = upload_session_for(upload_id, user)
+        if error:
+            return error
+
+        delete_upload_session(upload_id)
+        return {'message': 'Upload aborted', 'status': 'success'}, 200
+
+
+@submissions_ns.route('/uploads/<string:upload_id>/finalize')
+@submissions_ns.param('upload_id', 'The upload session identifier')
+class SubmissionUploadFinalize(Resource):
+    @jwt_required()
+    @submissions_ns.doc(
+        description='Finish a resumable upload and create the submission from it. '
+                    'Finalizing again within UPLOAD_SESSION_TTL_HOURS returns the submission already created.',
+        security='Bearer Auth',
+        responses={
+            200: ('Upload already finalized', submission_create_response),
+            201: ('Exam paper uploaded successfully', submission_create_response),
+            400: ('File checksum mismatch', message_response),
+            403: ('Exam not available for submission', message_response),
+            404: ('Upload session not found or expired', message_response),
+            409: ('Upload incomplete, or submission already exists for this exam', message_response)
+        }
+    )
+    def post(self, upload_id):
+        """Finish a resumable upload"""
+        user = User.query.get(int(get_jwt_identity()))
+
+        # A retry after a lost response gets the submission created the first time
+        finalized = get_finalized_upload(upload_id)
+        if finalized is not None and finalized['session']['user_id'] == user.id:
+            return finalized_upload_response(finalized)
+
+        session, error = upload_session_for(upload_id, user)
+        if error:
+            return error
+
+        # The exam may have closed, or a submission arrived another way, since the upload started
+        student_id, error = check_submission_target(user, session['exam_id'], session['student_id'])
+        if error:
+            return error
+
+        upload_result = finalize_upload_session(upload_id, subfolder='submissions')
+        if not upload_result['success']:
+            status_code = {'not_found': 404, 'incomplete': 409}.get(upload_result.get('reason'), 400)
+            response = {'message': upload_result['error'], 'status': 'error'}
+            if 'offset' in upload_result:
+                response['offset'] = upload_result['offset']
+            return response, status_code
+        if upload_result.get('already_finalized'):
+            return finalized_upload_response(upload_result)
+
+        return create_scan_submission(session['exam_id'], student_id, upload_result)
 
 
 @submissions_ns.route('/<int:submission_id>')
@@ -590,7 +885,8 @@ class SubmissionOCRStatus(Resource):
 class SubmissionOCRResults(Resource):
     @jwt_required()
     @submissions_ns.doc(
-        description='Get detailed OCR results for a submission',
+        description='Get detailed OCR results for a submission. The full Google Vision response is omitted unless include_raw=true.',
+        params={'include_raw': 'Include the full Google Vision API response (default: false)'},
         security='Bearer Auth',
         responses={
             200: ('OCR results retrieved successfully', message_response),
@@ -607,34 +903,45 @@ class SubmissionOCRResults(Resource):
         if not can_access_submission(submission, user):
             return {'message': 'Access denied', 'status': 'error'}, 403
 
+        include_raw = request.args.get('include_raw', 'false').lower() in ['true', '1', 't']
+
+        # Serve real OCR results when the submission has been processed
+        ocr_results = OCRResult.query.filter_by(submission_id=submission_id)\
+            .order_by(OCRResult.page_number).all()
+        if ocr_results:
+            return {
+                'status': 'success',
+                'ocr_results': [result.to_dict(include_raw=include_raw) for result in ocr_results]
+            }, 200
+
         # NOTE: OCR processing has been disabled. Returning hardcoded results.
         # Original OCR/Celery code is backed up in old_code/submissions_old.py
 
-        return {
-            'status': 'success',
-            'ocr_results': [
-                {
-                    'id': 1,
-                    'submission_id': submission_id,
-                    'ocr_service': 'simulated',
-                    'ocr_strategy_id': None,
-                    'raw_text': 'Sample OCR text (hardcoded)',
-                    'processed_text': 'Sample OCR text (hardcoded)',
-                    'confidence_score': 0.95,
-                    'raw_response': {},
-                    'bounding_boxes': [],
-                    'detected_language': 'en',
-                    'detected_breaks': [],
-                    'page_number': 1,
-                    'retry_count': 0,
-                    'processing_status': 'completed',
-                    'error_message': None,
-                    'processing_time_seconds': 0.0,
-                    'created_at': datetime.utcnow().isoformat(),
-                    'updated_at': datetime.utcnow().isoformat()
-                }
-            ]
-        }, 200
+        simulated_result = {
+            'id': 1,
+            'submission_id': submission_id,
+            'ocr_service': 'simulated',
+            'ocr_strategy_id': None,
+            'raw_text': 'Sample OCR text (hardcoded)',
+            'processed_text': 'Sample OCR text (hardcoded)',
+            'confidence_score': 0.95,
+            'raw_response_ref': None,
+            'raw_response_size': None,
+            'bounding_boxes': [],
+            'detected_language': 'en',
+            'detected_breaks': [],
+            'page_number': 1,
+            'retry_count': 0,
+            'processing_status': 'completed',
+            'error_message': None,
+            'processing_time_seconds': 0.0,
+            'created_at': datetime.utcnow().isoformat(),
+            'updated_at': datetime.utcnow().isoformat()
+        }
+        if include_raw:
+            simulated_result['raw_response'] = {}
+
+        return {'status': 'success', 'ocr_results': [simulated_result]}, 200
 
 
 @submissions_ns.route('/create-from-images')
@@ -642,10 +949,10 @@ class SubmissionFromImages(Resource):
     @jwt_required()
     @submissions_ns.expect(multi_image_upload_parser)
     @submissions_ns.doc(
-        description='Upload multiple scanned exam paper images and create a single PDF. Students can submit their own papers. Teachers/Admins can submit on behalf of students by providing student_id. Supported formats: PNG, JPG, JPEG. Only one submission per student per exam is allowed. The images will be combined into a single PDF in the order provided.',
+        description='Upload multiple scanned exam paper images and create a single PDF. Students can submit their own papers. Teachers/Admins can submit on behalf of students by providing student_id. Supported formats: PNG, JPG, JPEG. Only one submission per student per exam is allowed. The images will be combined into a single PDF in the order provided. The PDF is built in the background: the submission is returned with status "assembling" and becomes "completed" (or "failed", in which case a new upload is allowed) once it is done. A submission left "assembling" for longer than SUBMISSION_ASSEMBLY_TIMEOUT_MINUTES (its build was lost to a server restart) can also be replaced by a new upload.',
         security='Bearer Auth',
         responses={
-            201: ('PDF created and exam paper uploaded successfully', submission_create_response),
+            202: ('Images received, PDF being built', submission_assembly_response),
             400: ('Validation error - Missing images or invalid exam', message_response),
             403: ('Insufficient permissions or exam not available for submission', message_response),
             404: ('User or exam not found', message_response),
@@ -654,9 +961,8 @@ class SubmissionFromImages(Resource):
     )
     def post(self):
         """Create PDF from multiple images and upload as exam submission"""
-        import tempfile
-        import uuid as uuid_lib
-        from app.utils.pdf_utils import images_to_pdf, allowed_file
+        from PIL import Image
+        from app.services.submission_assembly import ASSEMBLING_STATUS, spool_uploads, submit_submission_assembly
 
         current_user_id = get_jwt_identity()
         user = User.query.get(int(current_user_id))
@@ -664,50 +970,16 @@ class SubmissionFromImages(Resource):
         if not user:
             return {'message': 'User not found', 'status': 'error'}, 404
 
-        # Students can submit, teachers/admins can submit on behalf of students
-        if not (user.has_role('student') or user.has_role('teacher') or user.has_role('admin')):
-            return {'message': 'Insufficient permissions', 'status': 'error'}, 403
-
         # Get exam_id from either form data or query parameters
         exam_id = request.form.get('exam_id', type=int) or request.args.get('exam_id', type=int)
         if not exam_id:
             return {'message': 'exam_id is required', 'status': 'error'}, 400
 
-        # Verify exam exists and is published
-        exam = Exam.query.get_or_404(exam_id)
-
-        # Check if exam is published and active (students only)
-        if user.has_role('student'):
-            if not exam.is_published or not exam.is_active:
-                return {'message': 'Exam not available for submission', 'status': 'error'}, 403
-
-            # Check if within exam timeframe
-            now = datetime.utcnow()
-            if exam.start_date and now < exam.start_date:
-                return {'message': 'Exam has not started yet', 'status': 'error'}, 403
-            if exam.end_date and now > exam.end_date:
-                return {'message': 'Exam submission period has ended', 'status': 'error'}, 403
-
-        # Get student_id
-        if user.has_role('teacher') or user.has_role('admin'):
-            student_id = request.form.get('student_id', type=int) or request.args.get('student_id', type=int)
-            if not student_id:
-                student_id = user.id
-        else:
-            student_id = user.id
-
-        # Check if submission already exists
-        existing_submission = Submission.query.filter_by(
-            exam_id=exam_id,
-            student_id=student_id
-        ).first()
-
-        if existing_submission:
-            return {
-                'message': 'Submission already exists for this exam',
-                'status': 'error',
-                'submission': existing_submission.to_dict()
-            }, 409
+        student_id, error = check_submission_target(
+            user, exam_id, request.form.get('student_id', type=int) or request.args.get('student_id', type=int)
+        )
+        if error:
+            return error
 
         # Get uploaded images
         images = request.files.getlist('images')
@@ -715,99 +987,59 @@ class SubmissionFromImages(Resource):
         if not images or len(images) == 0:
             return {'message': 'No images uploaded. Please provide at least one image.', 'status': 'error'}, 400
 
-        # Validate all images
-        temp_image_paths = []
+        # Validate all images (headers only - decoding happens in the background)
         allowed_image_extensions = {'png', 'jpg', 'jpeg'}
 
+        for i, image_file in enumerate(images):
+            if image_file.filename == '':
+                return {'message': f'Image {i+1} has no filename', 'status': 'error'}, 400
+
+            # Check file extension
+            if not allowed_file(image_file.filename, allowed_image_extensions):
+                return {
+                    'message': f'Image {i+1} has invalid type. Only PNG, JPG, and JPEG are allowed for multi-image upload.',
+                    'status': 'error'
+                }, 400
+
+            try:
+                with Image.open(image_file.stream) as img:
+                    image_format = img.format
+            except Exception:
+                image_format = None
+            if image_format not in ('PNG', 'JPEG'):
+                return {'message': f'Image {i+1} is not a readable PNG or JPEG image', 'status': 'error'}, 400
+
+        buffers = []
         try:
-            for i, image_file in enumerate(images):
-                if image_file.filename == '':
-                    return {'message': f'Image {i+1} has no filename', 'status': 'error'}, 400
-
-                # Check file extension
-                if not allowed_file(image_file.filename, allowed_image_extensions):
-                    return {
-                        'success': False,
-                        'error': f'Image {i+1} has invalid type. Only PNG, JPG, and JPEG are allowed for multi-image upload.'
-                    }, 400
-
-                # Save to temporary location
-                temp_dir = tempfile.gettempdir()
-                temp_filename = f"temp_upload_{uuid_lib.uuid4().hex}_{image_file.filename}"
-                temp_path = os.path.join(temp_dir, temp_filename)
-                image_file.save(temp_path)
-                temp_image_paths.append(temp_path)
-
-            # Create PDF from images
-            timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
-            unique_id = str(uuid_lib.uuid4())[:8]
-            pdf_filename = f"exam{exam_id}_student{student_id}_{timestamp}_{unique_id}.pdf"
-
-            # Determine output path
-            upload_base = current_app.config.get('UPLOAD_FOLDER', 'uploads')
-            pdf_dir = os.path.join(upload_base, 'submissions')
-            os.makedirs(pdf_dir, exist_ok=True)
-            pdf_path = os.path.join(pdf_dir, pdf_filename)
-
-            # Convert images to PDF
-            pdf_result = images_to_pdf(temp_image_paths, pdf_path)
-
-            if not pdf_result['success']:
-                return {'message': pdf_result['error'], 'status': 'error'}, 400
-
-            # Clean up temporary image files
-            for temp_path in temp_image_paths:
-                try:
-                    os.remove(temp_path)
-                except Exception:
-                    pass
-
-            # Create submission record
-            relative_pdf_path = os.path.join('submissions', pdf_filename).replace('\\', '/')
+            buffers = spool_uploads(images)
 
+            # Reserve the submission; it is the handle for the background PDF build
             submission = Submission(
                 exam_id=exam_id,
                 student_id=student_id,
-                scanned_paper_path=relative_pdf_path,
-                submission_status='pending',
-                page_count=pdf_result['page_count']
+                submission_status=ASSEMBLING_STATUS,
+                page_count=len(images)
             )
-
             db.session.add(submission)
             db.session.commit()
 
-            # NOTE: OCR processing has been disabled. Returning hardcoded success response.
-            # Original OCR/Celery code is backed up in old_code/submissions_old.py
-
-            # Update submission status to completed
-            submission.submission_status = 'completed'
-            submission.processed_at = datetime.utcnow()
-            db.session.commit()
-
-            return {
-                'submission': submission.to_dict(),
-                'task_id': 'hardcoded-task-' + str(submission.id),
-                'message': f'PDF created from {len(images)} image(s) and uploaded successfully. OCR processing completed (simulated).',
-                'status': 'success',
-                'page_count': pdf_result['page_count']
-            }, 201
+            submit_submission_assembly(submission.id, buffers)
 
         except Exception as e:
             db.session.rollback()
-
-            # Clean up temporary files
-            for temp_path in temp_image_paths:
-                try:
-                    if os.path.exists(temp_path):
-                        os.remove(temp_path)
-                except Exception:
-                    pass
-
-            # Delete PDF if it was created
-            try:
-                if 'pdf_path' in locals() and os.path.exists(pdf_path):
-                    os.remove(pdf_path)
-            except Exception:
-                pass
-
+            for buffer in buffers:
+                buffer.close()
             return {'message': f'Failed to create submission: {str(e)}', 'status': 'error'}, 500
+
+        return {
+            'submission': submission.to_dict(),
+            'job': {
+                'submission_id': submission.id,
+                'status': ASSEMBLING_STATUS,
+                'status_url': api.url_for(SubmissionDetail, submission_id=submission.id)
+            },
+            'message': f'{len(images)} image(s) received. The PDF is being built; poll the submission '
+                       f'until its status is no longer "{ASSEMBLING_STATUS}".',
+            'status': 'success',
+            'page_count': len(images)
+        }, 202
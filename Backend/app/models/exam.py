@@ -23,6 +23,10 @@ class Exam(db.Model):
     is_active = db.Column(db.Boolean, default=True, nullable=False)
     start_date = db.Column(db.DateTime)
     end_date = db.Column(db.DateTime)
+    # Answer-box layout of the printed answer sheet (see app/services/ocr/answer_regions.py)
+    answer_region_template = db.Column(db.JSON)
+    # Bubble grids of the printed multiple-choice sheet (see app/services/ocr/omr.py)
+    bubble_sheet_template = db.Column(db.JSON)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -52,6 +56,8 @@ class Exam(db.Model):
             'is_active': self.is_active,
             'start_date': self.start_date.isoformat() if self.start_date else None,
             'end_date': self.end_date.isoformat() if self.end_date else None,
+            'has_answer_region_template': bool(self.answer_region_template),
+            'has_bubble_sheet_template': bool(self.bubble_sheet_template),
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
@@ -2,7 +2,10 @@
 Submission Models for Student Exam Submissions
 """
 from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
 from app import db
+from app.utils.blob_store import get_json_blob, delete_json_blob
 
 
 class OCRStrategy(db.Model):
@@ -115,9 +118,11 @@ class Submission(db.Model):
     exam_id = db.Column(db.Integer, db.ForeignKey('exams.id', ondelete='CASCADE'), nullable=False)
     student_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     scanned_paper_path = db.Column(db.String(500))  # Path to scanned paper image
+    file_hash = db.Column(db.String(64), index=True)  # SHA-256 of the scanned paper (content-addressed storage key)
     scan_type = db.Column(db.String(20), default='full_page')  # 'full_page', 'per_question'
     page_count = db.Column(db.Integer, default=1)
-    submission_status = db.Column(db.String(20), default='pending', nullable=False)  # pending, processing, completed, failed
+    file_probe = db.Column(db.JSON)  # pdf_utils.probe_document() result for the scanned paper (keyed by file hash)
+    submission_status = db.Column(db.String(20), default='pending', nullable=False)  # assembling (multi-image PDF being built), pending, processing, completed, failed
     submitted_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     processed_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
@@ -136,6 +141,29 @@ class Submission(db.Model):
     def __repr__(self):
         return f'<Submission exam_id={self.exam_id} student_id={self.student_id}>'
 
+    def refresh_file_probe(self, file_path):
+        """
+        Probe the scanned paper and update page_count
+
+        The stored probe is reused while the file's hash is unchanged.
+
+        Args:
+            file_path: Full path to the scanned paper
+
+        Returns:
+            The probe result
+        """
+        from app.utils.pdf_utils import probe_document
+
+        probe = probe_document(file_path, cached=self.file_probe, file_hash=self.file_hash)
+        if probe is not self.file_probe:
+            self.file_probe = probe
+        if not self.file_hash:
+            self.file_hash = probe['file_hash']
+        if probe['success']:
+            self.page_count = probe['page_count']
+        return probe
+
     def to_dict(self, include_answers=False, include_grade=False):
         """Convert submission to dictionary"""
         data = {
@@ -143,6 +171,7 @@ class Submission(db.Model):
             'exam_id': self.exam_id,
             'student_id': self.student_id,
             'scanned_paper_path': self.scanned_paper_path,
+            'file_hash': self.file_hash,
             'scan_type': self.scan_type,
             'page_count': self.page_count,
             'submission_status': self.submission_status,
@@ -172,7 +201,7 @@ class SubmissionAnswer(db.Model):
     similarity_score = db.Column(db.Float)  # Text similarity score for open-ended (0-1)
     ocr_result_id = db.Column(db.Integer, db.ForeignKey('ocr_results.id', ondelete='SET NULL'))  # Link to OCR result
     extracted_bounding_box = db.Column(db.JSON)  # Location where answer was found in image
-    extraction_method = db.Column(db.String(50))  # 'pattern_match', 'coordinate_based', 'ml_based'
+    extraction_method = db.Column(db.String(50))  # 'pattern_match', 'coordinate_based', 'ml_based', 'omr'
     is_auto_graded = db.Column(db.Boolean, default=False)
     auto_grade_score = db.Column(db.Float)  # Score from automated grading
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
@@ -220,7 +249,9 @@ class OCRResult(db.Model):
     raw_text = db.Column(db.Text)  # Raw OCR output
     processed_text = db.Column(db.Text)  # Processed/cleaned text
     confidence_score = db.Column(db.Float)  # Overall confidence (0-1)
-    raw_response = db.Column(db.JSON)  # Full Google Vision API response
+    raw_response = db.deferred(db.Column(db.JSON))  # Legacy inline Vision response (new rows use raw_response_ref)
+    raw_response_ref = db.Column(db.String(255))  # Blob store path of the compressed Vision response
+    raw_response_size = db.Column(db.Integer)  # Uncompressed size of the Vision response in bytes
     bounding_boxes = db.Column(db.JSON)  # Text bounding box coordinates
     detected_language = db.Column(db.String(10))  # Detected language code
     detected_breaks = db.Column(db.JSON)  # Paragraph/line breaks
@@ -229,6 +260,10 @@ class OCRResult(db.Model):
     processing_status = db.Column(db.String(20), default='pending')  # pending, processing, completed, failed
     error_message = db.Column(db.Text)
     processing_time_seconds = db.Column(db.Float)
+    original_payload_bytes = db.Column(db.Integer)  # Page image size before upload optimization
+    sent_payload_bytes = db.Column(db.Integer)  # Bytes actually uploaded (0 when served from cache)
+    preprocessing = db.Column(db.JSON)  # Preprocessing steps, skew angle, crop box and timing for the page
+    unprocessed_confidence = db.Column(db.Float)  # Confidence of the page read without preprocessing (sampled)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -240,8 +275,15 @@ class OCRResult(db.Model):
     def __repr__(self):
         return f'<OCRResult submission_id={self.submission_id}>'
 
-    def to_dict(self):
-        return {
+    def load_raw_response(self):
+        """Load the full Vision response from the blob store (or the legacy inline column)"""
+        if self.raw_response_ref:
+            return get_json_blob(self.raw_response_ref)
+        return self.raw_response
+
+    def to_dict(self, include_raw=False):
+        """Convert OCR result to dictionary (the raw Vision response is only loaded if include_raw)"""
+        data = {
             'id': self.id,
             'submission_id': self.submission_id,
             'ocr_service': self.ocr_service,
@@ -249,7 +291,8 @@ class OCRResult(db.Model):
             'raw_text': self.raw_text,
             'processed_text': self.processed_text,
             'confidence_score': self.confidence_score,
-            'raw_response': self.raw_response,
+            'raw_response_ref': self.raw_response_ref,
+            'raw_response_size': self.raw_response_size,
             'bounding_boxes': self.bounding_boxes,
             'detected_language': self.detected_language,
             'detected_breaks': self.detected_breaks,
@@ -258,7 +301,43 @@ class OCRResult(db.Model):
             'processing_status': self.processing_status,
             'error_message': self.error_message,
             'processing_time_seconds': self.processing_time_seconds,
+            'original_payload_bytes': self.original_payload_bytes,
+            'sent_payload_bytes': self.sent_payload_bytes,
+            'preprocessing': self.preprocessing,
+            'unprocessed_confidence': self.unprocessed_confidence,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
+        if include_raw:
+            data['raw_response'] = self.load_raw_response()
+        return data
+
+
+# ============================================================================
+# RAW RESPONSE BLOBS (released once the rows pointing at them are deleted)
+# ============================================================================
+
+_SESSION_KEY = 'released_blob_refs'
+
+
+def release_blobs_on_commit(session, blob_refs):
+    """Drop references to blobs when the session commits (kept if it rolls back)"""
+    session.info.setdefault(_SESSION_KEY, []).extend(ref for ref in blob_refs if ref)
+
+
+@event.listens_for(OCRResult, 'after_delete')
+def _release_deleted_result_blob(mapper, connection, target):
+    session = object_session(target)
+    if session is not None and target.raw_response_ref:
+        release_blobs_on_commit(session, [target.raw_response_ref])
+
+
+@event.listens_for(Session, 'after_commit')
+def _delete_released_blobs(session):
+    for blob_ref in session.info.pop(_SESSION_KEY, None) or ():
+        delete_json_blob(blob_ref)
+
 
+@event.listens_for(Session, 'after_rollback')
+def _keep_released_blobs(session):
+    session.info.pop(_SESSION_KEY, None)
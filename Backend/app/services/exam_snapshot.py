@@ -0,0 +1,385 @@
+"""
+Exam Snapshots - Read-only copies of the exam data that extraction and grading need
+
+Every submission of an exam is extracted and graded against the same
+questions, options, answer keys and per-question OCR metadata. A snapshot
+loads them once, in a fixed number of queries, and is cached in-process
+until the exam changes.
+
+Commits that touch an exam, its questions, options, answer keys or OCR
+metadata bump a per-exam version counter in Redis, so every worker drops
+its stale copy on its next lookup. Without Redis, versions are only bumped
+in the writing process, and other processes rebuild their snapshots after
+EXAM_SNAPSHOT_LOCAL_TTL seconds.
+"""
+import os
+import copy
+import time
+import logging
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session, selectinload
+from app import db
+from app.models.exam import Exam, Question, QuestionOption, AnswerKey
+from app.models.submission import QuestionOCRMetadata
+
+logger = logging.getLogger(__name__)
+
+# Seconds to stay on local versions after Redis stops answering
+REDIS_RETRY_INTERVAL = 5.0
+
+_cache = None
+_cache_pid = None
+_cache_lock = threading.Lock()
+
+
+class OptionSnapshot(NamedTuple):
+    id: int
+    order_number: int
+    option_text: str
+    is_correct: bool
+
+
+class AnswerKeySnapshot(NamedTuple):
+    id: int
+    question_id: int
+    correct_answer: str
+    answer_type: str
+    points: float
+    strictness_level: str
+    keywords: Tuple[str, ...]
+
+
+class OCRMetadataSnapshot(NamedTuple):
+    subject_type: Optional[str]
+    language: Optional[str]
+    expected_answer_format: Optional[str]
+    has_formulas: bool
+    has_diagrams: bool
+    ocr_strategy_id: Optional[int]
+
+
+class QuestionSnapshot(NamedTuple):
+    id: int
+    exam_id: int
+    question_type: str
+    points: float
+    order_number: int
+    requires_review: bool
+    options: Tuple[OptionSnapshot, ...]            # in order_number order
+    answer_key: Optional[AnswerKeySnapshot]
+    ocr_metadata: Optional[OCRMetadataSnapshot]
+
+
+class ExamSnapshot:
+    """
+    One exam's questions (ordered), options, answer keys, OCR metadata and templates
+
+    Question records have the attribute names of the Question model, so
+    code that only reads questions takes either.
+    """
+    __slots__ = ('exam_id', 'version', 'built_at', 'primary_language', 'subject_type', 'has_formulas',
+                 'answer_region_template', 'bubble_sheet_template', 'questions', '_by_id', '_by_number')
+
+    def __init__(self, exam_id: int, version: int, primary_language: str, subject_type: Optional[str],
+                 has_formulas: bool, answer_region_template: Optional[Dict], bubble_sheet_template: Optional[Dict],
+                 questions: Tuple[QuestionSnapshot, ...]):
+        self.exam_id = exam_id
+        self.version = version
+        self.built_at = time.monotonic()
+        self.primary_language = primary_language
+        self.subject_type = subject_type
+        self.has_formulas = has_formulas
+        self.answer_region_template = answer_region_template
+        self.bubble_sheet_template = bubble_sheet_template
+        self.questions = questions
+        self._by_id = MappingProxyType({question.id: question for question in questions})
+        self._by_number = MappingProxyType({question.order_number: question for question in questions})
+
+    def __repr__(self):
+        return f'<ExamSnapshot exam_id={self.exam_id} version={self.version} questions={len(self.questions)}>'
+
+    def question(self, question_id: int) -> Optional[QuestionSnapshot]:
+        return self._by_id.get(question_id)
+
+    def question_by_number(self, order_number: int) -> Optional[QuestionSnapshot]:
+        return self._by_number.get(order_number)
+
+    def answer_key(self, question_id: int) -> Optional[AnswerKeySnapshot]:
+        question = self._by_id.get(question_id)
+        return question.answer_key if question else None
+
+
+def build_exam_snapshot(exam_id: int, version: int = 0) -> Optional[ExamSnapshot]:
+    """
+    Load an exam's snapshot from the database (four queries)
+
+    Args:
+        exam_id: Exam ID
+        version: Version the snapshot is valid for
+
+    Returns:
+        ExamSnapshot, or None if the exam does not exist
+    """
+    exam = db.session.get(Exam, exam_id)
+    if exam is None:
+        return None
+
+    questions = Question.query.filter_by(exam_id=exam_id).options(selectinload(Question.options)) \
+        .order_by(Question.order_number).all()
+    answer_keys = {key.question_id: key for key in AnswerKey.query.filter_by(exam_id=exam_id).all()}
+    metadata = {}
+    if questions:
+        for row in QuestionOCRMetadata.query.filter(
+                QuestionOCRMetadata.question_id.in_([question.id for question in questions])).all():
+            metadata.setdefault(row.question_id, row)
+
+    snapshots = []
+    for question in questions:
+        key = answer_keys.get(question.id)
+        ocr = metadata.get(question.id)
+        snapshots.append(QuestionSnapshot(
+            id=question.id,
+            exam_id=question.exam_id,
+            question_type=question.question_type,
+            points=question.points,
+            order_number=question.order_number,
+            requires_review=bool(question.requires_review),
+            options=tuple(OptionSnapshot(option.id, option.order_number, option.option_text, bool(option.is_correct))
+                          for option in question.options),
+            answer_key=AnswerKeySnapshot(
+                id=key.id,
+                question_id=key.question_id,
+                correct_answer=key.correct_answer,
+                answer_type=key.answer_type,
+                points=key.points,
+                strictness_level=key.strictness_level,
+                keywords=tuple(key.keywords or ())
+            ) if key else None,
+            ocr_metadata=OCRMetadataSnapshot(
+                subject_type=ocr.subject_type,
+                language=ocr.language,
+                expected_answer_format=ocr.expected_answer_format,
+                has_formulas=bool(ocr.has_formulas),
+                has_diagrams=bool(ocr.has_diagrams),
+                ocr_strategy_id=ocr.ocr_strategy_id
+            ) if ocr else None
+        ))
+
+    return ExamSnapshot(exam_id, version, exam.primary_language, exam.subject_type, bool(exam.has_formulas),
+                        copy.deepcopy(exam.answer_region_template), copy.deepcopy(exam.bubble_sheet_template),
+                        tuple(snapshots))
+
+
+class ExamSnapshotCache:
+    """
+    In-process LRU of exam snapshots, validated against shared version counters
+
+    A lookup costs one Redis GET while the snapshot is current, and a rebuild
+    (see build_exam_snapshot) once its exam has changed.
+    """
+
+    def __init__(self, client=None, max_entries: int = 256, local_ttl: float = 30.0,
+                 key_prefix: str = 'exam_snapshot:version'):
+        """
+        Args:
+            client: redis.Redis client for the shared versions (None = process-local only)
+            max_entries: Snapshots kept per process
+            local_ttl: Age in seconds after which a snapshot is rebuilt when its
+                       version cannot be checked against Redis
+            key_prefix: Prefix of the per-exam Redis version keys
+        """
+        self.client = client
+        self.max_entries = max_entries
+        self.local_ttl = local_ttl
+        self.key_prefix = key_prefix
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._local_versions = {}
+        self._redis_retry_at = 0.0
+        self._lock = threading.Lock()
+
+    def _shared_version(self, exam_id: int) -> Optional[int]:
+        """The exam's version in Redis (0 if never written), or None if Redis is not available"""
+        if self.client is None or time.monotonic() < self._redis_retry_at:
+            return None
+        try:
+            value = self.client.get(f'{self.key_prefix}:{exam_id}')
+        except Exception as e:
+            if not self._redis_retry_at:
+                logger.warning(f"Exam snapshot cache lost Redis, using local versions: {str(e)}")
+            self._redis_retry_at = time.monotonic() + REDIS_RETRY_INTERVAL
+            return None
+
+        if self._redis_retry_at:
+            logger.info("Exam snapshot cache reconnected to Redis")
+            self._redis_retry_at = 0.0
+        return int(value) if value else 0
+
+    def get(self, exam_id: int) -> Optional[ExamSnapshot]:
+        """
+        Current snapshot of an exam, built on a miss
+
+        Returns:
+            ExamSnapshot, or None if the exam does not exist
+        """
+        shared_version = self._shared_version(exam_id)
+        with self._lock:
+            version = shared_version if shared_version is not None else self._local_versions.get(exam_id, 0)
+            snapshot = self._entries.get(exam_id)
+            if snapshot is not None and snapshot.version == version and \
+                    (shared_version is not None or time.monotonic() - snapshot.built_at < self.local_ttl):
+                self._entries.move_to_end(exam_id)
+                self.hits += 1
+                return snapshot
+            self.misses += 1
+
+        # Versions are read before building: a write that lands meanwhile bumps past this snapshot
+        snapshot = build_exam_snapshot(exam_id, version)
+        with self._lock:
+            if snapshot is None:
+                self._entries.pop(exam_id, None)
+                return None
+            self._entries[exam_id] = snapshot
+            self._entries.move_to_end(exam_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return snapshot
+
+    def invalidate(self, exam_ids: Iterable[int]) -> None:
+        """Bump the versions of exams that changed (call after the change is committed)"""
+        exam_ids = sorted(set(exam_ids))
+        if not exam_ids:
+            return
+
+        with self._lock:
+            for exam_id in exam_ids:
+                self._entries.pop(exam_id, None)
+                self._local_versions[exam_id] = self._local_versions.get(exam_id, 0) + 1
+
+        if self.client is not None and time.monotonic() >= self._redis_retry_at:
+            try:
+                pipe = self.client.pipeline()
+                for exam_id in exam_ids:
+                    pipe.incr(f'{self.key_prefix}:{exam_id}')
+                pipe.execute()
+            except Exception as e:
+                # Other workers fall back to local_ttl while their snapshots can't be checked
+                logger.warning(f"Could not publish exam snapshot invalidation for {exam_ids}: {str(e)}")
+                self._redis_retry_at = time.monotonic() + REDIS_RETRY_INTERVAL
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+                'shared': self.client is not None
+            }
+
+
+def get_exam_snapshot_cache() -> ExamSnapshotCache:
+    """
+    Get the process-wide exam snapshot cache
+
+    Configured with:
+        EXAM_SNAPSHOT_REDIS_URL    Shared versions (default CELERY_BROKER_URL, 'none' = process-local only)
+        EXAM_SNAPSHOT_CACHE_SIZE   Snapshots kept per process (default 256)
+        EXAM_SNAPSHOT_LOCAL_TTL    Seconds a snapshot is trusted while Redis is unavailable (default 30)
+    """
+    global _cache, _cache_pid
+
+    pid = os.getpid()
+    if _cache is not None and _cache_pid == pid:
+        return _cache
+
+    with _cache_lock:
+        if _cache is None or _cache_pid != pid:
+            client = None
+            redis_url = os.environ.get('EXAM_SNAPSHOT_REDIS_URL') or \
+                os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
+            if redis_url.lower() != 'none':
+                try:
+                    import redis
+                    client = redis.Redis.from_url(redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+                except ImportError:
+                    client = None
+
+            _cache = ExamSnapshotCache(
+                client=client,
+                max_entries=int(os.environ.get('EXAM_SNAPSHOT_CACHE_SIZE', 256)),
+                local_ttl=float(os.environ.get('EXAM_SNAPSHOT_LOCAL_TTL', 30))
+            )
+            _cache_pid = pid
+
+    return _cache
+
+
+def get_exam_snapshot(exam_id: int) -> Optional[ExamSnapshot]:
+    """
+    Current snapshot of an exam (see ExamSnapshotCache.get)
+
+    Returns:
+        ExamSnapshot, or None if the exam does not exist
+    """
+    return get_exam_snapshot_cache().get(exam_id)
+
+
+# ============================================================================
+# INVALIDATION (session hooks: every commit that changes exam data)
+# ============================================================================
+
+_SESSION_KEY = 'changed_exam_ids'
+
+
+def _exam_id_of(session: Session, instance) -> Optional[int]:
+    """Exam an exam, question, option, answer key or OCR metadata row belongs to"""
+    if isinstance(instance, Exam):
+        return instance.id
+    if isinstance(instance, (Question, AnswerKey)):
+        if instance.exam_id is not None:
+            return instance.exam_id
+        exam = instance.__dict__.get('exam')  # Only if already loaded - no lazy load mid-flush
+        return exam.id if exam is not None else None
+
+    # Options and OCR metadata hang off a question
+    question = instance.__dict__.get('question')
+    if question is not None:
+        return _exam_id_of(session, question)
+    if instance.question_id is None:
+        return None
+    question = session.identity_map.get(db.inspect(Question).identity_key_from_primary_key((instance.question_id,)))
+    if question is not None:
+        return question.exam_id
+    with session.no_autoflush:
+        return session.query(Question.exam_id).filter_by(id=instance.question_id).scalar()
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_changed_exams(session, flush_context, instances):
+    changed = session.info.setdefault(_SESSION_KEY, set())
+    tracked = (Exam, Question, QuestionOption, AnswerKey, QuestionOCRMetadata)
+    for instance in list(session.new) + list(session.deleted) + \
+            [instance for instance in session.dirty if session.is_modified(instance)]:
+        if isinstance(instance, tracked):
+            exam_id = _exam_id_of(session, instance)
+            if exam_id is not None:
+                changed.add(exam_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_exams(session):
+    changed = session.info.pop(_SESSION_KEY, None)
+    if changed:
+        get_exam_snapshot_cache().invalidate(changed)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_changed_exams(session):
+    session.info.pop(_SESSION_KEY, None)
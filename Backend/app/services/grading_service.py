@@ -6,8 +6,8 @@ from datetime import datetime
 from typing import Dict, List, Tuple, Optional
 from app import db
 from app.models.submission import Submission, SubmissionAnswer
-from app.models.exam import AnswerKey, Question, Exam
 from app.models.grade import Grade, ReviewQueue
+from app.services.exam_snapshot import ExamSnapshot, AnswerKeySnapshot, QuestionSnapshot, get_exam_snapshot
 from app.services.text_comparison import TextComparator, MultipleChoiceComparator
 
 
@@ -49,9 +49,11 @@ class GradingService:
         if not submission.answers:
             raise ValueError(f"Submission {submission_id} has no answers to grade")
 
-        # Get exam to check for language hints
-        exam = submission.exam
-        primary_language = getattr(exam, 'primary_language', 'en')
+        # Questions and answer keys are read from the exam's snapshot, not queried per answer
+        snapshot = get_exam_snapshot(submission.exam_id)
+        if snapshot is None:
+            raise ValueError(f"Exam {submission.exam_id} not found")
+        primary_language = snapshot.primary_language or 'en'
 
         # Grade each answer
         total_score = 0.0
@@ -62,7 +64,7 @@ class GradingService:
 
         for answer in submission.answers:
             try:
-                result = GradingService._grade_single_answer(answer, primary_language)
+                result = GradingService._grade_single_answer(answer, snapshot, primary_language)
 
                 total_score += result['score']
                 max_score += result['max_points']
@@ -75,7 +77,9 @@ class GradingService:
                 answer.similarity_score = result.get('similarity_score')
 
                 # Check if needs review
-                review_info = GradingService._check_review_needed(answer, result)
+                review_info = GradingService._check_review_needed(
+                    answer, result, snapshot.question(answer.question_id)
+                )
                 if review_info:
                     review_items.append(review_info)
                     if review_info['priority'] == 'high':
@@ -136,12 +140,13 @@ class GradingService:
         }
 
     @staticmethod
-    def _grade_single_answer(answer: SubmissionAnswer, language: str = 'en') -> Dict:
+    def _grade_single_answer(answer: SubmissionAnswer, snapshot: ExamSnapshot, language: str = 'en') -> Dict:
         """
         Grade a single answer
 
         Args:
             answer: SubmissionAnswer object
+            snapshot: Snapshot of the submission's exam
             language: Primary language ('en', 'ar', 'mixed')
 
         Returns:
@@ -155,17 +160,11 @@ class GradingService:
             }
         """
         # Get answer key for this question
-        answer_key = AnswerKey.query.filter_by(
-            question_id=answer.question_id,
-            exam_id=answer.submission.exam_id
-        ).first()
+        answer_key = snapshot.answer_key(answer.question_id)
 
         if not answer_key:
             raise ValueError(f"No answer key found for question {answer.question_id}")
 
-        # Get question details
-        question = answer.question
-
         # Grade based on question type
         if answer_key.answer_type == 'multiple_choice':
             return GradingService._grade_multiple_choice(answer, answer_key)
@@ -173,7 +172,7 @@ class GradingService:
             return GradingService._grade_open_ended(answer, answer_key, language)
 
     @staticmethod
-    def _grade_multiple_choice(answer: SubmissionAnswer, answer_key: AnswerKey) -> Dict:
+    def _grade_multiple_choice(answer: SubmissionAnswer, answer_key: AnswerKeySnapshot) -> Dict:
         """Grade a multiple choice answer"""
 
         # Get correct option ID from answer key
@@ -203,7 +202,7 @@ class GradingService:
         }
 
     @staticmethod
-    def _grade_open_ended(answer: SubmissionAnswer, answer_key: AnswerKey, language: str) -> Dict:
+    def _grade_open_ended(answer: SubmissionAnswer, answer_key: AnswerKeySnapshot, language: str) -> Dict:
         """Grade an open-ended answer using keyword matching"""
 
         student_answer = answer.answer_text or ""
@@ -251,7 +250,8 @@ class GradingService:
         }
 
     @staticmethod
-    def _check_review_needed(answer: SubmissionAnswer, grading_result: Dict) -> Optional[Dict]:
+    def _check_review_needed(answer: SubmissionAnswer, grading_result: Dict,
+                             question: Optional[QuestionSnapshot]) -> Optional[Dict]:
         """
         Check if an answer needs to be added to review queue
 
@@ -264,7 +264,6 @@ class GradingService:
         """
         ocr_confidence = answer.confidence_score or 0.0
         grading_confidence = grading_result['confidence']
-        question = answer.question
 
         # HIGH PRIORITY: Low OCR confidence
         if ocr_confidence < GradingService.OCR_CONFIDENCE_THRESHOLD:
@@ -276,7 +275,7 @@ class GradingService:
             }
 
         # LOW PRIORITY: Question marked for review
-        if question.requires_review:
+        if question is not None and question.requires_review:
             return {
                 'answer': answer,
                 'reason': 'requires_review',
@@ -357,16 +356,15 @@ class GradingService:
             }
 
         # Get answer breakdown
+        snapshot = get_exam_snapshot(submission.exam_id)
         answers_breakdown = []
         for answer in submission.answers:
-            answer_key = AnswerKey.query.filter_by(
-                question_id=answer.question_id,
-                exam_id=submission.exam_id
-            ).first()
+            question = snapshot.question(answer.question_id) if snapshot else None
+            answer_key = question.answer_key if question else None
 
             answers_breakdown.append({
                 'question_id': answer.question_id,
-                'question_number': answer.question.order_number,
+                'question_number': question.order_number if question else None,
                 'question_type': answer_key.answer_type if answer_key else None,
                 'score': answer.auto_grade_score,
                 'max_points': answer_key.points if answer_key else None,
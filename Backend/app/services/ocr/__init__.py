@@ -2,8 +2,9 @@
 OCR Services Package
 """
 from .google_vision_ocr import GoogleVisionOCR
+from .tesseract_ocr import TesseractOCR
 from .ocr_strategy_selector import OCRStrategySelector
 from .text_processor import TextProcessor
 from .answer_extractor import AnswerExtractor
 
-__all__ = ['GoogleVisionOCR', 'OCRStrategySelector', 'TextProcessor', 'AnswerExtractor']
+__all__ = ['GoogleVisionOCR', 'TesseractOCR', 'OCRStrategySelector', 'TextProcessor', 'AnswerExtractor']
@@ -1,10 +1,31 @@
 """
 Answer Extractor - Extract student answers from OCR results and map to questions
 """
-from typing import Dict, List, Optional
-from app.models.exam import Exam, Question
+import math
+import re
+from typing import Dict, List, Optional, Tuple
+from app.models.exam import Exam
 from app.models.submission import OCRResult
+from app.services.exam_snapshot import QuestionSnapshot, get_exam_snapshot
 from .text_processor import TextProcessor
+from .layout import DocumentLayout
+from .omr import OPTION_LETTERS
+
+# OCR words that are only a marker's punctuation ("Q1 :" is read as two words)
+_MARKER_PUNCTUATION = re.compile(r'^[:.\-)]+$')
+
+
+def _union_box(boxes) -> Optional[List[int]]:
+    boxes = list(boxes)
+    if not boxes:
+        return None
+    return [min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes)]
+
+
+def _exam_questions(exam: Exam) -> Tuple[QuestionSnapshot, ...]:
+    """The exam's questions with their options, in order (from the exam snapshot)"""
+    snapshot = get_exam_snapshot(exam.id)
+    return snapshot.questions if snapshot else ()
 
 
 class AnswerExtractor:
@@ -14,19 +35,25 @@ class AnswerExtractor:
         """Initialize answer extractor"""
         self.text_processor = TextProcessor()
 
-    def extract_answers_from_full_page(self, ocr_result: OCRResult, exam: Exam) -> List[Dict]:
+    def extract_answers_from_full_page(self, ocr_result: OCRResult, exam: Exam,
+                                       layout: DocumentLayout = None,
+                                       page_layouts: List[Tuple[OCRResult, DocumentLayout]] = None) -> List[Dict]:
         """
         Extract answers from full-page scan
 
         Strategy:
-        1. Identify question numbers/markers in OCR text
-        2. Extract text between markers
+        1. Locate question markers on each page's word layout and take the
+           words right of / below each marker, up to the next one
+        2. For questions not located that way, split the OCR text at the markers
         3. Map to exam questions by order/number
         4. Handle multiple choice vs open-ended
 
         Args:
             ocr_result: OCRResult model instance
             exam: Exam model instance
+            layout: Word layout for the OCR text (read from ocr_result.bounding_boxes if None)
+                    - used to score each answer by the confidence of its own words
+            page_layouts: (page OCRResult, its layout) per page, for geometric extraction
 
         Returns:
             List of dictionaries containing:
@@ -50,50 +77,174 @@ class AnswerExtractor:
 
         # Split text by questions
         question_answers = self.text_processor.split_by_questions(text)
+        sorted_nums = sorted(question_answers.keys())
+
+        if layout is None:
+            layout = DocumentLayout.from_dict(ocr_result.bounding_boxes)
+        page_confidence = ocr_result.confidence_score or 0.0
+        located_answers = self.locate_answers(page_layouts or [])
 
         # Get all questions for this exam (ordered)
-        questions = Question.query.filter_by(exam_id=exam.id).order_by(Question.order_number).all()
+        questions = _exam_questions(exam)
 
         # Map extracted answers to questions
         for question in questions:
             question_num = question.order_number
-            answer_text = question_answers.get(question_num, '')
-
-            # If answer not found by question number, try sequential matching
-            if not answer_text and question_num <= len(question_answers):
-                # Try to get by index
-                sorted_nums = sorted(question_answers.keys())
-                if question_num - 1 < len(sorted_nums):
-                    actual_num = sorted_nums[question_num - 1]
-                    answer_text = question_answers.get(actual_num, '')
+            located = located_answers.get(question_num)
+
+            if located:
+                answer_text = located['answer_text']
+                confidence = located['confidence']
+                bounding_box = located['bounding_box']
+                extraction_method = 'coordinate_based'
+            else:
+                answer_text = question_answers.get(question_num, '')
+                bounding_box = None
+                extraction_method = 'pattern_match'
+
+                # If answer not found by question number, try sequential matching
+                if not answer_text and question_num <= len(question_answers):
+                    # Try to get by index
+                    if question_num - 1 < len(sorted_nums):
+                        actual_num = sorted_nums[question_num - 1]
+                        answer_text = question_answers.get(actual_num, '')
+
+                # Score the answer by its own words when the layout is available
+                confidence = layout.confidence_for_text(answer_text) if layout else None
+
+            if confidence is None:
+                confidence = page_confidence
 
             # Process based on question type
+            selected_option = None
             if question.question_type == 'multiple_choice':
                 # Extract selected option
                 selected_option = self._extract_multiple_choice_answer(answer_text, question)
 
-                extracted_answers.append({
-                    'question_id': question.id,
-                    'answer_text': answer_text,
-                    'answer_option_id': selected_option,
-                    'confidence': ocr_result.confidence_score or 0.0,
-                    'bounding_box': None,  # Could extract from OCR bounding boxes
-                    'extraction_method': 'pattern_match'
-                })
-
-            else:  # open_ended
-                # Extract full text answer
-                extracted_answers.append({
-                    'question_id': question.id,
-                    'answer_text': answer_text,
-                    'answer_option_id': None,
-                    'confidence': ocr_result.confidence_score or 0.0,
-                    'bounding_box': None,
-                    'extraction_method': 'pattern_match'
-                })
+            extracted_answers.append({
+                'question_id': question.id,
+                'answer_text': answer_text,
+                'answer_option_id': selected_option,
+                'confidence': confidence,
+                'bounding_box': bounding_box,
+                'extraction_method': extraction_method,
+                'ocr_result_id': located['ocr_result_id'] if located else None
+            })
 
         return extracted_answers
 
+    def locate_answers(self, page_layouts: List[Tuple[OCRResult, DocumentLayout]]) -> Dict[int, Dict]:
+        """
+        Find answers geometrically on the pages' word layouts
+
+        Question markers are found by tokenizing each page's words. An
+        answer is made of the words right of its marker on the same line and
+        below it, down to the next marker further down the page. The words
+        are fetched with grid queries (DocumentLayout.words_in), so each
+        answer costs a lookup of its own region rather than a scan of the
+        page, and is scored by the confidence of its own words.
+
+        The last answer on a page may run onto the next pages: the words
+        above the next page's first marker (the whole page if it has none)
+        are added to it.
+
+        Args:
+            page_layouts: (page OCRResult, its layout) per page, in page order
+
+        Returns:
+            {question_number: {'answer_text', 'confidence', 'bounding_box', 'ocr_result_id'}}
+            (the first marker of a number wins)
+        """
+        located = {}
+        word_counts = {}  # Words per located answer, to weigh in continuations
+        open_number = None  # Question whose answer runs to the bottom of the last page
+
+        for page_result, layout in page_layouts:
+            if layout is None or not layout.words:
+                continue
+
+            words = layout.words
+            has_lines = layout.line_count > 1
+            text, _ = layout.reading_text()
+
+            markers = []
+            for marker in self.text_processor.index_question_markers(text).markers:
+                marker_words = layout.words_at(marker.start, marker.end)
+                if not marker_words:
+                    continue
+                first = marker_words[0]
+                # A bare number only marks a question at the start of a line
+                if not marker.marker and has_lines and first > 0 and words[first - 1].line_id == words[first].line_id:
+                    continue
+                markers.append((marker.number, marker_words, _union_box(words[i].bbox for i in marker_words)))
+
+            marker_word_ids = {i for _, marker_words, _ in markers for i in marker_words}
+            language = layout.pages[0].get('language', 'unknown') if layout.pages else 'unknown'
+
+            if open_number is not None:
+                top = min((box[1] for _, _, box in markers), default=math.inf)
+                continuation = [i for i in layout.words_in((-math.inf, -math.inf, math.inf, top))
+                                if i not in marker_word_ids]
+                if continuation:
+                    self._continue_answer(located[open_number], word_counts, open_number, page_result,
+                                          words, continuation, language)
+                if markers:
+                    open_number = None
+
+            for k, (number, _, box) in enumerate(markers):
+                if number in located:
+                    continue
+                height = max(1, box[3] - box[1])
+
+                # A marker further along the same line bounds this answer on the right
+                right_limit = math.inf
+                if k + 1 < len(markers):
+                    next_box = markers[k + 1][2]
+                    if next_box[1] < box[3] and next_box[3] > box[1] and next_box[0] > box[2]:
+                        right_limit = next_box[0]
+                # The next marker lower down the page bounds it at the bottom
+                bottom = next((later[2][1] for later in markers[k + 1:] if later[2][1] >= box[3]), math.inf)
+
+                same_line = layout.words_in((box[2], box[1] - height / 2, right_limit, box[3] + height / 2))
+                below = layout.words_in((box[0] - 2 * height, box[3], right_limit, bottom))
+
+                answer_words = sorted((set(same_line) | set(below)) - marker_word_ids)
+                # Drop the marker's punctuation when OCR read it as separate words
+                while answer_words and _MARKER_PUNCTUATION.match(words[answer_words[0]].text):
+                    answer_words.pop(0)
+
+                answer_text = self.text_processor.clean_text(' '.join(words[i].text for i in answer_words), language)
+                located[number] = {
+                    'answer_text': answer_text,
+                    'confidence': (sum(words[i].confidence for i in answer_words) / len(answer_words))
+                                  if answer_words else None,
+                    'bounding_box': {'page': page_result.page_number or 1,
+                                     'bbox': _union_box(words[i].bbox for i in answer_words)}
+                                    if answer_words else None,
+                    'ocr_result_id': page_result.id
+                }
+                word_counts[number] = len(answer_words)
+                if bottom == math.inf:
+                    open_number = number
+
+        return located
+
+    def _continue_answer(self, answer: Dict, word_counts: Dict[int, int], number: int, page_result: OCRResult,
+                         words: List, continuation: List[int], language: str):
+        """Add the words a located answer continues with on a later page"""
+        text = self.text_processor.clean_text(' '.join(words[i].text for i in continuation), language)
+        answer['answer_text'] = ' '.join(part for part in (answer['answer_text'], text) if part)
+
+        count = word_counts[number]
+        answer['confidence'] = ((answer['confidence'] or 0.0) * count +
+                                sum(words[i].confidence for i in continuation)) / (count + len(continuation))
+        word_counts[number] = count + len(continuation)
+
+        # The box stays on the marker's page unless the answer only starts on this one
+        if answer['bounding_box'] is None:
+            answer['bounding_box'] = {'page': page_result.page_number or 1,
+                                      'bbox': _union_box(words[i].bbox for i in continuation)}
+
     def extract_answers_from_per_question_scan(self, ocr_results: List[OCRResult],
                                                exam: Exam) -> List[Dict]:
         """
@@ -111,7 +262,7 @@ class AnswerExtractor:
         extracted_answers = []
 
         # Get all questions for this exam (ordered)
-        questions = Question.query.filter_by(exam_id=exam.id).order_by(Question.order_number).all()
+        questions = _exam_questions(exam)
 
         # Match OCR results to questions by order
         for i, ocr_result in enumerate(ocr_results):
@@ -146,13 +297,117 @@ class AnswerExtractor:
 
         return extracted_answers
 
-    def _extract_multiple_choice_answer(self, text: str, question: Question) -> Optional[int]:
+    def extract_answers_from_regions(self, region_results: List[Dict], exam: Exam) -> List[Dict]:
+        """
+        Extract answers from OCR'd answer-box crops
+
+        Each crop already belongs to one question, so no marker splitting or
+        order matching is needed.
+
+        Args:
+            region_results: List of dictionaries, one per crop:
+                [
+                    {
+                        'question_id': int,
+                        'text': str,
+                        'confidence': float,
+                        'bounding_box': dict,
+                        'ocr_result_id': int
+                    },
+                    ...
+                ]
+            exam: Exam model instance
+
+        Returns:
+            List of answer dictionaries (with 'ocr_result_id' of the page)
+        """
+        questions = {question.id: question for question in _exam_questions(exam)}
+        extracted_answers = []
+
+        for region in region_results:
+            question = questions.get(region['question_id'])
+            if not question:
+                continue
+
+            text = region.get('text') or ''
+            selected_option = None
+            if question.question_type == 'multiple_choice':
+                selected_option = self._extract_multiple_choice_answer(text, question)
+
+            extracted_answers.append({
+                'question_id': question.id,
+                'answer_text': text,
+                'answer_option_id': selected_option,
+                'confidence': region.get('confidence') or 0.0,
+                'bounding_box': region.get('bounding_box'),
+                'extraction_method': 'answer_region',
+                'ocr_result_id': region.get('ocr_result_id')
+            })
+
+        return extracted_answers
+
+    def extract_answers_from_bubbles(self, bubble_results: List[Dict], exam: Exam) -> List[Dict]:
+        """
+        Turn bubble sheet marks into multiple choice answers
+
+        The n-th bubble of a row is the question's n-th option. Blank rows and
+        rows with several marks get no option; the latter score zero
+        confidence so that they are reviewed.
+
+        Args:
+            bubble_results: List of dictionaries, one per question:
+                [
+                    {
+                        'question_id': int,
+                        'status': str,              # 'marked', 'blank' or 'multiple'
+                        'option_index': int,
+                        'marked_options': [int],
+                        'confidence': float,
+                        'bounding_box': dict,
+                        'ocr_result_id': int
+                    },
+                    ...
+                ]
+            exam: Exam model instance
+
+        Returns:
+            List of answer dictionaries (with 'ocr_result_id' of the page)
+        """
+        questions = {question.id: question for question in _exam_questions(exam)}
+        extracted_answers = []
+
+        for mark in bubble_results:
+            question = questions.get(mark['question_id'])
+            if not question:
+                continue
+
+            options = question.options
+            option_index = mark.get('option_index')
+            selected_option = options[option_index].id if option_index is not None and option_index < len(options) \
+                else None
+
+            # The letter read, or every letter of a row with several marks
+            marked = [option_index] if option_index is not None else mark.get('marked_options', [])
+
+            extracted_answers.append({
+                'question_id': question.id,
+                'answer_text': ', '.join(OPTION_LETTERS[i] for i in marked),
+                'answer_option_id': selected_option,
+                'confidence': mark.get('confidence') or 0.0,
+                'bounding_box': mark.get('bounding_box'),
+                'extraction_method': 'omr',
+                'ocr_result_id': mark.get('ocr_result_id')
+            })
+
+        return extracted_answers
+
+    def _extract_multiple_choice_answer(self, text: str, question: QuestionSnapshot) -> Optional[int]:
         """
         Detect selected multiple choice option
 
         Args:
             text: Answer text from OCR
-            question: Question model instance
+            question: Question snapshot (or Question model instance)
 
         Returns:
             QuestionOption ID or None
@@ -181,9 +436,9 @@ class AnswerExtractor:
         return None
 
     def map_answer_to_question(self, answer_text: str, question_number: int,
-                               exam: Exam) -> Optional[Question]:
+                               exam: Exam) -> Optional[QuestionSnapshot]:
         """
-        Map extracted answer to Question model by number/order
+        Map extracted answer to a question by number/order
 
         Args:
             answer_text: Extracted answer text
@@ -191,11 +446,7 @@ class AnswerExtractor:
             exam: Exam model instance
 
         Returns:
-            Question model instance or None
+            Question snapshot or None
         """
-        question = Question.query.filter_by(
-            exam_id=exam.id,
-            order_number=question_number
-        ).first()
-
-        return question
+        snapshot = get_exam_snapshot(exam.id)
+        return snapshot.question_by_number(question_number) if snapshot else None
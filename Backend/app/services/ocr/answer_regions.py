@@ -0,0 +1,259 @@
+"""
+Answer Regions - Crops the answer boxes of a templated answer sheet for OCR
+"""
+import os
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+logger = logging.getLogger(__name__)
+
+ANCHOR_MODES = ('corner_marks', 'page')
+
+
+def validate_answer_region_template(template: Dict, question_ids: Iterable[int]) -> Optional[str]:
+    """
+    Check an answer region template against an exam's questions
+
+    Template format (stored on Exam.answer_region_template):
+        {
+            'anchor': 'corner_marks',      # or 'page'
+            'regions': [
+                {'question_id': 12, 'page': 1, 'box': [x0, y0, x1, y1]},
+                ...
+            ]
+        }
+
+    Boxes are fractions (0-1) of the anchor frame: the rectangle spanned by
+    the four printed corner marks, or the whole page with 'page' anchors.
+
+    Args:
+        template: Template dictionary
+        question_ids: IDs of the exam's questions
+
+    Returns:
+        Error message, or None if the template is valid
+    """
+    if not isinstance(template, dict):
+        return 'Template must be an object'
+
+    if template.get('anchor', 'corner_marks') not in ANCHOR_MODES:
+        return f"anchor must be one of: {', '.join(ANCHOR_MODES)}"
+
+    regions = template.get('regions')
+    if not isinstance(regions, list) or not regions:
+        return 'regions must be a non-empty list'
+
+    question_ids = set(question_ids)
+    seen = set()
+    for index, region in enumerate(regions):
+        if not isinstance(region, dict):
+            return f'Region {index} must be an object'
+
+        question_id = region.get('question_id')
+        if question_id not in question_ids:
+            return f'Region {index}: question {question_id} does not belong to this exam'
+        if question_id in seen:
+            return f'Region {index}: question {question_id} already has a region'
+        seen.add(question_id)
+
+        page = region.get('page', 1)
+        if not isinstance(page, int) or page < 1:
+            return f'Region {index}: page must be a positive integer'
+
+        box = region.get('box')
+        if not isinstance(box, list) or len(box) != 4 or \
+                not all(isinstance(v, (int, float)) and 0 <= v <= 1 for v in box):
+            return f'Region {index}: box must be [x0, y0, x1, y1] fractions between 0 and 1'
+        if box[0] >= box[2] or box[1] >= box[3]:
+            return f'Region {index}: box must have x0 < x1 and y0 < y1'
+
+    return None
+
+
+def has_answer_regions(template: Optional[Dict]) -> bool:
+    """Whether an exam template has any regions to crop"""
+    return bool(template and template.get('regions'))
+
+
+class AnswerRegionCropper:
+    """
+    Crops per-question answer boxes out of scanned answer sheet pages
+
+    Pages are registered by four solid corner marks printed on the sheet, so
+    boxes stay in place when the scanner shifts or scales the page. Pages on
+    which the marks cannot be found fall back to the full page frame.
+    Rotation is not corrected here.
+    """
+
+    def __init__(self, padding: float = None, mark_search: float = 0.2, mark_threshold: int = 100):
+        """
+        Initialize cropper
+
+        Args:
+            padding: Margin added around each box, as a fraction of the anchor frame
+                     (OCR_ANSWER_REGION_PADDING, default 0.01)
+            mark_search: Size of the corner windows searched for marks, as a fraction of the page
+            mark_threshold: Gray level below which a pixel counts as ink
+        """
+        self.padding = padding if padding is not None else \
+            float(os.environ.get('OCR_ANSWER_REGION_PADDING', 0.01))
+        self.mark_search = mark_search
+        self.mark_threshold = mark_threshold
+
+    def find_corner_marks(self, image: Image.Image) -> Optional[Dict[str, Tuple[int, int, int, int]]]:
+        """
+        Locate the four corner marks
+
+        Works on a downscaled copy: speckle averages away, and a min filter
+        erodes text strokes so that only solid marks survive. Of the solid
+        blobs left in a corner window (e.g. filled bubbles), the one nearest
+        the page corner is the mark.
+
+        Args:
+            image: Page image
+
+        Returns:
+            {'top_left' | 'top_right' | 'bottom_left' | 'bottom_right': (x0, y0, x1, y1)}
+            in page pixels, or None if a mark is missing
+        """
+        width, height = image.size
+        factor = max(1, min(width, height) // 400)
+        small = image.convert('L').reduce(factor)
+        ink = small.point(lambda p: 255 if p < self.mark_threshold else 0)
+        ink = ink.filter(ImageFilter.MinFilter(5))
+
+        small_width, small_height = ink.size
+        window_w = int(small_width * self.mark_search)
+        window_h = int(small_height * self.mark_search)
+        corners = {
+            'top_left': (0, 0),
+            'top_right': (small_width - window_w, 0),
+            'bottom_left': (0, small_height - window_h),
+            'bottom_right': (small_width - window_w, small_height - window_h),
+        }
+
+        marks = {}
+        for name, (left, top) in corners.items():
+            window = ink.crop((left, top, left + window_w, top + window_h))
+            ys, xs = np.nonzero(np.asarray(window))
+            if not len(xs):
+                return None
+            corner_x = window_w - 1 if name.endswith('right') else 0
+            corner_y = window_h - 1 if name.startswith('bottom') else 0
+            nearest = np.argmin((xs - corner_x) ** 2 + (ys - corner_y) ** 2)
+            ImageDraw.floodfill(window, (int(xs[nearest]), int(ys[nearest])), 128)
+            bbox = window.point(lambda p: 255 if p == 128 else 0).getbbox()
+            # Undo the erosion (radius 2), the window offset and the downscaling
+            marks[name] = (max(0, (left + bbox[0] - 2) * factor), max(0, (top + bbox[1] - 2) * factor),
+                           min(width, (left + bbox[2] + 2) * factor), min(height, (top + bbox[3] + 2) * factor))
+        return marks
+
+    def find_anchor_frame(self, image: Image.Image) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Locate the rectangle spanned by the four corner marks
+
+        Args:
+            image: Page image
+
+        Returns:
+            (x0, y0, x1, y1) in page pixels, or None if a mark is missing
+        """
+        marks = self.find_corner_marks(image)
+        if marks is None:
+            return None
+
+        x0 = min(marks['top_left'][0], marks['bottom_left'][0])
+        y0 = min(marks['top_left'][1], marks['top_right'][1])
+        x1 = max(marks['top_right'][2], marks['bottom_right'][2])
+        y1 = max(marks['bottom_left'][3], marks['bottom_right'][3])
+        return (x0, y0, x1, y1)
+
+    def crop(self, image_paths: List[str], template: Dict, output_dir: str) -> List[Dict]:
+        """
+        Crop every region of a template out of the page images
+
+        Each page is opened once; regions on pages that were not scanned are
+        skipped with a warning.
+
+        Args:
+            image_paths: Page image paths (page 1 first)
+            template: Exam answer region template
+            output_dir: Directory for the cropped PNG files
+
+        Returns:
+            List of dictionaries:
+            [
+                {
+                    'question_id': int,
+                    'page': int,
+                    'image_path': str,                  # cropped image
+                    'bounding_box': {'page': int, 'bbox': [x0, y0, x1, y1]},  # page pixels
+                    'anchored': bool                    # corner marks were found
+                },
+                ...
+            ]
+        """
+        pages = sorted({region.get('page', 1) for region in template.get('regions', [])})
+
+        crops = []
+        for page in pages:
+            if page > len(image_paths):
+                logger.warning(f"Answer regions reference page {page} but only {len(image_paths)} were scanned")
+                continue
+            crops.extend(self.crop_page(image_paths[page - 1], page, template, output_dir))
+
+        return crops
+
+    def crop_page(self, image_path: str, page: int, template: Dict, output_dir: str) -> List[Dict]:
+        """
+        Crop the regions of one page
+
+        Args:
+            image_path: Page image path
+            page: Page number (1-based)
+            template: Exam answer region template
+            output_dir: Directory for the cropped PNG files
+
+        Returns:
+            Crops of this page, in the format of crop()
+        """
+        regions = [region for region in template.get('regions', []) if region.get('page', 1) == page]
+        if not regions:
+            return []
+
+        os.makedirs(output_dir, exist_ok=True)
+        crops = []
+
+        with Image.open(image_path) as image:
+            image.load()
+            frame = None
+            if template.get('anchor', 'corner_marks') == 'corner_marks':
+                frame = self.find_anchor_frame(image)
+                if frame is None:
+                    logger.warning(f"Corner marks not found on page {page}, using the full page")
+            anchored = frame is not None
+            frame_x0, frame_y0, frame_x1, frame_y1 = frame or (0, 0, image.width, image.height)
+            frame_w = frame_x1 - frame_x0
+            frame_h = frame_y1 - frame_y0
+
+            for region in regions:
+                bx0, by0, bx1, by1 = region['box']
+                bbox = [
+                    max(0, int(frame_x0 + (bx0 - self.padding) * frame_w)),
+                    max(0, int(frame_y0 + (by0 - self.padding) * frame_h)),
+                    min(image.width, int(frame_x0 + (bx1 + self.padding) * frame_w)),
+                    min(image.height, int(frame_y0 + (by1 + self.padding) * frame_h)),
+                ]
+                crop_path = os.path.join(output_dir, f"page{page}_q{region['question_id']}.png")
+                image.crop(bbox).save(crop_path, 'PNG')
+                crops.append({
+                    'question_id': region['question_id'],
+                    'page': page,
+                    'image_path': crop_path,
+                    'bounding_box': {'page': page, 'bbox': bbox},
+                    'anchored': anchored
+                })
+
+        return crops
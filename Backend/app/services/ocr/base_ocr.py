@@ -3,11 +3,14 @@ Abstract Base Class for OCR Service Providers
 """
 from abc import ABC, abstractmethod
 from typing import Dict, List, Optional
+from .page_executor import get_page_executor
 
 
 class BaseOCRService(ABC):
     """Abstract base class for OCR service providers"""
 
+    engine_name = None  # Stored as OCRResult.ocr_service
+
     @abstractmethod
     def detect_text(self, image_path: str, language_hints: List[str] = None) -> Dict:
         """
@@ -37,6 +40,44 @@ class BaseOCRService(ABC):
         """
         pass
 
+    def detect_text_batch(self, image_paths: List[str], language_hints: List[str] = None) -> List[Dict]:
+        """
+        Basic text detection for several images
+
+        Providers that support multi-image requests should override this.
+        The default implementation calls detect_text() once per image,
+        running pages concurrently on the shared page executor.
+
+        Args:
+            image_paths: Paths to the image files
+            language_hints: List of language codes (e.g., ['ar', 'en'])
+
+        Returns:
+            List of OCR result dictionaries, in the same order as image_paths
+        """
+        return get_page_executor().map(
+            lambda image_path: self.detect_text(image_path, language_hints), image_paths
+        )
+
+    def detect_document_text_batch(self, image_paths: List[str], language_hints: List[str] = None) -> List[Dict]:
+        """
+        Document text detection for several images
+
+        Providers that support multi-image requests should override this.
+        The default implementation calls detect_document_text() once per image,
+        running pages concurrently on the shared page executor.
+
+        Args:
+            image_paths: Paths to the image files
+            language_hints: List of language codes (e.g., ['ar', 'en'])
+
+        Returns:
+            List of OCR result dictionaries, in the same order as image_paths
+        """
+        return get_page_executor().map(
+            lambda image_path: self.detect_document_text(image_path, language_hints), image_paths
+        )
+
     @abstractmethod
     def get_confidence_score(self, ocr_result: Dict) -> float:
         """
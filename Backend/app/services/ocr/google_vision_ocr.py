@@ -3,36 +3,65 @@ Google Cloud Vision API OCR Implementation
 """
 import os
 import io
+import time
 import requests
-from typing import Dict, List, Optional
+from contextlib import nullcontext
+from typing import Dict, List, Optional, Tuple
 from .base_ocr import BaseOCRService
+from .image_optimizer import ImageOptimizer
+from .layout import DocumentLayout
+from .http_transport import get_vision_session, get_http_timeout, get_retry_settings, RETRY_STATUS_CODES
+from .rate_limiter import VisionRateLimiter, RequestOutcome, get_vision_rate_limiter
+from .page_executor import get_page_executor
 import base64
 
 
 class GoogleVisionOCR(BaseOCRService):
     """Google Cloud Vision API implementation using API Key authentication"""
 
-    def __init__(self, api_key: str = None):
+    engine_name = 'google_vision'
+
+    # images:annotate limits - at most 16 images per call and a ~10MB JSON body
+    MAX_IMAGES_PER_REQUEST = 16
+    MAX_REQUEST_BYTES = 9 * 1024 * 1024
+
+    def __init__(self, api_key: str = None, session: requests.Session = None,
+                 image_optimizer: ImageOptimizer = None, rate_limiter: VisionRateLimiter = None):
         """
         Initialize Google Vision OCR client
 
         Args:
             api_key: Google Cloud Vision API key (if None, uses env variable)
+            session: HTTP session (if None, uses the shared per-process session)
+            image_optimizer: Pre-upload optimizer (if None, configured from env variables)
+            rate_limiter: Request gate (if None, uses the shared per-process limiter)
         """
         self.api_key = api_key or os.environ.get('GOOGLE_VISION_API_KEY')
         if not self.api_key:
             raise ValueError("Google Vision API key is required. Set GOOGLE_VISION_API_KEY environment variable.")
 
-        self.base_url = "https://vision.googleapis.com/v1/images:annotate"
+        self.base_url = os.environ.get('GOOGLE_VISION_API_URL') or "https://vision.googleapis.com/v1/images:annotate"
+        self.session = session or get_vision_session()
+        self.timeout = get_http_timeout()
+        self.image_optimizer = image_optimizer or ImageOptimizer()
+        self.rate_limiter = rate_limiter or get_vision_rate_limiter()
+        self.max_retries, self.backoff_factor = get_retry_settings()
+
+    def _encode_image(self, image_path: str) -> Tuple[str, Dict]:
+        """
+        Optimize and base64-encode an image file
 
-    def _encode_image(self, image_path: str) -> str:
-        """Encode image file to base64"""
-        with open(image_path, 'rb') as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
+        Returns:
+            (base64 content, payload stats from ImageOptimizer.optimize without 'content')
+        """
+        payload = self.image_optimizer.optimize(image_path)
+        content = base64.b64encode(payload.pop('content')).decode('utf-8')
+        return content, payload
 
-    def _make_request(self, image_path: str, feature_type: str, language_hints: List[str] = None) -> Dict:
+    def _build_image_request(self, image_path: str, feature_type: str,
+                             language_hints: List[str] = None) -> Tuple[Dict, Dict]:
         """
-        Make request to Google Vision API
+        Build a single AnnotateImageRequest entry
 
         Args:
             image_path: Path to image file
@@ -40,50 +69,156 @@ class GoogleVisionOCR(BaseOCRService):
             language_hints: Language codes
 
         Returns:
-            API response dictionary
+            (request entry for the "requests" array, payload stats)
         """
-        try:
-            # Encode image
-            image_content = self._encode_image(image_path)
-
-            # Build request payload
-            request_body = {
-                "requests": [
-                    {
-                        "image": {
-                            "content": image_content
-                        },
-                        "features": [
-                            {
-                                "type": feature_type,
-                                "maxResults": 1
-                            }
-                        ]
-                    }
-                ]
+        content, payload = self._encode_image(image_path)
+
+        image_request = {
+            "image": {
+                "content": content
+            },
+            "features": [
+                {
+                    "type": feature_type,
+                    "maxResults": 1
+                }
+            ]
+        }
+
+        # Add language hints if provided
+        if language_hints:
+            image_request["imageContext"] = {
+                "languageHints": language_hints
             }
 
-            # Add language hints if provided
-            if language_hints:
-                request_body["requests"][0]["imageContext"] = {
-                    "languageHints": language_hints
-                }
+        return image_request, payload
+
+    def _post(self, image_requests: List[Dict]) -> Dict:
+        """
+        POST one images:annotate call
 
-            # Make API request
-            response = requests.post(
-                f"{self.base_url}?key={self.api_key}",
-                json=request_body,
-                headers={'Content-Type': 'application/json'}
-            )
+        Every attempt, including retries of 429/5xx responses, first takes one
+        rate limiter token per image.
 
-            response.raise_for_status()
-            return response.json()
+        Args:
+            image_requests: List of AnnotateImageRequest entries
 
-        except requests.exceptions.RequestException as e:
-            raise Exception(f"Google Vision API request failed: {str(e)}")
+        Returns:
+            API response dictionary
+
+        Raises:
+            VisionUnavailableError: if the rate limiter's circuit is open
+        """
+        for attempt in range(self.max_retries + 1):
+            permit = self.rate_limiter.request(cost=len(image_requests)) if self.rate_limiter \
+                else nullcontext(RequestOutcome())
+            try:
+                with permit as outcome:
+                    response = self.session.post(
+                        f"{self.base_url}?key={self.api_key}",
+                        json={"requests": image_requests},
+                        timeout=self.timeout
+                    )
+                    outcome.status_code = response.status_code
+            except requests.exceptions.RequestException as e:
+                raise Exception(f"Google Vision API request failed: {str(e)}")
+
+            if response.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+                time.sleep(self._retry_delay(response, attempt))
+                continue
+
+            try:
+                response.raise_for_status()
+                return response.json()
+            except requests.exceptions.RequestException as e:
+                raise Exception(f"Google Vision API request failed: {str(e)}")
+
+    def _retry_delay(self, response: requests.Response, attempt: int) -> float:
+        """Seconds to wait before retrying: Retry-After if sent, else exponential backoff"""
+        retry_after = response.headers.get('Retry-After')
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return self.backoff_factor * (2 ** attempt)
+
+    def _make_request(self, image_path: str, feature_type: str,
+                      language_hints: List[str] = None) -> Tuple[Dict, Dict]:
+        """
+        Make request to Google Vision API
+
+        Args:
+            image_path: Path to image file
+            feature_type: 'TEXT_DETECTION' or 'DOCUMENT_TEXT_DETECTION'
+            language_hints: Language codes
+
+        Returns:
+            (API response dictionary, payload stats)
+        """
+        try:
+            image_request, payload = self._build_image_request(image_path, feature_type, language_hints)
         except Exception as e:
             raise Exception(f"Error processing image: {str(e)}")
 
+        return self._post([image_request]), payload
+
+    def _make_batch_request(self, image_paths: List[str], feature_type: str,
+                            language_hints: List[str] = None) -> List[Tuple[Optional[Dict], Dict]]:
+        """
+        Annotate several images with as few API round trips as possible
+
+        Pages are spread evenly over up to one chunk per concurrent worker,
+        each chunk holding at most MAX_IMAGES_PER_REQUEST entries and
+        MAX_REQUEST_BYTES of encoded payload. Chunks are posted in parallel
+        and the responses are split back out so that result i belongs to
+        image_paths[i].
+
+        Args:
+            image_paths: Paths to image files
+            feature_type: 'TEXT_DETECTION' or 'DOCUMENT_TEXT_DETECTION'
+            language_hints: Language codes (shared by all images)
+
+        Returns:
+            List of (response entry or None if the API returned nothing, payload stats)
+        """
+        executor = get_page_executor()
+        chunk_size = -(-len(image_paths) // executor.max_workers)  # ceil division
+        chunk_size = max(1, min(chunk_size, self.MAX_IMAGES_PER_REQUEST))
+
+        chunks = []
+        chunk = []
+        chunk_bytes = 0
+        payloads = []
+
+        for image_path in image_paths:
+            try:
+                image_request, payload = self._build_image_request(image_path, feature_type, language_hints)
+            except Exception as e:
+                raise Exception(f"Error processing image: {str(e)}")
+
+            payloads.append(payload)
+            request_bytes = len(image_request['image']['content'])
+            if chunk and (len(chunk) >= chunk_size or
+                          chunk_bytes + request_bytes > self.MAX_REQUEST_BYTES):
+                chunks.append(chunk)
+                chunk = []
+                chunk_bytes = 0
+
+            chunk.append(image_request)
+            chunk_bytes += request_bytes
+
+        if chunk:
+            chunks.append(chunk)
+
+        results = []
+        for chunk, response in zip(chunks, executor.map(self._post, chunks)):
+            responses = response.get('responses') or []
+            for i in range(len(chunk)):
+                results.append(responses[i] if i < len(responses) else None)
+
+        return list(zip(results, payloads))
+
     def detect_text(self, image_path: str, language_hints: List[str] = None) -> Dict:
         """
         Perform basic text detection (best for general text)
@@ -92,22 +227,36 @@ class GoogleVisionOCR(BaseOCRService):
             {
                 'full_text': str,
                 'annotations': List[Dict],
+                'layout': DocumentLayout,
                 'confidence': float,
                 'language': str
             }
         """
-        response = self._make_request(image_path, 'TEXT_DETECTION', language_hints)
+        response, payload = self._make_request(image_path, 'TEXT_DETECTION', language_hints)
+        responses = response.get('responses') or [None]
+        return self._attach_payload(self._parse_text_result(responses[0]), payload)
+
+    def detect_text_batch(self, image_paths: List[str], language_hints: List[str] = None) -> List[Dict]:
+        """
+        Basic text detection for several images, batched into shared API calls
+
+        Returns:
+            List of detect_text() style results, in the same order as image_paths
+        """
+        results = self._make_batch_request(image_paths, 'TEXT_DETECTION', language_hints)
+        return [self._attach_payload(self._parse_text_result(result), payload) for result, payload in results]
 
-        if 'responses' not in response or not response['responses']:
+    def _parse_text_result(self, result: Optional[Dict]) -> Dict:
+        """Parse one TEXT_DETECTION response entry"""
+        if not result:
             return {
                 'full_text': '',
                 'annotations': [],
+                'layout': DocumentLayout(),
                 'confidence': 0.0,
                 'language': 'unknown'
             }
 
-        result = response['responses'][0]
-
         if 'error' in result:
             raise Exception(f"Vision API error: {result['error'].get('message', 'Unknown error')}")
 
@@ -115,6 +264,7 @@ class GoogleVisionOCR(BaseOCRService):
             return {
                 'full_text': '',
                 'annotations': [],
+                'layout': DocumentLayout(),
                 'confidence': 0.0,
                 'language': 'unknown'
             }
@@ -136,10 +286,13 @@ class GoogleVisionOCR(BaseOCRService):
                 'confidence': ann.get('confidence', 0.0)
             })
 
+        layout = DocumentLayout.from_text_annotations(annotations[1:])
+
         return {
             'full_text': full_text,
             'annotations': annotation_data,
-            'confidence': self._calculate_average_confidence(annotation_data),
+            'layout': layout,
+            'confidence': layout.confidence,
             'language': detected_lang,
             'raw_response': result
         }
@@ -152,30 +305,38 @@ class GoogleVisionOCR(BaseOCRService):
             {
                 'full_text': str,
                 'pages': List[Dict],
-                'blocks': List[Dict],
-                'paragraphs': List[Dict],
-                'words': List[Dict],
+                'layout': DocumentLayout,
                 'confidence': float,
                 'language': str,
                 'breaks': Dict
             }
         """
-        response = self._make_request(image_path, 'DOCUMENT_TEXT_DETECTION', language_hints)
+        response, payload = self._make_request(image_path, 'DOCUMENT_TEXT_DETECTION', language_hints)
+        responses = response.get('responses') or [None]
+        return self._attach_payload(self._parse_document_result(responses[0]), payload)
+
+    def detect_document_text_batch(self, image_paths: List[str], language_hints: List[str] = None) -> List[Dict]:
+        """
+        Document text detection for several images, batched into shared API calls
 
-        if 'responses' not in response or not response['responses']:
+        Returns:
+            List of detect_document_text() style results, in the same order as image_paths
+        """
+        results = self._make_batch_request(image_paths, 'DOCUMENT_TEXT_DETECTION', language_hints)
+        return [self._attach_payload(self._parse_document_result(result), payload) for result, payload in results]
+
+    def _parse_document_result(self, result: Optional[Dict]) -> Dict:
+        """Parse one DOCUMENT_TEXT_DETECTION response entry"""
+        if not result:
             return {
                 'full_text': '',
                 'pages': [],
-                'blocks': [],
-                'paragraphs': [],
-                'words': [],
+                'layout': DocumentLayout(),
                 'confidence': 0.0,
                 'language': 'unknown',
                 'breaks': {}
             }
 
-        result = response['responses'][0]
-
         if 'error' in result:
             raise Exception(f"Vision API error: {result['error'].get('message', 'Unknown error')}")
 
@@ -183,80 +344,41 @@ class GoogleVisionOCR(BaseOCRService):
             return {
                 'full_text': '',
                 'pages': [],
-                'blocks': [],
-                'paragraphs': [],
-                'words': [],
+                'layout': DocumentLayout(),
                 'confidence': 0.0,
                 'language': 'unknown',
                 'breaks': {}
             }
 
+        # One pass over the symbol tree builds words, ids and breaks together
         full_text_annotation = result['fullTextAnnotation']
-        full_text = full_text_annotation.get('text', '')
-
-        # Extract pages, blocks, paragraphs, and words
-        pages_data = []
-        blocks_data = []
-        paragraphs_data = []
-        words_data = []
-        breaks_data = []
-
-        for page in full_text_annotation.get('pages', []):
-            detected_lang = 'unknown'
-            if page.get('property', {}).get('detectedLanguages'):
-                detected_lang = page['property']['detectedLanguages'][0].get('languageCode', 'unknown')
-
-            for block in page.get('blocks', []):
-                block_text = self._extract_text_from_block(block)
-                blocks_data.append({
-                    'text': block_text,
-                    'confidence': block.get('confidence', 0.0),
-                    'bounding_box': block.get('boundingBox', {}).get('vertices', [])
-                })
-
-                for paragraph in block.get('paragraphs', []):
-                    para_text = self._extract_text_from_paragraph(paragraph)
-                    paragraphs_data.append({
-                        'text': para_text,
-                        'confidence': paragraph.get('confidence', 0.0),
-                        'bounding_box': paragraph.get('boundingBox', {}).get('vertices', [])
-                    })
-
-                    for word in paragraph.get('words', []):
-                        word_text = ''.join([symbol.get('text', '') for symbol in word.get('symbols', [])])
-                        words_data.append({
-                            'text': word_text,
-                            'confidence': word.get('confidence', 0.0),
-                            'bounding_box': word.get('boundingBox', {}).get('vertices', [])
-                        })
-
-                        # Extract breaks (line breaks, spaces, etc.)
-                        for symbol in word.get('symbols', []):
-                            if symbol.get('property', {}).get('detectedBreak'):
-                                breaks_data.append({
-                                    'type': symbol['property']['detectedBreak'].get('type', 'SPACE'),
-                                    'after_text': symbol.get('text', '')
-                                })
-
-            pages_data.append({
-                'width': page.get('width', 0),
-                'height': page.get('height', 0),
-                'language': detected_lang,
-                'confidence': page.get('confidence', 0.0)
-            })
+        layout, line_breaks = DocumentLayout.from_full_text_annotation(full_text_annotation)
 
         return {
-            'full_text': full_text,
-            'pages': pages_data,
-            'blocks': blocks_data,
-            'paragraphs': paragraphs_data,
-            'words': words_data,
-            'confidence': self._calculate_average_confidence(words_data),
-            'language': pages_data[0]['language'] if pages_data else 'unknown',
-            'breaks': {'line_breaks': breaks_data},
+            'full_text': full_text_annotation.get('text', ''),
+            'pages': layout.pages,
+            'layout': layout,
+            'confidence': layout.confidence,
+            'language': layout.pages[0]['language'] if layout.pages else 'unknown',
+            'breaks': {'line_breaks': line_breaks},
             'raw_response': result
         }
 
+    @staticmethod
+    def _attach_payload(ocr_result: Dict, payload: Dict) -> Dict:
+        """
+        Record upload payload stats (original/sent bytes, scale) on an OCR result
+
+        Vision reports boxes in pixels of the image it was sent; a downscaled
+        upload's layout is mapped back to pixels of the page image itself, the
+        space the local engine and the preprocessing details use.
+        """
+        ocr_result['payload'] = payload
+        scale = payload.get('scale') or 1.0
+        if scale != 1.0 and ocr_result.get('layout') is not None:
+            ocr_result['layout'].rescale(1.0 / scale)
+        return ocr_result
+
     def detect_handwriting(self, image_path: str, language_hints: List[str] = None) -> Dict:
         """
         Handwriting detection (uses document_text_detection which is best for handwriting)
@@ -276,29 +398,3 @@ class GoogleVisionOCR(BaseOCRService):
     def get_confidence_score(self, ocr_result: Dict) -> float:
         """Extract average confidence from Vision API response"""
         return ocr_result.get('confidence', 0.0)
-
-    def _extract_text_from_block(self, block: Dict) -> str:
-        """Extract text from a block"""
-        texts = []
-        for paragraph in block.get('paragraphs', []):
-            texts.append(self._extract_text_from_paragraph(paragraph))
-        return ' '.join(texts)
-
-    def _extract_text_from_paragraph(self, paragraph: Dict) -> str:
-        """Extract text from a paragraph"""
-        words = []
-        for word in paragraph.get('words', []):
-            word_text = ''.join([symbol.get('text', '') for symbol in word.get('symbols', [])])
-            words.append(word_text)
-        return ' '.join(words)
-
-    def _calculate_average_confidence(self, items: List[Dict]) -> float:
-        """Calculate average confidence from a list of items"""
-        if not items:
-            return 0.0
-
-        confidences = [item.get('confidence', 0.0) for item in items if 'confidence' in item]
-        if not confidences:
-            return 0.0
-
-        return sum(confidences) / len(confidences)
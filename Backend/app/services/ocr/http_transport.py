@@ -0,0 +1,114 @@
+"""
+Shared HTTP Transport for OCR Providers
+Keeps one pooled, keep-alive requests.Session per worker process
+"""
+import os
+import threading
+from typing import Tuple
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# Statuses worth retrying: quota exhaustion and transient server errors
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def get_http_timeout() -> Tuple[float, float]:
+    """
+    Get (connect, read) timeouts for OCR API calls
+
+    Configured with OCR_HTTP_CONNECT_TIMEOUT and OCR_HTTP_READ_TIMEOUT (seconds)
+    """
+    connect_timeout = float(os.environ.get('OCR_HTTP_CONNECT_TIMEOUT', 5))
+    read_timeout = float(os.environ.get('OCR_HTTP_READ_TIMEOUT', 60))
+    return connect_timeout, read_timeout
+
+
+def get_retry_settings() -> Tuple[int, float]:
+    """
+    Get (max_retries, backoff_factor) for OCR API calls
+
+    Configured with OCR_HTTP_MAX_RETRIES and OCR_HTTP_BACKOFF_FACTOR (seconds)
+    """
+    max_retries = int(os.environ.get('OCR_HTTP_MAX_RETRIES', 3))
+    backoff_factor = float(os.environ.get('OCR_HTTP_BACKOFF_FACTOR', 1.0))
+    return max_retries, backoff_factor
+
+
+def build_session(pool_size: int = 10, max_retries: int = 3, backoff_factor: float = 1.0,
+                  status_forcelist: Tuple[int, ...] = RETRY_STATUS_CODES) -> requests.Session:
+    """
+    Build a pooled session with status-aware retries
+
+    Retries status_forcelist responses and connection errors with exponential
+    backoff. A Retry-After header sent with 429/503 takes precedence over the
+    backoff.
+
+    Args:
+        pool_size: Max keep-alive connections per host
+        max_retries: Retries per request before giving up
+        backoff_factor: Exponential backoff base in seconds
+        status_forcelist: Statuses to retry (empty to leave them to the caller)
+
+    Returns:
+        Configured requests.Session
+    """
+    retry = Retry(
+        total=max_retries,
+        connect=max_retries,
+        read=max_retries,
+        status=max_retries,
+        status_forcelist=status_forcelist,
+        allowed_methods=frozenset(['GET', 'POST']),  # images:annotate is side-effect free
+        backoff_factor=backoff_factor,
+        respect_retry_after_header=True,
+        raise_on_status=False  # Hand the last response back so raise_for_status() reports it
+    )
+
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=retry
+    )
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({'Content-Type': 'application/json'})
+    return session
+
+
+def get_vision_session() -> requests.Session:
+    """
+    Get the process-wide session used for Vision API calls
+
+    The session is created lazily and rebuilt after a fork, so every Celery
+    worker process owns its own connection pool. Configured with
+    OCR_HTTP_POOL_SIZE, OCR_HTTP_MAX_RETRIES and OCR_HTTP_BACKOFF_FACTOR.
+
+    The session only retries connection errors. 429/5xx responses are retried
+    by GoogleVisionOCR so that every attempt goes through the rate limiter.
+    """
+    global _session, _session_pid
+
+    pid = os.getpid()
+    if _session is not None and _session_pid == pid:
+        return _session
+
+    with _session_lock:
+        if _session is None or _session_pid != pid:
+            max_retries, backoff_factor = get_retry_settings()
+            _session = build_session(
+                pool_size=int(os.environ.get('OCR_HTTP_POOL_SIZE', 10)),
+                max_retries=max_retries,
+                backoff_factor=backoff_factor,
+                status_forcelist=()
+            )
+            _session_pid = pid
+
+    return _session
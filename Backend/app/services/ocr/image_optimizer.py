@@ -0,0 +1,118 @@
+"""
+Image Optimizer - Shrinks page images before they are uploaded for OCR
+"""
+import io
+import os
+from typing import Dict
+from PIL import Image
+
+
+class ImageOptimizer:
+    """
+    Pre-upload optimization stage for OCR payloads
+
+    Converts pages to grayscale, downscales them to a target long edge and
+    re-encodes them as JPEG or WebP. Images that are already small are sent
+    untouched, as are images the optimizer cannot make smaller.
+    """
+
+    FORMATS = {'JPEG', 'WEBP'}
+
+    def __init__(self, enabled: bool = None, max_long_edge: int = None, output_format: str = None,
+                 quality: int = None, min_bytes: int = None, grayscale: bool = None):
+        """
+        Initialize image optimizer (unset arguments fall back to env variables)
+
+        Args:
+            enabled: Run the stage at all (OCR_OPTIMIZE_IMAGES, default True)
+            max_long_edge: Target long edge in pixels (OCR_OPTIMIZE_MAX_LONG_EDGE, default 2400)
+            output_format: 'JPEG' or 'WEBP' (OCR_OPTIMIZE_FORMAT, default JPEG)
+            quality: Encoder quality 1-100 (OCR_OPTIMIZE_QUALITY, default 85)
+            min_bytes: Skip files smaller than this (OCR_OPTIMIZE_MIN_BYTES, default 300KB)
+            grayscale: Drop color channels (OCR_OPTIMIZE_GRAYSCALE, default True)
+        """
+        if enabled is None:
+            enabled = os.environ.get('OCR_OPTIMIZE_IMAGES', 'True').lower() in ['true', '1', 't']
+        if grayscale is None:
+            grayscale = os.environ.get('OCR_OPTIMIZE_GRAYSCALE', 'True').lower() in ['true', '1', 't']
+
+        self.enabled = enabled
+        self.grayscale = grayscale
+        self.max_long_edge = max_long_edge or int(os.environ.get('OCR_OPTIMIZE_MAX_LONG_EDGE', 2400))
+        self.output_format = (output_format or os.environ.get('OCR_OPTIMIZE_FORMAT', 'JPEG')).upper()
+        self.quality = quality or int(os.environ.get('OCR_OPTIMIZE_QUALITY', 85))
+        self.min_bytes = min_bytes if min_bytes is not None else \
+            int(os.environ.get('OCR_OPTIMIZE_MIN_BYTES', 300 * 1024))
+
+        if self.output_format not in self.FORMATS:
+            raise ValueError(f"Unsupported output format: {self.output_format}")
+
+    def optimize(self, image_path: str) -> Dict:
+        """
+        Produce the bytes that should be uploaded for an image
+
+        Args:
+            image_path: Path to the image file
+
+        Returns:
+            {
+                'content': bytes,         # bytes to upload
+                'original_bytes': int,    # size of the source file
+                'sent_bytes': int,        # size of content
+                'scale': float,           # sent width / original width
+                'optimized': bool         # False if the source was sent as is
+            }
+        """
+        original_bytes = os.path.getsize(image_path)
+
+        if not self.enabled or original_bytes < self.min_bytes:
+            return self._passthrough(image_path, original_bytes)
+
+        with Image.open(image_path) as img:
+            original_width = img.size[0]
+
+            # Let the JPEG decoder downscale by a power of two while decoding
+            if img.format == 'JPEG':
+                img.draft('L' if self.grayscale else 'RGB', (self.max_long_edge, self.max_long_edge))
+
+            if self.grayscale:
+                img = img.convert('L')
+            elif img.mode != 'RGB':
+                img = img.convert('RGB')
+
+            if max(img.size) > self.max_long_edge:
+                img.thumbnail((self.max_long_edge, self.max_long_edge), Image.LANCZOS)
+
+            buffer = io.BytesIO()
+            if self.output_format == 'JPEG':
+                img.save(buffer, 'JPEG', quality=self.quality, optimize=True)
+            else:
+                img.save(buffer, 'WEBP', quality=self.quality, method=4)
+
+            scale = img.size[0] / original_width if original_width else 1.0
+
+        content = buffer.getvalue()
+        if len(content) >= original_bytes:
+            return self._passthrough(image_path, original_bytes)
+
+        return {
+            'content': content,
+            'original_bytes': original_bytes,
+            'sent_bytes': len(content),
+            'scale': scale,
+            'optimized': True
+        }
+
+    @staticmethod
+    def _passthrough(image_path: str, original_bytes: int) -> Dict:
+        """Send the source file untouched"""
+        with open(image_path, 'rb') as image_file:
+            content = image_file.read()
+
+        return {
+            'content': content,
+            'original_bytes': original_bytes,
+            'sent_bytes': len(content),
+            'scale': 1.0,
+            'optimized': False
+        }
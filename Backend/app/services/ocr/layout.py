@@ -0,0 +1,388 @@
+"""
+Compact OCR Layout Model
+Single-pass parser for Vision fullTextAnnotation trees
+"""
+import bisect
+import math
+from typing import Dict, List, Optional, Tuple
+
+
+# Symbol breaks that end a line of text
+LINE_ENDING_BREAKS = {'LINE_BREAK', 'EOL_SURE_SPACE'}
+
+
+def _bbox(bounding_box: Optional[Dict]) -> Tuple[int, int, int, int]:
+    """Collapse a Vision boundingBox/boundingPoly to (x0, y0, x1, y1)"""
+    vertices = (bounding_box or {}).get('vertices') or []
+    if not vertices:
+        return (0, 0, 0, 0)
+    # Vision omits x/y when they are 0
+    xs = [vertex.get('x', 0) for vertex in vertices]
+    ys = [vertex.get('y', 0) for vertex in vertices]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+class Word:
+    """One recognized word with its position in the block/paragraph/line hierarchy"""
+    __slots__ = ('text', 'confidence', 'bbox', 'block_id', 'paragraph_id', 'line_id')
+
+    def __init__(self, text: str, confidence: float, bbox: Tuple[int, int, int, int],
+                 block_id: int, paragraph_id: int, line_id: int):
+        self.text = text
+        self.confidence = confidence
+        self.bbox = bbox
+        self.block_id = block_id
+        self.paragraph_id = paragraph_id
+        self.line_id = line_id
+
+    def __repr__(self):
+        return f'<Word {self.text!r} line={self.line_id}>'
+
+
+class WordGrid:
+    """
+    Uniform grid over word boxes for region queries
+
+    Each word is bucketed by the centre of its box, so a query visits only the
+    cells its box overlaps instead of every word of the page.
+    """
+    __slots__ = ('cell', 'buckets', 'extent')
+
+    def __init__(self, words: List[Word], cell: int = None):
+        """
+        Args:
+            words: Words of one page (image)
+            cell: Cell size in pixels (default: four median word heights)
+        """
+        if cell is None:
+            heights = sorted(w.bbox[3] - w.bbox[1] for w in words if w.bbox[3] > w.bbox[1])
+            cell = max(16, 4 * heights[len(heights) // 2]) if heights else 64
+        self.cell = cell
+        self.buckets = {}
+        for i, word in enumerate(words):
+            self.buckets.setdefault(self._cell_of(word), []).append(i)
+
+        cells = list(self.buckets)
+        self.extent = (min(c[0] for c in cells), min(c[1] for c in cells),
+                       max(c[0] for c in cells), max(c[1] for c in cells)) if cells else None
+
+    def _cell_of(self, word: Word) -> Tuple[int, int]:
+        x0, y0, x1, y1 = word.bbox
+        return (int((x0 + x1) / 2 // self.cell), int((y0 + y1) / 2 // self.cell))
+
+    def query(self, words: List[Word], box: Tuple[float, float, float, float]) -> List[int]:
+        """
+        Indices of the words whose centre lies inside box, in reading order
+
+        Args:
+            words: The words the grid was built over
+            box: (x0, y0, x1, y1); bounds may be +/-inf
+        """
+        if self.extent is None:
+            return []
+        x0, y0, x1, y1 = box
+        first_x = max(self.extent[0], int(x0 // self.cell) if math.isfinite(x0) else self.extent[0])
+        first_y = max(self.extent[1], int(y0 // self.cell) if math.isfinite(y0) else self.extent[1])
+        last_x = min(self.extent[2], int(x1 // self.cell) if math.isfinite(x1) else self.extent[2])
+        last_y = min(self.extent[3], int(y1 // self.cell) if math.isfinite(y1) else self.extent[3])
+
+        found = []
+        for cell_x in range(first_x, last_x + 1):
+            for cell_y in range(first_y, last_y + 1):
+                for i in self.buckets.get((cell_x, cell_y), ()):
+                    wx0, wy0, wx1, wy1 = words[i].bbox
+                    cx, cy = (wx0 + wx1) / 2, (wy0 + wy1) / 2
+                    if x0 <= cx <= x1 and y0 <= cy <= y1:
+                        found.append(i)
+        found.sort()
+        return found
+
+
+class DocumentLayout:
+    """
+    Compact layout of one OCR'd image
+
+    Words are stored once, in reading order, as __slots__ records. Block and
+    paragraph text is derived lazily from the words instead of being built
+    up front for every level of the tree.
+    """
+    __slots__ = ('words', 'pages', 'blocks', 'paragraphs', 'confidence',
+                 '_block_text', '_paragraph_text', '_token_index', '_grid', '_reading_text')
+
+    def __init__(self, words: List[Word] = None, pages: List[Dict] = None,
+                 blocks: List[Tuple] = None, paragraphs: List[Tuple] = None):
+        """
+        Args:
+            words: Word records in reading order
+            pages: Page dicts (width, height, language, confidence)
+            blocks: (confidence, bbox) per block id
+            paragraphs: (block_id, confidence, bbox) per paragraph id
+        """
+        self.words = words or []
+        self.pages = pages or []
+        self.blocks = blocks or []
+        self.paragraphs = paragraphs or []
+        self.confidence = (sum(word.confidence for word in self.words) / len(self.words)) if self.words else 0.0
+        self._block_text = {}
+        self._paragraph_text = {}
+        self._token_index = None
+        self._grid = None
+        self._reading_text = None
+
+    @classmethod
+    def from_full_text_annotation(cls, annotation: Dict) -> Tuple['DocumentLayout', List[Dict]]:
+        """
+        Parse a fullTextAnnotation in a single pass over its symbols
+
+        Args:
+            annotation: Vision fullTextAnnotation dictionary
+
+        Returns:
+            (DocumentLayout, line_breaks) where line_breaks lists every
+            detected symbol break as {'type': str, 'after_text': str}
+        """
+        words = []
+        pages = []
+        blocks = []
+        paragraphs = []
+        line_breaks = []
+        line_id = 0
+
+        for page in annotation.get('pages', []):
+            detected_languages = page.get('property', {}).get('detectedLanguages')
+            pages.append({
+                'width': page.get('width', 0),
+                'height': page.get('height', 0),
+                'language': detected_languages[0].get('languageCode', 'unknown') if detected_languages else 'unknown',
+                'confidence': page.get('confidence', 0.0)
+            })
+
+            for block in page.get('blocks', []):
+                block_id = len(blocks)
+                blocks.append((block.get('confidence', 0.0), _bbox(block.get('boundingBox'))))
+
+                for paragraph in block.get('paragraphs', []):
+                    paragraph_id = len(paragraphs)
+                    paragraphs.append((block_id, paragraph.get('confidence', 0.0),
+                                       _bbox(paragraph.get('boundingBox'))))
+                    line_open = False
+
+                    for word in paragraph.get('words', []):
+                        chars = []
+                        ends_line = False
+                        for symbol in word.get('symbols', []):
+                            chars.append(symbol.get('text', ''))
+                            detected_break = symbol.get('property', {}).get('detectedBreak')
+                            if detected_break:
+                                break_type = detected_break.get('type', 'SPACE')
+                                line_breaks.append({'type': break_type, 'after_text': symbol.get('text', '')})
+                                ends_line = ends_line or break_type in LINE_ENDING_BREAKS
+
+                        words.append(Word(''.join(chars), word.get('confidence', 0.0),
+                                          _bbox(word.get('boundingBox')), block_id, paragraph_id, line_id))
+                        line_open = True
+                        if ends_line:
+                            line_id += 1
+                            line_open = False
+
+                    # Paragraphs never share a line
+                    if line_open:
+                        line_id += 1
+
+        return cls(words, pages, blocks, paragraphs), line_breaks
+
+    @classmethod
+    def from_text_annotations(cls, annotations: List[Dict]) -> 'DocumentLayout':
+        """
+        Build a flat layout from TEXT_DETECTION word annotations
+
+        TEXT_DETECTION has no block/paragraph hierarchy, so every word lives
+        in block 0, paragraph 0, line 0.
+        """
+        words = [
+            Word(ann.get('description', ''), ann.get('confidence', 0.0),
+                 _bbox(ann.get('boundingPoly')), 0, 0, 0)
+            for ann in annotations
+        ]
+        return cls(words, blocks=[(0.0, (0, 0, 0, 0))] if words else [],
+                   paragraphs=[(0, 0.0, (0, 0, 0, 0))] if words else [])
+
+    @classmethod
+    def combine(cls, layouts: List['DocumentLayout']) -> 'DocumentLayout':
+        """Concatenate per-page layouts, renumbering block/paragraph/line ids"""
+        words, pages, blocks, paragraphs = [], [], [], []
+        line_offset = 0
+
+        for layout in layouts:
+            if layout is None:
+                continue
+            block_offset = len(blocks)
+            paragraph_offset = len(paragraphs)
+            for word in layout.words:
+                words.append(Word(word.text, word.confidence, word.bbox, word.block_id + block_offset,
+                                  word.paragraph_id + paragraph_offset, word.line_id + line_offset))
+            pages.extend(layout.pages)
+            blocks.extend(layout.blocks)
+            paragraphs.extend((block_id + block_offset, conf, bbox)
+                              for block_id, conf, bbox in layout.paragraphs)
+            line_offset += layout.line_count
+
+        return cls(words, pages, blocks, paragraphs)
+
+    def rescale(self, factor: float) -> None:
+        """
+        Multiply every box and page size by a factor, in place
+
+        Used to map boxes read from a downscaled upload back to the pixels
+        of the image the upload was made from.
+        """
+        def scaled(bbox):
+            return tuple(int(round(value * factor)) for value in bbox)
+
+        for word in self.words:
+            word.bbox = scaled(word.bbox)
+        self.blocks = [(conf, scaled(bbox)) for conf, bbox in self.blocks]
+        self.paragraphs = [(block_id, conf, scaled(bbox)) for block_id, conf, bbox in self.paragraphs]
+        for page in self.pages:
+            page['width'] = int(round(page.get('width', 0) * factor))
+            page['height'] = int(round(page.get('height', 0) * factor))
+        self._grid = None
+
+    @property
+    def line_count(self) -> int:
+        return (self.words[-1].line_id + 1) if self.words else 0
+
+    def block_text(self, block_id: int) -> str:
+        """Text of one block (computed on first access)"""
+        if block_id not in self._block_text:
+            self._block_text[block_id] = ' '.join(w.text for w in self.words if w.block_id == block_id)
+        return self._block_text[block_id]
+
+    def paragraph_text(self, paragraph_id: int) -> str:
+        """Text of one paragraph (computed on first access)"""
+        if paragraph_id not in self._paragraph_text:
+            self._paragraph_text[paragraph_id] = ' '.join(
+                w.text for w in self.words if w.paragraph_id == paragraph_id
+            )
+        return self._paragraph_text[paragraph_id]
+
+    def confidence_for_text(self, text: str) -> Optional[float]:
+        """
+        Average confidence of the words that make up a piece of text
+
+        Tokens are matched case-insensitively against recognized words, each
+        word being used at most once. Tokens that match no word are ignored.
+
+        Args:
+            text: Text assembled from this layout (e.g. one extracted answer)
+
+        Returns:
+            Mean word confidence, or None if no token matched
+        """
+        if not text:
+            return None
+
+        if self._token_index is None:
+            self._token_index = {}
+            for word in self.words:
+                self._token_index.setdefault(word.text.lower(), []).append(word.confidence)
+
+        available = {}
+        matched = []
+        for token in text.lower().split():
+            confidences = self._token_index.get(token)
+            if not confidences:
+                continue
+            used = available.get(token, 0)
+            if used < len(confidences):
+                matched.append(confidences[used])
+                available[token] = used + 1
+
+        return (sum(matched) / len(matched)) if matched else None
+
+    def words_in(self, box: Tuple[float, float, float, float]) -> List[int]:
+        """
+        Indices of the words whose centre lies inside a box, in reading order
+
+        Backed by a WordGrid built on first use. Only meaningful for a
+        single-page layout (word boxes are in that page's pixels).
+
+        Args:
+            box: (x0, y0, x1, y1) in page pixels; bounds may be +/-inf
+        """
+        if self._grid is None:
+            self._grid = WordGrid(self.words)
+        return self._grid.query(self.words, box)
+
+    def reading_text(self) -> Tuple[str, List[int]]:
+        """
+        Words joined in reading order, one line of text per layout line
+
+        Returns:
+            (text, word_starts) where word_starts[i] is the offset of word i
+        """
+        if self._reading_text is None:
+            parts = []
+            starts = []
+            offset = 0
+            for i, word in enumerate(self.words):
+                if i:
+                    separator = '\n' if word.line_id != self.words[i - 1].line_id else ' '
+                    parts.append(separator)
+                    offset += 1
+                starts.append(offset)
+                parts.append(word.text)
+                offset += len(word.text)
+            self._reading_text = (''.join(parts), starts)
+        return self._reading_text
+
+    def words_at(self, start: int, end: int) -> List[int]:
+        """Indices of the words overlapping a character range of reading_text()"""
+        text, starts = self.reading_text()
+        first = max(0, bisect.bisect_right(starts, start) - 1)
+        return [i for i in range(first, bisect.bisect_left(starts, end))
+                if starts[i] + len(self.words[i].text) > start]
+
+    def to_dict(self) -> Dict:
+        """
+        Columnar JSON form, suitable for OCRResult.bounding_boxes and caches
+
+        Returns:
+            {
+                'format': 'layout_v1',
+                'text': [str], 'confidence': [float], 'bbox': [[x0, y0, x1, y1]],
+                'block': [int], 'paragraph': [int], 'line': [int],
+                'blocks': [[confidence, [x0, y0, x1, y1]]],
+                'paragraphs': [[block_id, confidence, [x0, y0, x1, y1]]],
+                'pages': [dict]
+            }
+        """
+        return {
+            'format': 'layout_v1',
+            'text': [w.text for w in self.words],
+            'confidence': [w.confidence for w in self.words],
+            'bbox': [list(w.bbox) for w in self.words],
+            'block': [w.block_id for w in self.words],
+            'paragraph': [w.paragraph_id for w in self.words],
+            'line': [w.line_id for w in self.words],
+            'blocks': [[conf, list(bbox)] for conf, bbox in self.blocks],
+            'paragraphs': [[block_id, conf, list(bbox)] for block_id, conf, bbox in self.paragraphs],
+            'pages': self.pages
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict]) -> Optional['DocumentLayout']:
+        """Rebuild a layout from to_dict() output (None if data is not a layout)"""
+        if not isinstance(data, dict) or data.get('format') != 'layout_v1':
+            return None
+
+        words = [
+            Word(text, conf, tuple(bbox), block_id, paragraph_id, line_id)
+            for text, conf, bbox, block_id, paragraph_id, line_id in zip(
+                data['text'], data['confidence'], data['bbox'],
+                data['block'], data['paragraph'], data['line']
+            )
+        ]
+        blocks = [(conf, tuple(bbox)) for conf, bbox in data.get('blocks', [])]
+        paragraphs = [(block_id, conf, tuple(bbox)) for block_id, conf, bbox in data.get('paragraphs', [])]
+        return cls(words, data.get('pages', []), blocks, paragraphs)
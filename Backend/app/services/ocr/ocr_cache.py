@@ -0,0 +1,301 @@
+"""
+OCR Result Cache - Content-addressed cache in front of the OCR provider
+Keyed by SHA-256 of the image bytes + feature type + sorted language hints
+"""
+import os
+import gzip
+import json
+import time
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+from app.utils.disk_lru import DiskLRUDirectory
+from .layout import DocumentLayout
+
+
+_cache = None
+_cache_pid = None
+_cache_lock = threading.Lock()
+
+
+def image_sha256(image_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Hash an image file in chunks without loading it whole"""
+    digest = hashlib.sha256()
+    with open(image_path, 'rb') as image_file:
+        for chunk in iter(lambda: image_file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class OCRCacheBackend(ABC):
+    """Abstract base class for OCR cache storage backends"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Dict]:
+        """Return the cached OCR result for key (None on miss), marking it recently used"""
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: Dict) -> None:
+        """Store an OCR result, evicting least recently used entries if over budget"""
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Remove every cached entry"""
+        pass
+
+    def record(self, hit: bool) -> None:
+        """Record a lookup outcome in shared counters (optional)"""
+        pass
+
+    def shared_stats(self) -> Dict:
+        """Counters shared between processes (optional)"""
+        return {}
+
+
+class DiskOCRCache(OCRCacheBackend):
+    """
+    Local disk backend
+
+    Entries are gzip-compressed JSON files in a size-capped LRU directory
+    (see app/utils/disk_lru.py): hits touch the file, and eviction removes
+    the oldest files once the directory is over max_bytes.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 512 * 1024 * 1024):
+        self.store = DiskLRUDirectory(directory, max_bytes)
+
+    def _path(self, key: str) -> str:
+        return self.store.path(f"{key}.json.gz")
+
+    def get(self, key: str) -> Optional[Dict]:
+        path = self._path(key)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as cache_file:
+                value = json.load(cache_file)
+            self.store.touch(path)
+            return value
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            # Corrupt or half-written entry - treat as a miss
+            return None
+
+    def set(self, key: str, value: Dict) -> None:
+        def write(tmp_path):
+            with gzip.open(tmp_path, 'wt', encoding='utf-8') as cache_file:
+                json.dump(value, cache_file)
+
+        self.store.write(self._path(key), write)
+
+    def clear(self) -> None:
+        self.store.clear()
+
+
+class RedisOCRCache(OCRCacheBackend):
+    """
+    Redis backend
+
+    Values are gzip-compressed JSON strings. A sorted set of keys scored by
+    last access time tracks recency; once it grows past max_entries the
+    oldest keys are dropped. Hit/miss counters live in a shared hash so
+    every worker reports the same totals.
+    """
+
+    PREFIX = 'ocr_cache'
+
+    def __init__(self, redis_url: str, max_entries: int = 10000):
+        import redis
+        self.client = redis.Redis.from_url(redis_url)
+        self.max_entries = max_entries
+        self.lru_key = f"{self.PREFIX}:lru"
+        self.stats_key = f"{self.PREFIX}:stats"
+
+    def _value_key(self, key: str) -> str:
+        return f"{self.PREFIX}:v:{key}"
+
+    def get(self, key: str) -> Optional[Dict]:
+        data = self.client.get(self._value_key(key))
+        if data is None:
+            return None
+        self.client.zadd(self.lru_key, {key: time.time()})
+        return json.loads(gzip.decompress(data).decode('utf-8'))
+
+    def set(self, key: str, value: Dict) -> None:
+        data = gzip.compress(json.dumps(value).encode('utf-8'))
+        pipe = self.client.pipeline()
+        pipe.set(self._value_key(key), data)
+        pipe.zadd(self.lru_key, {key: time.time()})
+        pipe.zcard(self.lru_key)
+        size = pipe.execute()[-1]
+
+        excess = size - self.max_entries
+        if excess > 0:
+            stale_keys = self.client.zrange(self.lru_key, 0, excess - 1)
+            if stale_keys:
+                pipe = self.client.pipeline()
+                pipe.delete(*[self._value_key(k.decode('utf-8')) for k in stale_keys])
+                pipe.zrem(self.lru_key, *stale_keys)
+                pipe.execute()
+
+    def clear(self) -> None:
+        keys = self.client.zrange(self.lru_key, 0, -1)
+        pipe = self.client.pipeline()
+        if keys:
+            pipe.delete(*[self._value_key(k.decode('utf-8')) for k in keys])
+        pipe.delete(self.lru_key, self.stats_key)
+        pipe.execute()
+
+    def record(self, hit: bool) -> None:
+        self.client.hincrby(self.stats_key, 'hits' if hit else 'misses', 1)
+
+    def shared_stats(self) -> Dict:
+        stats = self.client.hgetall(self.stats_key)
+        return {
+            'hits': int(stats.get(b'hits', 0)),
+            'misses': int(stats.get(b'misses', 0)),
+            'entries': self.client.zcard(self.lru_key)
+        }
+
+
+class OCRResultCache:
+    """Content-addressed OCR result cache with hit/miss counters"""
+
+    # Bumped when cached results change meaning (2: word boxes in page pixels, not upload pixels)
+    KEY_VERSION = 2
+
+    def __init__(self, backend: OCRCacheBackend):
+        """
+        Initialize OCR result cache
+
+        Args:
+            backend: Storage backend (DiskOCRCache or RedisOCRCache)
+        """
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def make_key(cls, image_hash: str, feature_type: str, language_hints: List[str] = None) -> str:
+        """
+        Build the cache key for one OCR call
+
+        Args:
+            image_hash: SHA-256 of the image bytes
+            feature_type: 'TEXT_DETECTION' or 'DOCUMENT_TEXT_DETECTION'
+            language_hints: Language codes (order does not matter)
+
+        Returns:
+            Hex digest identifying the call
+        """
+        hints = ','.join(sorted(language_hints or []))
+        return hashlib.sha256(f"v{cls.KEY_VERSION}|{image_hash}|{feature_type}|{hints}".encode('utf-8')).hexdigest()
+
+    def key_for_image(self, image_path: str, feature_type: str, language_hints: List[str] = None) -> str:
+        """Build the cache key for an image file"""
+        return self.make_key(image_sha256(image_path), feature_type, language_hints)
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Look up a cached OCR result, counting the hit or miss"""
+        try:
+            value = self.backend.get(key)
+        except Exception:
+            # The cache must never take OCR down with it
+            value = None
+
+        hit = value is not None
+        if hit and value.get('layout') is not None:
+            value['layout'] = DocumentLayout.from_dict(value['layout'])
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+        try:
+            self.backend.record(hit)
+        except Exception:
+            pass
+
+        return value
+
+    def set(self, key: str, value: Dict) -> None:
+        """Store an OCR result (errors are swallowed)"""
+        if isinstance(value.get('layout'), DocumentLayout):
+            value = dict(value, layout=value['layout'].to_dict())
+        try:
+            self.backend.set(key, value)
+        except Exception:
+            pass
+
+    def stats(self) -> Dict:
+        """
+        Get cache statistics
+
+        Returns:
+            {
+                'backend': str,
+                'hits': int,       # this process
+                'misses': int,     # this process
+                'hit_rate': float,
+                'shared': dict     # backend-wide counters, if supported
+            }
+        """
+        lookups = self.hits + self.misses
+        try:
+            shared = self.backend.shared_stats()
+        except Exception:
+            shared = {}
+
+        return {
+            'backend': type(self.backend).__name__,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits / lookups) if lookups else 0.0,
+            'shared': shared
+        }
+
+
+def get_ocr_cache() -> Optional[OCRResultCache]:
+    """
+    Get the process-wide OCR result cache
+
+    Configured with:
+        OCR_CACHE_BACKEND     'disk' (default), 'redis' or 'none'
+        OCR_CACHE_DIR         Disk cache directory (default: <UPLOAD_FOLDER>/ocr_cache)
+        OCR_CACHE_MAX_BYTES   Disk cache size budget (default: 512MB)
+        OCR_CACHE_REDIS_URL   Redis URL (default: CELERY_BROKER_URL)
+        OCR_CACHE_MAX_ENTRIES Redis cache entry budget (default: 10000)
+
+    Returns:
+        OCRResultCache instance, or None if caching is disabled
+    """
+    global _cache, _cache_pid
+
+    backend_name = os.environ.get('OCR_CACHE_BACKEND', 'disk').lower()
+    if backend_name in ('', 'none', 'off', 'false'):
+        return None
+
+    pid = os.getpid()
+    if _cache is not None and _cache_pid == pid:
+        return _cache
+
+    with _cache_lock:
+        if _cache is None or _cache_pid != pid:
+            if backend_name == 'redis':
+                backend = RedisOCRCache(
+                    redis_url=os.environ.get('OCR_CACHE_REDIS_URL') or
+                              os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0'),
+                    max_entries=int(os.environ.get('OCR_CACHE_MAX_ENTRIES', 10000))
+                )
+            else:
+                backend = DiskOCRCache(
+                    directory=os.environ.get('OCR_CACHE_DIR') or
+                              os.path.join(os.environ.get('UPLOAD_FOLDER', 'uploads'), 'ocr_cache'),
+                    max_bytes=int(os.environ.get('OCR_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+                )
+            _cache = OCRResultCache(backend)
+            _cache_pid = pid
+
+    return _cache
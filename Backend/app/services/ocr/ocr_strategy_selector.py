@@ -1,10 +1,19 @@
 """
 OCR Strategy Selector - Selects optimal OCR strategy based on exam/question metadata
 """
-from typing import Dict, List, Optional
+import os
+import time
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
 from app.models.exam import Exam, Question
 from app.models.submission import QuestionOCRMetadata
+from app.services.exam_snapshot import ExamSnapshot, get_exam_snapshot, get_exam_snapshot_cache
+from .base_ocr import BaseOCRService
 from .google_vision_ocr import GoogleVisionOCR
+from .tesseract_ocr import TesseractOCR
+from .ocr_cache import OCRResultCache, get_ocr_cache
 
 
 class OCRStrategy:
@@ -17,19 +26,123 @@ class OCRStrategy:
     ENGLISH_TEXT = 'english_text'
 
 
-class OCRStrategySelector:
-    """Selects optimal OCR strategy based on exam/question metadata"""
+class QuestionPlan(NamedTuple):
+    """How one question's answer is read"""
+    question_id: int
+    strategy: str
+    language_hints: Tuple[str, ...]     # as sent to the OCR service
+    feature_type: str                   # Vision feature type of the strategy
+    source: str                         # 'bubbles', 'region' or 'page'
+    page: Optional[int]                 # template page of the bubble row / answer region
+    box: Optional[Tuple[float, ...]]    # answer region, fractions of the anchor frame
+
+
+class OCRPlan:
+    """
+    How an exam's scans are read: an exam-level strategy for full pages, and
+    a strategy, feature type, hints and source (bubble grid, answer region or
+    full page) per question
+
+    Built from the exam snapshot without further queries, so it changes
+    exactly when the exam, its questions, OCR metadata or templates do
+    (see get_ocr_plan).
+    """
+    __slots__ = ('exam_id', 'version', 'strategy', 'language_hints', 'feature_type', 'questions',
+                 'region_pages', 'bubble_pages')
+
+    def __init__(self, exam_id: int, version: int, strategy: str, language_hints: Tuple[str, ...],
+                 questions: Dict[int, QuestionPlan]):
+        self.exam_id = exam_id
+        self.version = version
+        self.strategy = strategy
+        self.language_hints = language_hints
+        self.feature_type = OCRStrategySelector.get_feature_type(strategy)
+        self.questions = MappingProxyType(questions)
+        self.region_pages = frozenset(plan.page for plan in questions.values() if plan.source == 'region')
+        self.bubble_pages = frozenset(plan.page for plan in questions.values() if plan.source == 'bubbles')
+
+    def __repr__(self):
+        return f'<OCRPlan exam_id={self.exam_id} version={self.version} strategy={self.strategy}>'
+
+    def question(self, question_id: int) -> QuestionPlan:
+        """A question's plan (the exam-level one for questions the plan does not know)"""
+        return self.questions.get(question_id) or QuestionPlan(
+            question_id, self.strategy, self.language_hints, self.feature_type, 'page', None, None)
+
+    def batches(self, question_ids: Iterable[int]) -> Dict[Tuple[str, Tuple[str, ...]], List[int]]:
+        """
+        Group questions into OCR calls: one per distinct (strategy, language hints)
 
-    def __init__(self, ocr_service: GoogleVisionOCR = None):
+        Returns:
+            {(strategy, language_hints): [question_id, ...]}
+        """
+        groups = {}
+        for question_id in question_ids:
+            plan = self.question(question_id)
+            groups.setdefault((plan.strategy, plan.language_hints), []).append(question_id)
+        return groups
+
+    def to_dict(self) -> Dict:
+        return {
+            'exam_id': self.exam_id,
+            'version': self.version,
+            'strategy': self.strategy,
+            'language_hints': list(self.language_hints),
+            'feature_type': self.feature_type,
+            'questions': [dict(plan._asdict(), language_hints=list(plan.language_hints),
+                               box=list(plan.box) if plan.box else None) for plan in self.questions.values()],
+            'region_pages': sorted(self.region_pages),
+            'bubble_pages': sorted(self.bubble_pages)
+        }
+
+
+class OCRStrategySelector:
+    """
+    Selects optimal OCR strategy based on exam/question metadata
+
+    In tiered mode pages are read by the local engine first and only sent to
+    Google Vision when the local page confidence is below the escalation
+    threshold, or when the strategy is one the local engine handles poorly
+    (handwriting and math by default).
+    """
+
+    def __init__(self, ocr_service: GoogleVisionOCR = None, cache: OCRResultCache = None,
+                 local_service: BaseOCRService = None, tiered: bool = None,
+                 escalation_threshold: float = None):
         """
         Initialize strategy selector
 
         Args:
             ocr_service: GoogleVisionOCR instance (creates new if None)
+            cache: OCR result cache (uses the shared process cache if None)
+            local_service: Local OCR engine for tiered mode (TesseractOCR if None)
+            tiered: Try the local engine first (OCR_TIERED_MODE, default False)
+            escalation_threshold: Local page confidence below which Vision is used
+                (OCR_LOCAL_CONFIDENCE_THRESHOLD, default 0.85)
         """
-        self.ocr_service = ocr_service or GoogleVisionOCR()
+        if tiered is None:
+            tiered = os.environ.get('OCR_TIERED_MODE', 'False').lower() in ['true', '1', 't']
 
-    def select_strategy_for_exam(self, exam: Exam) -> str:
+        self.ocr_service = ocr_service or GoogleVisionOCR()
+        self.cache = cache if cache is not None else get_ocr_cache()
+        self.tiered = tiered
+        self.local_service = local_service or (TesseractOCR() if tiered else None)
+        self.escalation_threshold = escalation_threshold if escalation_threshold is not None else \
+            float(os.environ.get('OCR_LOCAL_CONFIDENCE_THRESHOLD', 0.85))
+        self.cloud_only_strategies = {
+            name.strip() for name in
+            os.environ.get('OCR_CLOUD_ONLY_STRATEGIES', 'handwriting,math_formulas').split(',') if name.strip()
+        }
+
+        self.tier_counters = {
+            'local': {'calls': 0, 'pages': 0, 'seconds': 0.0},
+            'cloud': {'calls': 0, 'pages': 0, 'seconds': 0.0},
+            'tiered_pages': 0,
+            'escalated_pages': 0
+        }
+
+    @staticmethod
+    def select_strategy_for_exam(exam: Exam) -> str:
         """
         Select OCR strategy based on exam metadata
 
@@ -40,7 +153,7 @@ class OCRStrategySelector:
         - Default -> HANDWRITING (best for handwritten exams)
 
         Args:
-            exam: Exam model instance
+            exam: Exam model instance (or ExamSnapshot)
 
         Returns:
             Strategy name
@@ -84,30 +197,38 @@ class OCRStrategySelector:
         Returns:
             Strategy name
         """
-        # Check if question has specific OCR metadata
-        metadata = QuestionOCRMetadata.query.filter_by(question_id=question.id).first()
+        # Check if question has specific OCR metadata (from the exam snapshot, not a query per question)
+        snapshot = get_exam_snapshot(question.exam_id)
+        question_snapshot = snapshot.question(question.id) if snapshot else None
+        metadata = question_snapshot.ocr_metadata if question_snapshot else None
 
-        if metadata:
-            # Use question-specific settings
-            if metadata.has_formulas:
-                return OCRStrategy.MATH_FORMULAS
+        # Fall back to exam-level strategy
+        return self._strategy_from_metadata(metadata) or self.select_strategy_for_exam(snapshot or question.exam)
 
-            if metadata.language == 'ar':
-                return OCRStrategy.ARABIC_TEXT
-            elif metadata.language == 'en':
-                return OCRStrategy.ENGLISH_TEXT
-            elif metadata.language == 'mixed':
-                return OCRStrategy.MIXED_CONTENT
+    @staticmethod
+    def _strategy_from_metadata(metadata: Optional[QuestionOCRMetadata]) -> Optional[str]:
+        """Question-specific strategy, or None to use the exam-level one"""
+        if not metadata:
+            return None
 
-            if metadata.subject_type:
-                subject_lower = metadata.subject_type.lower()
-                if 'math' in subject_lower:
-                    return OCRStrategy.MATH_FORMULAS
-                elif 'arabic' in subject_lower:
-                    return OCRStrategy.ARABIC_TEXT
+        if metadata.has_formulas:
+            return OCRStrategy.MATH_FORMULAS
 
-        # Fall back to exam-level strategy
-        return self.select_strategy_for_exam(question.exam)
+        if metadata.language == 'ar':
+            return OCRStrategy.ARABIC_TEXT
+        elif metadata.language == 'en':
+            return OCRStrategy.ENGLISH_TEXT
+        elif metadata.language == 'mixed':
+            return OCRStrategy.MIXED_CONTENT
+
+        if metadata.subject_type:
+            subject_lower = metadata.subject_type.lower()
+            if 'math' in subject_lower:
+                return OCRStrategy.MATH_FORMULAS
+            elif 'arabic' in subject_lower:
+                return OCRStrategy.ARABIC_TEXT
+
+        return None
 
     def get_language_hints(self, exam: Exam, question: Question = None) -> List[str]:
         """
@@ -122,13 +243,18 @@ class OCRStrategySelector:
         """
         # Check question-specific metadata first
         if question:
-            metadata = QuestionOCRMetadata.query.filter_by(question_id=question.id).first()
-            if metadata and metadata.language:
-                if metadata.language == 'mixed':
-                    return ['ar', 'en']
-                return [metadata.language]
+            snapshot = get_exam_snapshot(exam.id)
+            question_snapshot = snapshot.question(question.id) if snapshot else None
+            hints = self._hints_from_metadata(question_snapshot.ocr_metadata if question_snapshot else None)
+            if hints:
+                return hints
 
         # Fall back to exam-level language
+        return self.exam_language_hints(exam)
+
+    @staticmethod
+    def exam_language_hints(exam: Exam) -> List[str]:
+        """Exam-level language hints (exam may also be an ExamSnapshot)"""
         if exam.primary_language == 'mixed':
             return ['ar', 'en']
         elif exam.primary_language == 'ar':
@@ -139,44 +265,322 @@ class OCRStrategySelector:
         # Default to English
         return ['en']
 
-    def execute_strategy(self, strategy: str, image_path: str,
-                         language_hints: List[str] = None) -> Dict:
+    @staticmethod
+    def _hints_from_metadata(metadata: Optional[QuestionOCRMetadata]) -> Optional[List[str]]:
+        """Question-specific language hints, or None to use the exam-level ones"""
+        if not metadata or not metadata.language:
+            return None
+        if metadata.language == 'mixed':
+            return ['ar', 'en']
+        return [metadata.language]
+
+    @staticmethod
+    def build_plan(snapshot: ExamSnapshot) -> OCRPlan:
         """
-        Execute the selected OCR strategy
+        Plan how an exam's scans are read (no queries: the snapshot carries the OCR metadata)
+
+        Args:
+            snapshot: Exam snapshot
+
+        Returns:
+            OCRPlan
+        """
+        selector = OCRStrategySelector
+        exam_strategy = selector.select_strategy_for_exam(snapshot)
+        exam_hints = selector.exam_language_hints(snapshot)
+
+        regions = {region['question_id']: region
+                   for region in (snapshot.answer_region_template or {}).get('regions', [])}
+        bubble_pages = {question_id: grid.get('page', 1)
+                        for grid in (snapshot.bubble_sheet_template or {}).get('grids', [])
+                        for question_id in grid.get('question_ids', [])}
+
+        questions = {}
+        for question in snapshot.questions:
+            metadata = question.ocr_metadata
+            strategy = selector._strategy_from_metadata(metadata) or exam_strategy
+            hints = selector.resolve_language_hints(strategy, selector._hints_from_metadata(metadata) or exam_hints)
+
+            if question.id in bubble_pages:
+                source, page, box = 'bubbles', bubble_pages[question.id], None
+            elif question.id in regions:
+                region = regions[question.id]
+                source, page, box = 'region', region.get('page', 1), tuple(region['box'])
+            else:
+                source, page, box = 'page', None, None
+
+            questions[question.id] = QuestionPlan(question.id, strategy, tuple(hints or ()),
+                                                  selector.get_feature_type(strategy), source, page, box)
+
+        return OCRPlan(snapshot.exam_id, snapshot.version, exam_strategy,
+                       tuple(selector.resolve_language_hints(exam_strategy, exam_hints) or ()), questions)
+
+    @staticmethod
+    def get_feature_type(strategy: str) -> str:
+        """
+        Get the Vision API feature type used by a strategy
 
         Args:
             strategy: OCR strategy name
-            image_path: Path to image file
-            language_hints: Language codes
 
         Returns:
-            OCR result dictionary
+            'TEXT_DETECTION' or 'DOCUMENT_TEXT_DETECTION'
         """
         if strategy == OCRStrategy.GENERAL_TEXT:
-            return self.ocr_service.detect_text(image_path, language_hints)
+            return 'TEXT_DETECTION'
+        return 'DOCUMENT_TEXT_DETECTION'
 
-        elif strategy == OCRStrategy.HANDWRITING:
-            return self.ocr_service.detect_handwriting(image_path, language_hints)
+    @staticmethod
+    def resolve_language_hints(strategy: str, language_hints: List[str] = None) -> List[str]:
+        """
+        Adjust language hints for the selected strategy
 
-        elif strategy == OCRStrategy.MATH_FORMULAS:
-            return self.ocr_service.detect_math_formulas(image_path, language_hints)
+        Args:
+            strategy: OCR strategy name
+            language_hints: Language codes
 
-        elif strategy == OCRStrategy.ARABIC_TEXT:
+        Returns:
+            Language codes actually sent to the OCR service
+        """
+        if strategy == OCRStrategy.ARABIC_TEXT:
             # Ensure Arabic is in language hints
             if not language_hints or 'ar' not in language_hints:
-                language_hints = ['ar']
-            return self.ocr_service.detect_handwriting(image_path, language_hints)
+                return ['ar']
 
         elif strategy == OCRStrategy.ENGLISH_TEXT:
             # Ensure English is in language hints
             if not language_hints or 'en' not in language_hints:
-                language_hints = ['en']
-            return self.ocr_service.detect_handwriting(image_path, language_hints)
+                return ['en']
 
         elif strategy == OCRStrategy.MIXED_CONTENT:
             # Use both languages
-            return self.ocr_service.detect_handwriting(image_path, ['ar', 'en'])
+            return ['ar', 'en']
+
+        return language_hints
+
+    def uses_local_tier(self, strategy: str) -> bool:
+        """Whether pages for this strategy go to the local engine first"""
+        return self.tiered and strategy not in self.cloud_only_strategies
+
+    def execute_strategy(self, strategy: str, image_path: str,
+                         language_hints: List[str] = None) -> Dict:
+        """
+        Execute the selected OCR strategy
 
+        Results are served from the OCR cache when the same image bytes were
+        already processed with the same feature type and language hints.
+
+        Args:
+            strategy: OCR strategy name
+            image_path: Path to image file
+            language_hints: Language codes
+
+        Returns:
+            OCR result dictionary
+        """
+        return self.execute_strategy_batch(strategy, [image_path], language_hints)[0]
+
+    def execute_strategy_batch(self, strategy: str, image_paths: List[str],
+                               language_hints: List[str] = None) -> List[Dict]:
+        """
+        Execute the selected OCR strategy for several pages at once
+
+        Cached pages are answered locally; the remaining pages are sent
+        through the OCR service's batch API so that a multi-page submission
+        costs as few API calls as possible. In tiered mode only the pages the
+        local engine was not confident about reach the OCR service.
+
+        Args:
+            strategy: OCR strategy name
+            image_paths: Paths to image files (one per page)
+            language_hints: Language codes
+
+        Returns:
+            List of OCR result dictionaries, in the same order as image_paths.
+            Each result names the engine that produced it under 'engine';
+            escalated pages also carry 'escalated' and 'local_confidence'.
+        """
+        language_hints = self.resolve_language_hints(strategy, language_hints)
+
+        if not self.uses_local_tier(strategy):
+            return self._run_engine(self.ocr_service, 'cloud', strategy, image_paths, language_hints)
+
+        results = self._run_engine(self.local_service, 'local', strategy, image_paths, language_hints)
+        escalate = [i for i, result in enumerate(results)
+                    if result.get('confidence', 0.0) < self.escalation_threshold]
+
+        self.tier_counters['tiered_pages'] += len(image_paths)
+        self.tier_counters['escalated_pages'] += len(escalate)
+
+        if escalate:
+            cloud_results = self._run_engine(self.ocr_service, 'cloud', strategy,
+                                             [image_paths[i] for i in escalate], language_hints)
+            for i, result in zip(escalate, cloud_results):
+                result['escalated'] = True
+                result['local_confidence'] = results[i].get('confidence', 0.0)
+                results[i] = result
+
+        return results
+
+    def execute_region_batch(self, crops: List[Dict], plan: OCRPlan) -> List[Dict]:
+        """
+        OCR answer-box crops with each question's own strategy and language hints
+
+        Crops that share a strategy and hints go out as one batch, so a sheet
+        costs one call per distinct question language rather than one per box.
+
+        Args:
+            crops: Crops from AnswerRegionCropper.crop()
+            plan: The exam's OCR plan (see get_ocr_plan())
+
+        Returns:
+            List of OCR result dictionaries, in the same order as crops
+        """
+        crop_indexes = {}
+        for i, crop in enumerate(crops):
+            crop_indexes.setdefault(crop['question_id'], []).append(i)
+
+        results = [None] * len(crops)
+        for (strategy, hints), question_ids in plan.batches(crop_indexes).items():
+            indexes = [i for question_id in question_ids for i in crop_indexes[question_id]]
+            group_results = self.execute_strategy_batch(
+                strategy, [crops[i]['image_path'] for i in indexes], list(hints) or None)
+            for i, result in zip(indexes, group_results):
+                results[i] = result
+
+        return results
+
+    def _run_engine(self, service: BaseOCRService, tier: str, strategy: str,
+                    image_paths: List[str], language_hints: List[str] = None) -> List[Dict]:
+        """
+        Run one OCR engine over pages, serving and filling its cache
+
+        Args:
+            service: OCR engine
+            tier: 'local' or 'cloud' (for latency counters)
+            strategy: OCR strategy name
+            image_paths: Paths to image files
+            language_hints: Language codes (already resolved)
+
+        Returns:
+            List of OCR result dictionaries, in the same order as image_paths
+        """
+        feature_type = self.get_feature_type(strategy)
+        if service is not self.ocr_service:
+            # Keep local results apart from Vision results for the same image
+            feature_type = f"{service.engine_name}:{feature_type}"
+
+        results = [None] * len(image_paths)
+        cache_keys = [None] * len(image_paths)
+
+        if self.cache:
+            for i, image_path in enumerate(image_paths):
+                cache_keys[i] = self.cache.key_for_image(image_path, feature_type, language_hints)
+                cached = self.cache.get(cache_keys[i])
+                if cached is not None:
+                    cached['cache_hit'] = True
+                    results[i] = cached
+
+        missing = [i for i, result in enumerate(results) if result is None]
+        if not missing:
+            return results
+
+        start_time = time.time()
+        missing_paths = [image_paths[i] for i in missing]
+        if len(missing_paths) == 1:
+            fresh_results = [self._detect(service, strategy, missing_paths[0], language_hints)]
+        elif strategy == OCRStrategy.GENERAL_TEXT:
+            fresh_results = service.detect_text_batch(missing_paths, language_hints)
         else:
-            # Default to handwriting
-            return self.ocr_service.detect_handwriting(image_path, language_hints)
+            fresh_results = service.detect_document_text_batch(missing_paths, language_hints)
+
+        counters = self.tier_counters[tier]
+        counters['calls'] += 1
+        counters['pages'] += len(missing_paths)
+        counters['seconds'] += time.time() - start_time
+
+        for i, result in zip(missing, fresh_results):
+            result['engine'] = service.engine_name
+            results[i] = result
+            if self.cache:
+                self.cache.set(cache_keys[i], result)
+
+        return results
+
+    def _detect(self, service: BaseOCRService, strategy: str, image_path: str,
+                language_hints: List[str] = None) -> Dict:
+        """Run a single page through one OCR engine"""
+        if strategy == OCRStrategy.GENERAL_TEXT:
+            return service.detect_text(image_path, language_hints)
+
+        if service is not self.ocr_service:
+            return service.detect_document_text(image_path, language_hints)
+
+        if strategy == OCRStrategy.MATH_FORMULAS:
+            return service.detect_math_formulas(image_path, language_hints)
+
+        # Handwriting, language-specific and mixed strategies all use
+        # document text detection
+        return service.detect_handwriting(image_path, language_hints)
+
+    def tier_stats(self) -> Dict:
+        """
+        Get per-tier latency and escalation statistics
+
+        Returns:
+            {
+                'tiered': bool,
+                'local': {'calls': int, 'pages': int, 'seconds': float, 'avg_page_seconds': float},
+                'cloud': {'calls': int, 'pages': int, 'seconds': float, 'avg_page_seconds': float},
+                'tiered_pages': int,      # pages that went to the local engine first
+                'escalated_pages': int,   # of those, pages that also went to Vision
+                'escalation_rate': float
+            }
+        """
+        stats = {'tiered': self.tiered}
+        for tier in ('local', 'cloud'):
+            counters = self.tier_counters[tier]
+            stats[tier] = dict(counters, avg_page_seconds=(
+                counters['seconds'] / counters['pages'] if counters['pages'] else 0.0
+            ))
+
+        tiered_pages = self.tier_counters['tiered_pages']
+        stats['tiered_pages'] = tiered_pages
+        stats['escalated_pages'] = self.tier_counters['escalated_pages']
+        stats['escalation_rate'] = (stats['escalated_pages'] / tiered_pages) if tiered_pages else 0.0
+        return stats
+
+
+_plans = OrderedDict()
+_plans_lock = threading.Lock()
+
+
+def get_ocr_plan(exam_id: int) -> Optional[OCRPlan]:
+    """
+    Current OCR plan of an exam
+
+    Plans are built once per exam snapshot: an edit to the exam replaces its
+    snapshot (see app/services/exam_snapshot.py), and with it the plan.
+
+    Returns:
+        OCRPlan, or None if the exam does not exist
+    """
+    snapshot = get_exam_snapshot(exam_id)
+    if snapshot is None:
+        with _plans_lock:
+            _plans.pop(exam_id, None)
+        return None
+
+    with _plans_lock:
+        entry = _plans.get(exam_id)
+        if entry is not None and entry[0] is snapshot:
+            _plans.move_to_end(exam_id)
+            return entry[1]
+
+    plan = OCRStrategySelector.build_plan(snapshot)
+    with _plans_lock:
+        _plans[exam_id] = (snapshot, plan)
+        _plans.move_to_end(exam_id)
+        while len(_plans) > get_exam_snapshot_cache().max_entries:
+            _plans.popitem(last=False)
+    return plan
@@ -0,0 +1,301 @@
+"""
+Optical Mark Recognition - Reads the filled bubbles of multiple-choice answer sheets
+
+Bubble sheets are read locally from the page pixels: no OCR engine (and no
+network call) is involved, so a class's multiple-choice pages take seconds
+on a CPU.
+"""
+import os
+import math
+import logging
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from PIL import Image
+
+from .answer_regions import ANCHOR_MODES, AnswerRegionCropper
+
+logger = logging.getLogger(__name__)
+
+# Bubble labels, in option order (the first bubble of a row is option A)
+OPTION_LETTERS = 'ABCDEFGHIJ'
+
+
+def _is_fraction(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and 0 <= value <= 1
+
+
+def validate_bubble_sheet_template(template: Dict, questions: Iterable) -> Optional[str]:
+    """
+    Check a bubble sheet template against an exam's questions
+
+    Template format (stored on Exam.bubble_sheet_template):
+        {
+            'anchor': 'corner_marks',      # or 'page'
+            'grids': [
+                {
+                    'page': 1,
+                    'question_ids': [12, 13, 14],   # one row of bubbles per question, top to bottom
+                    'options': 4,                   # bubbles per row (A, B, C, ...)
+                    'origin': [x, y],               # centre of the first bubble of the first row
+                    'option_step': 0.06,            # distance between bubble centres in a row
+                    'question_step': 0.03,          # distance between rows
+                    'bubble_size': 0.025            # bubble diameter, as a fraction of the frame width
+                },
+                ...
+            ]
+        }
+
+    Positions are fractions (0-1) of the anchor frame, as in answer region
+    templates: the rectangle spanned by the four printed corner marks, or the
+    whole page with 'page' anchors.
+
+    Args:
+        template: Template dictionary
+        questions: The exam's Question models
+
+    Returns:
+        Error message, or None if the template is valid
+    """
+    if not isinstance(template, dict):
+        return 'Template must be an object'
+
+    if template.get('anchor', 'corner_marks') not in ANCHOR_MODES:
+        return f"anchor must be one of: {', '.join(ANCHOR_MODES)}"
+
+    grids = template.get('grids')
+    if not isinstance(grids, list) or not grids:
+        return 'grids must be a non-empty list'
+
+    questions = {question.id: question for question in questions}
+    seen = set()
+    for index, grid in enumerate(grids):
+        if not isinstance(grid, dict):
+            return f'Grid {index} must be an object'
+
+        page = grid.get('page', 1)
+        if not isinstance(page, int) or page < 1:
+            return f'Grid {index}: page must be a positive integer'
+
+        options = grid.get('options')
+        if not isinstance(options, int) or not 2 <= options <= len(OPTION_LETTERS):
+            return f'Grid {index}: options must be an integer between 2 and {len(OPTION_LETTERS)}'
+
+        question_ids = grid.get('question_ids')
+        if not isinstance(question_ids, list) or not question_ids:
+            return f'Grid {index}: question_ids must be a non-empty list'
+        for question_id in question_ids:
+            question = questions.get(question_id)
+            if question is None:
+                return f'Grid {index}: question {question_id} does not belong to this exam'
+            if question.question_type != 'multiple_choice':
+                return f'Grid {index}: question {question_id} is not a multiple choice question'
+            if len(question.options) > options:
+                return f'Grid {index}: question {question_id} has {len(question.options)} options ' \
+                       f'but the grid has {options} bubbles per row'
+            if question_id in seen:
+                return f'Grid {index}: question {question_id} already has bubbles'
+            seen.add(question_id)
+
+        origin = grid.get('origin')
+        if not isinstance(origin, list) or len(origin) != 2 or not all(_is_fraction(v) for v in origin):
+            return f'Grid {index}: origin must be [x, y] fractions between 0 and 1'
+
+        for key in ('option_step', 'question_step', 'bubble_size'):
+            if not _is_fraction(grid.get(key)) or grid[key] == 0:
+                return f'Grid {index}: {key} must be a fraction between 0 and 1'
+        if grid['bubble_size'] > grid['option_step']:
+            return f'Grid {index}: bubble_size must not exceed option_step (bubbles would overlap)'
+
+        if origin[0] + (options - 1) * grid['option_step'] > 1 or \
+                origin[1] + (len(question_ids) - 1) * grid['question_step'] > 1:
+            return f'Grid {index}: bubbles extend past the anchor frame'
+
+    return None
+
+
+def has_bubble_grids(template: Optional[Dict]) -> bool:
+    """Whether an exam template has any bubble grids to read"""
+    return bool(template and template.get('grids'))
+
+
+def bubble_sheet_pages(template: Optional[Dict]) -> Set[int]:
+    """Page numbers that carry bubble grids"""
+    if not has_bubble_grids(template):
+        return set()
+    return {grid.get('page', 1) for grid in template['grids']}
+
+
+class BubbleSheetReader:
+    """
+    Reads filled bubbles from scanned bubble sheet pages
+
+    Pages are registered by the same four corner marks as answer region
+    sheets. Bubble centres are mapped through the quadrilateral spanned by the
+    marks, so small rotations and perspective from the scanner are absorbed.
+
+    Each bubble is scored by its fill ratio: the share of ink pixels in a disc
+    inside the printed outline. A row's darkest bubble is taken as the answer
+    when it is filled past the fill threshold and clearly darker than any
+    other filled bubble; otherwise the row is blank or has multiple marks.
+    """
+
+    def __init__(self, fill_threshold: float = None, min_fill_gap: float = None, ink_threshold: int = None,
+                 inner_ratio: float = 0.6):
+        """
+        Initialize reader
+
+        Args:
+            fill_threshold: Fill ratio from which a bubble counts as marked (OMR_FILL_THRESHOLD, default 0.5)
+            min_fill_gap: Fill ratio lead the darkest bubble needs over another marked bubble of the row,
+                          e.g. a half-erased change of answer (OMR_MIN_FILL_GAP, default 0.25)
+            ink_threshold: Gray level below which a pixel counts as ink (OMR_INK_THRESHOLD, default 160 -
+                           light enough for pencil)
+            inner_ratio: Diameter of the sampled disc, relative to the bubble (keeps the printed outline out)
+        """
+        self.fill_threshold = fill_threshold if fill_threshold is not None else \
+            float(os.environ.get('OMR_FILL_THRESHOLD', 0.5))
+        self.min_fill_gap = min_fill_gap if min_fill_gap is not None else \
+            float(os.environ.get('OMR_MIN_FILL_GAP', 0.25))
+        self.ink_threshold = ink_threshold if ink_threshold is not None else \
+            int(os.environ.get('OMR_INK_THRESHOLD', 160))
+        self.inner_ratio = inner_ratio
+        self.cropper = AnswerRegionCropper()
+
+    def _frame_corners(self, image: Image.Image, template: Dict, page: int) -> Tuple[np.ndarray, bool]:
+        """
+        Corners of the anchor frame (top-left, top-right, bottom-left, bottom-right) in page pixels
+
+        Returns:
+            (4x2 array, whether the corner marks were found)
+        """
+        marks = None
+        if template.get('anchor', 'corner_marks') == 'corner_marks':
+            marks = self.cropper.find_corner_marks(image)
+            if marks is None:
+                logger.warning(f"Corner marks not found on page {page}, using the full page")
+
+        if marks is None:
+            width, height = image.size
+            return np.array([[0, 0], [width, 0], [0, height], [width, height]], dtype=float), False
+
+        return np.array([
+            [marks['top_left'][0], marks['top_left'][1]],
+            [marks['top_right'][2], marks['top_right'][1]],
+            [marks['bottom_left'][0], marks['bottom_left'][3]],
+            [marks['bottom_right'][2], marks['bottom_right'][3]],
+        ], dtype=float), True
+
+    @staticmethod
+    def _map(corners: np.ndarray, u: np.ndarray, v: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Map frame fractions to page pixels (bilinear in the frame corners)"""
+        top_left, top_right, bottom_left, bottom_right = corners
+        points = ((1 - u) * (1 - v))[..., None] * top_left + (u * (1 - v))[..., None] * top_right + \
+            ((1 - u) * v)[..., None] * bottom_left + (u * v)[..., None] * bottom_right
+        return points[..., 0], points[..., 1]
+
+    def _fill_ratios(self, gray: np.ndarray, xs: np.ndarray, ys: np.ndarray, diameter: float) -> np.ndarray:
+        """
+        Share of ink pixels in a disc around each bubble centre
+
+        Args:
+            gray: Page as a 2-D uint8 array
+            xs, ys: Bubble centres in page pixels (any shape)
+            diameter: Bubble diameter in pixels
+
+        Returns:
+            Fill ratios (0-1), shaped like xs
+        """
+        radius = max(1.0, diameter * self.inner_ratio / 2)
+        reach = int(math.ceil(radius))
+        offset_y, offset_x = np.mgrid[-reach:reach + 1, -reach:reach + 1]
+        inside = offset_y ** 2 + offset_x ** 2 <= radius ** 2
+        offset_y, offset_x = offset_y[inside], offset_x[inside]
+
+        height, width = gray.shape
+        rows = np.clip(np.rint(ys).astype(int)[..., None] + offset_y, 0, height - 1)
+        cols = np.clip(np.rint(xs).astype(int)[..., None] + offset_x, 0, width - 1)
+        return (gray[rows, cols] < self.ink_threshold).mean(axis=-1)
+
+    def _decide(self, fills: np.ndarray) -> List[Dict]:
+        """Turn the fill ratios of a grid (questions x options) into marks"""
+        order = np.argsort(-fills, axis=1, kind='stable')
+        rows = np.arange(fills.shape[0])
+        best = fills[rows, order[:, 0]]
+        runner_up = fills[rows, order[:, 1]]
+
+        marks = []
+        for row, row_fills in enumerate(fills):
+            marked_options = [int(i) for i in np.flatnonzero(row_fills >= self.fill_threshold)]
+            if best[row] < self.fill_threshold:
+                status, option_index = 'blank', None
+                confidence = 1.0 - best[row] / self.fill_threshold
+            elif runner_up[row] >= self.fill_threshold and best[row] - runner_up[row] < self.min_fill_gap:
+                status, option_index, confidence = 'multiple', None, 0.0
+            else:
+                status, option_index = 'marked', int(order[row, 0])
+                confidence = min(1.0, (best[row] - runner_up[row]) / self.fill_threshold)
+            marks.append({
+                'status': status,
+                'option_index': option_index,
+                'marked_options': marked_options,
+                'fill_ratios': [round(float(f), 3) for f in row_fills],
+                'confidence': round(float(confidence), 3)
+            })
+        return marks
+
+    def read_page(self, image: Image.Image, page: int, template: Dict) -> Dict:
+        """
+        Read the bubble grids of one page
+
+        Args:
+            image: Page image
+            page: Page number (1-based)
+            template: Exam bubble sheet template
+
+        Returns:
+            {
+                'anchored': bool,               # corner marks were found
+                'marks': [
+                    {
+                        'question_id': int,
+                        'status': str,          # 'marked', 'blank' or 'multiple'
+                        'option_index': int,    # 0-based bubble of the answer (None unless 'marked')
+                        'marked_options': [int],  # bubbles filled past the threshold
+                        'fill_ratios': [float],
+                        'confidence': float,
+                        'bbox': [x0, y0, x1, y1]  # the question's row of bubbles, page pixels
+                    },
+                    ...
+                ]
+            }
+        """
+        grids = [grid for grid in template.get('grids', []) if grid.get('page', 1) == page]
+        if not grids:
+            return {'anchored': False, 'marks': []}
+
+        corners, anchored = self._frame_corners(image, template, page)
+        gray = np.asarray(image.convert('L'))
+        frame_width = (np.linalg.norm(corners[1] - corners[0]) + np.linalg.norm(corners[3] - corners[2])) / 2
+
+        marks = []
+        for grid in grids:
+            u = grid['origin'][0] + np.arange(grid['options']) * grid['option_step']
+            v = grid['origin'][1] + np.arange(len(grid['question_ids'])) * grid['question_step']
+            xs, ys = self._map(corners, *np.meshgrid(u, v))
+            diameter = grid['bubble_size'] * frame_width
+
+            half = diameter / 2
+            for question_id, row_xs, row_ys, mark in zip(grid['question_ids'], xs, ys,
+                                                         self._decide(self._fill_ratios(gray, xs, ys, diameter))):
+                mark['question_id'] = question_id
+                mark['bbox'] = [int(row_xs.min() - half), int(row_ys.min() - half),
+                                int(math.ceil(row_xs.max() + half)), int(math.ceil(row_ys.max() + half))]
+                marks.append(mark)
+
+        return {'anchored': anchored, 'marks': marks}
+
+    def read(self, image_path: str, page: int, template: Dict) -> Dict:
+        """Read the bubble grids of a page image file (see read_page())"""
+        with Image.open(image_path) as image:
+            image.load()
+            return self.read_page(image, page, template)
@@ -0,0 +1,80 @@
+"""
+Page Executor - Bounded-concurrency execution of per-page OCR calls
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Iterable, List, TypeVar
+
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+class PageExecutor:
+    """
+    Runs OCR calls for several pages in parallel on a shared thread pool
+
+    OCR calls are almost pure network wait, so threads are enough to overlap
+    them. The pool is shared by everything in the worker process, which
+    makes max_workers a per-worker concurrency limit rather than a
+    per-submission one.
+    """
+
+    def __init__(self, max_workers: int = None):
+        """
+        Initialize page executor
+
+        Args:
+            max_workers: Max concurrent OCR calls (if None, uses OCR_PAGE_CONCURRENCY)
+        """
+        self.max_workers = max(1, max_workers or int(os.environ.get('OCR_PAGE_CONCURRENCY', 4)))
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers,
+                                        thread_name_prefix='ocr-page')
+
+    def map(self, func: Callable[[T], R], items: Iterable[T]) -> List[R]:
+        """
+        Apply func to every item concurrently
+
+        Results are returned in input order. The first exception raised by
+        func is re-raised once all submitted calls have finished.
+
+        Args:
+            func: Callable run once per item (must not touch the DB session)
+            items: Inputs, e.g. image paths or request chunks
+
+        Returns:
+            List of results, in the same order as items
+        """
+        items = list(items)
+        if len(items) <= 1 or self.max_workers == 1:
+            return [func(item) for item in items]
+
+        futures = [self._pool.submit(func, item) for item in items]
+        wait(futures)
+        return [future.result() for future in futures]
+
+
+def get_page_executor() -> PageExecutor:
+    """
+    Get the process-wide page executor
+
+    Created lazily and rebuilt after a fork so that each Celery worker
+    process gets its own threads.
+    """
+    global _executor, _executor_pid
+
+    pid = os.getpid()
+    if _executor is not None and _executor_pid == pid:
+        return _executor
+
+    with _executor_lock:
+        if _executor is None or _executor_pid != pid:
+            _executor = PageExecutor()
+            _executor_pid = pid
+
+    return _executor
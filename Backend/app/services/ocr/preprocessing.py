@@ -0,0 +1,485 @@
+"""
+Scan Preprocessing - Straightens, cleans and crops page images before OCR
+"""
+import os
+import math
+import time
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from PIL import Image, ImageFilter, ImageOps
+
+logger = logging.getLogger(__name__)
+
+STEPS = ('rotate', 'denoise', 'binarize', 'deskew', 'crop')
+GEOMETRY_STEPS = ('rotate', 'deskew', 'crop')  # Steps that move page content
+
+_pool = None
+_pool_pid = None
+_pool_disabled_pid = None
+_pool_lock = threading.Lock()
+
+
+def _ink_mask(gray: np.ndarray, window: int, k: float) -> np.ndarray:
+    """
+    Adaptive (local mean) threshold, robust to shadows and uneven lighting
+
+    A pixel is ink when it is more than k darker than the mean of the
+    window around it. Window sums come from an integral image, so the cost
+    does not depend on the window size.
+
+    The integral image is uint32: it wraps on very large pages, but window
+    sums (at most 255 * window**2) are still exact in modular arithmetic.
+    """
+    height, width = gray.shape
+    integral = np.zeros((height + 1, width + 1), dtype=np.uint32)
+    gray.cumsum(axis=0, dtype=np.uint32, out=integral[1:, 1:])
+    integral[1:, 1:].cumsum(axis=1, dtype=np.uint32, out=integral[1:, 1:])
+
+    radius = window // 2
+    rows = np.arange(height)
+    cols = np.arange(width)
+    y0 = np.clip(rows - radius, 0, height)
+    y1 = np.clip(rows + radius + 1, 0, height)
+    x0 = np.clip(cols - radius, 0, width)
+    x1 = np.clip(cols + radius + 1, 0, width)
+
+    sums = integral[np.ix_(y1, x1)]
+    sums -= integral[np.ix_(y0, x1)]
+    sums -= integral[np.ix_(y1, x0)]
+    sums += integral[np.ix_(y0, x0)]
+    del integral
+
+    # gray * count < sum * (1 - k), in float32 to keep one float per pixel
+    threshold = sums.astype(np.float32)
+    del sums
+    threshold *= np.float32(1.0 - k)
+    scaled = np.multiply(gray, (y1 - y0).astype(np.float32)[:, None], dtype=np.float32)
+    scaled *= (x1 - x0).astype(np.float32)[None, :]
+    return scaled < threshold
+
+
+def _line_score(ys: np.ndarray, xs: np.ndarray, angle: float) -> float:
+    """Sharpness of the row projection profile after shearing by angle (degrees)"""
+    rows = np.round(ys - xs * np.tan(np.radians(angle))).astype(np.int64)
+    profile = np.bincount(rows - rows.min()).astype(np.float64)
+    return float(np.sum(np.diff(profile) ** 2))
+
+
+def _find_skew(mask: np.ndarray, max_angle: float, sample: int = 200000) -> float:
+    """
+    Skew angle of the text lines by projection profile
+
+    Text lines give the sharpest row profile when they are horizontal. A
+    coarse sweep over [-max_angle, max_angle] is refined around the best
+    angle.
+
+    Returns:
+        Angle in degrees (positive: lines descend to the right)
+    """
+    ys, xs = np.nonzero(mask)
+    if len(ys) < 100:
+        return 0.0
+    if len(ys) > sample:
+        step = len(ys) // sample + 1
+        ys, xs = ys[::step], xs[::step]
+
+    coarse = np.arange(-max_angle, max_angle + 0.5, 0.5)
+    best = max(coarse, key=lambda angle: _line_score(ys, xs, angle))
+    fine = np.arange(best - 0.5, best + 0.55, 0.05)
+    best = max(fine, key=lambda angle: _line_score(ys, xs, angle))
+    return float(round(best, 2))
+
+
+def _is_sideways(mask: np.ndarray, ratio: float = 1.5) -> bool:
+    """
+    Whether the text lines run vertically (page scanned or photographed at 90 degrees)
+
+    Horizontal lines leave many blank rows (the gaps between lines) inside
+    the inked area but few blank columns; sideways pages are the reverse.
+    """
+    rows = mask.sum(axis=1)
+    cols = mask.sum(axis=0)
+    inked_rows = np.nonzero(rows)[0]
+    inked_cols = np.nonzero(cols)[0]
+    if len(inked_rows) == 0 or len(inked_cols) == 0:
+        return False
+
+    blank_rows = np.mean(rows[inked_rows[0]:inked_rows[-1] + 1] == 0)
+    blank_cols = np.mean(cols[inked_cols[0]:inked_cols[-1] + 1] == 0)
+    return blank_cols > ratio * blank_rows + 0.05
+
+
+def _left_margin_first(mask: np.ndarray) -> bool:
+    """
+    Whether lines start at a sharp left margin rather than a sharp right one
+
+    Answer sheets are left-aligned, so after turning a sideways page this
+    tells the 90 and 270 degree cases apart.
+    """
+    profile = mask.sum(axis=0).astype(np.float64)
+    jumps = np.diff(profile)
+    edge = max(1, len(jumps) // 10)
+    inked = np.nonzero(profile)[0]
+    if len(inked) == 0:
+        return True
+    first, last = inked[0], inked[-1]
+    left = jumps[first:first + edge].max(initial=0.0)
+    right = -jumps[max(0, last - edge):last + 1].min(initial=0.0)
+    return left >= right
+
+
+def _content_box(mask: np.ndarray, margin: float, min_fraction: float = 0.002) -> Optional[Tuple[int, int, int, int]]:
+    """Bounding box of the inked area plus a margin, ignoring rows/columns with only speckle"""
+    height, width = mask.shape
+    rows = np.nonzero(mask.sum(axis=1) > max(2, min_fraction * width))[0]
+    cols = np.nonzero(mask.sum(axis=0) > max(2, min_fraction * height))[0]
+    if len(rows) == 0 or len(cols) == 0:
+        return None
+
+    pad_y = int(height * margin)
+    pad_x = int(width * margin)
+    box = (max(0, cols[0] - pad_x), max(0, rows[0] - pad_y),
+           min(width, cols[-1] + 1 + pad_x), min(height, rows[-1] + 1 + pad_y))
+
+    # A tiny box means a blank or unreadable page - leave it alone
+    if (box[2] - box[0]) * (box[3] - box[1]) < 0.1 * width * height:
+        return None
+    return box
+
+
+def preprocess_page(image_path: str, output_path: str, steps: Tuple[str, ...] = STEPS,
+                    max_skew: float = 5.0, threshold_k: float = 0.15, margin: float = 0.02) -> Dict:
+    """
+    Preprocess one page image (module level so it can run in a worker process)
+
+    Steps, in order: auto-rotation (EXIF orientation, then sideways pages),
+    median denoise, adaptive binarization, projection-profile deskew and
+    border cropping. Analysis always works on the ink mask; the output is
+    the binarized page, or the cleaned grayscale page without 'binarize'.
+
+    Args:
+        image_path: Source page image
+        output_path: Where to write the processed PNG
+        steps: Steps to apply (subset of STEPS)
+        max_skew: Largest skew angle searched, in degrees
+        threshold_k: How much darker than its surroundings a pixel must be to count as ink
+        margin: Margin kept around the content when cropping, as a fraction of the page
+
+    Returns:
+        {
+            'image_path': str,             # output_path
+            'steps': [str],                # steps that changed the page
+            'rotation': int,               # degrees turned counter-clockwise (multiple of 90)
+            'skew_angle': float,           # degrees corrected
+            'crop_box': [x0, y0, x1, y1],  # in the rotated page, or None
+            'original_size': [w, h],
+            'size': [w, h],
+            'seconds': float
+        }
+    """
+    start_time = time.time()
+    applied = []
+    rotation = 0
+    skew_angle = 0.0
+    crop_box = None
+
+    with Image.open(image_path) as source:
+        original_size = list(source.size)
+        image = source
+        if 'rotate' in steps and source.getexif().get(0x0112, 1) != 1:  # EXIF Orientation
+            image = ImageOps.exif_transpose(source)
+            applied.append('exif_orientation')
+        gray = image.convert('L')
+
+    if 'denoise' in steps:
+        gray = gray.filter(ImageFilter.MedianFilter(3))
+        applied.append('denoise')
+
+    window = max(15, (min(gray.size) // 40) | 1)
+    mask = _ink_mask(np.asarray(gray), window, threshold_k)
+
+    if 'rotate' in steps and _is_sideways(mask):
+        mask = np.rot90(mask)  # counter-clockwise
+        rotation = 90
+        if not _left_margin_first(mask):
+            mask = np.rot90(mask, 2)
+            rotation = 270
+        gray = gray.rotate(rotation, expand=True)
+        applied.append('rotate')
+
+    if 'deskew' in steps:
+        skew_angle = _find_skew(mask, max_skew)
+        if abs(skew_angle) >= 0.1:
+            # PIL rotates counter-clockwise; lines descending to the right need exactly that
+            mask_image = Image.fromarray(mask.astype(np.uint8) * 255)
+            mask = np.asarray(mask_image.rotate(skew_angle, resample=Image.NEAREST, expand=True)) > 0
+            gray = gray.rotate(skew_angle, resample=Image.BILINEAR, expand=True, fillcolor=255)
+            applied.append('deskew')
+        else:
+            skew_angle = 0.0
+
+    if 'binarize' in steps:
+        output = Image.fromarray(np.where(mask, 0, 255).astype(np.uint8)).convert('1')
+        applied.append('binarize')
+    else:
+        output = gray
+
+    if 'crop' in steps:
+        box = _content_box(mask, margin)
+        if box and box != (0, 0, output.width, output.height):
+            output = output.crop(box)
+            crop_box = [int(v) for v in box]
+            applied.append('crop')
+
+    output.save(output_path, 'PNG', optimize=True)
+
+    return {
+        'image_path': output_path,
+        'steps': applied,
+        'rotation': rotation,
+        'skew_angle': skew_angle,
+        'crop_box': crop_box,
+        'original_size': original_size,
+        'size': list(output.size),
+        'seconds': time.time() - start_time
+    }
+
+
+def _unrotate(points: List[Tuple[float, float]], angle: float, rotated_size: Tuple[float, float],
+              source_size: Tuple[float, float]) -> List[Tuple[float, float]]:
+    """Map points of an image rotated with rotate(angle, expand=True) back to the source image"""
+    radians = math.radians(angle)
+    cos_a, sin_a = math.cos(radians), math.sin(radians)
+    mapped = []
+    for x, y in points:
+        dx, dy = x - rotated_size[0] / 2, y - rotated_size[1] / 2
+        mapped.append((dx * cos_a - dy * sin_a + source_size[0] / 2,
+                       dx * sin_a + dy * cos_a + source_size[1] / 2))
+    return mapped
+
+
+def source_box(bbox: List[float], preprocessing: Optional[Dict]) -> Optional[List[float]]:
+    """
+    Map a box on a preprocessed page back onto the page as scanned
+
+    Undoes cropping, deskew and rotation (the box is widened to stay axis
+    aligned after undoing the skew).
+
+    Args:
+        bbox: [x0, y0, x1, y1] in pixels of the preprocessed page
+        preprocessing: preprocess_page() details for the page (None if not preprocessed)
+
+    Returns:
+        [x0, y0, x1, y1] as fractions (0-1) of the scanned page, or None if
+        the mapping is unknown (no size recorded, or EXIF-rotated source)
+    """
+    preprocessing = preprocessing or {}
+    steps = preprocessing.get('steps') or []
+    if 'exif_orientation' in steps:
+        return None
+
+    if not steps:
+        size = preprocessing.get('original_size') or preprocessing.get('size')
+        if not size:
+            return None
+        return [max(0.0, min(1.0, value / size[i % 2])) for i, value in enumerate(bbox)]
+
+    width, height = preprocessing['original_size']
+    rotation = preprocessing.get('rotation') or 0
+    skew_angle = preprocessing.get('skew_angle') or 0.0
+
+    # Sizes after each step, as PIL's expand computes them
+    rotated_size = (height, width) if rotation in (90, 270) else (width, height)
+    skew = math.radians(skew_angle)
+    deskewed_size = (rotated_size[0] * abs(math.cos(skew)) + rotated_size[1] * abs(math.sin(skew)),
+                     rotated_size[0] * abs(math.sin(skew)) + rotated_size[1] * abs(math.cos(skew)))
+
+    x0, y0, x1, y1 = bbox
+    offset_x, offset_y = (preprocessing.get('crop_box') or [0, 0])[:2]
+    points = [(x + offset_x, y + offset_y) for x, y in ((x0, y0), (x1, y0), (x0, y1), (x1, y1))]
+    if skew_angle:
+        points = _unrotate(points, skew_angle, deskewed_size, rotated_size)
+    if rotation:
+        points = _unrotate(points, rotation, rotated_size, (width, height))
+
+    xs = [x for x, _ in points]
+    ys = [y for _, y in points]
+    return [max(0.0, min(xs) / width), max(0.0, min(ys) / height),
+            min(1.0, max(xs) / width), min(1.0, max(ys) / height)]
+
+
+def get_preprocess_pool(workers: int) -> Optional[ProcessPoolExecutor]:
+    """
+    Get the process-wide preprocessing pool
+
+    Uses spawned processes so that a worker already running HTTP and OCR
+    threads is never forked. Rebuilt after a fork of the owning process.
+    Returns None once the pool has been disabled in this process.
+    """
+    global _pool, _pool_pid
+
+    pid = os.getpid()
+    if _pool_disabled_pid == pid:
+        return None
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+
+    with _pool_lock:
+        if _pool is None or _pool_pid != pid:
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _pool_pid = pid
+
+    return _pool
+
+
+def disable_preprocess_pool(reason: str):
+    """
+    Stop using worker processes in this process
+
+    Called when the pool cannot start (e.g. inside a daemonic Celery pool
+    process) or has died; preprocessing then runs in-process.
+    """
+    global _pool, _pool_disabled_pid
+
+    logger.warning(f"Preprocessing pool unavailable, running in-process: {reason}")
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+        _pool_disabled_pid = os.getpid()
+
+
+class ScanPreprocessor:
+    """
+    Preprocessing stage between rasterization and OCR
+
+    Pages are processed in a pool of worker processes (the work is CPU
+    bound, unlike the OCR calls themselves). A page that fails to process
+    is sent to OCR as it was.
+    """
+
+    def __init__(self, enabled: bool = None, steps: List[str] = None, max_skew: float = None,
+                 workers: int = None, shadow_rate: float = None):
+        """
+        Initialize preprocessor (unset arguments fall back to env variables)
+
+        Args:
+            enabled: Run the stage at all (OCR_PREPROCESS_ENABLED, default True)
+            steps: Steps to apply (OCR_PREPROCESS_STEPS, default all of
+                   rotate,denoise,binarize,deskew,crop)
+            max_skew: Largest skew angle corrected, in degrees (OCR_PREPROCESS_MAX_SKEW, default 5)
+            workers: Worker processes; 1 runs in-process (OCR_PREPROCESS_WORKERS,
+                     default: CPU count, at most 4)
+            shadow_rate: Fraction of pages also OCR'd unprocessed to measure the
+                         confidence gain (OCR_PREPROCESS_SHADOW_RATE, default 0.05)
+        """
+        if enabled is None:
+            enabled = os.environ.get('OCR_PREPROCESS_ENABLED', 'True').lower() in ['true', '1', 't']
+        if steps is None:
+            steps = [step.strip() for step in
+                     os.environ.get('OCR_PREPROCESS_STEPS', ','.join(STEPS)).split(',') if step.strip()]
+
+        unknown = set(steps) - set(STEPS)
+        if unknown:
+            raise ValueError(f"Unknown preprocessing steps: {', '.join(sorted(unknown))}")
+
+        self.enabled = enabled
+        self.steps = tuple(steps)
+        self.max_skew = max_skew if max_skew is not None else float(os.environ.get('OCR_PREPROCESS_MAX_SKEW', 5.0))
+        self.workers = max(1, workers or int(os.environ.get('OCR_PREPROCESS_WORKERS', min(4, os.cpu_count() or 1))))
+        self.shadow_rate = shadow_rate if shadow_rate is not None else \
+            float(os.environ.get('OCR_PREPROCESS_SHADOW_RATE', 0.05))
+
+    def process(self, image_paths: Iterable[str], output_dir: str, skip_pages: Iterable[int] = ()) -> List[Dict]:
+        """
+        Preprocess page images
+
+        image_paths may be a generator (see pdf_utils.iter_pdf_pages): each
+        page is handed to the pool as soon as it arrives, so preprocessing
+        overlaps with rasterizing the rest of the document.
+
+        Args:
+            image_paths: Page image paths
+            output_dir: Directory for the processed PNG files
+            skip_pages: Page numbers (1-based) to pass through unprocessed
+
+        Returns:
+            One preprocess_page() result per page, in order. Pages that were
+            not processed keep their original path, with 'steps' empty and
+            'error' set if processing failed.
+        """
+        if not self.enabled:
+            return [{'image_path': path, 'steps': []} for path in image_paths]
+
+        os.makedirs(output_dir, exist_ok=True)
+        skip_pages = set(skip_pages)
+        jobs = []
+        futures = []  # futures[i] belongs to jobs[i]
+        in_process = {}  # Results of jobs run without the pool, by job index
+        pool = None
+        use_pool = self.workers > 1
+
+        for i, path in enumerate(image_paths):
+            jobs.append((path, os.path.join(output_dir, f"page_{i + 1}.png")))
+
+            # Start the pool only once there is more than one page
+            if use_pool and pool is None and len(jobs) > 1:
+                try:
+                    pool = get_preprocess_pool(self.workers)
+                except Exception as e:
+                    disable_preprocess_pool(str(e))
+                use_pool = pool is not None
+            while pool is not None and len(futures) < len(jobs):
+                if len(futures) + 1 in skip_pages:
+                    skipped = Future()
+                    skipped.set_result({'image_path': jobs[len(futures)][0], 'steps': []})
+                    futures.append(skipped)
+                    continue
+                try:
+                    futures.append(pool.submit(preprocess_page, *jobs[len(futures)], self.steps, self.max_skew))
+                except Exception as e:
+                    disable_preprocess_pool(str(e))
+                    pool = None
+                    use_pool = False
+
+            if use_pool:
+                continue  # Submitted, or waiting for a second page before starting the pool
+            # Without the pool, every job that has no future runs here, in order
+            for j in range(len(futures), len(jobs)):
+                if j not in in_process:
+                    in_process[j] = self._process_page(*jobs[j], skip=j + 1 in skip_pages)
+
+        results = []
+        for i, (path, output_path) in enumerate(jobs):
+            if i in in_process:
+                results.append(in_process[i])
+                continue
+            if i < len(futures):
+                try:
+                    results.append(futures[i].result())
+                    continue
+                except BrokenProcessPool as e:
+                    disable_preprocess_pool(str(e))
+                    futures = futures[:i + 1]
+                except Exception as e:
+                    logger.warning(f"Preprocessing failed for {path}, using it unprocessed: {str(e)}")
+                    results.append({'image_path': path, 'steps': [], 'error': str(e)})
+                    continue
+            results.append(self._process_page(path, output_path, skip=i + 1 in skip_pages))
+
+        return results
+
+    def _process_page(self, path: str, output_path: str, skip: bool = False) -> Dict:
+        """Preprocess one page in-process, keeping the original if it fails (or is skipped)"""
+        if skip:
+            return {'image_path': path, 'steps': []}
+        try:
+            return preprocess_page(path, output_path, self.steps, self.max_skew)
+        except Exception as e:
+            logger.warning(f"Preprocessing failed for {path}, using it unprocessed: {str(e)}")
+            return {'image_path': path, 'steps': [], 'error': str(e)}
@@ -0,0 +1,441 @@
+"""
+Vision API Rate Limiter - Cluster-wide token bucket, adaptive concurrency and circuit breaker
+"""
+import os
+import time
+import math
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+
+logger = logging.getLogger(__name__)
+
+# Outcomes that mean "slow down": quota exhaustion and server trouble
+BACKOFF_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Seconds to stay on local state after Redis stops answering
+REDIS_RETRY_INTERVAL = 5.0
+
+_limiter = None
+_limiter_pid = None
+_limiter_lock = threading.Lock()
+
+
+class VisionUnavailableError(Exception):
+    """
+    Vision cannot take requests right now (circuit open or quota wait too long)
+
+    Tasks should park and come back after retry_after seconds instead of
+    spending their retry budget.
+    """
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LocalTokenBucket:
+    """In-process token bucket (per worker process)"""
+
+    def __init__(self, rate: float, burst: float):
+        """
+        Args:
+            rate: Tokens added per second
+            burst: Bucket capacity
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, cost: float) -> float:
+        """
+        Take cost tokens if available
+
+        Returns:
+            0 if the tokens were taken, otherwise seconds until they will be
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= cost:
+                self._tokens -= cost
+                return 0.0
+            return (cost - self._tokens) / self.rate
+
+
+class RedisTokenBucket:
+    """
+    Token bucket shared by every worker through Redis
+
+    Refill and take happen atomically in a Lua script using the Redis clock,
+    so workers on different hosts agree on time. If Redis is unreachable the
+    bucket degrades to a local bucket running at a fraction of the rate.
+    """
+
+    SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 60)
+return tostring(wait)
+"""
+
+    def __init__(self, client, rate: float, burst: float, key: str = 'ocr_rate:bucket',
+                 fallback_fraction: float = 0.25):
+        """
+        Args:
+            client: redis.Redis client
+            rate: Tokens added per second, cluster-wide
+            burst: Bucket capacity
+            key: Redis hash holding the bucket state
+            fallback_fraction: Share of the rate a worker may use while Redis is down
+        """
+        self.client = client
+        self.rate = rate
+        self.burst = burst
+        self.key = key
+        self.fallback = LocalTokenBucket(rate * fallback_fraction, burst)
+        self._script = client.register_script(self.SCRIPT)
+        self._redis_retry_at = 0.0
+
+    def try_acquire(self, cost: float) -> float:
+        if time.monotonic() < self._redis_retry_at:
+            return self.fallback.try_acquire(cost)
+
+        try:
+            wait = float(self._script(keys=[self.key], args=[self.rate, self.burst, cost]))
+        except Exception as e:
+            if not self._redis_retry_at:
+                logger.warning(f"Rate limiter lost Redis, using local fallback bucket: {str(e)}")
+            self._redis_retry_at = time.monotonic() + REDIS_RETRY_INTERVAL
+            return self.fallback.try_acquire(cost)
+
+        if self._redis_retry_at:
+            logger.info("Rate limiter reconnected to Redis")
+            self._redis_retry_at = 0.0
+        return wait
+
+
+class AdaptiveConcurrencyLimit:
+    """
+    AIMD concurrency limit for in-flight requests
+
+    Every healthy response grows the limit by 1/limit (about +1 per round of
+    requests); a 429/5xx or transport error halves it, at most once per
+    cooldown so a burst of failures from one overload counts once.
+    """
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = 16,
+                 decrease_factor: float = 0.5, cooldown: float = 1.0):
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout: float) -> bool:
+        """Wait for an in-flight slot (False on timeout)"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    def release(self, healthy: Optional[bool]) -> None:
+        """Free a slot and adjust the limit from the request outcome (None = no signal)"""
+        with self._condition:
+            self.in_flight -= 1
+            if healthy:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            elif healthy is False:
+                now = time.monotonic()
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.minimum, self.limit * self.decrease_factor)
+                    self._last_decrease = now
+            self._condition.notify_all()
+
+
+class CircuitBreaker:
+    """
+    Stops calling Vision after repeated failures
+
+    After failure_threshold consecutive unhealthy outcomes the circuit opens
+    for cooldown seconds. When Redis is available the open state is shared,
+    so one worker tripping the breaker parks the whole cluster. After the
+    cooldown a single failure re-opens it (half-open).
+    """
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30.0,
+                 client=None, key: str = 'ocr_rate:breaker_open_until'):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.client = client
+        self.key = key
+        self.failures = 0
+        self._open_until = 0.0
+        self._redis_retry_at = 0.0
+        self._lock = threading.Lock()
+
+    def _shared_open_until(self) -> float:
+        if self.client is None or time.monotonic() < self._redis_retry_at:
+            return 0.0
+        try:
+            value = self.client.get(self.key)
+            return float(value) if value else 0.0
+        except Exception:
+            self._redis_retry_at = time.monotonic() + REDIS_RETRY_INTERVAL
+            return 0.0
+
+    def check(self) -> None:
+        """Raise VisionUnavailableError while the circuit is open"""
+        open_until = max(self._open_until, self._shared_open_until())
+        remaining = open_until - time.time()
+        if remaining > 0:
+            raise VisionUnavailableError(
+                f"Vision circuit breaker open for another {remaining:.0f}s", retry_after=remaining
+            )
+
+    def record(self, healthy: bool) -> None:
+        with self._lock:
+            if healthy:
+                self.failures = 0
+                return
+
+            self.failures += 1
+            if self.failures < self.failure_threshold:
+                return
+
+            # Stay half-open afterwards: the next failure trips it again
+            self.failures = self.failure_threshold - 1
+            self._open_until = time.time() + self.cooldown
+
+        logger.warning(f"Vision circuit breaker opened for {self.cooldown:.0f}s")
+        if self.client is not None:
+            try:
+                self.client.set(self.key, str(self._open_until), ex=int(math.ceil(self.cooldown)))
+            except Exception:
+                pass
+
+    @property
+    def state(self) -> str:
+        if max(self._open_until, self._shared_open_until()) > time.time():
+            return 'open'
+        return 'half_open' if self.failures else 'closed'
+
+
+class RequestOutcome:
+    """Filled in by the caller inside VisionRateLimiter.request()"""
+    __slots__ = ('status_code',)
+
+    def __init__(self):
+        self.status_code = None
+
+    @property
+    def healthy(self) -> bool:
+        return self.status_code is not None and self.status_code not in BACKOFF_STATUS_CODES
+
+
+class VisionRateLimiter:
+    """
+    Gate in front of every Vision API request
+
+    A request must pass the circuit breaker, get an in-flight slot from the
+    adaptive concurrency limit and take one token per image from the bucket.
+    Any component left as None is skipped.
+    """
+
+    def __init__(self, bucket=None, concurrency: AdaptiveConcurrencyLimit = None,
+                 breaker: CircuitBreaker = None, max_wait: float = 60.0):
+        """
+        Args:
+            bucket: RedisTokenBucket or LocalTokenBucket (tokens = images)
+            concurrency: Adaptive in-flight limit
+            breaker: Circuit breaker
+            max_wait: Longest a request may queue before VisionUnavailableError
+        """
+        self.bucket = bucket
+        self.concurrency = concurrency
+        self.breaker = breaker
+        self.max_wait = max_wait
+        self.counters = {'requests': 0, 'healthy': 0, 'throttled': 0, 'failed': 0, 'wait_seconds': 0.0}
+        self._counter_lock = threading.Lock()
+
+    @contextmanager
+    def request(self, cost: int = 1):
+        """
+        Hold permission for one API call
+
+        Usage:
+            with limiter.request(cost=len(images)) as outcome:
+                response = session.post(...)
+                outcome.status_code = response.status_code
+
+        An exception inside the block counts as an unhealthy outcome.
+
+        Raises:
+            VisionUnavailableError: circuit open, or no capacity within max_wait
+        """
+        if self.breaker:
+            self.breaker.check()
+
+        start = time.monotonic()
+        if self.concurrency and not self.concurrency.acquire(self.max_wait):
+            raise VisionUnavailableError("Timed out waiting for a Vision request slot", retry_after=self.max_wait)
+
+        try:
+            self._take_tokens(cost, start)
+        except BaseException:
+            if self.concurrency:
+                self.concurrency.release(None)  # Never sent - no signal either way
+            raise
+
+        waited = time.monotonic() - start
+        outcome = RequestOutcome()
+        try:
+            yield outcome
+        finally:
+            healthy = outcome.healthy
+            if self.concurrency:
+                self.concurrency.release(healthy)
+            if self.breaker:
+                self.breaker.record(healthy)
+
+            with self._counter_lock:
+                self.counters['requests'] += 1
+                self.counters['wait_seconds'] += waited
+                if healthy:
+                    self.counters['healthy'] += 1
+                elif outcome.status_code == 429:
+                    self.counters['throttled'] += 1
+                else:
+                    self.counters['failed'] += 1
+
+    def _take_tokens(self, cost: int, start: float) -> None:
+        """Block until the bucket yields cost tokens (VisionUnavailableError past max_wait)"""
+        if not self.bucket:
+            return
+
+        cost = min(cost, self.bucket.burst)
+        while True:
+            wait = self.bucket.try_acquire(cost)
+            if wait <= 0:
+                return
+            if time.monotonic() - start + wait > self.max_wait:
+                raise VisionUnavailableError("Vision quota exhausted", retry_after=wait)
+            time.sleep(min(wait, 1.0))
+
+    def stats(self) -> Dict:
+        """
+        Get limiter statistics for this process
+
+        Returns:
+            {
+                'requests', 'healthy', 'throttled', 'failed': int,
+                'wait_seconds': float,            # time spent queuing for slots/tokens
+                'concurrency_limit': float,
+                'in_flight': int,
+                'breaker': 'closed' | 'half_open' | 'open'
+            }
+        """
+        with self._counter_lock:
+            stats = dict(self.counters)
+        if self.concurrency:
+            stats['concurrency_limit'] = round(self.concurrency.limit, 2)
+            stats['in_flight'] = self.concurrency.in_flight
+        if self.breaker:
+            stats['breaker'] = self.breaker.state
+        return stats
+
+
+def get_vision_rate_limiter() -> Optional[VisionRateLimiter]:
+    """
+    Get the process-wide Vision rate limiter
+
+    Configured with:
+        OCR_RATE_LIMIT_ENABLED             Turn the limiter on/off (default True)
+        GOOGLE_VISION_API_QUOTA_PER_MINUTE Cluster-wide images per minute (default 1800)
+        OCR_RATE_LIMIT_BURST               Bucket capacity in images (default 16)
+        OCR_RATE_LIMIT_REDIS_URL           Shared state (default CELERY_BROKER_URL, 'none' = local only)
+        OCR_RATE_LIMIT_FALLBACK_FRACTION   Share of the quota per worker while Redis is down (default 0.25)
+        OCR_RATE_LIMIT_MAX_WAIT            Seconds a request may queue before parking (default 60)
+        OCR_CONCURRENCY_MIN / OCR_CONCURRENCY_MAX   AIMD bounds (default 1 / 16)
+        OCR_BREAKER_FAILURES               Consecutive failures that open the circuit (default 5)
+        OCR_BREAKER_COOLDOWN               Seconds the circuit stays open (default 30)
+
+    Returns:
+        VisionRateLimiter instance, or None if disabled
+    """
+    global _limiter, _limiter_pid
+
+    if os.environ.get('OCR_RATE_LIMIT_ENABLED', 'True').lower() not in ['true', '1', 't']:
+        return None
+
+    pid = os.getpid()
+    if _limiter is not None and _limiter_pid == pid:
+        return _limiter
+
+    with _limiter_lock:
+        if _limiter is None or _limiter_pid != pid:
+            rate = float(os.environ.get('GOOGLE_VISION_API_QUOTA_PER_MINUTE', 1800)) / 60.0
+            burst = float(os.environ.get('OCR_RATE_LIMIT_BURST', 16))
+
+            client = None
+            redis_url = os.environ.get('OCR_RATE_LIMIT_REDIS_URL') or \
+                os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
+            if redis_url.lower() != 'none':
+                try:
+                    import redis
+                    client = redis.Redis.from_url(redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+                except ImportError:
+                    client = None
+
+            if client is not None:
+                bucket = RedisTokenBucket(
+                    client, rate, burst,
+                    fallback_fraction=float(os.environ.get('OCR_RATE_LIMIT_FALLBACK_FRACTION', 0.25))
+                )
+            else:
+                bucket = LocalTokenBucket(rate, burst)
+
+            _limiter = VisionRateLimiter(
+                bucket=bucket,
+                concurrency=AdaptiveConcurrencyLimit(
+                    initial=int(os.environ.get('OCR_PAGE_CONCURRENCY', 4)),
+                    minimum=int(os.environ.get('OCR_CONCURRENCY_MIN', 1)),
+                    maximum=int(os.environ.get('OCR_CONCURRENCY_MAX', 16))
+                ),
+                breaker=CircuitBreaker(
+                    failure_threshold=int(os.environ.get('OCR_BREAKER_FAILURES', 5)),
+                    cooldown=float(os.environ.get('OCR_BREAKER_COOLDOWN', 30)),
+                    client=client
+                ),
+                max_wait=float(os.environ.get('OCR_RATE_LIMIT_MAX_WAIT', 60))
+            )
+            _limiter_pid = pid
+
+    return _limiter
@@ -0,0 +1,170 @@
+"""
+Tesseract OCR Implementation (local, no network)
+"""
+import os
+from typing import Dict, List
+from PIL import Image
+from .base_ocr import BaseOCRService
+from .layout import DocumentLayout, Word
+
+try:
+    import pytesseract
+except ImportError:  # Local OCR is optional
+    pytesseract = None
+
+
+# Vision-style language codes -> Tesseract traineddata names
+TESSERACT_LANGUAGES = {
+    'en': 'eng',
+    'ar': 'ara',
+    'fr': 'fra',
+    'de': 'deu',
+    'es': 'spa'
+}
+
+# image_to_data row levels
+LEVEL_BLOCK = 2
+LEVEL_PARAGRAPH = 3
+LEVEL_WORD = 5
+
+
+class TesseractOCR(BaseOCRService):
+    """Local Tesseract implementation - best for printed and typed pages"""
+
+    engine_name = 'tesseract'
+
+    def __init__(self, tesseract_cmd: str = None, page_segmentation_mode: int = None, timeout: int = None):
+        """
+        Initialize Tesseract OCR
+
+        Args:
+            tesseract_cmd: Path to the tesseract binary (OCR_TESSERACT_CMD, default: on PATH)
+            page_segmentation_mode: Tesseract --psm value (OCR_TESSERACT_PSM, default 3 = automatic)
+            timeout: Seconds before a page is abandoned (OCR_TESSERACT_TIMEOUT, default 30)
+        """
+        if pytesseract is None:
+            raise ValueError("Local OCR requires pytesseract. Install it with: pip install pytesseract")
+
+        tesseract_cmd = tesseract_cmd or os.environ.get('OCR_TESSERACT_CMD')
+        if tesseract_cmd:
+            pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+
+        self.page_segmentation_mode = page_segmentation_mode or int(os.environ.get('OCR_TESSERACT_PSM', 3))
+        self.timeout = timeout or int(os.environ.get('OCR_TESSERACT_TIMEOUT', 30))
+
+    @staticmethod
+    def _tesseract_languages(language_hints: List[str] = None) -> str:
+        """Map language hints to a Tesseract language string (e.g. 'ara+eng')"""
+        languages = [TESSERACT_LANGUAGES[hint] for hint in (language_hints or []) if hint in TESSERACT_LANGUAGES]
+        return '+'.join(dict.fromkeys(languages)) or 'eng'
+
+    def detect_document_text(self, image_path: str, language_hints: List[str] = None) -> Dict:
+        """
+        Document text detection with layout
+
+        Returns:
+            Same shape as GoogleVisionOCR.detect_document_text():
+            {
+                'full_text': str,
+                'pages': List[Dict],
+                'layout': DocumentLayout,
+                'confidence': float,
+                'language': str,
+                'breaks': Dict,
+                'payload': Dict    # nothing is uploaded, so sent_bytes is 0
+            }
+        """
+        try:
+            with Image.open(image_path) as img:
+                img = img.convert('L')
+                width, height = img.size
+                data = pytesseract.image_to_data(
+                    img,
+                    lang=self._tesseract_languages(language_hints),
+                    config=f'--psm {self.page_segmentation_mode}',
+                    output_type=pytesseract.Output.DICT,
+                    timeout=self.timeout
+                )
+        except Exception as e:
+            raise Exception(f"Tesseract OCR failed: {str(e)}")
+
+        words = []
+        blocks = []
+        paragraphs = []
+        block_ids = {}
+        paragraph_ids = {}
+        line_ids = {}
+        lines = []
+        line_breaks = []
+
+        for i, level in enumerate(data['level']):
+            bbox = (data['left'][i], data['top'][i],
+                    data['left'][i] + data['width'][i], data['top'][i] + data['height'][i])
+            block_key = (data['page_num'][i], data['block_num'][i])
+            paragraph_key = block_key + (data['par_num'][i],)
+
+            if level == LEVEL_BLOCK:
+                block_ids[block_key] = len(blocks)
+                blocks.append((0.0, bbox))
+            elif level == LEVEL_PARAGRAPH:
+                paragraph_ids[paragraph_key] = len(paragraphs)
+                paragraphs.append((block_ids.get(block_key, 0), 0.0, bbox))
+            elif level == LEVEL_WORD:
+                text = (data['text'][i] or '').strip()
+                confidence = float(data['conf'][i])
+                if not text or confidence < 0:
+                    continue
+
+                line_key = paragraph_key + (data['line_num'][i],)
+                if line_key not in line_ids:
+                    # The previous word closed its line
+                    if line_breaks:
+                        line_breaks[-1]['type'] = 'LINE_BREAK'
+                    line_ids[line_key] = len(lines)
+                    lines.append([])
+
+                lines[line_ids[line_key]].append(text)
+                line_breaks.append({'type': 'SPACE', 'after_text': text[-1]})
+                words.append(Word(text, confidence / 100.0, bbox, block_ids.get(block_key, 0),
+                                  paragraph_ids.get(paragraph_key, 0), line_ids[line_key]))
+
+        if line_breaks:
+            line_breaks[-1]['type'] = 'LINE_BREAK'
+
+        language = (language_hints or ['unknown'])[0]
+        layout = DocumentLayout(words, blocks=blocks, paragraphs=paragraphs)
+        layout.pages = [{'width': width, 'height': height, 'language': language, 'confidence': layout.confidence}]
+
+        original_bytes = os.path.getsize(image_path)
+        return {
+            'full_text': ''.join(' '.join(line) + '\n' for line in lines),
+            'pages': layout.pages,
+            'layout': layout,
+            'confidence': layout.confidence,
+            'language': language,
+            'breaks': {'line_breaks': line_breaks},
+            'payload': {'original_bytes': original_bytes, 'sent_bytes': 0, 'scale': 1.0, 'optimized': False}
+        }
+
+    def detect_text(self, image_path: str, language_hints: List[str] = None) -> Dict:
+        """
+        Basic text detection
+
+        Returns:
+            detect_document_text() result plus Vision-style 'annotations'
+        """
+        result = self.detect_document_text(image_path, language_hints)
+        result['annotations'] = [
+            {
+                'text': word.text,
+                'bounding_box': [{'x': word.bbox[0], 'y': word.bbox[1]}, {'x': word.bbox[2], 'y': word.bbox[1]},
+                                 {'x': word.bbox[2], 'y': word.bbox[3]}, {'x': word.bbox[0], 'y': word.bbox[3]}],
+                'confidence': word.confidence
+            }
+            for word in result['layout'].words
+        ]
+        return result
+
+    def get_confidence_score(self, ocr_result: Dict) -> float:
+        """Extract average word confidence from a Tesseract result"""
+        return ocr_result.get('confidence', 0.0)
@@ -2,7 +2,110 @@
 Text Processor - Post-processing for OCR text cleaning and normalization
 """
 import re
-from typing import List, Dict
+from functools import lru_cache
+from typing import List, Dict, NamedTuple, Optional
+
+
+# Question marker: optional "Q"/"Question"/"س"/"السؤال" prefix, a number (any
+# Unicode digits, e.g. Arabic-Indic) and one delimiter. ")" only counts after a
+# prefix ("Q1)"), so "(x+2)" is not a marker, and only when looking up one
+# question: split_by_questions splits on the other delimiters, as it always has.
+# The lexer scans for the number and then looks back for the prefix, so the
+# regex engine only starts at digits.
+_MARKER_NUMBER_PATTERN = re.compile(r'(\d+)([\s:.\-)])')
+_MARKER_PREFIXES = (('question', 'Q'), ('q', 'Q'), ('السؤال', 'س'), ('س', 'س'))
+_ANSWER_LEAD_PATTERN = re.compile(r'[\s:.\-]*')
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+_ENGLISH_OPTION_PATTERN = re.compile(r'[A-Da-d]')
+_ARABIC_OPTIONS = {'أ': 'A', 'ب': 'B', 'ج': 'C', 'د': 'D'}
+
+
+class QuestionMarker(NamedTuple):
+    """A question marker found in OCR text"""
+    marker: Optional[str]  # 'Q' (Q/Question), 'س' (س/السؤال) or None for a bare number
+    number: int
+    start: int
+    end: int  # End of the marker, including its delimiter
+    delimiter: str
+
+
+class QuestionMarkerIndex:
+    """
+    Question markers of one OCR text, found in a single pass
+
+    Lookups by question number are dict hits, so extracting every question
+    of a page costs one scan of the text instead of one per question.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.markers: List[QuestionMarker] = []
+        self._by_number = None
+        self._segments = None
+        self._split_markers = None
+
+        previous_end = 0
+        for match in _MARKER_NUMBER_PATTERN.finditer(text):
+            number, delim = match.groups()
+            start = match.start()
+
+            # Whitespace and prefix before the number (never reaching into the previous marker)
+            while start > previous_end and text[start - 1].isspace():
+                start -= 1
+            prefix = None
+            head = text[max(previous_end, start - 8):start].lower()
+            for spelling, marker in _MARKER_PREFIXES:
+                if head.endswith(spelling):
+                    prefix = marker
+                    start -= len(spelling)
+                    break
+
+            if delim == ')' and not prefix:
+                continue
+            self.markers.append(QuestionMarker(prefix, int(number), start, match.end(), delim))
+            previous_end = match.end()
+
+    def _marker_for(self, question_number: int) -> Optional[int]:
+        """Index of the first marker for a number, preferring prefixed ones ("Q2" over a bare "2")"""
+        if self._by_number is None:
+            self._by_number = {}
+            for i, marker in enumerate(self.markers):
+                current = self._by_number.get(marker.number)
+                if current is None or (marker.marker and not self.markers[current].marker):
+                    self._by_number[marker.number] = i
+        return self._by_number.get(question_number)
+
+    def split_markers(self) -> List[QuestionMarker]:
+        """Markers the text is split on (all but the ")" ones)"""
+        if self._split_markers is None:
+            self._split_markers = [marker for marker in self.markers if marker.delimiter != ')']
+        return self._split_markers
+
+    def segment(self, i: int) -> str:
+        """Text between split marker i and the next one, whitespace collapsed"""
+        markers = self.split_markers()
+        end = markers[i + 1].start if i + 1 < len(markers) else len(self.text)
+        return _WHITESPACE_PATTERN.sub(' ', self.text[markers[i].end:end].strip())
+
+    def segments(self) -> Dict[int, str]:
+        """{question_number: text up to the next split marker} (a repeated number keeps its last segment)"""
+        if self._segments is None:
+            self._segments = {marker.number: self.segment(i) for i, marker in enumerate(self.split_markers())}
+        return self._segments
+
+    def line_after(self, question_number: int) -> str:
+        """Rest of the line after a question's marker ('' if the question has no marker)"""
+        i = self._marker_for(question_number)
+        if i is None:
+            return ''
+        start = _ANSWER_LEAD_PATTERN.match(self.text, self.markers[i].end).end()
+        end = self.text.find('\n', start)
+        return self.text[start:end if end != -1 else len(self.text)].strip()
+
+
+@lru_cache(maxsize=16)
+def _marker_index(text: str) -> QuestionMarkerIndex:
+    return QuestionMarkerIndex(text)
 
 
 class TextProcessor:
@@ -157,11 +260,26 @@ class TextProcessor:
 
         return ''
 
+    @staticmethod
+    def index_question_markers(text: str) -> QuestionMarkerIndex:
+        """
+        Tokenize the question markers of a text (cached for recently seen texts)
+
+        Args:
+            text: Full OCR text
+
+        Returns:
+            QuestionMarkerIndex
+        """
+        return _marker_index(text or '')
+
     @staticmethod
     def extract_answer_from_pattern(text: str, question_number: int) -> str:
         """
         Extract answer for a specific question from full-page scan
-        Looks for patterns like "Q1: answer", "1. answer", etc.
+        Looks for patterns like "Q1: answer", "1. answer", "س1: answer", etc.
+
+        The text is tokenized once and reused for every question asked of it.
 
         Args:
             text: Full text from OCR
@@ -170,24 +288,7 @@ class TextProcessor:
         Returns:
             Extracted answer text (empty if not found)
         """
-        # Patterns to match question markers
-        patterns = [
-            # English patterns
-            rf'(?:Q|Question)\s*{question_number}[\s:.-]+([^\n]+)',
-            rf'{question_number}[\s:.-]+([^\n]+)',
-            rf'(?:Q|Question)\s*{question_number}(?:\)|\.)\s*([^\n]+)',
-
-            # Arabic patterns (Arabic numerals and Arabic question markers)
-            rf'(?:س|السؤال)\s*{question_number}[\s:.-]+([^\n]+)',
-            rf'(?:س|السؤال)\s*{question_number}(?:\)|\.)\s*([^\n]+)',
-        ]
-
-        for pattern in patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE | re.MULTILINE)
-            if matches:
-                return matches[0].strip()
-
-        return ''
+        return TextProcessor.index_question_markers(text).line_after(question_number)
 
     @staticmethod
     def split_by_questions(text: str) -> Dict[int, str]:
@@ -195,40 +296,16 @@ class TextProcessor:
         Split full-page OCR text into individual question answers
         Returns dictionary mapping question number to answer text
 
+        Markers: "Q1", "Question 1", "1.", "س1", "السؤال ١", etc. followed by
+        whitespace, ":", "." or "-" ("Q1)" does not split the text).
+
         Args:
             text: Full OCR text
 
         Returns:
             Dictionary: {question_number: answer_text}
         """
-        answers = {}
-
-        # Pattern to find question markers (English and Arabic)
-        # Matches: "Q1", "Question 1", "1.", "س1", "السؤال 1", etc.
-        question_pattern = r'(?:Q|Question|س|السؤال)?\s*(\d+)[\s:.-]'
-
-        # Find all question markers
-        matches = list(re.finditer(question_pattern, text, re.IGNORECASE))
-
-        for i, match in enumerate(matches):
-            question_num = int(match.group(1))
-            start_pos = match.end()
-
-            # Find end position (start of next question or end of text)
-            if i + 1 < len(matches):
-                end_pos = matches[i + 1].start()
-            else:
-                end_pos = len(text)
-
-            # Extract answer text
-            answer_text = text[start_pos:end_pos].strip()
-
-            # Clean the answer
-            answer_text = re.sub(r'\s+', ' ', answer_text)
-
-            answers[question_num] = answer_text
-
-        return answers
+        return dict(TextProcessor.index_question_markers(text).segments())
 
     @staticmethod
     def detect_multiple_choice_selection(text: str) -> str:
@@ -242,20 +319,16 @@ class TextProcessor:
         Returns:
             Selected option letter (A, B, C, D) or empty string
         """
-        # Patterns for English options
-        english_patterns = [
-            r'\(?([A-Da-d])\)?',  # (A), A), A
-            r'([A-Da-d])\.',       # A.
-        ]
-
-        for pattern in english_patterns:
-            matches = re.findall(pattern, text)
-            if matches:
-                return matches[0].upper()
-
-        # Patterns for Arabic options (أ, ب, ج, د)
-        arabic_options = {'أ': 'A', 'ب': 'B', 'ج': 'C', 'د': 'D'}
-        for arabic_letter, english_letter in arabic_options.items():
+        if not text:
+            return ''
+
+        # English options: (A), A), A., A
+        match = _ENGLISH_OPTION_PATTERN.search(text)
+        if match:
+            return match.group(0).upper()
+
+        # Arabic options (أ, ب, ج, د)
+        for arabic_letter, english_letter in _ARABIC_OPTIONS.items():
             if arabic_letter in text:
                 return english_letter
 
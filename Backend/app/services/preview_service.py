@@ -0,0 +1,167 @@
+"""
+Preview Service - Page thumbnails and answer previews of scanned papers
+
+Previews are rendered on first request and kept in a size-capped disk
+cache. Cache keys are derived from the scanned file's SHA-256, the page,
+the crop box and the output size, so an entry never goes stale and its
+key doubles as the HTTP ETag.
+"""
+import io
+import os
+import math
+import hashlib
+import threading
+from typing import Dict, List, Optional, Tuple
+from PIL import Image, ImageOps
+from flask import current_app
+from app.utils.disk_lru import DiskLRUDirectory
+
+PREVIEW_FORMATS = {'jpeg': 'image/jpeg', 'png': 'image/png', 'webp': 'image/webp'}
+MAX_PREVIEW_SIZE = 2000
+MAX_RENDER_DPI = 300
+
+_cache = None
+_cache_pid = None
+_cache_lock = threading.Lock()
+
+
+class PreviewCache:
+    """
+    Disk cache of rendered previews
+
+    A size-capped LRU directory (see app/utils/disk_lru.py) with one file
+    per preview.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 * 1024):
+        self.store = DiskLRUDirectory(directory, max_bytes)
+
+    def path(self, key: str, fmt: str) -> str:
+        return self.store.path(f"{key}.{fmt}")
+
+    def get(self, key: str, fmt: str) -> Optional[str]:
+        """Return the cached file's path (None on miss), marking it recently used"""
+        path = self.path(key, fmt)
+        return path if self.store.touch(path) else None
+
+    def set(self, key: str, fmt: str, data: bytes) -> str:
+        """Store a rendered preview and return its path"""
+        def write(tmp_path):
+            with open(tmp_path, 'wb') as preview_file:
+                preview_file.write(data)
+
+        path = self.path(key, fmt)
+        self.store.write(path, write)
+        return path
+
+
+def get_preview_cache() -> PreviewCache:
+    """
+    Get the process-wide preview cache
+
+    Configured with:
+        PREVIEW_CACHE_DIR        Cache directory (default: <UPLOAD_FOLDER>/preview_cache)
+        PREVIEW_CACHE_MAX_BYTES  Size budget (default: 256MB)
+    """
+    global _cache, _cache_pid
+
+    pid = os.getpid()
+    if _cache is not None and _cache_pid == pid:
+        return _cache
+
+    with _cache_lock:
+        if _cache is None or _cache_pid != pid:
+            _cache = PreviewCache(
+                directory=os.environ.get('PREVIEW_CACHE_DIR') or
+                          os.path.join(current_app.config.get('UPLOAD_FOLDER', 'uploads'), 'preview_cache'),
+                max_bytes=int(os.environ.get('PREVIEW_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+            )
+            _cache_pid = pid
+
+    return _cache
+
+
+def preview_key(file_hash: str, page: int, box: Optional[List[float]], size: int, fmt: str) -> str:
+    """Cache key (and ETag) of a preview"""
+    box_part = ','.join(f'{v:.4f}' for v in box) if box else 'page'
+    return hashlib.sha256(f"{file_hash}|{page}|{box_part}|{size}|{fmt}".encode('utf-8')).hexdigest()
+
+
+def _render_pdf_page(file_path: str, page: int, page_info: Optional[Dict], box: Optional[List[float]],
+                     size: int) -> Image.Image:
+    """Render one PDF page at just the resolution the preview needs"""
+    from pdf2image import convert_from_path
+
+    dpi = MAX_RENDER_DPI
+    if page_info and page_info.get('width'):
+        x0, y0, x1, y1 = box or (0.0, 0.0, 1.0, 1.0)
+        longest_edge_inches = max((x1 - x0) * page_info['width'], (y1 - y0) * page_info['height']) / 72.0
+        dpi = min(MAX_RENDER_DPI, max(10, math.ceil(size / max(longest_edge_inches, 0.01))))
+
+    return convert_from_path(file_path, dpi=dpi, first_page=page, last_page=page)[0]
+
+
+def render_preview(file_path: str, page: int = 1, box: Optional[List[float]] = None, size: int = 400,
+                   fmt: str = 'jpeg', page_info: Optional[Dict] = None) -> bytes:
+    """
+    Render a page thumbnail, or a crop of a page
+
+    Args:
+        file_path: Scanned paper (PDF or image)
+        page: Page number (1-based)
+        box: [x0, y0, x1, y1] fractions of the page to crop, or None for the whole page
+        size: Longest edge of the preview in pixels
+        fmt: 'jpeg', 'png' or 'webp'
+        page_info: The page's entry in the file probe (sizes PDF rendering)
+
+    Returns:
+        Encoded preview
+    """
+    from app.utils.pdf_utils import is_pdf
+
+    if is_pdf(file_path):
+        image = _render_pdf_page(file_path, page, page_info, box, size)
+    else:
+        image = Image.open(file_path)
+        # Let the JPEG decoder downscale while decoding, keeping enough pixels for the crop
+        box_edge = max(box[2] - box[0], box[3] - box[1]) if box else 1.0
+        needed = math.ceil(size / max(box_edge, 0.01))
+        image.draft(image.mode, (needed, needed))
+        image = ImageOps.exif_transpose(image)
+
+    with image:
+        if box:
+            image = image.crop((
+                int(box[0] * image.width), int(box[1] * image.height),
+                max(int(box[0] * image.width) + 1, math.ceil(box[2] * image.width)),
+                max(int(box[1] * image.height) + 1, math.ceil(box[3] * image.height))
+            ))
+        image.thumbnail((size, size), Image.LANCZOS)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+
+        encoded = io.BytesIO()
+        image.save(encoded, fmt.upper(), quality=80)
+        return encoded.getvalue()
+
+
+def get_preview(file_path: str, file_hash: str, page: int = 1, box: Optional[List[float]] = None,
+                size: int = 400, fmt: str = 'jpeg', page_info: Optional[Dict] = None) -> Tuple[str, str]:
+    """
+    Get a preview from the cache, rendering it on a miss
+
+    Args:
+        file_path: Scanned paper (PDF or image)
+        file_hash: SHA-256 of the scanned paper
+        page, box, size, fmt, page_info: See render_preview()
+
+    Returns:
+        (path to the cached preview, ETag)
+    """
+    key = preview_key(file_hash, page, box, size, fmt)
+    cache = get_preview_cache()
+
+    path = cache.get(key, fmt)
+    if path is None:
+        path = cache.set(key, fmt, render_preview(file_path, page, box, size, fmt, page_info))
+    return path, key
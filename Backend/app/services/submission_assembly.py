@@ -0,0 +1,190 @@
+"""
+Submission Assembly Service - Builds multi-image submissions into a PDF in the background
+
+create-from-images reserves the submission (status 'assembling') and hands
+spooled copies of the uploaded images to a bounded, process-wide thread
+pool, so the request returns as soon as the uploads are received. The
+submission row is the job handle: it becomes 'completed' with its scanned
+paper attached, or 'failed' with none.
+
+Builds run inside the server process, so a restart or crash mid-build
+leaves the row 'assembling' for good. Such a row counts as abandoned once
+it is older than SUBMISSION_ASSEMBLY_TIMEOUT_MINUTES (default 30) and,
+like a failed build, can then be replaced by a new upload.
+"""
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import List
+from flask import current_app
+
+ASSEMBLING_STATUS = 'assembling'
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def is_assembly_abandoned(submission) -> bool:
+    """
+    Whether a submission is still 'assembling' long after any build would have finished
+
+    Args:
+        submission: Submission model instance
+
+    Returns:
+        bool: True if its build was lost (e.g. the server process restarted)
+    """
+    if submission.submission_status != ASSEMBLING_STATUS or submission.scanned_paper_path:
+        return False
+    timeout = timedelta(minutes=float(os.environ.get('SUBMISSION_ASSEMBLY_TIMEOUT_MINUTES', 30)))
+    started = submission.updated_at or submission.created_at
+    return started is not None and started < datetime.utcnow() - timeout
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """
+    Get the process-wide assembly pool (SUBMISSION_ASSEMBLY_WORKERS, default 2)
+
+    Rebuilt after a fork so each server worker process gets its own threads.
+    """
+    global _executor, _executor_pid
+
+    pid = os.getpid()
+    if _executor is not None and _executor_pid == pid:
+        return _executor
+
+    with _executor_lock:
+        if _executor is None or _executor_pid != pid:
+            _executor = ThreadPoolExecutor(
+                max_workers=max(1, int(os.environ.get('SUBMISSION_ASSEMBLY_WORKERS', 2))),
+                thread_name_prefix='submission-assembly'
+            )
+            _executor_pid = pid
+
+    return _executor
+
+
+def spool_uploads(files) -> List:
+    """
+    Copy uploaded files into spooled buffers that outlive the request
+
+    Small images stay in memory; larger ones roll over to anonymous temporary
+    files (IMAGES_TO_PDF_SPOOL_BYTES, default 4MB).
+
+    Args:
+        files: FileStorage objects from request.files
+
+    Returns:
+        List of SpooledTemporaryFile, in upload order
+    """
+    max_size = int(os.environ.get('IMAGES_TO_PDF_SPOOL_BYTES', 4 * 1024 * 1024))
+    buffers = []
+    try:
+        for file in files:
+            buffer = tempfile.SpooledTemporaryFile(max_size=max_size)
+            buffers.append(buffer)
+            file.stream.seek(0)
+            shutil.copyfileobj(file.stream, buffer, 1024 * 1024)
+            buffer.seek(0)
+    except Exception:
+        for buffer in buffers:
+            buffer.close()
+        raise
+    return buffers
+
+
+def assemble_submission_pdf(submission_id: int, images: List) -> bool:
+    """
+    Build a submission's PDF from its images and attach it (needs an app context)
+
+    Args:
+        submission_id: Submission in 'assembling' status
+        images: Image paths or seekable file objects, in page order
+
+    Returns:
+        bool: True if the submission was completed
+    """
+    from app import db
+    from app.models.submission import Submission
+    from app.utils.pdf_utils import images_to_pdf
+    from app.utils.file_upload import store_local_file, delete_file
+
+    submission = Submission.query.get(submission_id)
+    if submission is None or submission.submission_status != ASSEMBLING_STATUS:
+        current_app.logger.warning(f'Submission {submission_id} is no longer waiting for its PDF')
+        return False
+
+    upload_base = current_app.config.get('UPLOAD_FOLDER', 'uploads')
+    pdf_path = os.path.join(upload_base, 'submissions', f'.assembly_{submission_id}_{os.getpid()}.pdf')
+    stored_filepath = None
+
+    try:
+        pdf_result = images_to_pdf(images, pdf_path)
+        if not pdf_result['success']:
+            raise Exception(pdf_result['error'])
+
+        current_app.logger.info(
+            f"Built PDF for submission {submission_id}: {pdf_result['page_count']} page(s) "
+            f"({pdf_result['passthrough_pages']} JPEG passthrough) in {pdf_result['seconds']:.2f}s, "
+            f"peak image memory {pdf_result['peak_memory_bytes'] / (1024 * 1024):.1f} MB"
+        )
+
+        # Move the PDF into content-addressed storage
+        stored = store_local_file(pdf_path, subfolder='submissions')
+        if not stored['success']:
+            raise Exception(stored['error'])
+        stored_filepath = stored['filepath']
+
+        submission.scanned_paper_path = stored_filepath
+        submission.file_hash = stored['file_hash']
+        submission.page_count = pdf_result['page_count']
+        submission.refresh_file_probe(os.path.join(upload_base, stored_filepath))
+
+        # NOTE: OCR processing has been disabled, so the submission completes here.
+        # Original OCR/Celery code is backed up in old_code/submissions_old.py
+        submission.submission_status = 'completed'
+        submission.processed_at = datetime.utcnow()
+        db.session.commit()
+        return True
+
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Failed to assemble PDF for submission {submission_id}: {str(e)}')
+
+        if stored_filepath:
+            delete_file(stored_filepath)
+        elif os.path.exists(pdf_path):
+            os.remove(pdf_path)
+
+        submission = Submission.query.get(submission_id)
+        if submission is not None:
+            submission.submission_status = 'failed'
+            submission.processed_at = datetime.utcnow()
+            db.session.commit()
+        return False
+
+
+def submit_submission_assembly(submission_id: int, images: List) -> None:
+    """
+    Queue assemble_submission_pdf on the assembly pool
+
+    Args:
+        submission_id: Submission in 'assembling' status
+        images: Spooled image buffers (closed once the PDF is built)
+    """
+    app = current_app._get_current_object()
+
+    def run():
+        try:
+            with app.app_context():
+                assemble_submission_pdf(submission_id, images)
+        finally:
+            for image in images:
+                if hasattr(image, 'close'):
+                    image.close()
+
+    _get_executor().submit(run)
@@ -35,7 +35,10 @@ def make_celery(app):
         worker_prefetch_multiplier=1,  # Don't prefetch multiple tasks
         task_routes={
             'app.services.tasks.ocr_tasks.process_submission_ocr': {'queue': 'ocr_queue'},
+            'app.services.tasks.ocr_tasks.start_submission_ocr_pipeline': {'queue': 'ocr_queue'},
             'app.services.tasks.ocr_tasks.process_single_page_ocr': {'queue': 'ocr_queue'},
+            'app.services.tasks.ocr_tasks.finalize_submission_ocr': {'queue': 'ocr_queue'},
+            'app.services.tasks.ocr_tasks.grade_submission_after_ocr': {'queue': 'default'},
         },
         task_default_queue='default',
         task_queues=(
@@ -45,9 +48,10 @@ def make_celery(app):
     )
 
     # Configure retry policy
+    # Vision quota is enforced per image by the cluster-wide rate limiter in
+    # app/services/ocr/rate_limiter.py, so tasks themselves are not rate limited
     celery.conf.task_annotations = {
         'app.services.tasks.ocr_tasks.process_submission_ocr': {
-            'rate_limit': '10/m',  # Max 10 OCR tasks per minute (API quota)
             'max_retries': 3,
             'default_retry_delay': 60,  # 1 minute between retries
         }
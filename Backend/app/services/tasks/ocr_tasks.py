@@ -1,18 +1,53 @@
 """
 OCR Celery Tasks for Asynchronous Processing
+
+A submission can go through OCR in two ways:
+
+- process_submission_ocr runs every stage (rasterize, OCR, extract,
+  persist) in one task.
+- start_submission_ocr_pipeline runs the same stages as a DAG: it
+  rasterizes, then fans out one process_single_page_ocr task per page in
+  a chord whose callback, finalize_submission_ocr, extracts and stores the
+  answers before grade_submission_after_ocr grades them. Pages run on any
+  free worker, and a failed page is retried on its own.
+
+Pages of an exam's bubble sheet template are not OCR'd: their filled
+bubbles are read locally (see app/services/ocr/omr.py). Which pages are
+bubble or answer region pages, and the strategy and language hints of
+each page and answer box, come from the exam's OCR plan (see
+get_ocr_plan in app/services/ocr/ocr_strategy_selector.py).
+
+Every stage can be repeated. Both entry points clear a submission's OCR
+results before reading it again; within one pipeline run, a retried page
+task skips a page that already has a completed OCRResult. Answers and
+grades are replaced rather than added to.
 """
 import time
 import os
+import math
+import random
+import shutil
 from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 from celery import Task
 from celery.utils.log import get_task_logger
 from app import db
-from app.models.submission import Submission, OCRResult, SubmissionAnswer, OCRProcessingJob
+from app.models.submission import Submission, OCRResult, SubmissionAnswer, OCRProcessingJob, release_blobs_on_commit
 from app.models.exam import Exam
+from app.models.grade import ReviewQueue
 from app.services.ocr import GoogleVisionOCR, OCRStrategySelector, TextProcessor, AnswerExtractor
+from app.services.ocr.layout import DocumentLayout
+from app.services.ocr.answer_regions import AnswerRegionCropper, has_answer_regions
+from app.services.ocr.omr import OPTION_LETTERS, BubbleSheetReader, bubble_sheet_pages
+from app.services.ocr.ocr_strategy_selector import OCRPlan, get_ocr_plan
+from app.services.ocr.preprocessing import ScanPreprocessor, GEOMETRY_STEPS
+from app.services.ocr.rate_limiter import VisionUnavailableError
+from app.utils.blob_store import put_json_blob
 
 logger = get_task_logger(__name__)
 
+TASK_PREFIX = 'app.services.tasks.ocr_tasks.'
+
 # Will be set when celery is initialized
 celery = None
 
@@ -32,20 +67,24 @@ class OCRTask(Task):
     retry_jitter = True  # Add randomness to avoid thundering herd
 
 
-def process_submission_ocr(submission_id: int):
+def process_submission_ocr(submission_id: int, parked_since: float = None):
     """
     Main OCR processing task for a submission
 
     Workflow:
-    1. Load submission and exam metadata
-    2. Determine OCR strategy based on exam type
+    1. Load submission and the exam's OCR plan
+    2. Take the OCR strategy and language hints from the plan
     3. Process scanned image(s)
     4. Extract answers
     5. Create SubmissionAnswer records
     6. Update submission status
 
+    While Vision is unavailable the submission is parked and re-queued,
+    for at most OCR_VISION_OUTAGE_MAX_WAIT seconds before it fails.
+
     Args:
         submission_id: Submission ID to process
+        parked_since: When the submission was first parked for a Vision outage
 
     Returns:
         Dictionary with processing results
@@ -53,7 +92,8 @@ def process_submission_ocr(submission_id: int):
     from app.services.tasks.celery_config import celery
 
     start_time = time.time()
-    job = None
+    stage_timings = {}  # Seconds spent per pipeline stage (reported for benchmarking)
+    work_dir = None
 
     try:
         logger.info(f"Starting OCR processing for submission {submission_id}")
@@ -64,155 +104,110 @@ def process_submission_ocr(submission_id: int):
             raise ValueError(f"Submission {submission_id} not found")
 
         exam = submission.exam
+        plan = get_ocr_plan(exam.id)
 
         # Update submission status
         submission.submission_status = 'processing'
         db.session.commit()
 
-        # Initialize OCR services
-        ocr_service = GoogleVisionOCR()
-        strategy_selector = OCRStrategySelector(ocr_service)
-        text_processor = TextProcessor()
-        answer_extractor = AnswerExtractor()
-
-        # Select OCR strategy
-        strategy = strategy_selector.select_strategy_for_exam(exam)
-        language_hints = strategy_selector.get_language_hints(exam)
-
-        logger.info(f"Using OCR strategy: {strategy}, languages: {language_hints}")
+        preprocessor = ScanPreprocessor()
 
-        # Get file path (handle both absolute and relative paths)
-        file_path = submission.scanned_paper_path
-        if not os.path.isabs(file_path):
-            # Relative path - prepend upload folder
-            from flask import current_app
-            upload_folder = current_app.config.get('UPLOAD_FOLDER', 'uploads')
-            file_path = os.path.join(upload_folder, file_path)
+        # Rasterize and preprocess the pages
+        work_dir = _ocr_work_dir(submission_id)
+        _clear_ocr_results(submission_id)
+        image_paths, original_image_paths, page_preprocessing = _prepare_pages(
+            submission, exam, preprocessor, work_dir, stage_timings
+        )
 
-        # Check if file exists
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(f"Scanned paper not found: {file_path}")
+        # Bubble sheet pages are read locally; only the other pages go to OCR
+        bubble_pages = _bubble_pages(submission, plan)
+        ocr_results = _read_bubble_pages(
+            submission_id, exam, {page: image_paths[page - 1] for page in bubble_pages},
+            dict(enumerate(page_preprocessing, start=1)), start_time, stage_timings
+        )
+        text_pages = [page for page in range(1, len(image_paths) + 1) if page not in bubble_pages]
 
-        # Check if file is PDF and convert to images if necessary
-        from app.utils.pdf_utils import is_pdf, pdf_to_images
+        layouts = None
+        if text_pages:
+            # Initialize OCR services
+            ocr_service = GoogleVisionOCR()
+            strategy_selector = OCRStrategySelector(ocr_service)
+            text_processor = TextProcessor()
 
-        image_paths = []
-        temp_images_to_cleanup = []
+            # OCR strategy for full pages (answer regions use each question's own)
+            strategy = plan.strategy
+            language_hints = list(plan.language_hints)
 
-        if is_pdf(file_path):
-            logger.info(f"PDF detected, converting to images: {file_path}")
-            pdf_conversion = pdf_to_images(file_path)
+            logger.info(f"Using OCR strategy: {strategy}, languages: {language_hints}")
 
-            if not pdf_conversion['success']:
-                raise Exception(f"Failed to convert PDF: {pdf_conversion['error']}")
+            if _use_answer_regions(submission, plan):
+                # Templated answer sheets: OCR only the answer boxes
+                region_crops = AnswerRegionCropper().crop(image_paths, exam.answer_region_template,
+                                                          os.path.join(work_dir, 'regions'))
+                region_crops = [crop for crop in region_crops if crop['page'] not in bubble_pages]
+                logger.info(f"Running OCR on {len(region_crops)} answer region(s)")
+                if region_crops:
+                    ocr_results += _ocr_answer_regions(
+                        submission_id, plan, region_crops, strategy_selector, text_processor,
+                        dict(enumerate(page_preprocessing, start=1)), start_time, stage_timings
+                    )
+            else:
+                stage_start = time.time()
+                text_image_paths = [image_paths[page - 1] for page in text_pages]
 
-            image_paths = pdf_conversion['image_paths']
-            temp_images_to_cleanup = image_paths  # Mark for cleanup after processing
-            logger.info(f"PDF converted to {len(image_paths)} page(s)")
-
-            # Update submission page count
-            submission.page_count = len(image_paths)
-        else:
-            # Single image file
-            image_paths = [file_path]
-            submission.page_count = 1
+                if len(text_image_paths) > 1:
+                    # Multi-page: pack pages into as few Vision API calls as possible
+                    logger.info(f"Running batch OCR on {len(text_image_paths)} page(s)")
+                    page_ocr_results = strategy_selector.execute_strategy_batch(
+                        strategy=strategy,
+                        image_paths=text_image_paths,
+                        language_hints=language_hints
+                    )
+                else:
+                    page_ocr_results = [strategy_selector.execute_strategy(
+                        strategy=strategy,
+                        image_path=text_image_paths[0],
+                        language_hints=language_hints
+                    )]
 
-        # Process each page/image
-        ocr_results = []
-        all_extracted_answers = []
+                stage_timings['ocr'] = time.time() - stage_start
 
-        for page_num, image_path in enumerate(image_paths, start=1):
-            logger.info(f"Processing page {page_num}/{len(image_paths)}: {image_path}")
+                unprocessed_confidence = _unprocessed_confidence(
+                    strategy_selector, strategy, language_hints,
+                    [original_image_paths[page - 1] for page in text_pages],
+                    [page_preprocessing[page - 1] for page in text_pages], preprocessor.shadow_rate
+                )
 
-            # Perform OCR on this page
-            ocr_raw_result = strategy_selector.execute_strategy(
-                strategy=strategy,
-                image_path=image_path,
-                language_hints=language_hints
-            )
+                stage_start = time.time()
+                for index, (page_num, ocr_raw_result) in enumerate(zip(text_pages, page_ocr_results)):
+                    logger.info(f"Processing page {page_num}/{len(image_paths)}: {image_paths[page_num - 1]}")
+                    ocr_results.append(_page_ocr_result(
+                        submission_id, page_num, ocr_raw_result, text_processor, start_time,
+                        page_preprocessing[page_num - 1], unprocessed_confidence.get(index)
+                    ))
+                layouts = [result.get('layout') for result in page_ocr_results]
+                stage_timings['persist'] = time.time() - stage_start
 
-            # Extract data
-            full_text = ocr_raw_result.get('full_text', '')
-            confidence = ocr_raw_result.get('confidence', 0.0)
-            detected_language = ocr_raw_result.get('language', 'unknown')
-
-            # Clean/process text
-            processed_text = text_processor.clean_text(full_text, detected_language)
-
-            # Create OCRResult record for this page
-            ocr_result = OCRResult(
-                submission_id=submission_id,
-                ocr_service='google_vision',
-                raw_text=full_text,
-                processed_text=processed_text,
-                confidence_score=confidence,
-                processing_status='completed',
-                raw_response=ocr_raw_result.get('raw_response'),
-                detected_language=detected_language,
-                bounding_boxes=ocr_raw_result.get('annotations', []),
-                detected_breaks=ocr_raw_result.get('breaks', {}),
-                processing_time_seconds=time.time() - start_time,
-                page_number=page_num
-            )
-            db.session.add(ocr_result)
-            db.session.flush()  # Get ocr_result.id
-            ocr_results.append(ocr_result)
-
-        # Clean up temporary images from PDF conversion
-        for temp_img in temp_images_to_cleanup:
-            try:
-                if os.path.exists(temp_img):
-                    os.remove(temp_img)
-                    logger.info(f"Cleaned up temporary image: {temp_img}")
-            except Exception as e:
-                logger.warning(f"Failed to cleanup temp image {temp_img}: {str(e)}")
-
-        # Use the first OCR result for backwards compatibility
-        # (or combine results if multi-page)
-        primary_ocr_result = ocr_results[0]
-
-        # If multi-page, combine the text
-        if len(ocr_results) > 1:
-            combined_text = '\n\n--- PAGE BREAK ---\n\n'.join(
-                [r.processed_text for r in ocr_results]
-            )
-            avg_confidence = sum([r.confidence_score for r in ocr_results]) / len(ocr_results)
+            _log_ocr_stats(strategy_selector, ocr_service, ocr_results)
+        else:
+            logger.info("Every page is a bubble sheet page, skipping OCR")
 
-            # Update primary result with combined data
-            primary_ocr_result.processed_text = combined_text
-            primary_ocr_result.confidence_score = avg_confidence
+        ocr_results.sort(key=lambda result: result.page_number)
+        if not ocr_results:
+            raise ValueError(f"Submission {submission_id} produced no OCR results")
 
         # Extract answers based on scan type
-        if submission.scan_type == 'full_page':
-            # Use primary OCR result (with combined text if multi-page)
-            extracted_answers = answer_extractor.extract_answers_from_full_page(
-                primary_ocr_result, exam
-            )
-        else:  # per_question
-            # Use all OCR results for per-question extraction
-            extracted_answers = answer_extractor.extract_answers_from_per_question_scan(
-                ocr_results, exam
-            )
-
-        # Create SubmissionAnswer records
-        for ans_data in extracted_answers:
-            submission_answer = SubmissionAnswer(
-                submission_id=submission_id,
-                question_id=ans_data['question_id'],
-                answer_text=ans_data['answer_text'],
-                answer_option_id=ans_data.get('answer_option_id'),
-                confidence_score=ans_data['confidence'],
-                ocr_result_id=primary_ocr_result.id,
-                extracted_bounding_box=ans_data.get('bounding_box'),
-                extraction_method=ans_data.get('extraction_method')
-            )
-            db.session.add(submission_answer)
+        stage_start = time.time()
+        extracted_answers = _persist_answers(submission, exam, ocr_results, AnswerExtractor(), layouts)
 
         # Update submission
         submission.submission_status = 'completed'
         submission.processed_at = datetime.utcnow()
 
+        stage_timings['extract'] = time.time() - stage_start
+        stage_start = time.time()
         db.session.commit()
+        stage_timings['commit'] = time.time() - stage_start
 
         logger.info(f"OCR processing completed for submission {submission_id}: "
                    f"{len(extracted_answers)} answers extracted")
@@ -220,11 +215,12 @@ def process_submission_ocr(submission_id: int):
         return {
             'status': 'success',
             'submission_id': submission_id,
-            'ocr_result_id': primary_ocr_result.id,
+            'ocr_result_id': ocr_results[0].id,
             'page_count': len(ocr_results),
             'answers_extracted': len(extracted_answers),
-            'confidence_score': primary_ocr_result.confidence_score,
-            'processing_time': time.time() - start_time
+            'confidence_score': _average_confidence(ocr_results),
+            'processing_time': time.time() - start_time,
+            'stage_timings': stage_timings
         }
 
     except FileNotFoundError as e:
@@ -243,10 +239,47 @@ def process_submission_ocr(submission_id: int):
             'error': str(e)
         }
 
+    except VisionUnavailableError as e:
+        db.session.rollback()
+        parked_since = parked_since or start_time
+        submission = Submission.query.get(submission_id)
+
+        if _vision_outage_wait_exceeded(parked_since, e.retry_after):
+            logger.error(f"Vision unavailable for too long, failing submission {submission_id}: {str(e)}")
+            if submission:
+                submission.submission_status = 'failed'
+                db.session.commit()
+            return {
+                'status': 'failed',
+                'submission_id': submission_id,
+                'error': str(e),
+                'processing_time': time.time() - start_time
+            }
+
+        logger.warning(f"Vision unavailable, parking submission {submission_id} "
+                       f"for {e.retry_after:.0f}s: {str(e)}")
+        if submission:
+            submission.submission_status = 'pending'
+            db.session.commit()
+
+        # Re-queue as a fresh task so waiting out the quota doesn't use up a retry
+        if celery is not None:
+            celery.send_task(TASK_PREFIX + 'process_submission_ocr',
+                             args=[submission_id], kwargs={'parked_since': parked_since},
+                             queue='ocr_queue', countdown=max(1, math.ceil(e.retry_after)))
+
+        return {
+            'status': 'parked',
+            'submission_id': submission_id,
+            'error': str(e),
+            'retry_after': e.retry_after
+        }
+
     except Exception as e:
         logger.error(f"OCR processing failed for submission {submission_id}: {str(e)}")
 
         # Update submission status
+        db.session.rollback()
         submission = Submission.query.get(submission_id)
         if submission:
             submission.submission_status = 'failed'
@@ -260,18 +293,801 @@ def process_submission_ocr(submission_id: int):
             'processing_time': time.time() - start_time
         }
 
+    finally:
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+# ============================================================================
+# PAGE-LEVEL PIPELINE (rasterize -> chord of page OCR -> finalize -> grade)
+# ============================================================================
+
+def start_submission_ocr_pipeline(submission_id: int, grade: bool = True):
+    """
+    Rasterize a submission and fan out one OCR task per page
+
+    Stage 1 of the pipeline. Clears the OCR results of any earlier run, so
+    the stage can simply be repeated. The page images are written to the
+    submission's work directory under UPLOAD_FOLDER, which all workers
+    must share. Preprocessing overlaps rasterization, but the page tasks
+    are only dispatched once every page is prepared.
+
+    Args:
+        submission_id: Submission ID to process
+        grade: Grade the submission once its answers are stored
+
+    Returns:
+        Dictionary with the dispatched page count and the id of the task
+        whose result is the final pipeline result
+    """
+    from celery import chord, group
+    from app.services.tasks.celery_config import celery
+
+    start_time = time.time()
+    stage_timings = {}
+
+    try:
+        submission = Submission.query.get(submission_id)
+        if not submission:
+            raise ValueError(f"Submission {submission_id} not found")
+
+        exam = submission.exam
+        plan = get_ocr_plan(exam.id)
+        submission.submission_status = 'processing'
+        db.session.commit()
+
+        work_dir = _ocr_work_dir(submission_id)
+        shutil.rmtree(work_dir, ignore_errors=True)
+        _clear_ocr_results(submission_id)
+        image_paths, original_image_paths, page_preprocessing = _prepare_pages(
+            submission, exam, ScanPreprocessor(), work_dir, stage_timings
+        )
+        if not image_paths:
+            raise FileNotFoundError(f"Scanned paper of submission {submission_id} has no pages")
+        mode = 'regions' if _use_answer_regions(submission, plan) else 'pages'
+        bubble_pages = _bubble_pages(submission, plan)
+        db.session.commit()
+
+    except FileNotFoundError as e:
+        logger.error(f"File not found for submission {submission_id}: {str(e)}")
+        db.session.rollback()
+        submission = Submission.query.get(submission_id)
+        if submission:
+            submission.submission_status = 'failed'
+            db.session.commit()
+        return {'status': 'failed', 'submission_id': submission_id, 'error': str(e)}
+
+    except Exception as e:
+        # The task isn't retried and the chord isn't dispatched yet - don't leave it 'processing'
+        logger.error(f"Preparing pages failed for submission {submission_id}: {str(e)}")
+        db.session.rollback()
+        submission = Submission.query.get(submission_id)
+        if submission:
+            submission.submission_status = 'failed'
+            db.session.commit()
+        return {
+            'status': 'failed',
+            'submission_id': submission_id,
+            'error': str(e),
+            'processing_time': time.time() - start_time
+        }
+
+    page_tasks = group(
+        celery.signature(TASK_PREFIX + 'process_single_page_ocr', args=(submission_id, page_number), kwargs={
+            'image_path': image_paths[page_number - 1],
+            'original_image_path': original_image_paths[page_number - 1],
+            'preprocessing': page_preprocessing[page_number - 1],
+            'mode': 'bubbles' if page_number in bubble_pages else mode
+        }, queue='ocr_queue')
+        for page_number in range(1, len(image_paths) + 1)
+    )
+    callback = celery.signature(TASK_PREFIX + 'finalize_submission_ocr', args=(submission_id,),
+                                kwargs={'stage_timings': stage_timings, 'start_time': start_time},
+                                queue='ocr_queue')
+    if grade:
+        callback = callback | celery.signature(TASK_PREFIX + 'grade_submission_after_ocr',
+                                               args=(submission_id,), queue='default')
+    callback.on_error(celery.signature(TASK_PREFIX + 'mark_submission_ocr_failed', args=(submission_id,)))
+
+    result = chord(page_tasks)(callback)
+
+    logger.info(f"Dispatched OCR for {len(image_paths)} page(s) of submission {submission_id} ({mode})")
+    return {
+        'status': 'dispatched',
+        'submission_id': submission_id,
+        'page_count': len(image_paths),
+        'mode': mode,
+        'pipeline_task_id': result.id,
+        'stage_timings': stage_timings
+    }
+
 
-def process_single_page_ocr(submission_id: int, page_number: int):
+def process_single_page_ocr(submission_id: int, page_number: int, image_path: str = None,
+                            original_image_path: str = None, preprocessing: Dict = None,
+                            mode: str = 'pages', parked_since: float = None):
     """
-    Process a single page/question scan (for per-question scan mode)
+    OCR one page of a submission and store its OCRResult
+
+    Stage 2 of the pipeline, run once per page inside a chord. A page that
+    already has a completed OCRResult is not read again, so a retried or
+    redelivered task costs nothing. Errors are raised so that the task is
+    retried on its own; while Vision is unavailable the task waits for the
+    circuit breaker instead of using up its retries, for at most
+    OCR_VISION_OUTAGE_MAX_WAIT seconds.
 
     Args:
         submission_id: Submission ID
-        page_number: Page number to process
+        page_number: Page number to process (1-based)
+        image_path: Page image to read (preprocessed)
+        original_image_path: Page image before preprocessing
+        preprocessing: Preprocessing details for the page
+        mode: 'pages' (read the whole page), 'regions' (read the answer boxes) or
+              'bubbles' (read the bubble grids locally, without OCR)
+        parked_since: When the page was first parked for a Vision outage (set on retry)
 
     Returns:
-        Dictionary with processing results
+        Dictionary with the page's OCRResult id and stage timings
     """
-    # Similar to process_submission_ocr but for individual pages
-    # Can be implemented later if needed for multi-page per-question scans
-    pass
+    from celery import current_task
+
+    start_time = time.time()
+    stage_timings = {}
+
+    existing = OCRResult.query.filter_by(submission_id=submission_id, page_number=page_number,
+                                         processing_status='completed').first()
+    if existing:
+        logger.info(f"Page {page_number} of submission {submission_id} already read, skipping")
+        return {'page_number': page_number, 'ocr_result_id': existing.id, 'stage_timings': {}}
+
+    submission = Submission.query.get(submission_id)
+    if not submission:
+        raise ValueError(f"Submission {submission_id} not found")
+    exam = submission.exam
+
+    if mode == 'bubbles':
+        try:
+            ocr_result = _read_bubble_pages(submission_id, exam, {page_number: image_path},
+                                            {page_number: preprocessing}, start_time, stage_timings)[0]
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return {'page_number': page_number, 'ocr_result_id': ocr_result.id, 'stage_timings': stage_timings}
+
+    ocr_service = GoogleVisionOCR()
+    strategy_selector = OCRStrategySelector(ocr_service)
+    text_processor = TextProcessor()
+
+    try:
+        if mode == 'regions':
+            crops = AnswerRegionCropper().crop_page(
+                image_path, page_number, exam.answer_region_template,
+                os.path.join(_ocr_work_dir(submission_id), 'regions')
+            )
+            if not crops:
+                return {'page_number': page_number, 'ocr_result_id': None, 'stage_timings': {}}
+            ocr_result = _ocr_answer_regions(
+                submission_id, get_ocr_plan(exam.id), crops, strategy_selector, text_processor,
+                {page_number: preprocessing}, start_time, stage_timings
+            )[0]
+        else:
+            plan = get_ocr_plan(exam.id)
+            strategy = plan.strategy
+            language_hints = list(plan.language_hints)
+
+            stage_start = time.time()
+            ocr_raw_result = strategy_selector.execute_strategy(strategy, image_path, language_hints)
+            stage_timings['ocr'] = time.time() - stage_start
+
+            unprocessed_confidence = _unprocessed_confidence(
+                strategy_selector, strategy, language_hints, [original_image_path],
+                [preprocessing or {'steps': []}], ScanPreprocessor().shadow_rate
+            )
+
+            stage_start = time.time()
+            ocr_result = _page_ocr_result(
+                submission_id, page_number, ocr_raw_result, text_processor, start_time,
+                preprocessing, unprocessed_confidence.get(0)
+            )
+            stage_timings['persist'] = time.time() - stage_start
+
+        db.session.commit()
+
+    except VisionUnavailableError as e:
+        db.session.rollback()
+        parked_since = parked_since or start_time
+        if _vision_outage_wait_exceeded(parked_since, e.retry_after):
+            # Give up: the error now counts as an ordinary failure of the page
+            logger.error(f"Vision unavailable for too long, failing page {page_number} "
+                         f"of submission {submission_id}: {str(e)}")
+            raise
+        logger.warning(f"Vision unavailable, parking page {page_number} of submission {submission_id} "
+                       f"for {e.retry_after:.0f}s: {str(e)}")
+        # Waiting out the quota is not a failure - don't count it against max_retries
+        raise current_task.retry(exc=e, countdown=max(1, math.ceil(e.retry_after)), max_retries=None,
+                                 kwargs=dict(current_task.request.kwargs or {}, parked_since=parked_since))
+
+    except Exception:
+        db.session.rollback()
+        raise
+
+    _log_ocr_stats(strategy_selector, ocr_service, [ocr_result])
+    return {'page_number': page_number, 'ocr_result_id': ocr_result.id, 'stage_timings': stage_timings}
+
+
+def finalize_submission_ocr(page_results: List[Dict], submission_id: int, stage_timings: Dict = None,
+                            start_time: float = None):
+    """
+    Extract and store a submission's answers once all pages are read
+
+    Stage 3 of the pipeline (the chord callback). Works from the stored
+    OCRResult rows and replaces any answers of an earlier run.
+
+    Args:
+        page_results: Results of the page tasks
+        submission_id: Submission ID
+        stage_timings: Timings of the rasterize stage
+        start_time: Pipeline start time
+
+    Returns:
+        Dictionary with processing results (same shape as process_submission_ocr)
+    """
+    stage_timings = dict(stage_timings or {})
+    for stage in ('ocr', 'omr', 'persist'):
+        # Pages run in parallel - report the slowest
+        stage_timings[stage] = max([page.get('stage_timings', {}).get(stage, 0.0) for page in page_results] or [0.0])
+
+    submission = Submission.query.get(submission_id)
+    if not submission:
+        raise ValueError(f"Submission {submission_id} not found")
+    exam = submission.exam
+
+    ocr_results = _latest_ocr_results(submission_id)
+    if not ocr_results:
+        raise ValueError(f"Submission {submission_id} has no OCR results")
+
+    try:
+        stage_start = time.time()
+        extracted_answers = _persist_answers(submission, exam, ocr_results, AnswerExtractor())
+        submission.page_count = len(page_results)
+        submission.submission_status = 'completed'
+        submission.processed_at = datetime.utcnow()
+        stage_timings['extract'] = time.time() - stage_start
+
+        stage_start = time.time()
+        db.session.commit()
+        stage_timings['commit'] = time.time() - stage_start
+    except Exception:
+        db.session.rollback()
+        raise
+
+    shutil.rmtree(_ocr_work_dir(submission_id), ignore_errors=True)
+
+    logger.info(f"OCR pipeline completed for submission {submission_id}: "
+                f"{len(extracted_answers)} answers extracted from {len(ocr_results)} page(s)")
+
+    return {
+        'status': 'success',
+        'submission_id': submission_id,
+        'ocr_result_id': ocr_results[0].id,
+        'page_count': len(page_results),
+        'answers_extracted': len(extracted_answers),
+        'confidence_score': _average_confidence(ocr_results),
+        'processing_time': time.time() - start_time if start_time else None,
+        'stage_timings': stage_timings
+    }
+
+
+def grade_submission_after_ocr(ocr_result: Dict, submission_id: int):
+    """
+    Grade a submission whose answers were just extracted
+
+    Stage 4 of the pipeline. Uses regrading, which drops the grade and
+    review items of an earlier run first, so the stage can be repeated.
+
+    Args:
+        ocr_result: Result of finalize_submission_ocr
+        submission_id: Submission ID
+
+    Returns:
+        The OCR result with the grading result under 'grading'
+    """
+    from app.services.grading_service import GradingService
+
+    if not ocr_result.get('answers_extracted'):
+        logger.info(f"Submission {submission_id} has no answers, skipping grading")
+        return ocr_result
+
+    try:
+        grading = GradingService.regrade_submission(submission_id)
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return dict(ocr_result, grading=grading)
+
+
+def mark_submission_ocr_failed(request, exc, traceback, submission_id: int):
+    """
+    Error callback of the pipeline: mark the submission as failed
+
+    Called once a page has used up its retries (or a later stage failed).
+    """
+    logger.error(f"OCR pipeline failed for submission {submission_id}: {exc}")
+
+    db.session.rollback()
+    submission = Submission.query.get(submission_id)
+    if submission:
+        submission.submission_status = 'failed'
+        db.session.commit()
+
+
+# ============================================================================
+# STAGE HELPERS (shared by both ways of running OCR)
+# ============================================================================
+
+def _vision_outage_wait_exceeded(parked_since: float, retry_after: float) -> bool:
+    """Whether waiting retry_after more seconds would exceed OCR_VISION_OUTAGE_MAX_WAIT"""
+    max_wait = float(os.environ.get('OCR_VISION_OUTAGE_MAX_WAIT', 3600))
+    return time.time() + retry_after - parked_since > max_wait
+
+
+def _ocr_work_dir(submission_id: int) -> str:
+    """Scratch directory for a submission's page images"""
+    from flask import current_app
+    upload_folder = current_app.config.get('UPLOAD_FOLDER', 'uploads')
+    return os.path.join(upload_folder, 'ocr_work', f'submission_{submission_id}')
+
+
+def _clear_ocr_results(submission_id: int):
+    """Drop the OCR results of an earlier run, so every page is read again (their blobs go on commit)"""
+    release_blobs_on_commit(db.session, [ref for (ref,) in db.session.query(OCRResult.raw_response_ref)
+                                         .filter_by(submission_id=submission_id)])
+    OCRResult.query.filter_by(submission_id=submission_id).delete()
+
+
+def _latest_ocr_results(submission_id: int) -> List[OCRResult]:
+    """Completed OCR results, one per page (the newest if a page was stored twice)"""
+    by_page = {}
+    for result in OCRResult.query.filter_by(submission_id=submission_id, processing_status='completed') \
+            .order_by(OCRResult.id).all():
+        by_page[result.page_number] = result
+    return [by_page[page] for page in sorted(by_page)]
+
+
+def _prepare_pages(submission: Submission, exam: Exam, preprocessor: ScanPreprocessor, work_dir: str,
+                   stage_timings: Dict) -> Tuple[List[str], List[str], List[Dict]]:
+    """
+    Rasterize the scanned paper and preprocess its pages
+
+    Args:
+        submission: Submission model instance (page_count is updated)
+        exam: Exam model instance
+        preprocessor: Preprocessing stage
+        work_dir: Scratch directory for page images
+        stage_timings: Stage timings to fill in ('rasterize' and 'preprocess')
+
+    Returns:
+        (image_paths, original_image_paths, page_preprocessing) - the pages
+        to read, the pages as rasterized, and preprocessing details per page
+    """
+    # Get file path (handle both absolute and relative paths)
+    file_path = submission.scanned_paper_path
+    if not os.path.isabs(file_path):
+        # Relative path - prepend upload folder
+        from flask import current_app
+        upload_folder = current_app.config.get('UPLOAD_FOLDER', 'uploads')
+        file_path = os.path.join(upload_folder, file_path)
+
+    # Check if file exists
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"Scanned paper not found: {file_path}")
+
+    region_template = exam.answer_region_template
+    if has_answer_regions(region_template) and region_template.get('anchor') == 'page':
+        # Boxes are relative to the page as scanned - keep its geometry
+        preprocessor.steps = tuple(step for step in preprocessor.steps if step not in GEOMETRY_STEPS)
+
+    # Check if file is PDF and rasterize it if necessary
+    from app.utils.pdf_utils import is_pdf, iter_pdf_pages
+    stage_start = time.time()
+    stage_timings['rasterize'] = 0.0
+    image_paths = []
+
+    def rasterized_pages():
+        if is_pdf(file_path):
+            logger.info(f"PDF detected, converting to images: {file_path}")
+            pages = iter_pdf_pages(file_path, output_dir=os.path.join(work_dir, 'raw'))
+        else:
+            # Single image file
+            pages = iter([file_path])
+        while True:
+            # 'rasterize' counts only the time spent waiting for pages
+            wait_start = time.time()
+            path = next(pages, None)
+            stage_timings['rasterize'] += time.time() - wait_start
+            if path is None:
+                return
+            image_paths.append(path)
+            yield path
+
+    # Straighten, clean and crop the pages before OCR, each page as soon as it is rendered
+    # (OCR itself starts once all pages are prepared).
+    # Bubble sheet pages are not OCR'd and are registered by their corner marks - keep them as scanned
+    bubble_pages = bubble_sheet_pages(exam.bubble_sheet_template) if submission.scan_type == 'full_page' else ()
+    preprocessing = preprocessor.process(rasterized_pages(), os.path.join(work_dir, 'pages'),
+                                         skip_pages=bubble_pages)
+    page_preprocessing = [{key: value for key, value in page.items() if key != 'image_path'}
+                          for page in preprocessing]
+    stage_timings['preprocess'] = time.time() - stage_start - stage_timings['rasterize']
+    submission.page_count = len(image_paths)
+    logger.info(f"Prepared {len(image_paths)} page(s)")
+
+    return [page['image_path'] for page in preprocessing], image_paths, page_preprocessing
+
+
+def _use_answer_regions(submission: Submission, plan: OCRPlan) -> bool:
+    """Whether to read only the answer boxes of the exam's region template"""
+    if submission.scan_type != 'full_page' or not plan.region_pages:
+        return False
+    if any(page <= submission.page_count for page in plan.region_pages):
+        return True
+
+    logger.warning("No answer regions matched the scanned pages, reading full pages instead")
+    return False
+
+
+def _bubble_pages(submission: Submission, plan: OCRPlan) -> List[int]:
+    """Scanned pages to read with the exam's bubble sheet template instead of OCR"""
+    if submission.scan_type != 'full_page':
+        return []
+    pages = plan.bubble_pages
+    missing = sorted(page for page in pages if page > submission.page_count)
+    if missing:
+        logger.warning(f"Bubble grids reference page(s) {missing} but only {submission.page_count} were scanned")
+    return sorted(page for page in pages if page <= submission.page_count)
+
+
+def _read_bubble_pages(submission_id: int, exam: Exam, image_paths: Dict[int, str],
+                       page_preprocessing: Dict[int, Dict], start_time: float,
+                       stage_timings: Dict) -> List[OCRResult]:
+    """
+    Read the bubble grids of bubble sheet pages and store one OCRResult per page
+
+    The marks of each page are kept under bounding_boxes['bubble_marks'],
+    from which _bubble_results() maps them to their questions.
+
+    Args:
+        submission_id: Submission ID
+        exam: Exam model instance
+        image_paths: Page image paths by page number
+        page_preprocessing: Preprocessing details by page number
+        start_time: Task start time
+        stage_timings: Stage timings to fill in ('omr')
+
+    Returns:
+        The page OCRResult rows, in page order
+    """
+    stage_start = time.time()
+    reader = BubbleSheetReader()
+
+    ocr_results = []
+    for page_num, image_path in sorted(image_paths.items()):
+        page = reader.read(image_path, page_num, exam.bubble_sheet_template)
+        marks = page['marks']
+        counts = {status: sum(1 for mark in marks if mark['status'] == status)
+                  for status in ('marked', 'blank', 'multiple')}
+        logger.info(f"Read {len(marks)} bubble row(s) on page {page_num}: {counts}")
+
+        summary = '\n'.join(f"{mark['question_id']}: " +
+                            ', '.join(OPTION_LETTERS[i] for i in mark['marked_options']) for mark in marks)
+        ocr_result = OCRResult(
+            submission_id=submission_id,
+            ocr_service='omr',
+            raw_text=summary,
+            processed_text=summary,
+            confidence_score=sum(mark['confidence'] for mark in marks) / len(marks) if marks else 0.0,
+            processing_status='completed',
+            detected_language='unknown',
+            bounding_boxes={'bubble_marks': marks, 'anchored': page['anchored']},
+            processing_time_seconds=time.time() - start_time,
+            page_number=page_num,
+            original_payload_bytes=0,
+            sent_payload_bytes=0,
+            preprocessing=page_preprocessing.get(page_num)
+        )
+        db.session.add(ocr_result)
+        db.session.flush()  # Get ocr_result.id
+        ocr_results.append(ocr_result)
+
+    stage_timings['omr'] = time.time() - stage_start
+    return ocr_results
+
+
+def _unprocessed_confidence(strategy_selector: OCRStrategySelector, strategy: str, language_hints: List[str],
+                            original_image_paths: List[str], page_preprocessing: List[Dict],
+                            shadow_rate: float) -> Dict[int, float]:
+    """
+    Measure what preprocessing buys by also reading a sample of pages unprocessed
+
+    Returns:
+        {page index: confidence of the unprocessed page}
+    """
+    shadow_pages = [i for i, page in enumerate(page_preprocessing)
+                    if page['steps'] and random.random() < shadow_rate]
+    if not shadow_pages:
+        return {}
+
+    try:
+        shadow_results = strategy_selector.execute_strategy_batch(
+            strategy=strategy,
+            image_paths=[original_image_paths[i] for i in shadow_pages],
+            language_hints=language_hints
+        )
+    except Exception as e:
+        logger.warning(f"Unprocessed comparison OCR failed: {str(e)}")
+        return {}
+
+    return {i: result.get('confidence', 0.0) for i, result in zip(shadow_pages, shadow_results)}
+
+
+def _page_ocr_result(submission_id: int, page_num: int, ocr_raw_result: Dict, text_processor: TextProcessor,
+                     start_time: float, preprocessing: Optional[Dict] = None,
+                     unprocessed_confidence: Optional[float] = None) -> OCRResult:
+    """Store the OCR result of a whole page"""
+    # Extract data
+    full_text = ocr_raw_result.get('full_text', '')
+    confidence = ocr_raw_result.get('confidence', 0.0)
+    detected_language = ocr_raw_result.get('language', 'unknown')
+    payload = ocr_raw_result.get('payload') or {}
+    layout = ocr_raw_result.get('layout')
+
+    # Clean/process text
+    processed_text = text_processor.clean_text(full_text, detected_language)
+
+    # Keep the bulky Vision response out of the row - store a compressed blob instead
+    raw_blob = {}
+    if ocr_raw_result.get('raw_response') is not None:
+        raw_blob = put_json_blob(ocr_raw_result['raw_response'])
+        if not raw_blob['success']:
+            logger.warning(f"Could not store raw response for page {page_num}: {raw_blob['error']}")
+
+    # Create OCRResult record for this page
+    ocr_result = OCRResult(
+        submission_id=submission_id,
+        ocr_service=ocr_raw_result.get('engine', 'google_vision'),
+        raw_text=full_text,
+        processed_text=processed_text,
+        confidence_score=confidence,
+        processing_status='completed',
+        raw_response_ref=raw_blob.get('ref'),
+        raw_response_size=raw_blob.get('size'),
+        detected_language=detected_language,
+        bounding_boxes=layout.to_dict() if layout else ocr_raw_result.get('annotations', []),
+        detected_breaks=ocr_raw_result.get('breaks', {}),
+        processing_time_seconds=time.time() - start_time,
+        page_number=page_num,
+        original_payload_bytes=payload.get('original_bytes'),
+        sent_payload_bytes=0 if ocr_raw_result.get('cache_hit') else payload.get('sent_bytes'),
+        preprocessing=preprocessing,
+        unprocessed_confidence=unprocessed_confidence
+    )
+    db.session.add(ocr_result)
+    db.session.flush()  # Get ocr_result.id
+    return ocr_result
+
+
+def _ocr_answer_regions(submission_id: int, plan: OCRPlan, crops: list, strategy_selector: OCRStrategySelector,
+                        text_processor: TextProcessor, page_preprocessing: Dict[int, Dict], start_time: float,
+                        stage_timings: dict) -> List[OCRResult]:
+    """
+    OCR the answer-box crops of a templated sheet and store one OCRResult per page
+
+    The crops of each page are kept under bounding_boxes['answer_regions'],
+    from which _region_results() maps them back to their questions.
+
+    Args:
+        submission_id: Submission ID
+        plan: The exam's OCR plan (strategy and language hints per question)
+        crops: Crops from AnswerRegionCropper.crop()
+        strategy_selector: Strategy selector for the submission
+        text_processor: Text processor used to clean each crop's text
+        page_preprocessing: Preprocessing details by page number
+        start_time: Task start time
+        stage_timings: Stage timings to fill in ('ocr' and 'persist')
+
+    Returns:
+        The page OCRResult rows, in page order
+    """
+    stage_start = time.time()
+    crop_ocr_results = strategy_selector.execute_region_batch(crops, plan)
+    stage_timings['ocr'] = time.time() - stage_start
+    stage_start = time.time()
+
+    pages = {}
+    for crop, ocr_raw_result in zip(crops, crop_ocr_results):
+        pages.setdefault(crop['page'], []).append((crop, ocr_raw_result))
+
+    ocr_results = []
+    for page_num, page_crops in sorted(pages.items()):
+        regions = []
+        raw_responses = []
+        original_bytes = 0
+        sent_bytes = 0
+        for crop, ocr_raw_result in page_crops:
+            full_text = ocr_raw_result.get('full_text', '')
+            language = ocr_raw_result.get('language', 'unknown')
+            payload = ocr_raw_result.get('payload') or {}
+            regions.append({
+                'question_id': crop['question_id'],
+                'bbox': crop['bounding_box']['bbox'],
+                'text': full_text,
+                'processed_text': text_processor.clean_text(full_text, language),
+                'confidence': ocr_raw_result.get('confidence', 0.0),
+                'language': language,
+                'engine': ocr_raw_result.get('engine', 'google_vision'),
+                'anchored': crop['anchored']
+            })
+            if ocr_raw_result.get('raw_response') is not None:
+                raw_responses.append({'question_id': crop['question_id'],
+                                      'response': ocr_raw_result['raw_response']})
+            original_bytes += payload.get('original_bytes') or 0
+            if not ocr_raw_result.get('cache_hit'):
+                sent_bytes += payload.get('sent_bytes') or 0
+
+        raw_blob = {}
+        if raw_responses:
+            raw_blob = put_json_blob(raw_responses)
+            if not raw_blob['success']:
+                logger.warning(f"Could not store raw responses for page {page_num}: {raw_blob['error']}")
+
+        languages = [region['language'] for region in regions if region['language'] != 'unknown']
+        engines = sorted({region['engine'] for region in regions})
+
+        ocr_result = OCRResult(
+            submission_id=submission_id,
+            ocr_service=','.join(engines),
+            raw_text='\n'.join(region['text'] for region in regions),
+            processed_text='\n'.join(region['processed_text'] for region in regions),
+            confidence_score=sum(region['confidence'] for region in regions) / len(regions),
+            processing_status='completed',
+            raw_response_ref=raw_blob.get('ref'),
+            raw_response_size=raw_blob.get('size'),
+            detected_language=max(set(languages), key=languages.count) if languages else 'unknown',
+            bounding_boxes={'answer_regions': regions},
+            processing_time_seconds=time.time() - start_time,
+            page_number=page_num,
+            original_payload_bytes=original_bytes,
+            sent_payload_bytes=sent_bytes,
+            preprocessing=page_preprocessing.get(page_num)
+        )
+        db.session.add(ocr_result)
+        db.session.flush()  # Get ocr_result.id
+        ocr_results.append(ocr_result)
+
+    stage_timings['persist'] = time.time() - stage_start
+    return ocr_results
+
+
+def _region_results(ocr_results: List[OCRResult]) -> List[Dict]:
+    """Answer-box results stored by _ocr_answer_regions(), for extract_answers_from_regions()"""
+    region_results = []
+    for ocr_result in ocr_results:
+        for region in ocr_result.bounding_boxes['answer_regions']:
+            region_results.append({
+                'question_id': region['question_id'],
+                'text': region['processed_text'],
+                'confidence': region['confidence'],
+                'bounding_box': {'page': ocr_result.page_number, 'bbox': region['bbox']},
+                'ocr_result_id': ocr_result.id
+            })
+    return region_results
+
+
+def _is_region_result(ocr_result: OCRResult) -> bool:
+    return isinstance(ocr_result.bounding_boxes, dict) and 'answer_regions' in ocr_result.bounding_boxes
+
+
+def _bubble_results(ocr_results: List[OCRResult]) -> List[Dict]:
+    """Bubble marks stored by _read_bubble_pages(), for extract_answers_from_bubbles()"""
+    bubble_results = []
+    for ocr_result in ocr_results:
+        for mark in ocr_result.bounding_boxes['bubble_marks']:
+            bubble_results.append(dict(mark, bounding_box={'page': ocr_result.page_number, 'bbox': mark['bbox']},
+                                       ocr_result_id=ocr_result.id))
+    return bubble_results
+
+
+def _is_bubble_result(ocr_result: OCRResult) -> bool:
+    return isinstance(ocr_result.bounding_boxes, dict) and 'bubble_marks' in ocr_result.bounding_boxes
+
+
+def _average_confidence(ocr_results: List[OCRResult]) -> float:
+    if not ocr_results:
+        return 0.0
+    return sum(r.confidence_score or 0.0 for r in ocr_results) / len(ocr_results)
+
+
+def _persist_answers(submission: Submission, exam: Exam, ocr_results: List[OCRResult],
+                     answer_extractor: AnswerExtractor, layouts: List[DocumentLayout] = None) -> List[Dict]:
+    """
+    Extract answers from the page OCR results and replace the submission's answers
+
+    Args:
+        submission: Submission model instance
+        exam: Exam model instance
+        ocr_results: Page OCRResult rows, in page order
+        answer_extractor: Answer extractor
+        layouts: Layouts of the OCR'd (not bubble sheet) pages, if still in memory
+                 (rebuilt from the rows otherwise)
+
+    Returns:
+        List of extracted answer dictionaries
+    """
+    bubble_answers = answer_extractor.extract_answers_from_bubbles(
+        _bubble_results([r for r in ocr_results if _is_bubble_result(r)]), exam)
+    text_results = [r for r in ocr_results if not _is_bubble_result(r)]
+
+    if not text_results:
+        extracted_answers = []
+    elif all(_is_region_result(r) for r in text_results):
+        # Crops map straight to their questions
+        extracted_answers = answer_extractor.extract_answers_from_regions(_region_results(text_results), exam)
+    elif submission.scan_type == 'full_page':
+        # Read all pages as one text; the rows keep their own page text
+        combined = OCRResult(
+            processed_text='\n\n--- PAGE BREAK ---\n\n'.join(r.processed_text or '' for r in text_results),
+            confidence_score=_average_confidence(text_results)
+        )
+        if layouts is None:
+            layouts = [DocumentLayout.from_dict(r.bounding_boxes) for r in text_results]
+        extracted_answers = answer_extractor.extract_answers_from_full_page(
+            combined, exam, layout=DocumentLayout.combine(layouts), page_layouts=list(zip(text_results, layouts))
+        )
+    else:  # per_question
+        # Use all OCR results for per-question extraction
+        extracted_answers = answer_extractor.extract_answers_from_per_question_scan(
+            text_results, exam
+        )
+
+    # Bubbles are read more reliably than text markers - they win for their questions
+    bubble_question_ids = {answer['question_id'] for answer in bubble_answers}
+    extracted_answers = bubble_answers + [answer for answer in extracted_answers
+                                          if answer['question_id'] not in bubble_question_ids]
+
+    # Replace the answers (and their review items) of an earlier run
+    ReviewQueue.query.filter_by(submission_id=submission.id).delete()
+    SubmissionAnswer.query.filter_by(submission_id=submission.id).delete()
+
+    # Create SubmissionAnswer records
+    for ans_data in extracted_answers:
+        submission_answer = SubmissionAnswer(
+            submission_id=submission.id,
+            question_id=ans_data['question_id'],
+            answer_text=ans_data['answer_text'],
+            answer_option_id=ans_data.get('answer_option_id'),
+            confidence_score=ans_data['confidence'],
+            ocr_result_id=ans_data.get('ocr_result_id') or (ocr_results[0].id if ocr_results else None),
+            extracted_bounding_box=ans_data.get('bounding_box'),
+            extraction_method=ans_data.get('extraction_method')
+        )
+        db.session.add(submission_answer)
+
+    return extracted_answers
+
+
+def _log_ocr_stats(strategy_selector: OCRStrategySelector, ocr_service: GoogleVisionOCR,
+                   ocr_results: List[OCRResult]):
+    """Log cache, tier, rate limiter and preprocessing statistics"""
+    if strategy_selector.cache:
+        logger.info(f"OCR cache stats: {strategy_selector.cache.stats()}")
+    if strategy_selector.tiered:
+        logger.info(f"OCR tier stats: {strategy_selector.tier_stats()}")
+    if ocr_service.rate_limiter:
+        logger.info(f"Vision rate limiter stats: {ocr_service.rate_limiter.stats()}")
+
+    deltas = [r.confidence_score - r.unprocessed_confidence
+              for r in ocr_results if r.unprocessed_confidence is not None]
+    if deltas:
+        logger.info(f"Preprocessing confidence delta over {len(deltas)} sampled page(s): "
+                    f"{sum(deltas) / len(deltas):+.3f}")
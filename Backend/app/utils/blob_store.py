@@ -0,0 +1,155 @@
+"""
+Blob Store Utilities
+Content-addressed, compressed JSON blobs on the local filesystem, designed for easy cloud migration
+
+Blobs are reference counted like stored uploads (see app/utils/file_upload.py):
+every put_json_blob adds a reference and delete_json_blob drops one, removing
+the blob with the last. Blobs written before counting started have no count
+until scripts/backfill_ocr_blobs.py rebuilds them, and are kept until then.
+"""
+import os
+import json
+import gzip
+import hashlib
+from flask import current_app
+from app.utils.file_upload import add_file_reference, delete_file
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional - fall back to gzip
+    zstandard = None
+
+
+BLOB_SUBFOLDER = 'blobs'
+
+
+def _blob_root():
+    """Absolute-or-relative directory holding all blobs"""
+    return os.path.join(current_app.config.get('UPLOAD_FOLDER', 'uploads'), BLOB_SUBFOLDER)
+
+
+def _compress(data):
+    """Compress bytes, returning (compressed bytes, file extension)"""
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=10).compress(data), 'zst'
+    return gzip.compress(data, compresslevel=6), 'gz'
+
+
+def _decompress(data, blob_ref):
+    """Decompress a blob according to the extension in its reference"""
+    if blob_ref.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError('zstandard is required to read zstd blobs')
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def put_json_blob(value):
+    """
+    Store a JSON-serializable value as a compressed, content-addressed blob
+
+    Identical values share one file, so storing the same value twice is free
+    (it adds a reference - release it with delete_json_blob).
+
+    Args:
+        value: JSON-serializable value (e.g. a Vision API response)
+
+    Returns:
+        dict: {
+            'success': bool,
+            'ref': str (relative path to blob, for database storage),
+            'size': int (uncompressed JSON bytes),
+            'stored_bytes': int (compressed bytes on disk),
+            'error': str (error message if failed)
+        }
+    """
+    try:
+        data = json.dumps(value, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        blob_dir = os.path.join(digest[:2], digest[2:4])
+
+        # Reuse an existing copy regardless of which codec wrote it
+        for ext in ('zst', 'gz'):
+            blob_ref = os.path.join(BLOB_SUBFOLDER, blob_dir, f"{digest}.json.{ext}").replace('\\', '/')
+            full_path = os.path.join(_blob_root(), blob_dir, f"{digest}.json.{ext}")
+            # A blob without a count (written before counting) stays uncounted until the backfill
+            if os.path.exists(full_path) and (not os.path.exists(f"{full_path}.refs") or
+                                              add_file_reference(blob_ref)):
+                return {
+                    'success': True,
+                    'ref': blob_ref,
+                    'size': len(data),
+                    'stored_bytes': os.path.getsize(full_path)
+                }
+
+        compressed, ext = _compress(data)
+
+        def write(full_path):
+            tmp_path = f"{full_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as blob_file:
+                blob_file.write(compressed)
+            os.replace(tmp_path, full_path)
+
+        blob_ref = os.path.join(BLOB_SUBFOLDER, blob_dir, f"{digest}.json.{ext}").replace('\\', '/')
+        add_file_reference(blob_ref, write)
+
+        return {
+            'success': True,
+            'ref': blob_ref,
+            'size': len(data),
+            'stored_bytes': len(compressed)
+        }
+
+    except Exception as e:
+        return {
+            'success': False,
+            'error': f'Failed to store blob: {str(e)}'
+        }
+
+
+def get_json_blob(blob_ref):
+    """
+    Load a JSON blob
+
+    Args:
+        blob_ref: Relative path to blob (as stored in database)
+
+    Returns:
+        Decoded value, or None if the blob is missing or unreadable
+    """
+    if not blob_ref:
+        return None
+
+    try:
+        full_path = os.path.join(current_app.config.get('UPLOAD_FOLDER', 'uploads'), blob_ref)
+        with open(full_path, 'rb') as blob_file:
+            data = _decompress(blob_file.read(), blob_ref)
+        return json.loads(data.decode('utf-8'))
+
+    except FileNotFoundError:
+        current_app.logger.warning(f'Blob not found: {blob_ref}')
+        return None
+    except Exception as e:
+        current_app.logger.error(f'Failed to read blob {blob_ref}: {str(e)}')
+        return None
+
+
+def delete_json_blob(blob_ref):
+    """
+    Drop a reference to a blob, removing the blob with the last one
+
+    Blobs without a reference count (written before counting started) are
+    kept: other rows may still point at them.
+
+    Args:
+        blob_ref: Relative path to blob (as stored in database)
+
+    Returns:
+        bool: True if a reference was dropped
+    """
+    if not blob_ref:
+        return False
+    full_path = os.path.join(current_app.config.get('UPLOAD_FOLDER', 'uploads'), blob_ref)
+    if not os.path.exists(f"{full_path}.refs"):
+        return False
+    return delete_file(blob_ref)
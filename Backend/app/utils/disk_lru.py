@@ -0,0 +1,114 @@
+"""
+Disk LRU Utilities
+Size-capped directory of cache files, evicted least recently used first
+"""
+import os
+import threading
+from typing import Callable, List, Optional
+
+
+class DiskLRUDirectory:
+    """
+    Directory of cache files kept under a size budget
+
+    File mtime is the LRU clock: hits touch the file, and eviction removes
+    the oldest files until the directory is back under 90% of max_bytes.
+    Files are written through a temporary file and os.replace, so readers
+    never see half-written entries. The running size is computed on first
+    write and kept per process (other processes' writes are picked up at
+    the next eviction).
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes = None  # Lazily computed on first write
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, filename: str) -> str:
+        """Path of a cache file (spread over subdirectories by its first two characters)"""
+        return os.path.join(self.directory, filename[:2], filename)
+
+    def touch(self, path: str) -> bool:
+        """Mark a file recently used; False if it is not cached"""
+        try:
+            os.utime(path, None)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def write(self, path: str, write: Callable[[str], None]) -> None:
+        """
+        Create or replace a cache file, evicting old files if over budget
+
+        Args:
+            path: Cache file path (from path())
+            write: Called with a temporary path to write the content to
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        write(tmp_path)
+        new_size = os.path.getsize(tmp_path)
+        old_size = self._size(path)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, size, _ in self._entries())
+            else:
+                # An overwritten entry only adds the difference
+                self._total_bytes += new_size - (old_size or 0)
+
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def clear(self) -> None:
+        """Remove every cache file"""
+        with self._lock:
+            for path, _, _ in self._entries():
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            self._total_bytes = 0
+
+    @staticmethod
+    def _size(path: str) -> Optional[int]:
+        try:
+            return os.path.getsize(path)
+        except FileNotFoundError:
+            return None
+
+    def _entries(self) -> List:
+        """List (path, size, mtime) for every cache file"""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                if filename.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _evict(self) -> None:
+        """Remove least recently used files down to 90% of max_bytes"""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+
+        self._total_bytes = total
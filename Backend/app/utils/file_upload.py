@@ -4,10 +4,19 @@ Handles file uploads with local filesystem storage, designed for easy cloud migr
 """
 import os
 import uuid
-from datetime import datetime
+import hashlib
+from contextlib import contextmanager
 from werkzeug.utils import secure_filename
 from flask import current_app
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
 
 def allowed_file(filename, allowed_extensions=None):
     """
@@ -42,21 +51,192 @@ def get_file_extension(filename):
     return None
 
 
-def save_uploaded_file(file, subfolder='', prefix=''):
+def file_sha256(file_path, chunk_size=1024 * 1024):
+    """
+    Hash a file in chunks without loading it whole
+
+    Args:
+        file_path: Path to the file
+        chunk_size: Bytes read at a time
+
+    Returns:
+        str: Hex SHA-256 digest
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive lock on a file (via a <path>.lock sidecar)"""
+    lock_path = f"{path}.lock"
+    with open(lock_path, 'a+b') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _refs_lock(full_path):
+    """Lock guarding the reference counts of a stored file's directory (one refs.lock per directory)"""
+    return file_lock(os.path.join(os.path.dirname(full_path), 'refs'))
+
+
+def _read_refcount(refs_path):
+    try:
+        with open(refs_path) as refs_file:
+            return int(refs_file.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def _write_refcount(refs_path, count):
+    tmp_path = f"{refs_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as refs_file:
+        refs_file.write(str(count))
+    os.replace(tmp_path, refs_path)
+
+
+def _add_reference(full_path, write=None):
+    """
+    Count one more reference to a stored file, writing it first if needed
+
+    Returns:
+        bool: True if write() created the file, False if it was already
+        stored, None if it is missing and there is no write()
+    """
+    refs_path = f"{full_path}.refs"
+    with _refs_lock(full_path):
+        refs = _read_refcount(refs_path)
+        stored = os.path.exists(full_path) and (refs > 0 or write is None)
+        if not stored:
+            if write is None:
+                return None
+            write(full_path)
+            refs = 0
+        _write_refcount(refs_path, refs + 1)
+    return not stored
+
+
+def add_file_reference(filepath, write=None):
+    """
+    Add a reference to a content-addressed file (released with delete_file)
+
+    Args:
+        filepath: Relative path to file (as stored in database)
+        write: Called with the full path to create the file if it is missing
+
+    Returns:
+        bool: True if the file is there and was referenced
+    """
+    upload_base = current_app.config.get('UPLOAD_FOLDER', 'uploads')
+    full_path = os.path.join(upload_base, filepath)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    return _add_reference(full_path, write) is not None
+
+
+def set_file_references(filepath, count):
+    """
+    Set the reference count of a content-addressed file, removing it at 0
+
+    For repairs (see scripts/backfill_ocr_blobs.py) - normal code adds
+    references with add_file_reference and drops them with delete_file.
+
+    Args:
+        filepath: Relative path to file (as stored in database)
+        count: Number of references that point at the file
+    """
+    upload_base = current_app.config.get('UPLOAD_FOLDER', 'uploads')
+    full_path = os.path.join(upload_base, filepath)
+    refs_path = f"{full_path}.refs"
+    with _refs_lock(full_path):
+        if count > 0:
+            _write_refcount(refs_path, count)
+            return
+        for path in (full_path, refs_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _store_chunks(chunks, subfolder, file_ext):
+    """
+    Write chunks to content-addressed storage, hashing them on the way
+
+    Stored as <subfolder>/<h[:2]>/<h[2:4]>/<sha256>.<ext> with a .refs
+    sidecar counting the references; identical content is kept once. The
+    counts of a directory share one lock file, so none is left per file.
+
+    Returns:
+        dict: {'filepath', 'filename', 'file_hash', 'size', 'deduplicated'}
     """
-    Save uploaded file to local filesystem with unique name
+    upload_base = current_app.config.get('UPLOAD_FOLDER', 'uploads')
+    upload_dir = os.path.join(upload_base, subfolder)
+    os.makedirs(upload_dir, exist_ok=True)
+
+    digest = hashlib.sha256()
+    size = 0
+    tmp_path = os.path.join(upload_dir, f".upload_{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp_path, 'wb') as tmp_file:
+            for chunk in chunks:
+                digest.update(chunk)
+                size += len(chunk)
+                tmp_file.write(chunk)
+
+        file_hash = digest.hexdigest()
+        filename = f"{file_hash}.{file_ext}"
+        content_dir = os.path.join(file_hash[:2], file_hash[2:4])
+        full_dir = os.path.join(upload_dir, content_dir)
+        os.makedirs(full_dir, exist_ok=True)
+        full_path = os.path.join(full_dir, filename)
+
+        deduplicated = not _add_reference(full_path, lambda path: os.replace(tmp_path, path))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return {
+        'filepath': os.path.join(subfolder, content_dir, filename).replace('\\', '/'),
+        'filename': filename,
+        'file_hash': file_hash,
+        'size': size,
+        'deduplicated': deduplicated
+    }
+
+
+def save_uploaded_file(file, subfolder=''):
+    """
+    Save uploaded file to local filesystem, named by its content
     Designed to be easily replaced with cloud storage implementation
 
+    The upload is streamed to disk in chunks while its SHA-256 is computed.
+    Identical uploads share one stored file, which is reference counted
+    (see delete_file).
+
     Args:
         file: FileStorage object from request.files
         subfolder: Subfolder within uploads directory (e.g., 'exams', 'submissions')
-        prefix: Optional prefix for filename (e.g., 'exam_', 'submission_')
 
     Returns:
         dict: {
             'success': bool,
             'filepath': str (relative path to file),
             'filename': str (generated filename),
+            'file_hash': str (SHA-256 of the content),
+            'size': int (bytes),
+            'deduplicated': bool (the same content was already stored),
             'error': str (error message if failed)
         }
     """
@@ -75,40 +255,44 @@ def save_uploaded_file(file, subfolder='', prefix=''):
                 'error': f'File type not allowed. Allowed types: {", ".join(allowed_ext)}'
             }
 
-        # Generate unique filename
         original_filename = secure_filename(file.filename)
         file_ext = get_file_extension(original_filename)
-        timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
-        unique_id = str(uuid.uuid4())[:8]
-        new_filename = f"{prefix}{timestamp}_{unique_id}.{file_ext}"
 
-        # Create upload directory structure
-        upload_base = current_app.config.get('UPLOAD_FOLDER', 'uploads')
-        upload_dir = os.path.join(upload_base, subfolder)
+        stream = file.stream
+        stored = _store_chunks(iter(lambda: stream.read(UPLOAD_CHUNK_SIZE), b''), subfolder, file_ext)
+
+        return dict(stored, success=True, original_filename=original_filename)
 
-        # Create directory if it doesn't exist
-        os.makedirs(upload_dir, exist_ok=True)
+    except Exception as e:
+        return {
+            'success': False,
+            'error': f'Failed to save file: {str(e)}'
+        }
 
-        # Full path to save file
-        full_path = os.path.join(upload_dir, new_filename)
 
-        # Save file
-        file.save(full_path)
+def store_local_file(path, subfolder='', file_ext=None):
+    """
+    Move a file created on the server (e.g. a generated PDF) into content-addressed storage
 
-        # Return relative path (for database storage)
-        relative_path = os.path.join(subfolder, new_filename).replace('\\', '/')
+    Args:
+        path: File to move (removed afterwards)
+        subfolder: Subfolder within uploads directory
+        file_ext: Stored extension (default: the path's own)
 
-        return {
-            'success': True,
-            'filepath': relative_path,
-            'filename': new_filename,
-            'original_filename': original_filename
-        }
+    Returns:
+        dict: Same as save_uploaded_file
+    """
+    try:
+        with open(path, 'rb') as f:
+            stored = _store_chunks(iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b''), subfolder,
+                                   file_ext or get_file_extension(path) or 'bin')
+        os.remove(path)
+        return dict(stored, success=True, original_filename=os.path.basename(path))
 
     except Exception as e:
         return {
             'success': False,
-            'error': f'Failed to save file: {str(e)}'
+            'error': f'Failed to store file: {str(e)}'
         }
 
 
@@ -117,15 +301,29 @@ def delete_file(filepath):
     Delete file from local filesystem
     Designed to be easily replaced with cloud storage implementation
 
+    Content-addressed files lose one reference and are removed with the last one.
+
     Args:
         filepath: Relative path to file (as stored in database)
 
     Returns:
-        bool: True if file was deleted successfully
+        bool: True if the reference (or file) was deleted successfully
     """
     try:
         upload_base = current_app.config.get('UPLOAD_FOLDER', 'uploads')
         full_path = os.path.join(upload_base, filepath)
+        refs_path = f"{full_path}.refs"
+
+        if os.path.exists(refs_path):
+            with _refs_lock(full_path):
+                refs = _read_refcount(refs_path) - 1
+                if refs > 0:
+                    _write_refcount(refs_path, refs)
+                    return True
+                if os.path.exists(full_path):
+                    os.remove(full_path)
+                os.remove(refs_path)
+            return True
 
         if os.path.exists(full_path):
             os.remove(full_path)
@@ -4,100 +4,366 @@ Handles PDF creation from images and PDF to image conversion for OCR processing
 """
 import os
 import io
-from PIL import Image
-from pdf2image import convert_from_path
-from typing import List, Dict, Optional
+import time
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps
+from pdf2image import convert_from_path, pdfinfo_from_path
+from typing import Iterator, List, Dict, Optional
 from flask import current_app
 
 
-def images_to_pdf(image_paths: List[str], output_path: str) -> Dict:
+_COPY_BUFFER_BYTES = 1024 * 1024
+
+# EXIF orientations a page /Rotate can express (mirrored ones need decoding)
+_EXIF_PAGE_ROTATION = {1: 0, 3: 180, 6: 90, 8: 270}
+
+
+def _jpeg_passthrough(img: Image.Image) -> Optional[int]:
+    """
+    Page rotation for embedding a JPEG's DCT stream as is, or None if it must be decoded
+
+    Args:
+        img: Opened (not yet decoded) image
+    """
+    if img.format != 'JPEG' or img.mode not in ('L', 'RGB'):
+        return None
+    return _EXIF_PAGE_ROTATION.get(img.getexif().get(0x0112, 1))
+
+
+def _flatten_to_rgb(img: Image.Image) -> Image.Image:
+    """Convert an image to RGB or L for PDF embedding, painting alpha onto white"""
+    img = ImageOps.exif_transpose(img)
+    if img.mode in ('RGBA', 'LA', 'P'):
+        # Create white background
+        rgb_img = Image.new('RGB', img.size, (255, 255, 255))
+        if img.mode == 'P':
+            img = img.convert('RGBA')
+        rgb_img.paste(img, mask=img.split()[-1])
+        return rgb_img
+    if img.mode not in ('RGB', 'L'):
+        return img.convert('RGB')
+    return img
+
+
+class _PDFWriter:
+    """
+    Minimal PDF writer that appends one image page at a time
+
+    Each page is written as soon as it is added; only the object offsets
+    are kept until close().
+    """
+
+    def __init__(self, fileobj, resolution: float = 100.0):
+        self.file = fileobj
+        self.resolution = resolution
+        self.offsets = {}
+        self.page_ids = []
+        self.next_id = 3  # 1 = catalog, 2 = page tree
+        self.file.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def _begin_object(self) -> int:
+        obj_id = self.next_id
+        self.next_id += 1
+        self.offsets[obj_id] = self.file.tell()
+        self.file.write(f'{obj_id} 0 obj\n'.encode())
+        return obj_id
+
+    def _object(self, body: str, obj_id: int = None) -> int:
+        if obj_id is None:
+            obj_id = self._begin_object()
+        else:
+            self.offsets[obj_id] = self.file.tell()
+            self.file.write(f'{obj_id} 0 obj\n'.encode())
+        self.file.write(body.encode() + b'\nendobj\n')
+        return obj_id
+
+    def add_page(self, width: int, height: int, mode: str, stream, length: int, rotate: int = 0):
+        """
+        Append a page holding one DCT-encoded image
+
+        Args:
+            width, height: Image size in pixels
+            mode: 'L' or 'RGB'
+            stream: File object positioned at the JPEG data (copied in chunks)
+            length: Bytes of JPEG data
+            rotate: Page rotation in degrees (clockwise)
+        """
+        color_space = '/DeviceGray' if mode == 'L' else '/DeviceRGB'
+        image_id = self._begin_object()
+        self.file.write(f'<< /Type /XObject /Subtype /Image /Width {width} /Height {height} '
+                        f'/ColorSpace {color_space} /BitsPerComponent 8 /Filter /DCTDecode '
+                        f'/Length {length} >>\nstream\n'.encode())
+        shutil.copyfileobj(stream, self.file, _COPY_BUFFER_BYTES)
+        self.file.write(b'\nendstream\nendobj\n')
+
+        page_w = width * 72.0 / self.resolution
+        page_h = height * 72.0 / self.resolution
+        content = f'q {page_w:.2f} 0 0 {page_h:.2f} 0 0 cm /Im0 Do Q'
+        content_id = self._object(f'<< /Length {len(content)} >>\nstream\n{content}\nendstream')
+        self.page_ids.append(self._object(
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {page_w:.2f} {page_h:.2f}] '
+            f'/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R'
+            + (f' /Rotate {rotate}' if rotate else '') + ' >>'
+        ))
+
+    def close(self):
+        """Write the page tree, catalog and cross-reference table"""
+        kids = ' '.join(f'{page_id} 0 R' for page_id in self.page_ids)
+        self._object(f'<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>', obj_id=2)
+        self._object('<< /Type /Catalog /Pages 2 0 R >>', obj_id=1)
+
+        xref_offset = self.file.tell()
+        self.file.write(f'xref\n0 {self.next_id}\n0000000000 65535 f \n'.encode())
+        for obj_id in range(1, self.next_id):
+            self.file.write(f'{self.offsets[obj_id]:010d} 00000 n \n'.encode())
+        self.file.write(f'trailer\n<< /Size {self.next_id} /Root 1 0 R >>\n'
+                        f'startxref\n{xref_offset}\n%%EOF\n'.encode())
+
+
+def _open_source(source):
+    """Open an image source (path or binary file object) for reading from the start"""
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, 'rb')
+    source.seek(0)
+    return source
+
+
+def _source_size(source) -> int:
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    return source.seek(0, os.SEEK_END)
+
+
+def _prepare_image_page(source, quality: int) -> Dict:
+    """
+    Get one image ready to become a PDF page: decode, EXIF-orient and normalize it
+
+    JPEGs the PDF can show as they are are only inspected, not decoded.
+    Runs on a worker thread (Pillow releases the GIL while decoding and
+    encoding), so it must not touch the source after returning.
+
+    Returns:
+        dict: {'width', 'height', 'mode', 'rotate', 'memory_bytes', and
+               'encoded' (BytesIO with the JPEG data) unless it is a passthrough}
+    """
+    stream = _open_source(source)
+    try:
+        with Image.open(stream) as img:
+            rotate = _jpeg_passthrough(img)
+            if rotate is not None:
+                return {'width': img.width, 'height': img.height, 'mode': img.mode, 'rotate': rotate,
+                        'memory_bytes': _COPY_BUFFER_BYTES}
+
+            page = _flatten_to_rgb(img)
+            encoded = io.BytesIO()
+            page.save(encoded, 'JPEG', quality=quality)
+            # Decoded bitmap + its encoded copy
+            memory_bytes = page.width * page.height * len(page.getbands()) + encoded.tell()
+            result = {'width': page.width, 'height': page.height, 'mode': page.mode, 'rotate': 0,
+                      'memory_bytes': memory_bytes, 'encoded': encoded}
+            page.close()
+            return result
+    finally:
+        if stream is not source:
+            stream.close()
+
+
+def images_to_pdf(images: List, output_path: str, quality: int = 95, thread_count: int = None) -> Dict:
     """
     Convert multiple images to a single PDF file
 
+    JPEG files are embedded as they are (no decoding, no second lossy pass);
+    other images are decoded, EXIF-oriented and encoded as JPEG on a small
+    thread pool. Pages are written in order as soon as they are ready, so at
+    most thread_count decoded images are in memory.
+
     Args:
-        image_paths: List of paths to image files (PNG, JPG, JPEG)
+        images: Image files (PNG, JPG, JPEG) as paths or seekable binary file
+                objects, e.g. spooled copies of uploads
         output_path: Path where the PDF should be saved
+        quality: JPEG quality for images that have to be re-encoded
+        thread_count: Images prepared in parallel (IMAGES_TO_PDF_THREADS,
+                      default: CPU count, at most 4)
 
     Returns:
         dict: {
             'success': bool,
             'filepath': str (path to created PDF),
             'page_count': int,
+            'passthrough_pages': int (JPEGs embedded without decoding),
+            'seconds': float (build time),
+            'peak_memory_bytes': int (estimated largest image data held at once),
             'error': str (if failed)
         }
     """
+    start_time = time.time()
+    temp_path = output_path + '.part'
+
     try:
-        if not image_paths:
+        if not images:
             return {'success': False, 'error': 'No images provided'}
 
-        # Open all images and convert to RGB (required for PDF)
-        images = []
-        for img_path in image_paths:
-            if not os.path.exists(img_path):
-                return {'success': False, 'error': f'Image not found: {img_path}'}
-
-            img = Image.open(img_path)
-
-            # Convert to RGB if necessary (PNG with alpha, etc.)
-            if img.mode in ('RGBA', 'LA', 'P'):
-                # Create white background
-                rgb_img = Image.new('RGB', img.size, (255, 255, 255))
-                if img.mode == 'P':
-                    img = img.convert('RGBA')
-                rgb_img.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-                img = rgb_img
-            elif img.mode != 'RGB':
-                img = img.convert('RGB')
+        for source in images:
+            if isinstance(source, (str, os.PathLike)) and not os.path.exists(source):
+                return {'success': False, 'error': f'Image not found: {source}'}
 
-            images.append(img)
-
-        if not images:
-            return {'success': False, 'error': 'No valid images to convert'}
+        thread_count = max(1, thread_count or int(os.environ.get('IMAGES_TO_PDF_THREADS',
+                                                                 min(4, os.cpu_count() or 1))))
 
         # Create directory if it doesn't exist
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
-        # Save first image as PDF with additional pages
-        first_image = images[0]
-        remaining_images = images[1:] if len(images) > 1 else []
-
-        if remaining_images:
-            first_image.save(
-                output_path,
-                'PDF',
-                save_all=True,
-                append_images=remaining_images,
-                resolution=100.0,
-                quality=95
-            )
-        else:
-            first_image.save(output_path, 'PDF', resolution=100.0, quality=95)
+        passthrough_pages = 0
+        page_memory = []
+
+        with open(temp_path, 'wb') as pdf_file, ThreadPoolExecutor(max_workers=thread_count) as executor:
+            writer = _PDFWriter(pdf_file)
+            pending = deque()
+            next_index = 0
+
+            try:
+                while pending or next_index < len(images):
+                    # Keep thread_count images being prepared ahead of the writer
+                    while next_index < len(images) and len(pending) < thread_count:
+                        pending.append((images[next_index],
+                                        executor.submit(_prepare_image_page, images[next_index], quality)))
+                        next_index += 1
+
+                    source, future = pending.popleft()
+                    page = future.result()
+                    page_memory.append(page['memory_bytes'])
+
+                    if 'encoded' in page:
+                        length = page['encoded'].tell()
+                        page['encoded'].seek(0)
+                        writer.add_page(page['width'], page['height'], page['mode'], page['encoded'], length)
+                        continue
+
+                    # Embed the DCT stream straight from the source
+                    length = _source_size(source)
+                    stream = _open_source(source)
+                    try:
+                        writer.add_page(page['width'], page['height'], page['mode'], stream, length, page['rotate'])
+                    finally:
+                        if stream is not source:
+                            stream.close()
+                    passthrough_pages += 1
+            finally:
+                for _, future in pending:
+                    future.cancel()
+
+            writer.close()
 
-        # Close all images
-        for img in images:
-            img.close()
+        os.replace(temp_path, output_path)
 
         return {
             'success': True,
             'filepath': output_path,
-            'page_count': len(images)
+            'page_count': len(images),
+            'passthrough_pages': passthrough_pages,
+            'seconds': time.time() - start_time,
+            'peak_memory_bytes': max(sum(page_memory[i:i + thread_count]) for i in range(len(page_memory)))
         }
 
     except Exception as e:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
         return {
             'success': False,
             'error': f'Failed to create PDF: {str(e)}'
         }
 
 
-def pdf_to_images(pdf_path: str, output_dir: Optional[str] = None, dpi: int = 300) -> Dict:
+def iter_pdf_pages(pdf_path: str, output_dir: Optional[str] = None, dpi: int = None, fmt: str = None,
+                   grayscale: bool = None, thread_count: int = None) -> Iterator[str]:
+    """
+    Rasterize a PDF one page at a time, yielding each page image as it is ready
+
+    Each page is rendered by its own pdftoppm call straight to disk, so no
+    page is held in memory. Up to thread_count pages render ahead of the
+    consumer, which can start on page 1 while later pages render.
+    Unset arguments fall back to env variables.
+
+    Args:
+        pdf_path: Path to PDF file
+        output_dir: Directory for the page images (if None, a new temporary
+                    directory under UPLOAD_FOLDER/temp_pdf_conversions, which
+                    the caller removes)
+        dpi: Resolution (OCR_PDF_DPI, default 300)
+        fmt: Image format - png, jpeg, tiff or ppm (OCR_PDF_FORMAT, default png)
+        grayscale: Render in grayscale (OCR_PDF_GRAYSCALE, default True)
+        thread_count: Pages rendered in parallel (OCR_PDF_THREADS, default:
+                      CPU count, at most 4)
+
+    Yields:
+        Page image paths, page 1 first
+
+    Raises:
+        FileNotFoundError: If the PDF does not exist
+        pdf2image exceptions if the PDF cannot be read
+    """
+    if not os.path.exists(pdf_path):
+        raise FileNotFoundError(f'PDF not found: {pdf_path}')
+
+    dpi = dpi or int(os.environ.get('OCR_PDF_DPI', 300))
+    fmt = (fmt or os.environ.get('OCR_PDF_FORMAT', 'png')).lower()
+    if grayscale is None:
+        grayscale = os.environ.get('OCR_PDF_GRAYSCALE', 'True').lower() in ['true', '1', 't']
+    thread_count = max(1, thread_count or int(os.environ.get('OCR_PDF_THREADS', min(4, os.cpu_count() or 1))))
+
+    if output_dir is None:
+        upload_base = current_app.config.get('UPLOAD_FOLDER', 'uploads')
+        temp_base = os.path.join(upload_base, 'temp_pdf_conversions')
+        os.makedirs(temp_base, exist_ok=True)
+        output_dir = tempfile.mkdtemp(prefix='pdf_', dir=temp_base)
+    else:
+        os.makedirs(output_dir, exist_ok=True)
+
+    page_count = pdfinfo_from_path(pdf_path)['Pages']
+
+    def render(page: int) -> str:
+        return convert_from_path(
+            pdf_path,
+            dpi=dpi,
+            output_folder=output_dir,
+            first_page=page,
+            last_page=page,
+            fmt=fmt,
+            single_file=True,
+            output_file=f'page_{page:04d}',
+            grayscale=grayscale,
+            paths_only=True
+        )[0]
+
+    with ThreadPoolExecutor(max_workers=thread_count) as executor:
+        pending = deque()
+        next_page = 1
+        try:
+            while pending or next_page <= page_count:
+                # Keep thread_count pages rendering ahead of the consumer
+                while next_page <= page_count and len(pending) < thread_count:
+                    pending.append(executor.submit(render, next_page))
+                    next_page += 1
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def pdf_to_images(pdf_path: str, output_dir: Optional[str] = None, dpi: int = None) -> Dict:
     """
     Convert PDF pages to images for OCR processing
 
+    Collects iter_pdf_pages() - use that directly to start on the first
+    pages before the last one is rendered.
+
     Args:
         pdf_path: Path to PDF file
-        output_dir: Directory to save images (if None, uses temp directory)
-        dpi: Resolution for image conversion (default: 300)
+        output_dir: Directory to save images (if None, uses a new temporary directory)
+        dpi: Resolution for image conversion (default: OCR_PDF_DPI, 300)
 
     Returns:
         dict: {
@@ -111,30 +377,7 @@ def pdf_to_images(pdf_path: str, output_dir: Optional[str] = None, dpi: int = 30
         if not os.path.exists(pdf_path):
             return {'success': False, 'error': f'PDF not found: {pdf_path}'}
 
-        # Create output directory if not specified
-        if output_dir is None:
-            upload_base = current_app.config.get('UPLOAD_FOLDER', 'uploads')
-            output_dir = os.path.join(upload_base, 'temp_pdf_conversions')
-
-        os.makedirs(output_dir, exist_ok=True)
-
-        # Convert PDF to images
-        images = convert_from_path(
-            pdf_path,
-            dpi=dpi,
-            output_folder=output_dir,
-            fmt='png'
-        )
-
-        # Save images and get paths
-        image_paths = []
-        base_filename = os.path.splitext(os.path.basename(pdf_path))[0]
-
-        for i, image in enumerate(images, start=1):
-            image_filename = f"{base_filename}_page_{i}.png"
-            image_path = os.path.join(output_dir, image_filename)
-            image.save(image_path, 'PNG')
-            image_paths.append(image_path)
+        image_paths = list(iter_pdf_pages(pdf_path, output_dir=output_dir, dpi=dpi))
 
         return {
             'success': True,
@@ -162,33 +405,123 @@ def is_pdf(file_path: str) -> bool:
     return file_path.lower().endswith('.pdf')
 
 
-def get_pdf_page_count(pdf_path: str) -> int:
+def probe_pdf(pdf_path: str) -> Dict:
     """
-    Get the number of pages in a PDF file
+    Read a PDF's page count, page sizes and text layers without rendering it
+
+    Only the page tree, resources and (for pages with fonts) content
+    streams are parsed.
 
     Args:
         pdf_path: Path to PDF file
 
     Returns:
-        int: Number of pages (0 if error)
+        dict: {
+            'success': bool,
+            'page_count': int,
+            'pages': [
+                {
+                    'width': float, 'height': float,   # points, as displayed
+                    'rotation': int,
+                    'has_text': bool,                  # text layer present
+                    'image_only': bool                 # images and no text (a scan)
+                },
+                ...
+            ],
+            'error': str (if failed)
+        }
     """
     try:
         from PyPDF2 import PdfReader
+
         with open(pdf_path, 'rb') as f:
             pdf = PdfReader(f)
-            return len(pdf.pages)
-    except Exception:
-        # Fallback: convert and count
+            if pdf.is_encrypted:
+                pdf.decrypt('')
+
+            pages = []
+            for page in pdf.pages:
+                rotation = int(page.get('/Rotate', 0) or 0) % 360
+                width, height = float(page.mediabox.width), float(page.mediabox.height)
+                if rotation in (90, 270):
+                    width, height = height, width
+
+                resources = page.get('/Resources') or {}
+                fonts = resources.get('/Font') if hasattr(resources, 'get') else None
+                xobjects = resources.get('/XObject') if hasattr(resources, 'get') else None
+                has_images = any(xobject.get_object().get('/Subtype') == '/Image'
+                                 for xobject in (xobjects or {}).values())
+
+                has_text = False
+                if fonts:
+                    contents = page.get_contents()
+                    has_text = contents is not None and b'BT' in contents.get_data()
+
+                pages.append({
+                    'width': round(width, 2),
+                    'height': round(height, 2),
+                    'rotation': rotation,
+                    'has_text': has_text,
+                    'image_only': has_images and not has_text
+                })
+
+        return {'success': True, 'page_count': len(pages), 'pages': pages}
+
+    except Exception as e:
+        return {'success': False, 'error': f'Failed to read PDF: {str(e)}'}
+
+
+def probe_document(file_path: str, cached: Optional[Dict] = None, file_hash: Optional[str] = None) -> Dict:
+    """
+    Probe a scanned paper (PDF or image), reusing an earlier probe of the same bytes
+
+    Args:
+        file_path: Path to the PDF or image
+        cached: Earlier probe result (as stored on Submission.file_probe)
+        file_hash: SHA-256 of the file, if already known
+
+    Returns:
+        probe_pdf() result plus 'file_hash' - cached itself if the file is unchanged
+    """
+    from app.utils.file_upload import file_sha256
+
+    file_hash = file_hash or file_sha256(file_path)
+    if cached and cached.get('success') and cached.get('file_hash') == file_hash:
+        return cached
+
+    if is_pdf(file_path):
+        probe = probe_pdf(file_path)
+    else:
         try:
-            result = pdf_to_images(pdf_path)
-            if result['success']:
-                # Clean up temporary images
-                for img_path in result['image_paths']:
-                    try:
-                        os.remove(img_path)
-                    except:
-                        pass
-                return result['page_count']
-        except Exception:
-            pass
-    return 0
+            # Only the image header is read
+            with Image.open(file_path) as img:
+                width, height = img.size
+            probe = {'success': True, 'page_count': 1, 'pages': [
+                {'width': width, 'height': height, 'rotation': 0, 'has_text': False, 'image_only': True}
+            ]}
+        except Exception as e:
+            probe = {'success': False, 'error': f'Failed to read image: {str(e)}'}
+
+    probe['file_hash'] = file_hash
+    return probe
+
+
+def get_pdf_page_count(pdf_path: str) -> int:
+    """
+    Get the number of pages in a PDF file
+
+    Args:
+        pdf_path: Path to PDF file
+
+    Returns:
+        int: Number of pages (0 if error)
+    """
+    probe = probe_pdf(pdf_path)
+    if probe['success']:
+        return probe['page_count']
+
+    # Fallback: ask poppler (without rendering any page)
+    try:
+        return pdfinfo_from_path(pdf_path)['Pages']
+    except Exception:
+        return 0
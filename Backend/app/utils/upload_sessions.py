@@ -0,0 +1,365 @@
+"""
+Resumable Upload Sessions
+Lets clients upload large scanned papers in chunks that survive dropped connections
+
+A session lives in <UPLOAD_FOLDER>/upload_sessions/<upload_id>/ as meta.json
+plus the bytes received so far (data.part). Chunks must be sent in order;
+each carries its SHA-256 so a corrupted chunk is rejected and resent instead
+of poisoning the file. Sessions idle for longer than UPLOAD_SESSION_TTL_HOURS
+are removed.
+
+A finalized session leaves only complete.json behind, with the stored
+file's details, so a finalize retried after a lost response gets the same
+result. It expires after UPLOAD_SESSION_TTL_HOURS too.
+"""
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import hashlib
+from werkzeug.utils import secure_filename
+from flask import current_app
+from app.utils.file_upload import allowed_file, get_file_extension, file_lock, store_local_file, delete_file
+
+SESSION_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+_READ_BYTES = 1024 * 1024
+
+
+def _chunk_bytes():
+    """Largest chunk accepted per request (must stay under MAX_CONTENT_LENGTH)"""
+    return int(os.environ.get('UPLOAD_CHUNK_BYTES', 8 * 1024 * 1024))
+
+
+def _max_total_bytes():
+    return int(os.environ.get('UPLOAD_MAX_TOTAL_BYTES', 500 * 1024 * 1024))
+
+
+def _ttl_seconds():
+    return float(os.environ.get('UPLOAD_SESSION_TTL_HOURS', 24)) * 3600
+
+
+def _sessions_dir():
+    upload_base = current_app.config.get('UPLOAD_FOLDER', 'uploads')
+    return os.path.join(upload_base, 'upload_sessions')
+
+
+def _session_dir(upload_id):
+    if not upload_id or not SESSION_ID_PATTERN.match(upload_id):
+        return None
+    return os.path.join(_sessions_dir(), upload_id)
+
+
+def _last_activity(session_dir):
+    """Latest mtime of the session's files (None if it is gone)"""
+    mtimes = []
+    for name in ('meta.json', 'data.part', 'complete.json'):
+        try:
+            mtimes.append(os.path.getmtime(os.path.join(session_dir, name)))
+        except FileNotFoundError:
+            pass
+    return max(mtimes) if mtimes else None
+
+
+def _received_bytes(session_dir):
+    try:
+        return os.path.getsize(os.path.join(session_dir, 'data.part'))
+    except FileNotFoundError:
+        return 0
+
+
+def _range_sha256(path, offset, length):
+    """SHA-256 of a byte range of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        remaining = length
+        while remaining > 0:
+            data = f.read(min(_READ_BYTES, remaining))
+            if not data:
+                break
+            digest.update(data)
+            remaining -= len(data)
+    return digest.hexdigest()
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as json_file:
+        json.dump(data, json_file)
+    os.replace(tmp_path, path)
+
+
+def expire_upload_sessions():
+    """
+    Remove sessions idle for longer than UPLOAD_SESSION_TTL_HOURS
+
+    Returns:
+        int: Number of sessions removed
+    """
+    sessions_dir = _sessions_dir()
+    if not os.path.isdir(sessions_dir):
+        return 0
+
+    cutoff = time.time() - _ttl_seconds()
+    removed = 0
+    for upload_id in os.listdir(sessions_dir):
+        session_dir = _session_dir(upload_id)
+        if session_dir is None:
+            continue
+        last_activity = _last_activity(session_dir)
+        if last_activity is None or last_activity < cutoff:
+            shutil.rmtree(session_dir, ignore_errors=True)
+            removed += 1
+
+    if removed:
+        current_app.logger.info(f'Expired {removed} abandoned upload session(s)')
+    return removed
+
+
+def create_upload_session(user_id, exam_id, student_id, filename, total_size, sha256=None):
+    """
+    Start a resumable upload
+
+    Args:
+        user_id: Uploading user (the only one allowed to continue the session)
+        exam_id: Exam the paper is submitted for
+        student_id: Student the paper belongs to
+        filename: Original filename (decides the stored extension)
+        total_size: Size of the whole file in bytes
+        sha256: Optional hex SHA-256 of the whole file, checked on finalize
+
+    Returns:
+        dict: {'success': bool, 'session': dict, 'error': str}
+    """
+    if not filename or not allowed_file(filename):
+        allowed_ext = current_app.config.get('ALLOWED_EXTENSIONS', {'png', 'jpg', 'jpeg', 'pdf'})
+        return {'success': False, 'error': f'File type not allowed. Allowed types: {", ".join(allowed_ext)}'}
+
+    if not isinstance(total_size, int) or total_size <= 0:
+        return {'success': False, 'error': 'total_size must be a positive integer'}
+    if total_size > _max_total_bytes():
+        return {'success': False, 'error': f'File too large (max {_max_total_bytes()} bytes)'}
+
+    if sha256 is not None and not re.match(r'^[0-9a-fA-F]{64}$', sha256):
+        return {'success': False, 'error': 'sha256 must be a hex SHA-256 digest'}
+
+    expire_upload_sessions()
+
+    upload_id = uuid.uuid4().hex
+    session_dir = _session_dir(upload_id)
+    os.makedirs(session_dir)
+
+    original_filename = secure_filename(filename)
+    meta = {
+        'upload_id': upload_id,
+        'user_id': user_id,
+        'exam_id': exam_id,
+        'student_id': student_id,
+        'filename': original_filename,
+        'file_ext': get_file_extension(original_filename),
+        'total_size': total_size,
+        'sha256': sha256.lower() if sha256 else None,
+        'created_at': time.time()
+    }
+    with open(os.path.join(session_dir, 'meta.json'), 'w') as meta_file:
+        json.dump(meta, meta_file)
+    open(os.path.join(session_dir, 'data.part'), 'wb').close()
+
+    return {'success': True, 'session': get_upload_session(upload_id)}
+
+
+def get_upload_session(upload_id):
+    """
+    Get a session's metadata and progress
+
+    Returns:
+        dict with the session metadata plus 'offset' (bytes received),
+        'chunk_size' and 'expires_at', or None if it is unknown or expired
+    """
+    session_dir = _session_dir(upload_id)
+    if session_dir is None:
+        return None
+
+    last_activity = _last_activity(session_dir)
+    if last_activity is None or last_activity < time.time() - _ttl_seconds():
+        return None
+    if os.path.exists(os.path.join(session_dir, 'complete.json')):
+        return None
+
+    try:
+        with open(os.path.join(session_dir, 'meta.json')) as meta_file:
+            meta = json.load(meta_file)
+    except (FileNotFoundError, ValueError):
+        return None
+
+    meta['offset'] = _received_bytes(session_dir)
+    meta['chunk_size'] = _chunk_bytes()
+    meta['expires_at'] = last_activity + _ttl_seconds()
+    return meta
+
+
+def get_finalized_upload(upload_id):
+    """
+    Get the result of a session that was already finalized
+
+    Returns:
+        dict: The finalize_upload_session result (with 'session'), or None
+        if the session was not finalized or its marker expired
+    """
+    session_dir = _session_dir(upload_id)
+    if session_dir is None:
+        return None
+
+    completion_path = os.path.join(session_dir, 'complete.json')
+    try:
+        if os.path.getmtime(completion_path) < time.time() - _ttl_seconds():
+            return None
+        with open(completion_path) as completion_file:
+            return json.load(completion_file)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def append_chunk(upload_id, offset, stream, length, checksum):
+    """
+    Append a chunk to a session
+
+    A chunk that was already received whole (a retry after a lost response)
+    is acknowledged without being written again.
+
+    Args:
+        upload_id: Session ID
+        offset: Byte offset the chunk starts at
+        stream: Readable stream with the chunk
+        length: Chunk length in bytes
+        checksum: Hex SHA-256 of the chunk
+
+    Returns:
+        dict: {
+            'success': bool,
+            'offset': int (bytes received after this request),
+            'reason': str ('not_found', 'invalid', 'offset_mismatch' or 'checksum_mismatch' on failure),
+            'error': str
+        }
+    """
+    session = get_upload_session(upload_id)
+    if session is None:
+        return {'success': False, 'reason': 'not_found', 'error': 'Upload session not found or expired'}
+
+    if not checksum or not re.match(r'^[0-9a-fA-F]{64}$', checksum):
+        return {'success': False, 'reason': 'invalid', 'offset': session['offset'],
+                'error': 'X-Chunk-SHA256 header with the chunk\'s hex SHA-256 is required'}
+    if offset is None or offset < 0:
+        return {'success': False, 'reason': 'invalid', 'offset': session['offset'], 'error': 'offset is required'}
+    if not length or length <= 0:
+        return {'success': False, 'reason': 'invalid', 'offset': session['offset'], 'error': 'Empty chunk'}
+    if length > _chunk_bytes():
+        return {'success': False, 'reason': 'invalid', 'offset': session['offset'],
+                'error': f'Chunk too large (max {_chunk_bytes()} bytes)'}
+    if offset + length > session['total_size']:
+        return {'success': False, 'reason': 'invalid', 'offset': session['offset'],
+                'error': 'Chunk extends past total_size'}
+
+    checksum = checksum.lower()
+    data_path = os.path.join(_session_dir(upload_id), 'data.part')
+
+    with file_lock(data_path):
+        received = _received_bytes(_session_dir(upload_id))
+
+        if offset != received:
+            # A resent chunk we already have is fine; anything else must resume at `received`
+            if offset + length <= received and _range_sha256(data_path, offset, length) == checksum:
+                return {'success': True, 'offset': received}
+            return {'success': False, 'reason': 'offset_mismatch', 'offset': received,
+                    'error': f'Expected offset {received}'}
+
+        digest = hashlib.sha256()
+        written = 0
+        with open(data_path, 'r+b') as data_file:
+            data_file.seek(offset)
+            try:
+                while written < length:
+                    data = stream.read(min(_READ_BYTES, length - written))
+                    if not data:
+                        break
+                    digest.update(data)
+                    data_file.write(data)
+                    written += len(data)
+            finally:
+                if written != length or digest.hexdigest() != checksum:
+                    data_file.truncate(offset)
+
+        if written != length:
+            return {'success': False, 'reason': 'invalid', 'offset': offset,
+                    'error': f'Chunk truncated ({written} of {length} bytes received)'}
+        if digest.hexdigest() != checksum:
+            return {'success': False, 'reason': 'checksum_mismatch', 'offset': offset,
+                    'error': 'Chunk checksum mismatch'}
+
+    return {'success': True, 'offset': offset + length}
+
+
+def finalize_upload_session(upload_id, subfolder='submissions'):
+    """
+    Move a complete upload into storage and close the session
+
+    Finalizing a session again returns the first result, with
+    'already_finalized' set.
+
+    Returns:
+        dict: Same as store_local_file, plus 'session' (the session metadata)
+        and 'reason' ('not_found', 'incomplete', 'checksum_mismatch') on failure
+    """
+    finalized = get_finalized_upload(upload_id)
+    if finalized is not None:
+        return dict(finalized, already_finalized=True)
+
+    session = get_upload_session(upload_id)
+    if session is None:
+        return {'success': False, 'reason': 'not_found', 'error': 'Upload session not found or expired'}
+
+    session_dir = _session_dir(upload_id)
+    data_path = os.path.join(session_dir, 'data.part')
+
+    with file_lock(data_path):
+        # Another request may have finalized the session while this one waited
+        finalized = get_finalized_upload(upload_id)
+        if finalized is not None:
+            return dict(finalized, already_finalized=True)
+
+        received = _received_bytes(session_dir)
+        if received != session['total_size']:
+            return {'success': False, 'reason': 'incomplete', 'offset': received,
+                    'error': f'Upload incomplete ({received} of {session["total_size"]} bytes)'}
+
+        stored = store_local_file(data_path, subfolder, file_ext=session['file_ext'])
+        if not stored['success']:
+            return stored
+
+        if session['sha256'] and stored['file_hash'] != session['sha256']:
+            delete_file(stored['filepath'])
+            shutil.rmtree(session_dir, ignore_errors=True)
+            return {'success': False, 'reason': 'checksum_mismatch',
+                    'error': 'File checksum does not match the sha256 given when the upload started'}
+
+        result = dict(stored, session=session, original_filename=session['filename'])
+        _write_json(os.path.join(session_dir, 'complete.json'), result)
+        os.remove(os.path.join(session_dir, 'meta.json'))
+
+    return result
+
+
+def delete_upload_session(upload_id):
+    """
+    Abort a session and discard what was received
+
+    Returns:
+        bool: True if the session existed
+    """
+    session_dir = _session_dir(upload_id)
+    if session_dir is None or not os.path.isdir(session_dir):
+        return False
+    shutil.rmtree(session_dir, ignore_errors=True)
+    return True
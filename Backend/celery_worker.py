@@ -14,17 +14,34 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from app import create_app
-from app.services.tasks import ocr_tasks
+from app.services.tasks import celery_config, ocr_tasks
 
 # Create Flask app to initialize Celery with app context
 app = create_app()
 
-# Get the celery instance (it's set in app module during create_app)
-from app import celery
+# create_app() doesn't set up Celery - build the instance here and share it
+celery = celery_config.make_celery(app)
+celery_config.celery = celery
+ocr_tasks.set_celery(celery)
+
+# Page tasks retry on their own with backoff (see OCRTask); the other stages
+# are retried by re-running the pipeline, which skips pages already read
+page_retry_options = {
+    'autoretry_for': ocr_tasks.OCRTask.autoretry_for,
+    'retry_kwargs': ocr_tasks.OCRTask.retry_kwargs,
+    'retry_backoff': ocr_tasks.OCRTask.retry_backoff,
+    'retry_backoff_max': ocr_tasks.OCRTask.retry_backoff_max,
+    'retry_jitter': ocr_tasks.OCRTask.retry_jitter,
+}
 
 # Register tasks
 celery.task(name='app.services.tasks.ocr_tasks.process_submission_ocr')(ocr_tasks.process_submission_ocr)
-celery.task(name='app.services.tasks.ocr_tasks.process_single_page_ocr')(ocr_tasks.process_single_page_ocr)
+celery.task(name='app.services.tasks.ocr_tasks.start_submission_ocr_pipeline')(ocr_tasks.start_submission_ocr_pipeline)
+celery.task(name='app.services.tasks.ocr_tasks.process_single_page_ocr',
+            **page_retry_options)(ocr_tasks.process_single_page_ocr)
+celery.task(name='app.services.tasks.ocr_tasks.finalize_submission_ocr')(ocr_tasks.finalize_submission_ocr)
+celery.task(name='app.services.tasks.ocr_tasks.grade_submission_after_ocr')(ocr_tasks.grade_submission_after_ocr)
+celery.task(name='app.services.tasks.ocr_tasks.mark_submission_ocr_failed')(ocr_tasks.mark_submission_ocr_failed)
 
 if __name__ == '__main__':
     celery.start()
@@ -0,0 +1,26 @@
+"""Add answer region template to exams
+
+Revision ID: add_exam_answer_regions_001
+Revises: add_ocr_raw_response_blobs_001
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_exam_answer_regions_001'
+down_revision = 'add_ocr_raw_response_blobs_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('exams', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('answer_region_template', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('exams', schema=None) as batch_op:
+        batch_op.drop_column('answer_region_template')
@@ -0,0 +1,26 @@
+"""Add bubble sheet template to exams
+
+Revision ID: add_exam_bubble_sheet_001
+Revises: add_submission_file_hash_001
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_exam_bubble_sheet_001'
+down_revision = 'add_submission_file_hash_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('exams', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('bubble_sheet_template', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('exams', schema=None) as batch_op:
+        batch_op.drop_column('bubble_sheet_template')
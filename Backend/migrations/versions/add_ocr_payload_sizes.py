@@ -0,0 +1,29 @@
+"""Track OCR upload payload sizes
+
+Revision ID: add_ocr_payload_sizes_001
+Revises: 40685b62af08
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_ocr_payload_sizes_001'
+down_revision = '40685b62af08'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Page image size before and after the pre-upload optimizer
+    with op.batch_alter_table('ocr_results', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('original_payload_bytes', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('sent_payload_bytes', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('ocr_results', schema=None) as batch_op:
+        batch_op.drop_column('sent_payload_bytes')
+        batch_op.drop_column('original_payload_bytes')
@@ -0,0 +1,28 @@
+"""Add preprocessing details to OCR results
+
+Revision ID: add_ocr_preprocessing_001
+Revises: add_exam_answer_regions_001
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_ocr_preprocessing_001'
+down_revision = 'add_exam_answer_regions_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('ocr_results', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('preprocessing', sa.JSON(), nullable=True))
+        batch_op.add_column(sa.Column('unprocessed_confidence', sa.Float(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('ocr_results', schema=None) as batch_op:
+        batch_op.drop_column('unprocessed_confidence')
+        batch_op.drop_column('preprocessing')
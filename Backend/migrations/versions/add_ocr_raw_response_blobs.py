@@ -0,0 +1,30 @@
+"""Move OCR raw responses to the blob store
+
+Revision ID: add_ocr_raw_response_blobs_001
+Revises: add_ocr_payload_sizes_001
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_ocr_raw_response_blobs_001'
+down_revision = 'add_ocr_payload_sizes_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # New rows keep only a reference to the compressed response blob;
+    # the inline raw_response column stays readable for existing rows
+    with op.batch_alter_table('ocr_results', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('raw_response_ref', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('raw_response_size', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('ocr_results', schema=None) as batch_op:
+        batch_op.drop_column('raw_response_size')
+        batch_op.drop_column('raw_response_ref')
@@ -0,0 +1,28 @@
+"""Add content hash of the scanned paper to submissions
+
+Revision ID: add_submission_file_hash_001
+Revises: add_submission_file_probe_001
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_submission_file_hash_001'
+down_revision = 'add_submission_file_probe_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('submissions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('file_hash', sa.String(length=64), nullable=True))
+        batch_op.create_index(batch_op.f('ix_submissions_file_hash'), ['file_hash'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('submissions', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_submissions_file_hash'))
+        batch_op.drop_column('file_hash')
@@ -0,0 +1,26 @@
+"""Add scanned paper probe to submissions
+
+Revision ID: add_submission_file_probe_001
+Revises: add_ocr_preprocessing_001
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_submission_file_probe_001'
+down_revision = 'add_ocr_preprocessing_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('submissions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('file_probe', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('submissions', schema=None) as batch_op:
+        batch_op.drop_column('file_probe')
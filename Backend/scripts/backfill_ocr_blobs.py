@@ -0,0 +1,110 @@
+"""
+Backfill the OCR raw response blob store
+
+1. Moves raw responses still stored inline in ocr_results.raw_response
+   (rows written before the blob store) into compressed blobs.
+2. Rebuilds every blob's reference count from the rows that point at it,
+   and removes blobs no row points at (blobs newer than --min-age-minutes
+   are left alone, as their row may not be committed yet).
+
+Run once after deploying reference-counted blobs, and again whenever the
+counts need repairing:
+
+    python scripts/backfill_ocr_blobs.py [--dry-run]
+"""
+import os
+import sys
+import time
+import argparse
+from collections import Counter
+
+# Add parent directory to path to allow imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+from flask import current_app
+
+load_dotenv()
+
+from app import create_app, db
+from app.models.submission import OCRResult
+from app.utils.blob_store import BLOB_SUBFOLDER, put_json_blob
+from app.utils.file_upload import set_file_references
+from config import config
+
+
+def move_inline_responses(batch_size, dry_run):
+    """Store inline raw responses as blobs and clear the column"""
+    moved = 0
+    query = OCRResult.query.filter(OCRResult.raw_response.isnot(None), OCRResult.raw_response_ref.is_(None))
+    if dry_run:
+        return query.count()
+
+    while True:
+        batch = query.order_by(OCRResult.id).limit(batch_size).all()
+        if not batch:
+            return moved
+        for result in batch:
+            if result.raw_response is not None:
+                blob = put_json_blob(result.raw_response)
+                if not blob['success']:
+                    raise RuntimeError(f"OCR result {result.id}: {blob['error']}")
+                result.raw_response_ref = blob['ref']
+                result.raw_response_size = blob['size']
+            # SQL NULL (None would store a JSON null)
+            result.raw_response = db.null()
+        db.session.commit()
+        moved += len(batch)
+        print(f"  moved {moved} response(s)")
+
+
+def rebuild_reference_counts(min_age_minutes, dry_run):
+    """Set each blob's count to the rows pointing at it; remove unreferenced blobs"""
+    counts = Counter(ref for (ref,) in db.session.query(OCRResult.raw_response_ref)
+                     .filter(OCRResult.raw_response_ref.isnot(None)))
+    upload_base = current_app.config.get('UPLOAD_FOLDER', 'uploads')
+    cutoff = time.time() - min_age_minutes * 60
+
+    updated = removed = 0
+    for root, _, files in os.walk(os.path.join(upload_base, BLOB_SUBFOLDER)):
+        for name in files:
+            if not name.endswith(('.json.zst', '.json.gz')):
+                continue
+            full_path = os.path.join(root, name)
+            blob_ref = os.path.relpath(full_path, upload_base).replace('\\', '/')
+            count = counts.get(blob_ref, 0)
+            if count == 0:
+                if os.path.getmtime(full_path) > cutoff:
+                    continue
+                removed += 1
+            else:
+                updated += 1
+            if not dry_run:
+                set_file_references(blob_ref, count)
+
+    missing = sum(1 for blob_ref in counts
+                  if not os.path.exists(os.path.join(upload_base, blob_ref)))
+    return updated, removed, missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill OCR raw response blobs and their reference counts')
+    parser.add_argument('--batch-size', type=int, default=200, help='Rows moved per commit')
+    parser.add_argument('--min-age-minutes', type=float, default=60,
+                        help='Keep unreferenced blobs younger than this')
+    parser.add_argument('--dry-run', action='store_true', help='Only report what would change')
+    args = parser.parse_args()
+
+    app = create_app(config[os.getenv('FLASK_ENV', 'development')])
+    with app.app_context():
+        moved = move_inline_responses(args.batch_size, args.dry_run)
+        print(f"Inline responses {'to move' if args.dry_run else 'moved'}: {moved}")
+
+        updated, removed, missing = rebuild_reference_counts(args.min_age_minutes, args.dry_run)
+        print(f"Blobs recounted: {updated}, unreferenced blobs {'to remove' if args.dry_run else 'removed'}: {removed}")
+        if missing:
+            print(f"Warning: {missing} referenced blob(s) are missing from {BLOB_SUBFOLDER}/")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,296 @@
+"""
+OCR Pipeline Benchmark
+Pushes synthetic submissions through process_submission_ocr against the local
+Google Vision stand-in (scripts/vision_stub_server.py) and reports throughput,
+per-stage latency percentiles and worker memory.
+
+By default the task runs in a pool of worker processes that mirrors Celery's
+prefork pool. With --celery the submissions are dispatched to running Celery
+workers instead; those workers must be started with the same DATABASE_URL,
+UPLOAD_FOLDER and GOOGLE_VISION_API_URL as this script, and their Vision
+calls go through the shared Redis token bucket, so throughput is capped by
+GOOGLE_VISION_API_QUOTA_PER_MINUTE and the OCR_RATE_LIMIT_* settings.
+
+Usage:
+    python scripts/benchmark_ocr.py --submissions 50 --pages 3 --workers 4
+    python scripts/benchmark_ocr.py --latency lognormal:500:0.6 --throttle-rate 0.05
+    python scripts/benchmark_ocr.py --database-url postgresql://localhost/bench --celery
+"""
+import os
+import sys
+import math
+import time
+import random
+import shutil
+import argparse
+import tempfile
+from multiprocessing import Pool
+
+# Add parent directory to path to allow imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.vision_stub_server import build_parser as build_stub_parser, start_server
+
+STAGES = ['rasterize', 'preprocess', 'ocr', 'persist', 'extract', 'commit', 'total']
+
+_worker_app = None
+
+
+def benchmark_config():
+    """Development config without SQL echo (imported late - Config reads env at import)"""
+    from config import config
+
+    class BenchmarkConfig(config['development']):
+        SQLALCHEMY_ECHO = False
+
+    return BenchmarkConfig
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def max_rss_mb():
+    """Peak resident memory of the current process in MB (None where unsupported)"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return rss / (1024.0 * 1024.0) if sys.platform == 'darwin' else rss / 1024.0
+
+
+def make_page_image(submission_number, page_number, questions):
+    """Render a synthetic answer sheet page (unique bytes per page)"""
+    from PIL import Image, ImageDraw
+
+    img = Image.new('L', (1700, 2200), 255)
+    draw = ImageDraw.Draw(img)
+    draw.text((80, 60), f"Benchmark submission {submission_number} - page {page_number}", fill=0)
+    rng = random.Random(f"{submission_number}-{page_number}")
+    for number in range(1, questions + 1):
+        draw.text((80, 100 + number * 60), f"{number}. {rng.choice('ABCD')}", fill=0)
+    # Scanner-like speckle so every page hashes differently
+    for _ in range(2000):
+        img.putpixel((rng.randrange(1700), rng.randrange(2200)), rng.randrange(160, 255))
+    return img
+
+
+def seed(app, args):
+    """
+    Create a teacher, an exam with answer keys, and one student + submission per run
+
+    Returns:
+        List of submission IDs
+    """
+    from app import db
+    from app.models.user import User
+    from app.models.exam import Exam, Question, QuestionOption, AnswerKey
+    from app.models.submission import Submission
+
+    upload_folder = app.config['UPLOAD_FOLDER']
+    os.makedirs(os.path.join(upload_folder, 'submissions'), exist_ok=True)
+    run_id = int(time.time())
+
+    teacher = User(username=f'bench_teacher_{run_id}', email=f'bench_teacher_{run_id}@example.com',
+                   first_name='Bench', last_name='Teacher', is_active=True)
+    teacher.set_password('benchmark')
+    db.session.add(teacher)
+    db.session.flush()
+
+    exam = Exam(title=f'OCR benchmark {run_id}', creator_id=teacher.id, subject_type='english',
+                primary_language='en', is_published=True)
+    db.session.add(exam)
+    db.session.flush()
+
+    for number in range(1, args.questions + 1):
+        question = Question(exam_id=exam.id, question_text=f'Question {number}',
+                            question_type='multiple_choice', points=1.0, order_number=number)
+        db.session.add(question)
+        db.session.flush()
+        options = [QuestionOption(question_id=question.id, option_text=letter, order_number=i + 1,
+                                  is_correct=(letter == 'A'))
+                   for i, letter in enumerate('ABCD')]
+        db.session.add_all(options)
+        db.session.flush()
+        db.session.add(AnswerKey(exam_id=exam.id, question_id=question.id, correct_answer=str(options[0].id),
+                                 answer_type='multiple_choice', points=1.0))
+
+    submission_ids = []
+    for n in range(args.submissions):
+        student = User(username=f'bench_student_{run_id}_{n}', email=f'bench_student_{run_id}_{n}@example.com',
+                       first_name='Bench', last_name=f'Student {n}', is_active=True)
+        student.set_password('benchmark')
+        db.session.add(student)
+        db.session.flush()
+
+        pages = [make_page_image(n, page, args.questions) for page in range(1, args.pages + 1)]
+        if len(pages) > 1:
+            relative_path = f'submissions/bench_{run_id}_{n}.pdf'
+            pages[0].save(os.path.join(upload_folder, relative_path), 'PDF', save_all=True,
+                          append_images=pages[1:], resolution=200.0)
+        else:
+            relative_path = f'submissions/bench_{run_id}_{n}.png'
+            pages[0].save(os.path.join(upload_folder, relative_path))
+
+        submission = Submission(exam_id=exam.id, student_id=student.id, scanned_paper_path=relative_path,
+                                scan_type='full_page', page_count=len(pages))
+        db.session.add(submission)
+        db.session.flush()
+        submission_ids.append(submission.id)
+
+    db.session.commit()
+    return submission_ids
+
+
+def _init_worker():
+    """Give each worker process its own app (and DB engine), like a Celery worker"""
+    global _worker_app
+    from app import create_app
+
+    _worker_app = create_app(benchmark_config())
+    _worker_app.app_context().push()
+
+
+def _run_submission(submission_id):
+    from app.services.tasks.ocr_tasks import process_submission_ocr
+
+    result = process_submission_ocr(submission_id)
+    result['worker_pid'] = os.getpid()
+    result['worker_max_rss_mb'] = max_rss_mb()
+    return result
+
+
+def run_in_process(submission_ids, workers):
+    """Run the task in a prefork-style process pool"""
+    with Pool(processes=workers, initializer=_init_worker) as pool:
+        return pool.map(_run_submission, submission_ids, chunksize=1)
+
+
+def run_on_celery(app, submission_ids):
+    """Dispatch to running Celery workers and collect the results"""
+    from app.services.tasks.celery_config import make_celery
+
+    celery_app = make_celery(app)
+    pending = [celery_app.send_task('app.services.tasks.ocr_tasks.process_submission_ocr',
+                                    args=[submission_id], queue='ocr_queue')
+               for submission_id in submission_ids]
+    results = [async_result.get(timeout=3600) for async_result in pending]
+
+    # Worker memory comes from the workers' own rusage (maxrss is in KB)
+    worker_stats = celery_app.control.inspect().stats() or {}
+    return results, {
+        name: stats.get('rusage', {}).get('maxrss', 0) / 1024.0
+        for name, stats in worker_stats.items()
+    }
+
+
+def report(results, elapsed, pages, stub_stats, worker_memory):
+    """Print throughput, stage percentiles and memory"""
+    succeeded = [result for result in results if result.get('status') == 'success']
+    failed = len(results) - len(succeeded)
+    total_pages = sum(result.get('page_count', 0) for result in succeeded)
+
+    print()
+    print('=' * 64)
+    print('OCR PIPELINE BENCHMARK')
+    print('=' * 64)
+    print(f"Submissions:    {len(results)} ({failed} failed), {pages} page(s) each")
+    print(f"Wall time:      {elapsed:.2f}s")
+    print(f"Throughput:     {total_pages / elapsed:.2f} pages/sec, {len(succeeded) / elapsed:.2f} submissions/sec")
+    print()
+    print(f"{'Stage':<12}{'p50 (ms)':>12}{'p95 (ms)':>12}{'p99 (ms)':>12}")
+    for stage in STAGES:
+        if stage == 'total':
+            values = [result['processing_time'] for result in succeeded]
+        else:
+            values = [result.get('stage_timings', {}).get(stage) for result in succeeded]
+            values = [value for value in values if value is not None]
+        print(f"{stage:<12}{percentile(values, 50) * 1000:>12.1f}"
+              f"{percentile(values, 95) * 1000:>12.1f}{percentile(values, 99) * 1000:>12.1f}")
+
+    print()
+    if worker_memory:
+        for worker, rss in sorted(worker_memory.items()):
+            print(f"Worker {worker}: peak RSS {rss:.1f} MB")
+    else:
+        print('Worker memory: not available on this platform')
+
+    if stub_stats:
+        print()
+        print(f"Vision stand-in: {stub_stats}")
+
+    for result in results:
+        if result.get('status') != 'success':
+            print(f"  submission {result.get('submission_id')}: {result.get('error')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark process_submission_ocr against the Vision stand-in',
+                                     parents=[build_stub_parser()], conflict_handler='resolve')
+    parser.add_argument('--submissions', type=int, default=20)
+    parser.add_argument('--pages', type=int, default=2, help='Pages per submission')
+    parser.add_argument('--workers', type=int, default=4, help='Worker processes (ignored with --celery)')
+    parser.add_argument('--database-url', help='Database to use (default: throwaway SQLite in the work dir)')
+    parser.add_argument('--work-dir', help='Directory for uploads and the default database (default: temp dir)')
+    parser.add_argument('--no-stub', action='store_true',
+                        help='Do not start the stand-in (use GOOGLE_VISION_API_URL as is)')
+    parser.add_argument('--cache', action='store_true', help='Leave the OCR result cache enabled')
+    parser.add_argument('--celery', action='store_true', help='Dispatch to running Celery workers')
+    parser.add_argument('--keep', action='store_true', help='Keep the work dir afterwards')
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='ocr_bench_')
+    if not os.path.isabs(args.recordings):
+        args.recordings = os.path.join(work_dir, args.recordings)
+
+    # Must be set before config is imported - Config reads them at class definition
+    os.environ['UPLOAD_FOLDER'] = os.path.join(work_dir, 'uploads')
+    os.environ['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(work_dir, 'benchmark.db')}"
+    os.environ.setdefault('GOOGLE_VISION_API_KEY', 'benchmark')
+    if not args.cache:
+        os.environ['OCR_CACHE_BACKEND'] = 'none'
+
+    server = None
+    if not args.no_stub:
+        server = start_server(args)
+        os.environ['GOOGLE_VISION_API_URL'] = f"http://{args.host}:{args.port}/v1/images:annotate"
+        print(f"Vision stand-in on {os.environ['GOOGLE_VISION_API_URL']} (latency {args.latency})")
+
+    from app import create_app
+
+    app = create_app(benchmark_config())
+    try:
+        with app.app_context():
+            print(f"Seeding {args.submissions} submission(s) of {args.pages} page(s)...")
+            submission_ids = seed(app, args)
+
+            start = time.time()
+            if args.celery:
+                results, worker_memory = run_on_celery(app, submission_ids)
+            else:
+                results = run_in_process(submission_ids, args.workers)
+                worker_memory = {}
+                for result in results:
+                    if result.get('worker_max_rss_mb') is not None:
+                        worker_memory[result['worker_pid']] = max(worker_memory.get(result['worker_pid'], 0.0),
+                                                                  result['worker_max_rss_mb'])
+            elapsed = time.time() - start
+
+        stub_stats = dict(server.RequestHandlerClass.state.counters) if server else None
+        report(results, elapsed, args.pages, stub_stats, worker_memory)
+    finally:
+        if server:
+            server.shutdown()
+        if not args.keep and not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Text Processor Micro-Benchmark
+Times question-marker extraction on long synthetic multi-page OCR texts
+(English and Arabic markers, Western and Arabic-Indic digits) against the
+per-question regex scans TextProcessor used before the marker lexer, and
+compares their answers.
+
+Usage:
+    python scripts/benchmark_text_processor.py
+    python scripts/benchmark_text_processor.py --pages 20 --questions 15 --repeat 10
+"""
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+# Add parent directory to path to allow imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.ocr.text_processor import TextProcessor, _marker_index
+
+ARABIC_INDIC = str.maketrans('0123456789', '٠١٢٣٤٥٦٧٨٩')
+WORDS = ['Paris', 'London', 'the answer is', 'photosynthesis', 'because', '(B)', 'energy',
+         'باريس', 'الجواب', 'الطاقة', 'لأن']
+
+
+def make_text(pages, questions, seed):
+    """A multi-page OCR text with a mix of marker styles"""
+    rng = random.Random(seed)
+    lines = []
+    number = 0
+    for page in range(1, pages + 1):
+        lines.append(f'Exam page {page}')
+        for _ in range(questions):
+            number += 1
+            marker = rng.choice([f'Q{number}', f'Question {number}', f'{number}', f'س{number}',
+                                 f'السؤال {number}', f'س{str(number).translate(ARABIC_INDIC)}'])
+            answer = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 25)))
+            lines.append(f'{marker}{rng.choice([".", ":", " -"])} {answer}')
+    return '\n'.join(lines), number
+
+
+def legacy_extract_answer_from_pattern(text, question_number):
+    """Previous implementation: up to five full-text scans per question"""
+    patterns = [
+        rf'(?:Q|Question)\s*{question_number}[\s:.-]+([^\n]+)',
+        rf'{question_number}[\s:.-]+([^\n]+)',
+        rf'(?:Q|Question)\s*{question_number}(?:\)|\.)\s*([^\n]+)',
+        rf'(?:س|السؤال)\s*{question_number}[\s:.-]+([^\n]+)',
+        rf'(?:س|السؤال)\s*{question_number}(?:\)|\.)\s*([^\n]+)',
+    ]
+    for pattern in patterns:
+        matches = re.findall(pattern, text, re.IGNORECASE | re.MULTILINE)
+        if matches:
+            return matches[0].strip()
+    return ''
+
+
+def legacy_split_by_questions(text):
+    """Previous implementation of split_by_questions"""
+    answers = {}
+    matches = list(re.finditer(r'(?:Q|Question|س|السؤال)?\s*(\d+)[\s:.-]', text, re.IGNORECASE))
+    for i, match in enumerate(matches):
+        end_pos = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        answers[int(match.group(1))] = re.sub(r'\s+', ' ', text[match.end():end_pos].strip())
+    return answers
+
+
+def time_per_text(func, texts, repeat):
+    """Best-of-repeat seconds to run func over every text"""
+    best = float('inf')
+    for _ in range(repeat):
+        _marker_index.cache_clear()  # Count tokenization in every run
+        start = time.perf_counter()
+        for text, question_count in texts:
+            func(text, question_count)
+        best = min(best, time.perf_counter() - start)
+    return best / len(texts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark TextProcessor question-marker extraction')
+    parser.add_argument('--texts', type=int, default=5, help='Synthetic texts per run')
+    parser.add_argument('--pages', type=int, default=10, help='Pages per text')
+    parser.add_argument('--questions', type=int, default=10, help='Questions per page')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs (best is reported)')
+    args = parser.parse_args()
+
+    texts = [make_text(args.pages, args.questions, seed) for seed in range(args.texts)]
+
+    def lexer_all_questions(text, count):
+        return [TextProcessor.extract_answer_from_pattern(text, n) for n in range(1, count + 1)]
+
+    def legacy_all_questions(text, count):
+        return [legacy_extract_answer_from_pattern(text, n) for n in range(1, count + 1)]
+
+    # The lexer also finds Arabic-Indic question numbers, which the legacy
+    # per-question patterns (built with Western digits) miss
+    legacy_found = sum(sum(1 for answer in legacy_all_questions(text, count) if answer) for text, count in texts)
+    lexer_found = sum(sum(1 for answer in lexer_all_questions(text, count) if answer) for text, count in texts)
+    split_mismatches = sum(TextProcessor.split_by_questions(text) != legacy_split_by_questions(text)
+                           for text, _ in texts)
+
+    average_chars = sum(len(text) for text, _ in texts) / len(texts)
+    total_questions = sum(count for _, count in texts)
+    print(f'{args.texts} texts x {args.pages} pages x {args.questions} questions '
+          f'(~{average_chars / 1024:.0f} KB each), best of {args.repeat}')
+    print(f'Answers found: legacy {legacy_found}/{total_questions}, lexer {lexer_found}/{total_questions}')
+    print(f'split_by_questions results differing from legacy: {split_mismatches}')
+    print()
+
+    rows = [
+        ('extract every question', legacy_all_questions, lexer_all_questions),
+        ('split, then every question', lambda text, count: (legacy_split_by_questions(text),
+                                                            legacy_all_questions(text, count)),
+         lambda text, count: (TextProcessor.split_by_questions(text), lexer_all_questions(text, count))),
+        ('split_by_questions', lambda text, _: legacy_split_by_questions(text),
+         lambda text, _: TextProcessor.split_by_questions(text)),
+    ]
+    print(f"{'operation':<30}{'legacy ms':>12}{'lexer ms':>12}{'speedup':>10}")
+    for name, legacy, lexer in rows:
+        legacy_seconds = time_per_text(legacy, texts, args.repeat)
+        lexer_seconds = time_per_text(lexer, texts, args.repeat)
+        print(f'{name:<30}{legacy_seconds * 1000:>12.2f}{lexer_seconds * 1000:>12.2f}'
+              f'{legacy_seconds / lexer_seconds:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+"""
+Google Vision Stand-in Server
+Local HTTP server that mimics images:annotate for offline OCR benchmarks
+
+Responses are replayed from recordings keyed by the SHA-256 of the uploaded
+image bytes (<recordings>/<sha256>.json holds one AnnotateImageResponse).
+Images without a recording get a synthetic DOCUMENT_TEXT_DETECTION answer
+sheet, so the pipeline runs end to end without any recordings at all.
+
+Note that recordings are keyed by the bytes actually uploaded, i.e. after the
+pre-upload image optimizer - record and replay with the same OCR_OPTIMIZE_*
+settings.
+
+Usage:
+    python scripts/vision_stub_server.py --port 8085 --latency lognormal:350:0.4 --throttle-rate 0.02
+
+    # Record real responses for images that have no recording yet
+    python scripts/vision_stub_server.py --record --upstream-key $GOOGLE_VISION_API_KEY
+
+Then point the backend at it:
+    GOOGLE_VISION_API_URL=http://127.0.0.1:8085/v1/images:annotate
+"""
+import os
+import sys
+import json
+import time
+import random
+import base64
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+UPSTREAM_URL = 'https://vision.googleapis.com/v1/images:annotate'
+
+
+def parse_latency(spec):
+    """
+    Parse a latency distribution spec into a sampler returning seconds
+
+    Supported specs (milliseconds):
+        fixed:200
+        uniform:100:400
+        lognormal:350:0.4    (median, sigma)
+        none
+    """
+    kind, *params = spec.split(':')
+    params = [float(param) for param in params]
+
+    if kind == 'none':
+        return lambda: 0.0
+    if kind == 'fixed':
+        return lambda: params[0] / 1000.0
+    if kind == 'uniform':
+        return lambda: random.uniform(params[0], params[1]) / 1000.0
+    if kind == 'lognormal':
+        # params: median in ms, sigma of the underlying normal
+        return lambda: random.lognormvariate(0.0, params[1]) * params[0] / 1000.0
+
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def _box(x0, y0, x1, y1):
+    return {'vertices': [{'x': x0, 'y': y0}, {'x': x1, 'y': y0}, {'x': x1, 'y': y1}, {'x': x0, 'y': y1}]}
+
+
+def synthesize_response(image_hash, questions=10):
+    """
+    Build a deterministic answer-sheet response for an image without a recording
+
+    Lines read "1. B", "2. D", ... with answers and confidences derived from
+    the image hash, laid out as one block with one paragraph per line.
+    """
+    rng = random.Random(image_hash)
+    paragraphs = []
+    lines = []
+
+    for number in range(1, questions + 1):
+        tokens = [f"{number}.", rng.choice('ABCD')]
+        lines.append(' '.join(tokens))
+        y0 = number * 60
+        words = []
+        x = 40
+        for i, token in enumerate(tokens):
+            symbols = []
+            for j, char in enumerate(token):
+                symbol = {'text': char, 'confidence': round(rng.uniform(0.85, 0.99), 2)}
+                if j == len(token) - 1:
+                    symbol['property'] = {'detectedBreak': {'type': 'LINE_BREAK' if i == len(tokens) - 1 else 'SPACE'}}
+                symbols.append(symbol)
+            words.append({
+                'boundingBox': _box(x, y0, x + 20 * len(token), y0 + 40),
+                'symbols': symbols,
+                'confidence': round(rng.uniform(0.85, 0.99), 2)
+            })
+            x += 20 * len(token) + 20
+        paragraphs.append({'boundingBox': _box(40, y0, x, y0 + 40), 'words': words, 'confidence': 0.95})
+
+    text = '\n'.join(lines) + '\n'
+    return {
+        'fullTextAnnotation': {
+            'text': text,
+            'pages': [{
+                'width': 1700,
+                'height': 2200,
+                'property': {'detectedLanguages': [{'languageCode': 'en', 'confidence': 1.0}]},
+                'blocks': [{'boundingBox': _box(40, 60, 400, questions * 60 + 40),
+                            'paragraphs': paragraphs, 'confidence': 0.95}],
+                'confidence': 0.95
+            }]
+        },
+        'textAnnotations': [{'description': text, 'locale': 'en'}]
+    }
+
+
+class StubState:
+    """Configuration and counters shared by all request handler threads"""
+
+    def __init__(self, args):
+        self.recordings = args.recordings
+        self.record = args.record
+        self.upstream_key = args.upstream_key
+        self.latency = parse_latency(args.latency)
+        self.per_image_latency = args.per_image_ms / 1000.0
+        self.error_rate = args.error_rate
+        self.throttle_rate = args.throttle_rate
+        self.retry_after = args.retry_after
+        self.questions = args.questions
+        self.lock = threading.Lock()
+        self.counters = {'requests': 0, 'images': 0, 'replayed': 0, 'recorded': 0,
+                         'synthesized': 0, 'throttled': 0, 'errors': 0}
+        os.makedirs(self.recordings, exist_ok=True)
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def respond(self, image_request):
+        """Produce one AnnotateImageResponse entry"""
+        content = base64.b64decode(image_request.get('image', {}).get('content', ''))
+        image_hash = hashlib.sha256(content).hexdigest()
+        path = os.path.join(self.recordings, f"{image_hash}.json")
+
+        if os.path.exists(path):
+            self.count('replayed')
+            with open(path, 'r', encoding='utf-8') as recording:
+                return json.load(recording)
+
+        if self.record:
+            import requests
+            response = requests.post(f"{UPSTREAM_URL}?key={self.upstream_key}",
+                                     json={'requests': [image_request]}, timeout=(5, 60))
+            response.raise_for_status()
+            entry = (response.json().get('responses') or [{}])[0]
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as recording:
+                json.dump(entry, recording)
+            os.replace(tmp_path, path)
+            self.count('recorded')
+            return entry
+
+        self.count('synthesized')
+        return synthesize_response(image_hash, self.questions)
+
+
+class VisionStubHandler(BaseHTTPRequestHandler):
+    """images:annotate stand-in"""
+
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real endpoint
+    state = None
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/stats':
+            with self.state.lock:
+                counters = dict(self.state.counters)
+            return self._send_json(200, counters)
+        self._send_json(404, {'error': {'code': 404, 'message': 'Not found'}})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+
+        if not self.path.split('?')[0].endswith('/images:annotate'):
+            return self._send_json(404, {'error': {'code': 404, 'message': 'Not found'}})
+
+        state = self.state
+        state.count('requests')
+
+        roll = random.random()
+        if roll < state.throttle_rate:
+            state.count('throttled')
+            return self._send_json(429, {'error': {'code': 429, 'message': 'Quota exceeded',
+                                                   'status': 'RESOURCE_EXHAUSTED'}},
+                                   headers={'Retry-After': str(state.retry_after)})
+        if roll < state.throttle_rate + state.error_rate:
+            state.count('errors')
+            return self._send_json(500, {'error': {'code': 500, 'message': 'Injected failure',
+                                                   'status': 'INTERNAL'}})
+
+        try:
+            image_requests = json.loads(body).get('requests', [])
+        except ValueError:
+            return self._send_json(400, {'error': {'code': 400, 'message': 'Invalid JSON payload'}})
+
+        state.count('images', len(image_requests))
+        time.sleep(state.latency() + state.per_image_latency * len(image_requests))
+
+        try:
+            responses = [state.respond(image_request) for image_request in image_requests]
+        except Exception as e:
+            state.count('errors')
+            return self._send_json(502, {'error': {'code': 502, 'message': f'Upstream failed: {str(e)}'}})
+
+        self._send_json(200, {'responses': responses})
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output readable
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Local Google Vision images:annotate stand-in')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8085)
+    parser.add_argument('--recordings', default=os.path.join('uploads', 'vision_recordings'),
+                        help='Directory of <sha256>.json recorded responses')
+    parser.add_argument('--record', action='store_true',
+                        help='Forward images without a recording to Google Vision and save the response')
+    parser.add_argument('--upstream-key', default=os.environ.get('GOOGLE_VISION_API_KEY'),
+                        help='API key used with --record (default: GOOGLE_VISION_API_KEY)')
+    parser.add_argument('--latency', default='lognormal:350:0.4',
+                        help='Per-request latency: none, fixed:MS, uniform:MIN_MS:MAX_MS or lognormal:MEDIAN_MS:SIGMA')
+    parser.add_argument('--per-image-ms', type=float, default=40.0,
+                        help='Extra latency per image in a batched request')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of requests answered with 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds sent with 429s')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 500')
+    parser.add_argument('--questions', type=int, default=10, help='Answer lines in synthesized responses')
+    return parser
+
+
+def start_server(args):
+    """Start the stand-in on a background thread and return the server"""
+    handler = type('Handler', (VisionStubHandler,), {'state': StubState(args)})
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='vision-stub', daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    args = build_parser().parse_args()
+    if args.record and not args.upstream_key:
+        print('--record requires --upstream-key or GOOGLE_VISION_API_KEY')
+        sys.exit(1)
+
+    server = start_server(args)
+    print(f"Vision stand-in listening on http://{args.host}:{args.port}/v1/images:annotate")
+    print(f"Stats: http://{args.host}:{args.port}/stats")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,34 @@
+"""
+Unit test fixtures
+
+Unlike the test_*.py scripts next to run.py, which drive a running server,
+these tests run in-process against a temporary SQLite database:
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """Application on a fresh SQLite database, with Redis-backed helpers kept local"""
+    for name in ('OCR_CACHE_BACKEND', 'OCR_RATE_LIMIT_REDIS_URL', 'EXAM_SNAPSHOT_REDIS_URL'):
+        monkeypatch.setenv(name, 'none')
+
+    from config import config
+    from app import create_app, db
+
+    class UnitTestConfig(config['testing']):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'test.db'}"
+        UPLOAD_FOLDER = str(tmp_path / 'uploads')
+
+    app = create_app(UnitTestConfig)
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.drop_all()
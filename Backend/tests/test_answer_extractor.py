@@ -0,0 +1,53 @@
+"""
+Answers located on the word layout keep the part that runs onto the next page
+"""
+from types import SimpleNamespace
+
+from app.services.ocr.answer_extractor import AnswerExtractor
+from app.services.ocr.layout import DocumentLayout, Word
+
+
+def _page_layout(lines, confidence=0.9):
+    """Layout with one line of words every 40 px, each word 100 px wide"""
+    words = [Word(text, confidence, (20 + 110 * x, 40 * line_id, 120 + 110 * x, 40 * line_id + 30), 0, 0, line_id)
+             for line_id, line in enumerate(lines) for x, text in enumerate(line.split())]
+    return DocumentLayout(words=words, pages=[{'width': 2000, 'height': 3000, 'language': 'en'}])
+
+
+def _pages(*page_lines):
+    return [(SimpleNamespace(id=number, page_number=number), _page_layout(lines))
+            for number, lines in enumerate(page_lines, start=1)]
+
+
+def test_answer_continues_on_next_page():
+    located = AnswerExtractor().locate_answers(_pages(
+        ['Q1: photosynthesis uses', 'light energy and'],
+        ['water to make glucose', 'Q2: mitochondria']
+    ))
+
+    assert located[1]['answer_text'] == 'photosynthesis uses light energy and water to make glucose'
+    assert located[1]['bounding_box']['page'] == 1
+    assert located[1]['ocr_result_id'] == 1
+    assert located[2]['answer_text'] == 'mitochondria'
+
+
+def test_answer_continues_over_a_page_without_markers():
+    located = AnswerExtractor().locate_answers(_pages(
+        ['Q1: first part'],
+        ['second part'],
+        ['third part', 'Q2: next answer']
+    ))
+
+    assert located[1]['answer_text'] == 'first part second part third part'
+    assert located[2]['answer_text'] == 'next answer'
+
+
+def test_answer_closed_by_a_marker_is_not_continued():
+    located = AnswerExtractor().locate_answers(_pages(
+        ['Q1: first', 'Q2: second'],
+        ['Q3: third']
+    ))
+
+    assert located[1]['answer_text'] == 'first'
+    assert located[2]['answer_text'] == 'second'
+    assert located[3]['answer_text'] == 'third'
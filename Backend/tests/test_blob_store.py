@@ -0,0 +1,108 @@
+"""
+Raw response blobs are released with the OCR results that point at them
+"""
+import os
+
+import pytest
+
+from app import db
+from app.models.exam import Exam
+from app.models.submission import OCRResult, Submission
+from app.models.user import User
+from app.services.tasks.ocr_tasks import _clear_ocr_results
+from app.utils.blob_store import delete_json_blob, get_json_blob, put_json_blob
+from scripts.backfill_ocr_blobs import move_inline_responses, rebuild_reference_counts
+
+RESPONSE = {'responses': [{'fullTextAnnotation': {'text': 'Q1: Paris'}}]}
+
+
+@pytest.fixture
+def submission(app):
+    teacher = User(username='teacher', email='teacher@example.com', first_name='T', last_name='T')
+    student = User(username='student', email='student@example.com', first_name='S', last_name='S')
+    for user in (teacher, student):
+        user.set_password('secret')
+    db.session.add_all([teacher, student])
+    db.session.flush()
+    exam = Exam(title='Exam', creator_id=teacher.id, is_published=True, is_active=True)
+    db.session.add(exam)
+    db.session.flush()
+    submission = Submission(exam_id=exam.id, student_id=student.id, submission_status='completed')
+    db.session.add(submission)
+    db.session.commit()
+    return submission
+
+
+def _blob_path(app, blob_ref):
+    return os.path.join(app.config['UPLOAD_FOLDER'], blob_ref)
+
+
+def _add_results(submission, count):
+    refs = []
+    for page in range(1, count + 1):
+        blob = put_json_blob(RESPONSE)
+        db.session.add(OCRResult(submission_id=submission.id, page_number=page, raw_response_ref=blob['ref']))
+        refs.append(blob['ref'])
+    db.session.commit()
+    return refs
+
+
+def test_identical_blobs_are_removed_with_the_last_reference(app):
+    first, second = put_json_blob(RESPONSE), put_json_blob(RESPONSE)
+    assert first['ref'] == second['ref']
+
+    assert delete_json_blob(first['ref'])
+    assert get_json_blob(first['ref']) == RESPONSE
+
+    assert delete_json_blob(second['ref'])
+    assert not os.path.exists(_blob_path(app, first['ref']))
+
+
+def test_clearing_ocr_results_releases_blobs_on_commit(app, submission):
+    blob_ref = _add_results(submission, 2)[0]
+
+    _clear_ocr_results(submission.id)
+    db.session.rollback()
+    assert os.path.exists(_blob_path(app, blob_ref))
+
+    _clear_ocr_results(submission.id)
+    db.session.commit()
+    assert not os.path.exists(_blob_path(app, blob_ref))
+
+
+def test_deleting_a_submission_releases_its_blobs(app, submission):
+    blob_ref = _add_results(submission, 1)[0]
+
+    db.session.delete(submission)
+    db.session.commit()
+
+    assert not os.path.exists(_blob_path(app, blob_ref))
+
+
+def test_backfill_moves_inline_responses_and_recounts(app, submission):
+    legacy = OCRResult(submission_id=submission.id, page_number=1, raw_response=RESPONSE)
+    db.session.add(legacy)
+    db.session.commit()
+
+    assert move_inline_responses(batch_size=10, dry_run=False) == 1
+    assert legacy.raw_response_ref and legacy.load_raw_response() == RESPONSE
+
+    # A blob left behind by a row deleted before counting started
+    orphan = put_json_blob({'responses': []})['ref']
+    os.remove(_blob_path(app, orphan) + '.refs')
+
+    updated, removed, missing = rebuild_reference_counts(min_age_minutes=0, dry_run=False)
+
+    assert (updated, removed, missing) == (1, 1, 0)
+    assert not os.path.exists(_blob_path(app, orphan))
+    with open(_blob_path(app, legacy.raw_response_ref) + '.refs') as refs_file:
+        assert refs_file.read() == '1'
+
+
+def test_uncounted_legacy_blob_is_never_deleted(app):
+    blob_ref = put_json_blob(RESPONSE)['ref']
+    os.remove(_blob_path(app, blob_ref) + '.refs')
+
+    assert put_json_blob(RESPONSE)['ref'] == blob_ref
+    assert not delete_json_blob(blob_ref)
+    assert get_json_blob(blob_ref) == RESPONSE
@@ -0,0 +1,58 @@
+"""
+Size-capped LRU cache directories shared by the OCR and preview caches
+"""
+import os
+import time
+
+from app.services.ocr.ocr_cache import DiskOCRCache
+from app.services.preview_service import PreviewCache
+from app.utils.disk_lru import DiskLRUDirectory
+
+
+def _writer(data):
+    def write(tmp_path):
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+    return write
+
+
+def test_overwriting_an_entry_does_not_grow_the_size(tmp_path):
+    store = DiskLRUDirectory(str(tmp_path), max_bytes=10_000)
+    path = store.path('abcdef')
+
+    for _ in range(50):
+        store.write(path, _writer(b'x' * 1000))
+    store.write(path, _writer(b'x' * 400))
+
+    assert store._total_bytes == 400
+    assert os.path.exists(path)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    store = DiskLRUDirectory(str(tmp_path), max_bytes=3000)
+    paths = [store.path(f'{name}-entry') for name in ('aa', 'bb', 'cc')]
+    for age, path in enumerate(paths):
+        store.write(path, _writer(b'x' * 1000))
+        stamp = time.time() - 100 + age
+        os.utime(path, (stamp, stamp))
+
+    assert store.touch(paths[0])  # 'aa' is now the most recently used
+    store.write(store.path('dd-entry'), _writer(b'x' * 1000))
+
+    assert [os.path.exists(path) for path in paths] == [True, False, False]
+    assert store._total_bytes <= 2700
+
+
+def test_caches_store_and_find_entries(tmp_path):
+    ocr_cache = DiskOCRCache(str(tmp_path / 'ocr'), max_bytes=10_000)
+    ocr_cache.set('ab12', {'text': 'Q1: Paris'})
+    assert ocr_cache.get('ab12') == {'text': 'Q1: Paris'}
+    assert ocr_cache.get('cd34') is None
+
+    previews = PreviewCache(str(tmp_path / 'previews'), max_bytes=10_000)
+    path = previews.set('ef56', 'png', b'png bytes')
+    assert previews.get('ef56', 'png') == path
+    assert previews.get('ef56', 'jpeg') is None
+
+    ocr_cache.clear()
+    assert ocr_cache.get('ab12') is None
@@ -0,0 +1,36 @@
+"""
+Content-addressed storage keeps no lock file per stored file
+"""
+import os
+
+from app.utils.file_upload import delete_file, store_local_file
+
+
+def _store(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_bytes(content)
+    stored = store_local_file(str(path), 'submissions', file_ext='pdf')
+    assert stored['success'], stored
+    return stored
+
+
+def _stored_files(app):
+    root = os.path.join(app.config['UPLOAD_FOLDER'], 'submissions')
+    return sorted(name for _, _, files in os.walk(root) for name in files)
+
+
+def test_uploads_leave_only_one_lock_per_directory(app, tmp_path):
+    stored = [_store(tmp_path, f'scan{i}.pdf', f'scan {i}'.encode()) for i in range(5)]
+    duplicate = _store(tmp_path, 'again.pdf', b'scan 0')
+    assert duplicate['deduplicated'] and duplicate['filepath'] == stored[0]['filepath']
+
+    for result in stored:
+        assert delete_file(result['filepath'])
+
+    # The duplicate still holds a reference to scan 0
+    full_path = os.path.join(app.config['UPLOAD_FOLDER'], duplicate['filepath'])
+    assert os.path.exists(full_path)
+
+    assert delete_file(duplicate['filepath'])
+    assert not os.path.exists(full_path)
+    assert set(_stored_files(app)) == {'refs.lock'}
@@ -0,0 +1,122 @@
+"""
+OCR tasks end in a clean status instead of crashing or waiting forever
+"""
+import time
+from types import SimpleNamespace
+
+import celery
+import pytest
+
+from app import db
+from app.models.exam import Exam
+from app.models.submission import Submission
+from app.models.user import User
+from app.services.ocr.rate_limiter import VisionUnavailableError
+from app.services.tasks import ocr_tasks
+
+
+@pytest.fixture
+def submission(app):
+    teacher = User(username='teacher', email='teacher@example.com', first_name='T', last_name='T')
+    student = User(username='student', email='student@example.com', first_name='S', last_name='S')
+    for user in (teacher, student):
+        user.set_password('secret')
+    db.session.add_all([teacher, student])
+    db.session.flush()
+    exam = Exam(title='Exam', creator_id=teacher.id, is_published=True, is_active=True)
+    db.session.add(exam)
+    db.session.flush()
+    submission = Submission(exam_id=exam.id, student_id=student.id, submission_status='pending',
+                            scan_type='full_page')
+    db.session.add(submission)
+    db.session.commit()
+    return submission
+
+
+def _vision_down(*args, **kwargs):
+    raise VisionUnavailableError('circuit open', retry_after=60)
+
+
+def test_submission_without_pages_fails_cleanly(submission, monkeypatch):
+    monkeypatch.setattr(ocr_tasks, '_prepare_pages', lambda *args: ([], [], []))
+
+    result = ocr_tasks.process_submission_ocr(submission.id)
+
+    assert result['status'] == 'failed'
+    assert 'no OCR results' in result['error']
+    assert db.session.get(Submission, submission.id).submission_status == 'failed'
+
+
+def test_submission_is_parked_during_short_outage(submission, monkeypatch):
+    monkeypatch.setenv('OCR_VISION_OUTAGE_MAX_WAIT', '3600')
+    monkeypatch.setattr(ocr_tasks, '_prepare_pages', _vision_down)
+
+    result = ocr_tasks.process_submission_ocr(submission.id)
+
+    assert result['status'] == 'parked'
+    assert db.session.get(Submission, submission.id).submission_status == 'pending'
+
+
+def test_submission_fails_after_long_outage(submission, monkeypatch):
+    monkeypatch.setenv('OCR_VISION_OUTAGE_MAX_WAIT', '3600')
+    monkeypatch.setattr(ocr_tasks, '_prepare_pages', _vision_down)
+
+    result = ocr_tasks.process_submission_ocr(submission.id, parked_since=time.time() - 3590)
+
+    assert result['status'] == 'failed'
+    assert db.session.get(Submission, submission.id).submission_status == 'failed'
+
+
+class FakeTask:
+    """Stands in for celery.current_task, recording the retry it was asked for"""
+
+    def __init__(self, kwargs):
+        self.request = SimpleNamespace(kwargs=kwargs)
+        self.retried_with = None
+
+    def retry(self, **options):
+        self.retried_with = options
+        return celery.exceptions.Retry()
+
+
+def _run_page_during_outage(submission, monkeypatch, parked_since=None):
+    kwargs = {'image_path': 'page_1.png', 'mode': 'pages'}
+    if parked_since:
+        kwargs['parked_since'] = parked_since
+    monkeypatch.setenv('GOOGLE_VISION_API_KEY', 'test-key')
+    monkeypatch.setattr(celery, 'current_task', FakeTask(kwargs))
+    monkeypatch.setattr(ocr_tasks.OCRStrategySelector, 'execute_strategy', _vision_down)
+    ocr_tasks.process_single_page_ocr(submission.id, 1, **kwargs)
+
+
+def test_page_retry_carries_parked_since(submission, monkeypatch):
+    monkeypatch.setenv('OCR_VISION_OUTAGE_MAX_WAIT', '3600')
+
+    with pytest.raises(celery.exceptions.Retry):
+        _run_page_during_outage(submission, monkeypatch)
+
+    task = celery.current_task
+    assert task.retried_with['max_retries'] is None
+    assert task.retried_with['kwargs']['image_path'] == 'page_1.png'
+    assert time.time() - task.retried_with['kwargs']['parked_since'] < 60
+
+
+def test_page_gives_up_after_long_outage(submission, monkeypatch):
+    monkeypatch.setenv('OCR_VISION_OUTAGE_MAX_WAIT', '3600')
+
+    with pytest.raises(VisionUnavailableError):
+        _run_page_during_outage(submission, monkeypatch, parked_since=time.time() - 3590)
+
+    assert celery.current_task.retried_with is None
+
+
+def test_pipeline_start_fails_cleanly_when_preparing_pages_fails(submission, monkeypatch):
+    def corrupt_pdf(*args):
+        raise RuntimeError('Unable to get page count. Is poppler installed and in PATH?')
+    monkeypatch.setattr(ocr_tasks, '_prepare_pages', corrupt_pdf)
+
+    result = ocr_tasks.start_submission_ocr_pipeline(submission.id)
+
+    assert result['status'] == 'failed'
+    assert 'page count' in result['error']
+    assert db.session.get(Submission, submission.id).submission_status == 'failed'
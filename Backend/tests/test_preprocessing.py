@@ -0,0 +1,101 @@
+"""
+ScanPreprocessor page order when the worker pool is unavailable, and the ink mask
+"""
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.services.ocr import preprocessing
+from app.services.ocr.preprocessing import ScanPreprocessor
+
+
+def _pages(tmp_path, count):
+    """Blank pages told apart by their width"""
+    paths = []
+    for i in range(count):
+        path = str(tmp_path / f'scan_{i + 1}.png')
+        Image.new('L', (400 + 10 * i, 500), 255).save(path)
+        paths.append(path)
+    return paths
+
+
+def _widths(results):
+    return [result['original_size'][0] for result in results]
+
+
+@pytest.fixture(autouse=True)
+def _no_real_pool(monkeypatch):
+    monkeypatch.setattr(preprocessing, 'disable_preprocess_pool', lambda reason: None)
+
+
+def test_pool_unavailable_keeps_page_order(tmp_path, monkeypatch):
+    monkeypatch.setattr(preprocessing, 'get_preprocess_pool', lambda workers: None)
+    paths = _pages(tmp_path, 4)
+
+    results = ScanPreprocessor(workers=2).process(iter(paths), str(tmp_path / 'out'))
+
+    assert _widths(results) == [400, 410, 420, 430]
+
+
+def test_pool_failing_to_start_keeps_page_order(tmp_path, monkeypatch):
+    def broken(workers):
+        raise OSError('cannot spawn')
+
+    monkeypatch.setattr(preprocessing, 'get_preprocess_pool', broken)
+    paths = _pages(tmp_path, 4)
+
+    results = ScanPreprocessor(workers=2).process(iter(paths), str(tmp_path / 'out'))
+
+    assert _widths(results) == [400, 410, 420, 430]
+
+
+def test_pool_failing_on_submit_keeps_page_order(tmp_path, monkeypatch):
+    class FlakyPool:
+        """Runs the first two pages, then stops accepting work"""
+
+        def __init__(self):
+            self.submitted = 0
+
+        def submit(self, fn, *args):
+            from concurrent.futures import Future
+            if self.submitted == 2:
+                raise RuntimeError('pool shut down')
+            self.submitted += 1
+            future = Future()
+            future.set_result(fn(*args))
+            return future
+
+    pool = FlakyPool()
+    monkeypatch.setattr(preprocessing, 'get_preprocess_pool', lambda workers: pool)
+    paths = _pages(tmp_path, 5)
+
+    results = ScanPreprocessor(workers=2).process(iter(paths), str(tmp_path / 'out'))
+
+    assert pool.submitted == 2
+    assert _widths(results) == [400, 410, 420, 430, 440]
+    assert [result['image_path'].rsplit('_', 1)[1] for result in results] == \
+        ['1.png', '2.png', '3.png', '4.png', '5.png']
+
+
+def test_skipped_pages_stay_in_place_without_pool(tmp_path, monkeypatch):
+    monkeypatch.setattr(preprocessing, 'get_preprocess_pool', lambda workers: None)
+    paths = _pages(tmp_path, 3)
+
+    results = ScanPreprocessor(workers=2).process(iter(paths), str(tmp_path / 'out'), skip_pages=[2])
+
+    assert results[1] == {'image_path': paths[1], 'steps': []}
+    assert results[0]['original_size'][0] == 400 and results[2]['original_size'][0] == 420
+
+
+def test_ink_mask_matches_window_means():
+    gray = np.random.default_rng(0).integers(0, 256, (40, 55), dtype=np.uint8)
+    window, k = 15, 0.15
+    radius = window // 2
+
+    expected = np.zeros(gray.shape, dtype=bool)
+    for y in range(gray.shape[0]):
+        for x in range(gray.shape[1]):
+            region = gray[max(0, y - radius):y + radius + 1, max(0, x - radius):x + radius + 1]
+            expected[y, x] = int(gray[y, x]) * region.size < int(region.sum()) * (1.0 - k)
+
+    assert np.array_equal(preprocessing._ink_mask(gray, window, k), expected)
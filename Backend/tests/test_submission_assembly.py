@@ -0,0 +1,73 @@
+"""
+Submissions whose background PDF build was lost can be uploaded again
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.api.submissions import check_submission_target
+from app.models.exam import Exam
+from app.models.submission import Submission
+from app.models.user import Role, User, UserRole
+from app.services.submission_assembly import ASSEMBLING_STATUS, is_assembly_abandoned
+
+
+@pytest.fixture
+def student_and_exam(app):
+    teacher = User(username='teacher', email='teacher@example.com', first_name='T', last_name='T')
+    student = User(username='student', email='student@example.com', first_name='S', last_name='S')
+    for user in (teacher, student):
+        user.set_password('secret')
+    role = Role(name='student')
+    db.session.add_all([teacher, student, role])
+    db.session.flush()
+    db.session.add(UserRole(user_id=student.id, role_id=role.id))
+    exam = Exam(title='Exam', creator_id=teacher.id, is_published=True, is_active=True)
+    db.session.add(exam)
+    db.session.commit()
+    return student, exam
+
+
+def _assembling(student, exam, age):
+    started = datetime.utcnow() - age
+    submission = Submission(exam_id=exam.id, student_id=student.id, submission_status=ASSEMBLING_STATUS,
+                            created_at=started, updated_at=started)
+    db.session.add(submission)
+    db.session.commit()
+    return submission
+
+
+def test_recent_assembly_blocks_new_upload(student_and_exam):
+    student, exam = student_and_exam
+    submission = _assembling(student, exam, timedelta(minutes=1))
+
+    student_id, error = check_submission_target(student, exam.id)
+
+    assert not is_assembly_abandoned(submission)
+    assert student_id is None and error[1] == 409
+
+
+def test_abandoned_assembly_is_replaced(student_and_exam, monkeypatch):
+    monkeypatch.setenv('SUBMISSION_ASSEMBLY_TIMEOUT_MINUTES', '30')
+    student, exam = student_and_exam
+    submission = _assembling(student, exam, timedelta(hours=2))
+    submission_id = submission.id
+
+    student_id, error = check_submission_target(student, exam.id)
+
+    assert is_assembly_abandoned(submission)
+    assert error is None and student_id == student.id
+    db.session.commit()
+    assert db.session.get(Submission, submission_id) is None
+
+
+def test_completed_submission_is_never_abandoned(student_and_exam):
+    student, exam = student_and_exam
+    submission = _assembling(student, exam, timedelta(days=1))
+    submission.submission_status = 'completed'
+    submission.scanned_paper_path = 'submissions/paper.pdf'
+    db.session.commit()
+
+    assert not is_assembly_abandoned(submission)
+    assert check_submission_target(student, exam.id)[1][1] == 409
@@ -0,0 +1,57 @@
+"""
+The question marker lexer splits text exactly like the regex it replaced
+"""
+import random
+import re
+
+import pytest
+
+from app.services.ocr.text_processor import TextProcessor
+
+
+def legacy_split_by_questions(text):
+    """split_by_questions before the lexer"""
+    answers = {}
+    matches = list(re.finditer(r'(?:Q|Question|س|السؤال)?\s*(\d+)[\s:.-]', text, re.IGNORECASE))
+    for i, match in enumerate(matches):
+        end_pos = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        answers[int(match.group(1))] = re.sub(r'\s+', ' ', text[match.end():end_pos].strip())
+    return answers
+
+
+MARKER_FIXTURES = [
+    'Q1: Paris\nQ2: Berlin\nQ3. Rome',
+    'Question 1 - photosynthesis\nQuestion 2: mitochondria',
+    '1. first answer\n2. second answer\n10. tenth answer',
+    'Q1) Paris\nQ2) Berlin',
+    'Q1) (A)\n2. x = (y+2) * 3\n3) seven',
+    'س1: القاهرة\nس2: الرياض',
+    'السؤال ١: نعم\nالسؤال ٢ - لا',
+    'س١) أ\nس٢. ب',
+    'Q１ fullwidth\nQ２: digits',
+    'subquestion 4: eq3 12.5 kg\nQ 7 spaced',
+    'QUESTION3:upper\nquestion4 lower\nq5-dash',
+    '',
+    'no markers at all',
+    'Q1:\n\nQ1: repeated number',
+]
+
+
+@pytest.mark.parametrize('text', MARKER_FIXTURES)
+def test_split_matches_legacy_regex(text):
+    assert TextProcessor.split_by_questions(text) == legacy_split_by_questions(text)
+
+
+def test_split_matches_legacy_regex_on_random_text():
+    pieces = ['Q', 'q', 'Question', 'question', 'س', 'السؤال', '1', '2', '12', '٣', '۴', '７',
+              ' ', '  ', '\n', ':', '.', '-', ')', '(', 'a', 'answer', 'x+2']
+    rng = random.Random(21)
+    for _ in range(2000):
+        text = ''.join(rng.choice(pieces) for _ in range(rng.randint(1, 30)))
+        assert TextProcessor.split_by_questions(text) == legacy_split_by_questions(text), repr(text)
+
+
+def test_prefixed_parenthesis_marker_is_found_for_one_question():
+    text = 'Q1) Paris\nQ2) Berlin'
+
+    assert TextProcessor.extract_answer_from_pattern(text, 2) == 'Berlin'
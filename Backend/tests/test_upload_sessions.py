@@ -0,0 +1,93 @@
+"""
+Finalizing a resumable upload can be retried after a lost response
+"""
+import hashlib
+import io
+import os
+import time
+
+import pytest
+from flask_jwt_extended import create_access_token
+from PIL import Image
+
+from app import db
+from app.models.exam import Exam
+from app.models.submission import Submission
+from app.models.user import Role, User, UserRole
+from app.utils.upload_sessions import finalize_upload_session, get_finalized_upload
+
+UPLOADS = '/api/v1/submissions/uploads'
+
+
+@pytest.fixture
+def student_and_exam(app):
+    teacher = User(username='teacher', email='teacher@example.com', first_name='T', last_name='T')
+    student = User(username='student', email='student@example.com', first_name='S', last_name='S')
+    for user in (teacher, student):
+        user.set_password('secret')
+    role = Role(name='student')
+    db.session.add_all([teacher, student, role])
+    db.session.flush()
+    db.session.add(UserRole(user_id=student.id, role_id=role.id))
+    exam = Exam(title='Exam', creator_id=teacher.id, is_published=True, is_active=True)
+    db.session.add(exam)
+    db.session.commit()
+    return student, exam
+
+
+def _scan_bytes():
+    buffer = io.BytesIO()
+    Image.new('L', (200, 100), 255).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def _upload(app, student, exam):
+    """Start a session and send the whole scan as one chunk"""
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {create_access_token(identity=str(student.id))}'}
+    data = _scan_bytes()
+
+    response = client.post(UPLOADS, headers=headers,
+                           json={'exam_id': exam.id, 'filename': 'scan.png', 'total_size': len(data)})
+    assert response.status_code == 201, response.get_json()
+    upload_id = response.get_json()['upload']['upload_id']
+
+    response = client.put(f'{UPLOADS}/{upload_id}?offset=0', data=data,
+                          headers=dict(headers, **{'X-Chunk-SHA256': hashlib.sha256(data).hexdigest(),
+                                                   'Content-Type': 'application/octet-stream'}))
+    assert response.status_code == 200, response.get_json()
+    return client, headers, upload_id
+
+
+def test_repeated_finalize_returns_the_same_submission(app, student_and_exam):
+    student, exam = student_and_exam
+    client, headers, upload_id = _upload(app, student, exam)
+
+    first = client.post(f'{UPLOADS}/{upload_id}/finalize', headers=headers)
+    retry = client.post(f'{UPLOADS}/{upload_id}/finalize', headers=headers)
+
+    assert first.status_code == 201, first.get_json()
+    assert retry.status_code == 200, retry.get_json()
+    assert retry.get_json()['submission']['id'] == first.get_json()['submission']['id']
+    assert Submission.query.filter_by(exam_id=exam.id).count() == 1
+
+    # The session itself is closed: no more chunks, and only the marker is left
+    assert client.get(f'{UPLOADS}/{upload_id}', headers=headers).status_code == 404
+    session_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'upload_sessions', upload_id)
+    assert 'data.part' not in os.listdir(session_dir)
+
+
+def test_finalize_marker_expires(app, student_and_exam, monkeypatch):
+    student, exam = student_and_exam
+    client, headers, upload_id = _upload(app, student, exam)
+    assert client.post(f'{UPLOADS}/{upload_id}/finalize', headers=headers).status_code == 201
+
+    assert finalize_upload_session(upload_id)['already_finalized']
+
+    monkeypatch.setenv('UPLOAD_SESSION_TTL_HOURS', '1')
+    completion_path = os.path.join(app.config['UPLOAD_FOLDER'], 'upload_sessions', upload_id, 'complete.json')
+    stale = time.time() - 2 * 3600
+    os.utime(completion_path, (stale, stale))
+
+    assert get_finalized_upload(upload_id) is None
+    assert client.post(f'{UPLOADS}/{upload_id}/finalize', headers=headers).status_code == 404
@@ -0,0 +1,54 @@
+"""
+Word boxes from a downscaled Vision upload are reported in page pixels
+"""
+import numpy as np
+from PIL import Image
+
+from app.services.ocr.google_vision_ocr import GoogleVisionOCR
+from app.services.ocr.image_optimizer import ImageOptimizer
+from app.services.ocr.preprocessing import source_box
+
+
+def _vertices(x0, y0, x1, y1):
+    return {'vertices': [{'x': x0, 'y': y0}, {'x': x1, 'y': y0}, {'x': x1, 'y': y1}, {'x': x0, 'y': y1}]}
+
+
+def _response(box):
+    """One-word DOCUMENT_TEXT_DETECTION response, as Vision returns it for the sent image"""
+    word = {'boundingBox': _vertices(*box), 'confidence': 0.9,
+            'symbols': [{'text': 'A', 'confidence': 0.9, 'property': {'detectedBreak': {'type': 'LINE_BREAK'}}}]}
+    paragraph = {'boundingBox': _vertices(*box), 'confidence': 0.9, 'words': [word]}
+    block = {'boundingBox': _vertices(*box), 'confidence': 0.9, 'paragraphs': [paragraph]}
+    return {'responses': [{'fullTextAnnotation': {
+        'text': 'A\n', 'pages': [{'width': 1000, 'height': 750, 'confidence': 0.9, 'blocks': [block]}]}}]}
+
+
+def test_downscaled_upload_boxes_map_back_to_page(tmp_path, monkeypatch):
+    # A phone-photo sized page that the optimizer halves before upload
+    page = str(tmp_path / 'page.png')
+    noise = np.random.default_rng(0).integers(0, 256, (1500, 2000), dtype=np.uint8)
+    Image.fromarray(noise).save(page)
+
+    ocr = GoogleVisionOCR(api_key='test', session=object(), rate_limiter=object(),
+                          image_optimizer=ImageOptimizer(enabled=True, max_long_edge=1000, min_bytes=0))
+    monkeypatch.setattr(ocr, '_post', lambda image_requests: _response((100, 50, 200, 100)))
+
+    result = ocr.detect_document_text(page)
+
+    assert result['payload']['scale'] == 0.5
+    assert result['layout'].words[0].bbox == (200, 100, 400, 200)
+    assert result['layout'].pages[0]['width'] == 2000
+    # The unprocessed page's preview region is the word's share of the scanned page
+    assert source_box(list(result['layout'].words[0].bbox), {'steps': [], 'original_size': [2000, 1500]}) == \
+        [0.1, 100 / 1500, 0.2, 200 / 1500]
+
+
+def test_full_size_upload_boxes_unchanged(tmp_path, monkeypatch):
+    page = str(tmp_path / 'page.png')
+    Image.new('L', (1000, 750), 255).save(page)
+
+    ocr = GoogleVisionOCR(api_key='test', session=object(), rate_limiter=object(),
+                          image_optimizer=ImageOptimizer(enabled=False))
+    monkeypatch.setattr(ocr, '_post', lambda image_requests: _response((100, 50, 200, 100)))
+
+    assert ocr.detect_document_text(page)['layout'].words[0].bbox == (100, 50, 200, 100)